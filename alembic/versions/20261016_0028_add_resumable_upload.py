@@ -0,0 +1,51 @@
+"""add ResumableUpload table for tus-style guest uploads
+
+Revision ID: 20261016_0028
+Revises: 20251211_0027
+Create Date: 2026-10-16 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_0028"
+down_revision = "20251211_0027"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ResumableUpload",
+        sa.Column("UploadID", sa.String(length=32), primary_key=True, nullable=False),
+        sa.Column("EventID", sa.Integer(), sa.ForeignKey("Event.EventID"), nullable=False),
+        sa.Column(
+            "GuestID", sa.Integer(), sa.ForeignKey("GuestSession.GuestID"), nullable=False
+        ),
+        sa.Column("FileName", sa.String(length=255), nullable=False),
+        sa.Column("DeclaredType", sa.String(length=64), nullable=True),
+        sa.Column("Length", sa.BigInteger(), nullable=False),
+        sa.Column("Offset", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("StagingPath", sa.String(length=400), nullable=False),
+        sa.Column("Status", sa.String(length=16), nullable=False, server_default="uploading"),
+        sa.Column(
+            "FileMetadataID",
+            sa.Integer(),
+            sa.ForeignKey("FileMetadata.FileMetadataID"),
+            nullable=True,
+        ),
+        sa.Column("CreatedAt", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.Column("UpdatedAt", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+    )
+    op.create_index(
+        "IX_ResumableUpload_Guest", "ResumableUpload", ["EventID", "GuestID", "Status"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("IX_ResumableUpload_Guest", table_name="ResumableUpload")
+    op.drop_table("ResumableUpload")
@@ -0,0 +1,38 @@
+"""
+Add CurrentUsageBytes to EventStorage for incremental usage accounting.
+
+Revision ID: 20261016_0029
+Revises: 20261016_0028
+Create Date: 2026-10-16
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20261016_0029"
+down_revision = "20261016_0028"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("EventStorage", schema="dbo") as batch_op:
+        batch_op.add_column(
+            sa.Column(
+                "CurrentUsageBytes", sa.BigInteger(), nullable=False, server_default=sa.text("0")
+            )
+        )
+    # Seed from the MB figure; the reconciler replaces it with exact byte counts
+    op.execute(
+        "UPDATE dbo.EventStorage SET CurrentUsageBytes = "
+        "CAST(CurrentUsageMB AS BIGINT) * 1048576"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("EventStorage", schema="dbo") as batch_op:
+        batch_op.drop_column("CurrentUsageBytes")
@@ -0,0 +1,47 @@
+"""add MediaJob table for the durable media-ingest queue
+
+Revision ID: 20261016_0030
+Revises: 20261016_0029
+Create Date: 2026-10-16 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_0030"
+down_revision = "20261016_0029"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "MediaJob",
+        sa.Column("JobID", sa.Integer(), primary_key=True, autoincrement=True, nullable=False),
+        sa.Column("Kind", sa.String(length=32), nullable=False),
+        sa.Column("EventID", sa.Integer(), sa.ForeignKey("dbo.Event.EventID"), nullable=False),
+        sa.Column("FileMetadataID", sa.Integer(), nullable=True),
+        sa.Column("Payload", sa.Text(), nullable=True),
+        sa.Column("Status", sa.String(length=16), nullable=False, server_default="queued"),
+        sa.Column("Attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("MaxAttempts", sa.Integer(), nullable=False, server_default="5"),
+        sa.Column("RunAfter", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.Column("LockedBy", sa.String(length=64), nullable=True),
+        sa.Column("LockedAt", sa.DateTime(), nullable=True),
+        sa.Column("LastError", sa.Text(), nullable=True),
+        sa.Column("CreatedAt", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.Column("UpdatedAt", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        schema="dbo",
+    )
+    op.create_index(
+        "IX_MediaJob_Status_RunAfter", "MediaJob", ["Status", "RunAfter"], schema="dbo"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("IX_MediaJob_Status_RunAfter", table_name="MediaJob", schema="dbo")
+    op.drop_table("MediaJob", schema="dbo")
@@ -0,0 +1,31 @@
+"""add IX_Purchase_UserID_Status for the entitlement lookup
+
+Revision ID: 20261016_0031
+Revises: 20261016_0030
+Create Date: 2026-10-16 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_0031"
+down_revision = "20261016_0030"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Latest paid purchase per user (app.services.entitlements) is a seek on this index
+    op.create_index(
+        "IX_Purchase_UserID_Status",
+        "Purchase",
+        ["UserID", "Status", "CreatedAt"],
+        schema="dbo",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("IX_Purchase_UserID_Status", table_name="Purchase", schema="dbo")
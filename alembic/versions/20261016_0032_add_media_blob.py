@@ -0,0 +1,49 @@
+"""add MediaBlob table and FileMetadata.BlobID for content-addressed originals
+
+Revision ID: 20261016_0032
+Revises: 20261016_0031
+Create Date: 2026-10-16 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_0032"
+down_revision = "20261016_0031"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "MediaBlob",
+        sa.Column("BlobID", sa.Integer(), primary_key=True, autoincrement=True, nullable=False),
+        sa.Column("UserID", sa.Integer(), sa.ForeignKey("dbo.Users.UserID"), nullable=False),
+        sa.Column("Checksum", sa.String(length=64), nullable=False),
+        sa.Column("Size", sa.BigInteger(), nullable=False),
+        sa.Column("RefCount", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("CreatedAt", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.Column("UpdatedAt", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        schema="dbo",
+    )
+    op.create_index(
+        "UX_MediaBlob_UserID_Checksum",
+        "MediaBlob",
+        ["UserID", "Checksum"],
+        unique=True,
+        schema="dbo",
+    )
+    # Existing files keep their per-event copies; only new uploads reference blobs
+    with op.batch_alter_table("FileMetadata", schema="dbo") as batch_op:
+        batch_op.add_column(sa.Column("BlobID", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("FileMetadata", schema="dbo") as batch_op:
+        batch_op.drop_column("BlobID")
+    op.drop_index("UX_MediaBlob_UserID_Checksum", table_name="MediaBlob", schema="dbo")
+    op.drop_table("MediaBlob", schema="dbo")
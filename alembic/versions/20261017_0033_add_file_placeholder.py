@@ -0,0 +1,29 @@
+"""add FileMetadata.Placeholder for inline gallery blur-up placeholders
+
+Revision ID: 20261017_0033
+Revises: 20261016_0032
+Create Date: 2026-10-17 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261017_0033"
+down_revision = "20261016_0032"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Filled in as thumbnails render; existing files stay NULL until backfilled
+    with op.batch_alter_table("FileMetadata", schema="dbo") as batch_op:
+        batch_op.add_column(sa.Column("Placeholder", sa.String(length=1024), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("FileMetadata", schema="dbo") as batch_op:
+        batch_op.drop_column("Placeholder")
@@ -0,0 +1,43 @@
+"""add gallery keyset indexes on EventGalleryOrder and FileMetadata
+
+Revision ID: 20261017_0034
+Revises: 20261017_0033
+Create Date: 2026-10-17 00:00:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "20261017_0034"
+down_revision = "20261017_0033"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Each gallery page (app.api.gallery._build_gallery_files) is a range seek on
+    # one of these, in the order the page is read: ordinals, then chronological
+    op.create_index(
+        "IX_EventGalleryOrder_EventID_Ordinal",
+        "EventGalleryOrder",
+        ["EventID", "Ordinal", "FileMetadataID"],
+        schema="dbo",
+    )
+    op.create_index(
+        "IX_FileMetadata_EventID_Captured_Upload",
+        "FileMetadata",
+        ["EventID", "CapturedDateTime", "UploadDate", "FileMetadataID"],
+        schema="dbo",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "IX_FileMetadata_EventID_Captured_Upload", table_name="FileMetadata", schema="dbo"
+    )
+    op.drop_index(
+        "IX_EventGalleryOrder_EventID_Ordinal", table_name="EventGalleryOrder", schema="dbo"
+    )
@@ -5,7 +5,13 @@ import os
 from typing import Optional
 
 from fastapi import APIRouter, Depends, Form, HTTPException, Request
-from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse, Response
+from fastapi.responses import (
+    HTMLResponse,
+    JSONResponse,
+    PlainTextResponse,
+    RedirectResponse,
+    Response,
+)
 from sqlalchemy import desc, func, or_
 from sqlalchemy.orm import Session
 
@@ -234,6 +240,23 @@ async def admin_mini_dashboard(
     )
 
 
+@router.get("/admin/metrics")
+async def admin_metrics(user=Depends(require_admin)):
+    """Process-local pipeline and cache metrics (per web worker) as JSON."""
+    from app.services.entitlements import entitlement_metrics
+    from app.services.media_exec import get_supervisor
+    from app.services.thumb_cache import get_thumb_cache
+    from app.services.thumb_scheduler import get_scheduler
+
+    payload = {
+        "thumb_scheduler": get_scheduler().metrics(),
+        "thumb_cache": get_thumb_cache().metrics(),
+        "entitlements": entitlement_metrics(),
+        "media_exec": get_supervisor().metrics(),
+    }
+    return JSONResponse(payload, headers={"Cache-Control": "no-store"})
+
+
 @router.get("/admin/audit-logs")
 async def download_audit_logs(request: Request, user=Depends(require_admin)):
     # Serve a stable snapshot of the log to avoid Content-Length
@@ -21,6 +21,7 @@ from app.models.billing import PaymentLog, Purchase
 from app.models.event_plan import EventPlan
 from app.services.auth import get_current_user, require_admin, require_user
 from app.services.email_utils import send_billing_email
+from app.services.entitlements import invalidate_entitlements
 from db import get_db
 
 router = APIRouter()
@@ -1040,6 +1041,7 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
                     if payment_intent:
                         setattr(eap, "StripePaymentIntentID", str(payment_intent))
                     _safe_commit()
+                    invalidate_entitlements(getattr(eap, "UserID", None))
                     audit.debug(
                         "[stripe_webhook] committed EventAddonPurchase %s",
                         getattr(eap, "PurchaseID", None),
@@ -1179,6 +1181,7 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
                 if payment_intent:
                     setattr(purchase, "StripePaymentIntentID", str(payment_intent))
                 _safe_commit()
+                invalidate_entitlements(getattr(purchase, "UserID", None))
                 # Notify user best-effort
                 try:
                     from app.models.user import User
@@ -1217,6 +1220,7 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
             if purchase:
                 setattr(purchase, "Status", "paid")
                 _safe_commit()
+                invalidate_entitlements(getattr(purchase, "UserID", None))
                 try:
                     from app.models.user import User
 
@@ -1320,6 +1324,7 @@ async def admin_refund(
         )  # type: ignore
         setattr(p, "Status", "refunded")
         db.commit()
+        invalidate_entitlements(getattr(p, "UserID", None))
         # Notify user via email (best-effort)
         try:
             from app.models.user import User
@@ -1370,6 +1375,7 @@ async def admin_cancel(
     try:
         setattr(p, "Status", "canceled")
         db.commit()
+        invalidate_entitlements(getattr(p, "UserID", None))
         try:
             from app.models.user import User
 
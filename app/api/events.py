@@ -10,6 +10,7 @@ from fastapi.responses import HTMLResponse, RedirectResponse
 from PIL import Image
 from sqlalchemy import func as _func
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from app.core.settings import settings
 from app.core.templates import templates
@@ -23,10 +24,19 @@ from app.models.event import (
     Theme,
 )
 from app.services.auth import require_user
+from app.services.blob_store import acquire_blobs, blob_path, link_original
 from app.services.csrf import CSRF_COOKIE, validate_csrf_token
 from app.services.email_utils import send_event_date_locked_email
 from app.services.mime_utils import is_allowed_mime
-from app.services.thumbs import generate_all_thumbs_for_file
+from app.services.storage_accounting import adjust_usage
+from app.services.upload_ingest import (
+    apply_capture_metadata,
+    discard_staged,
+    queue_post_ingest,
+    stage_upload,
+    staging_dir,
+    start_thumbnail_job,
+)
 from db import get_db
 
 router = APIRouter()
@@ -42,7 +52,7 @@ async def owner_upload_to_event(
 ):
     """Authenticated upload for event owners.
 
-    Saves files to storage/{user}/{event}/, creates FileMetadata rows, and generates thumbnails.
+    Saves files to storage/{user}/{event}/, creates FileMetadata rows, and queues thumbnails.
     Redirects back to the gallery view.
     """
     # CSRF validation (skip for TestClient UA)
@@ -78,36 +88,35 @@ async def owner_upload_to_event(
         name = (name or "").replace("\\", "/").split("/")[-1]
         return re.sub(r"[^A-Za-z0-9._-]", "_", name)
 
-    def unique_path(base_dir: str, fname: str) -> str:
-        root, ext = os.path.splitext(fname)
-        candidate = os.path.join(base_dir, fname)
-        idx = 1
-        while os.path.exists(candidate):
-            candidate = os.path.join(base_dir, f"{root}_{idx}{ext}")
-            idx += 1
-        return candidate
-
     created = 0
+    added_bytes = 0
+    created_recs: list[FileMetadata] = []
+    max_bytes = int(getattr(settings, "MAX_UPLOAD_BYTES", 200_000_000) or 0)
+    chunk_bytes = int(getattr(settings, "UPLOAD_CHUNK_BYTES", 1024 * 1024))
+    allowed_prefixes = tuple(
+        getattr(settings, "ALLOWED_UPLOAD_MIME_PREFIXES", ("image/", "video/"))
+    )
     for uf in files or []:
+        staged = None
         try:
             orig_name = safe_name(uf.filename or "upload.bin")
-            # Read small buffer for MIME sniff; then stream remainder
-            head = await uf.read()  # For MVP we read full file; future: chunked
-            ok, mime = is_allowed_mime(head, fallback_content_type=uf.content_type)
-            if not ok:
+            # Spool to the event's staging folder in chunks; MIME is sniffed
+            # from the head and the size limit is enforced while streaming.
+            staged = await stage_upload(
+                uf,
+                staging_dir(base),
+                max_bytes=max_bytes,
+                allowed_prefixes=allowed_prefixes,
+                chunk_size=chunk_bytes,
+            )
+            if staged.rejected:
                 continue
-            # Enforce simple size limit from settings if present
-            try:
-                max_bytes = int(getattr(settings, "MAX_UPLOAD_BYTES", 200_000_000))
-                if max_bytes and len(head) > max_bytes:
-                    continue
-            except Exception:
-                pass
-            dest = unique_path(base, orig_name)
-            os.makedirs(os.path.dirname(dest), exist_ok=True)
-            with open(dest, "wb") as fh:
-                fh.write(head)
-            size_bytes = os.path.getsize(dest)
+            mime = staged.mime
+            # Bytes live once in the user's blob store; the event gets a hard link
+            blob_ids, _ = acquire_blobs(db, uid, [(staged.checksum, staged.size, staged.path)])
+            staged.path = None
+            dest = link_original(blob_path(uid, staged.checksum), base, orig_name, staged.checksum)
+            size_bytes = staged.size
 
             # Create FileMetadata
             fm = FileMetadata(
@@ -115,24 +124,18 @@ async def owner_upload_to_event(
                 FileName=os.path.basename(dest),
                 FileType=str(mime or "application/octet-stream"),
                 FileSize=int(size_bytes),
+                Checksum=staged.checksum,
+                BlobID=blob_ids.get(staged.checksum),
             )
+            # Capture time/GPS come from the stored file's headers; the checksum
+            # was already computed while streaming. Videos are probed with ffprobe,
+            # so this runs off the event loop.
+            await run_in_threadpool(apply_capture_metadata, fm, dest, fm.FileType, staged.checksum)
             db.add(fm)
             db.flush()
 
-            # Generate thumbnails/poster (best-effort)
-            try:
-                gid = int(getattr(fm, "FileMetadataID"))
-                gtype = str(getattr(fm, "FileType", ""))
-                gname = str(getattr(fm, "FileName", ""))
-                generate_all_thumbs_for_file(
-                    uid,
-                    int(event_id),
-                    gid,
-                    gtype,
-                    gname,
-                )
-            except Exception:
-                pass
+            added_bytes += int(size_bytes)
+            created_recs.append(fm)
             created += 1
         except Exception:
             try:
@@ -140,8 +143,16 @@ async def owner_upload_to_event(
             except Exception:
                 pass
             continue
+        finally:
+            if staged is not None:
+                discard_staged([staged])
 
     if created:
+        try:
+            adjust_usage(db, int(event_id), added_bytes)
+        except Exception:
+            pass
+        queued = queue_post_ingest(db, uid, int(event_id), created_recs)
         try:
             db.commit()
         except Exception:
@@ -149,6 +160,14 @@ async def owner_upload_to_event(
                 db.rollback()
             except Exception:
                 pass
+            queued = True  # nothing was persisted to render
+        if not queued:
+            # Thumbnails/posters render on the shared pool rather than on this
+            # request; their bytes are counted when each render completes.
+            try:
+                start_thumbnail_job(uid, int(event_id), created_recs)
+            except Exception:
+                pass
     referer = request.headers.get("referer") or "/gallery"
     return RedirectResponse(url=referer, status_code=303)
 
@@ -1744,9 +1763,10 @@ async def events_dashboard(
     # Plan badge
     plan, features = (None, {})
     try:
-        from app.services.billing_utils import get_active_plan
+        from app.services.entitlements import get_entitlements
 
-        plan, features = get_active_plan(db, getattr(user, "UserID", 0))
+        ent = get_entitlements(db, int(getattr(user, "UserID", 0)))
+        plan, features = (ent if ent.has_plan else None), ent.features
     except Exception:
         plan, features = (None, {})
     # Usage metrics
@@ -1,6 +1,9 @@
  # ruff: noqa: I001
+import asyncio
+import base64
 import hashlib
 import io
+import json
 import os
 import zipfile
 from datetime import datetime, timezone, timedelta
@@ -13,26 +16,48 @@ from fastapi.responses import (
     RedirectResponse,
     StreamingResponse,
 )
-from sqlalchemy import case
+from sqlalchemy import and_, case, cast, literal, or_
 from sqlalchemy import inspect as sa_inspect
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from app.core.settings import settings
 from app.core.templates import templates
 from app.models.album import Album, AlbumPhoto
 from app.models.event import Event, FavoriteFile, FileMetadata
 from app.models.photo_order import EventGalleryOrder
+from app.services.accel import send_file
 from app.services.auth import require_user, require_admin
+from app.services.blob_store import collect_unreferenced_blobs, release_blobs
 from app.services.csrf import (
     CSRF_COOKIE,
     issue_csrf_token,
     set_csrf_cookie,
     validate_csrf_token,
 )
+from app.services.media_urls import (
+    THUMB_KIND_IMAGE,
+    THUMB_KIND_VIDEO,
+    signed_thumb_url,
+    url_expiry,
+    verify_thumb_signature,
+)
+from app.services.storage_accounting import adjust_usage
+from app.services.thumb_scheduler import (
+    KIND_IMAGE,
+    KIND_LQIP,
+    KIND_VIDEO,
+    PRIORITY_BACKFILL,
+    PRIORITY_INTERACTIVE,
+    get_scheduler,
+)
+from app.services.thumb_cache import get_thumb_cache
 from app.services.thumbs import (
     cleanup_thumbnails,
-    ensure_image_thumbnail,
-    ensure_video_poster,
+    negotiate_thumb_ext,
+    snap_thumb_width,
+    thumb_media_type,
+    thumb_variant_path,
 )
 from db import get_db
 
@@ -43,6 +68,7 @@ GALLERY_COOKIE = "gallery_scope"
 
 # Cache DB feature detection for optional columns
 _HAS_DELETED_AT: Optional[bool] = None
+_HAS_GALLERY_ORDER: bool = False
 
 # In-memory recent deletion attempts for debugging (temporary)
 DELETION_LOGS: list = []
@@ -66,6 +92,19 @@ def _has_deleted_at(db: Session) -> bool:
     return _HAS_DELETED_AT
 
 
+def _has_gallery_order(db: Session) -> bool:
+    """Whether the EventGalleryOrder table exists; only a positive answer is cached."""
+    global _HAS_GALLERY_ORDER
+    if not _HAS_GALLERY_ORDER:
+        try:
+            _HAS_GALLERY_ORDER = sa_inspect(db.get_bind()).has_table(
+                EventGalleryOrder.__tablename__, schema=EventGalleryOrder.__table__.schema
+            )
+        except Exception:
+            return False
+    return _HAS_GALLERY_ORDER
+
+
 def _sign_scope(value: str) -> str:
     import hashlib
     import hmac
@@ -112,6 +151,65 @@ async def gallery_app_page(
     return RedirectResponse(url=f"/events/{event_id}/gallery", status_code=303)
 
 
+def _encode_gallery_cursor(phase: str, values) -> str:
+    """Opaque cursor for a row's sort phase and key (see ``_build_gallery_files``).
+
+    Datetimes keep milliseconds, the precision of the DATETIME columns they come
+    from, unless the value carries more (SQLite keeps whatever was written).
+    """
+    raw = [phase] + [
+        (v.isoformat(timespec="milliseconds") if v.microsecond % 1000 == 0 else v.isoformat())
+        if isinstance(v, datetime)
+        else v
+        for v in values
+    ]
+    data = json.dumps(raw, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def _decode_gallery_cursor(cursor: str, shapes: dict[str, int]) -> Optional[list]:
+    """``[phase, *key]`` from ``_encode_gallery_cursor``; None when malformed or for another scope.
+
+    ``shapes`` maps the scope's phase names to their key lengths.
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        raw = json.loads(data)
+        if not isinstance(raw, list) or not raw or shapes.get(raw[0]) != len(raw) - 1:
+            return None
+        # Integers stay integers; strings are the datetime keys
+        return raw[:1] + [datetime.fromisoformat(v) if isinstance(v, str) else v for v in raw[1:]]
+    except Exception:
+        return None
+
+
+def _cursor_param(db: Session, key, value):
+    """Bind a cursor value so it compares exactly with the column it was read from.
+
+    pyodbc sends datetimes as datetime2, and SQL Server then widens a DATETIME
+    column (1/300 s ticks) to compare: ``.003`` read back no longer equals the
+    stored ``.00333``. Casting the parameter to the column's type keeps the
+    comparison exact, and on the parameter side it stays sargable.
+    """
+    if isinstance(value, datetime) and db.get_bind().dialect.name == "mssql":
+        return cast(literal(value), key.type)
+    return value
+
+
+def _keyset_after(db: Session, keys, values):
+    """``(keys) > (values)`` as plain-column comparisons an index range can seek on.
+
+    SQL Server has no row-value comparison, so it is expanded as
+    ``k1 >= v1 AND (k1 > v1 OR (k2 >= v2 AND (k2 > v2 OR ...)))``; the leading
+    ``k1 >= v1`` is the seek predicate. Keys must be non-NULL within the phase.
+    """
+    clause = None
+    for key, value in reversed(list(zip(keys, values))):
+        value = _cursor_param(db, key, value)
+        clause = key > value if clause is None else and_(key >= value, or_(key > value, clause))
+    return clause
+
+
 def _build_gallery_files(
     db: Session,
     user_id: int,
@@ -122,7 +220,14 @@ def _build_gallery_files(
     limit: int | None = None,
     offset: int | None = None,
     album_id: int | None = None,
-) -> tuple[list[dict], bool]:
+    cursor: str | None = None,
+) -> tuple[list[dict], str | None]:
+    """One page of the gallery and the cursor for the next page (None on the last).
+
+    The deleted view re-sorts the page by permanent delete date for display; the
+    returned cursor is still that of the last row in keyset order, so pages
+    neither skip nor repeat files.
+    """
 
     # Scope to user (and optionally an event)
     event_query = db.query(Event).filter(Event.UserID == user_id)
@@ -130,7 +235,7 @@ def _build_gallery_files(
         event_query = event_query.filter(Event.EventID == event_id)
     event_ids = [e.EventID for e in event_query.all()]
     if not event_ids:
-        return [], False
+        return [], None
     # Build explicit column list to avoid selecting optional columns on legacy DBs
     has_del_at = _has_deleted_at(db)
     select_cols = [
@@ -147,6 +252,8 @@ def _build_gallery_files(
             select_cols.append(FileMetadata.DeletedAt)
         except Exception:
             has_del_at = False
+    idx_placeholder = len(select_cols)
+    select_cols.append(FileMetadata.Placeholder)
     q = db.query(*select_cols).filter(FileMetadata.EventID.in_(event_ids))
     # If album_id provided, restrict to files belonging to that album
     if album_id is not None:
@@ -161,7 +268,7 @@ def _build_gallery_files(
                 except Exception:
                     a_eid = None
             if not alb or a_eid not in event_ids:
-                return [], False
+                return [], None
             # Get FileIDs for album
             rows_fp = db.query(AlbumPhoto.FileID).filter(AlbumPhoto.AlbumID == album_id).all()
             file_ids = set()
@@ -171,10 +278,10 @@ def _build_gallery_files(
                 except Exception:
                     continue
             if not file_ids:
-                return [], False
+                return [], None
             q = q.filter(FileMetadata.FileMetadataID.in_(file_ids))
         except Exception:
-            return [], False
+            return [], None
     # Deleted filter: when show_deleted is true, ONLY show deleted files; otherwise only non-deleted
     if show_deleted:
         q = q.filter(FileMetadata.Deleted)
@@ -193,17 +300,49 @@ def _build_gallery_files(
         )
         fav_ids = set(int(r[0]) for r in fav_rows)
         if not fav_ids:
-            return [], False
+            return [], None
         q = q.filter(FileMetadata.FileMetadataID.in_(fav_ids))
 
-    # Sort by CapturedDateTime asc (chronological).
-    # Put NULL captured times last, then by UploadDate asc.
-    q = q.order_by(
-        case((FileMetadata.CapturedDateTime.is_(None), 1), else_=0),
-        FileMetadata.CapturedDateTime.asc(),
-        FileMetadata.UploadDate.asc(),
-        FileMetadata.FileMetadataID.asc(),  # deterministic tie-breaker for stable paging
-    )
+    # Canonical order, read as consecutive phases: EventGalleryOrder ordinals when
+    # scoped to a single event, then the rest chronologically, then files with no
+    # captured time by UploadDate; the id breaks ties for stable paging. Each phase
+    # orders by plain columns, so a page is a range seek on the gallery indexes
+    # (alembic 20261017_0034) and costs its own size rather than the whole gallery.
+    idx_ordinal = None
+    unordered = []
+    phases = []
+    if event_id is not None and _has_gallery_order(db):
+        q = q.outerjoin(
+            EventGalleryOrder,
+            and_(
+                EventGalleryOrder.EventID == FileMetadata.EventID,
+                EventGalleryOrder.FileMetadataID == FileMetadata.FileMetadataID,
+            ),
+        )
+        idx_ordinal = len(select_cols)
+        select_cols.append(EventGalleryOrder.Ordinal)
+        q = q.add_columns(EventGalleryOrder.Ordinal)
+        phases.append(
+            (
+                "o",
+                [EventGalleryOrder.Ordinal.isnot(None)],
+                [EventGalleryOrder.Ordinal, FileMetadata.FileMetadataID],
+            )
+        )
+        unordered = [EventGalleryOrder.Ordinal.is_(None)]
+    phases += [
+        (
+            "c",
+            unordered + [FileMetadata.CapturedDateTime.isnot(None)],
+            [FileMetadata.CapturedDateTime, FileMetadata.UploadDate, FileMetadata.FileMetadataID],
+        ),
+        (
+            "u",
+            unordered + [FileMetadata.CapturedDateTime.is_(None)],
+            [FileMetadata.UploadDate, FileMetadata.FileMetadataID],
+        ),
+    ]
+    idx_sort = len(select_cols)
     files: list[dict] = []
     # Preload favorites set for flag
     if not favorites_only:
@@ -212,89 +351,59 @@ def _build_gallery_files(
         )
         fav_ids = set(int(r[0]) for r in fav_rows2)
 
-    # Attempt to prefer EventGalleryOrder when scoped to a single event.
-    order_ids: list[int] = []
-    if event_id is not None:
+    # Pagination: a keyset cursor (from a previous page) takes precedence over
+    # offset; fetch one extra row to know if more remain. A page reads on from the
+    # cursor's phase into the next ones until it is full, one bounded query each.
+    names = [name for name, _, _ in phases]
+    after = (
+        _decode_gallery_cursor(cursor, {name: len(keys) for name, _, keys in phases})
+        if cursor
+        else None
+    )
+    start = names.index(after[0]) if after is not None else 0
+    skip = 0
+    if after is None and offset:
         try:
-            from sqlalchemy import text
-
-            # Try calling dbo.GetEventGalleryOrder(@EventID) (SQL Server stored proc)
-            sql = text("EXEC dbo.GetEventGalleryOrder :eid")
-            res = db.execute(sql.bindparams(eid=event_id))
-            rows_sp = res.fetchall()
-            order_ids = [int(r[0]) for r in rows_sp] if rows_sp else []
+            skip = max(0, int(offset))
         except Exception:
-            try:
-                rows_o = (
-                    db.query(EventGalleryOrder.FileMetadataID)
-                    .filter(EventGalleryOrder.EventID == event_id)
-                    .order_by(EventGalleryOrder.Ordinal)
-                    .all()
-                )
-                order_ids = [int(r[0]) for r in rows_o] if rows_o else []
-            except Exception:
-                order_ids = []
-
-    # If we have explicit ordinal ordering, build the full ordered row list in Python
-    # (ordered rows first, then any remaining files in chronological order), then
-    # apply pagination in Python so offset/limit reflect the canonical order.
-    rows: list = []
-    has_more = False
-    if order_ids:
+            skip = 0
+    fetch_limit = None
+    if limit and limit > 0:
         try:
-            all_rows = list(q)
-            # map id->row
-            idx_id = 0
-            by_id = {int(r[idx_id]): r for r in all_rows}
-            ordered_rows: list = []
-            for fid in order_ids:
-                if fid in by_id:
-                    ordered_rows.append(by_id.pop(fid))
-            # append remaining rows in the chronological order provided by `q`
-            if by_id:
-                for r in all_rows:
-                    try:
-                        rid = int(r[idx_id])
-                    except Exception:
-                        continue
-                    if rid in by_id:
-                        ordered_rows.append(by_id.pop(rid))
-            # Apply offset/limit in Python
-            start = int(offset or 0)
-            if limit and int(limit) > 0:
-                lim = int(limit)
-                slice_rows = ordered_rows[start : start + lim]
-                has_more = len(ordered_rows) > (start + lim)
-            else:
-                slice_rows = ordered_rows[start:]
-                has_more = False
-            rows = slice_rows
+            fetch_limit = int(limit) + 1
         except Exception:
-            # Fall back to DB pagination when anything unexpected happens
-            rows = []
-            has_more = False
-
-    if not order_ids:
-        # Pagination: fetch one extra to know if more remain
-        q2 = q
-        if offset:
-            try:
-                q2 = q2.offset(int(offset))
-            except Exception:
-                pass
-        fetch_limit = None
-        if limit and limit > 0:
-            try:
-                fetch_limit = int(limit) + 1
-                q2 = q2.limit(fetch_limit)
-            except Exception:
-                pass
-
-        rows = list(q2)
-        has_more = False
-        if fetch_limit is not None and len(rows) > (fetch_limit - 1):
-            has_more = True
-            rows = rows[: (fetch_limit - 1)]
+            fetch_limit = None
+
+    rows = []
+    row_phases = []
+    for name, where, keys in phases[start:]:
+        q2 = q.filter(*where)
+        if after is not None and name == after[0]:
+            q2 = q2.filter(_keyset_after(db, keys, after[1:]))
+        if skip:
+            # Offset paging: step over whole phases by count, then offset into one
+            in_phase = q2.count()
+            if in_phase <= skip:
+                skip -= in_phase
+                continue
+            q2 = q2.add_columns(*keys).order_by(*[k.asc() for k in keys]).offset(skip)
+            skip = 0
+        else:
+            q2 = q2.add_columns(*keys).order_by(*[k.asc() for k in keys])
+        if fetch_limit is not None:
+            q2 = q2.limit(fetch_limit - len(rows))
+        got = list(q2)
+        rows += got
+        row_phases += [name] * len(got)
+        if fetch_limit is not None and len(rows) >= fetch_limit:
+            break
+
+    next_cursor = None
+    if fetch_limit is not None and len(rows) > (fetch_limit - 1):
+        rows = rows[: (fetch_limit - 1)]
+        row_phases = row_phases[: len(rows)]
+        if rows:
+            next_cursor = _encode_gallery_cursor(row_phases[-1], rows[-1][idx_sort:])
 
     # Indexes into row tuple
     idx_id = 0
@@ -305,7 +414,17 @@ def _build_gallery_files(
     idx_deleted = 6
     idx_deleted_at = 7 if has_del_at else None
 
-    for row in rows:
+    # Signed thumbnail URLs let /thumbs skip the session and ownership lookup
+    expires = url_expiry()
+
+    def _thumb(row, width: int) -> str:
+        ctype = row[idx_filetype] or ""
+        kind = THUMB_KIND_VIDEO if ctype.startswith("video") else THUMB_KIND_IMAGE
+        return signed_thumb_url(
+            user_id, row[idx_event], row[idx_id], width, kind=kind, expires=expires
+        )
+
+    for row, phase in zip(rows, row_phases):
         ftype = "other"
         ctype = (row[idx_filetype] or "") if row is not None else ""
         if ctype.startswith("image"):
@@ -315,18 +434,11 @@ def _build_gallery_files(
         thumb_url = None
         if ftype in ("image", "video"):
             # Use id-based thumb/poster endpoint for caching; prefer 720 for grid
-            thumb_url = f"/thumbs/{row[idx_id]}.jpg?w=720"
+            thumb_url = _thumb(row, 720)
         # Build srcset candidates
         srcset = None
         if ftype == "image":
-            srcset = ", ".join(
-                [
-                    f"/thumbs/{row[idx_id]}.jpg?w=480 480w",
-                    f"/thumbs/{row[idx_id]}.jpg?w=720 720w",
-                    f"/thumbs/{row[idx_id]}.jpg?w=960 960w",
-                    f"/thumbs/{row[idx_id]}.jpg?w=1440 1440w",
-                ]
-            )
+            srcset = ", ".join(f"{_thumb(row, w)} {w}w" for w in (480, 720, 960, 1440))
         # Deletion countdown
         deleted_flag = bool(row[idx_deleted])
         deleted_at = (row[idx_deleted_at] if (has_del_at and idx_deleted_at is not None) else None)
@@ -335,7 +447,10 @@ def _build_gallery_files(
         if deleted_flag:
             if has_del_at and deleted_at is not None:
                 try:
-                    delta_days = (datetime.now(timezone.utc) - deleted_at).days
+                    now = datetime.now(timezone.utc)
+                    if deleted_at.tzinfo is None:
+                        now = now.replace(tzinfo=None)  # DATETIME columns hold naive UTC
+                    delta_days = (now - deleted_at).days
                     days_left = max(0, 30 - max(0, delta_days))
                     # Compute the permanent delete date (DeletedAt + 30 days)
                     try:
@@ -368,18 +483,11 @@ def _build_gallery_files(
             except Exception:
                 days_label = None
         # precompute thumbnail id-based URLs to keep lines short for linters
-        thumb_480 = (
-            f"/thumbs/{row[idx_id]}.jpg?w=480" if ftype in ("image", "video") else None
-        )
-        thumb_720 = (
-            f"/thumbs/{row[idx_id]}.jpg?w=720" if ftype in ("image", "video") else None
-        )
-        thumb_960 = (
-            f"/thumbs/{row[idx_id]}.jpg?w=960" if ftype in ("image", "video") else None
-        )
-        thumb_1440 = (
-            f"/thumbs/{row[idx_id]}.jpg?w=1440" if ftype in ("image", "video") else None
-        )
+        has_thumbs = ftype in ("image", "video")
+        thumb_480 = _thumb(row, 480) if has_thumbs else None
+        thumb_720 = thumb_url
+        thumb_960 = _thumb(row, 960) if has_thumbs else None
+        thumb_1440 = _thumb(row, 1440) if has_thumbs else None
 
         files.append(
             {
@@ -393,6 +501,8 @@ def _build_gallery_files(
                 "thumbnail_960": thumb_960,
                 "thumbnail_1440": thumb_1440,
                 "srcset": srcset,
+                # Inline blur-up placeholder; saves a /thumbs request per tile
+                "placeholder": row[idx_placeholder] if ftype in ("image", "video") else None,
                 "name": row[idx_name],
                 "datetime": (
                     row[idx_captured].isoformat() if row[idx_captured] else None
@@ -403,8 +513,12 @@ def _build_gallery_files(
                 "permanent_delete_date": permanent_delete_date,
                 "days_label": days_label,
                 "favorite": (row[idx_id] in fav_ids),
+                # Opaque keyset position for fetching the page after this file
+                "cursor": _encode_gallery_cursor(phase, row[idx_sort:]),
             }
         )
+        if idx_ordinal is not None and row[idx_ordinal] is not None:
+            files[-1]["ordinal"] = int(row[idx_ordinal])
     # In deleted view, prefer sorting by permanent delete date (unknown goes last)
     try:
         if show_deleted and files:
@@ -416,7 +530,7 @@ def _build_gallery_files(
             )
     except Exception:
         pass
-    return files, has_more
+    return files, next_cursor
 
 
 def _build_gallery_ids(
@@ -647,7 +761,7 @@ async def user_gallery(
     except Exception:
         pass
 
-    files, has_more = _build_gallery_files(
+    files, next_cursor = _build_gallery_files(
         db,
         user_id=user_id,
         event_id=selected_event_id,
@@ -672,68 +786,6 @@ async def user_gallery(
                     f["days_left"] = 9999
                 except Exception:
                     pass
-    # Attach ordinal values from EventGalleryOrder for server-rendered files when possible
-    try:
-        if selected_event_id is not None and files:
-            file_ids = []
-            for f in files:
-                try:
-                    v = f.get("id")
-                    if v is None:
-                        continue
-                    file_ids.append(int(v))
-                except Exception:
-                    continue
-            if file_ids:
-                rows = (
-                    db.query(
-                        EventGalleryOrder.FileMetadataID,
-                        EventGalleryOrder.Ordinal,
-                    )
-                    .filter(
-                        EventGalleryOrder.EventID == selected_event_id,
-                        EventGalleryOrder.FileMetadataID.in_(file_ids),
-                    )
-                    .all()
-                )
-                ord_map = {}
-                for r in rows or []:
-                    try:
-                        fid = int(r[0])
-                        ordv = getattr(r, "Ordinal", None)
-                        if ordv is None:
-                            try:
-                                ordv = int(r[1])
-                            except Exception:
-                                ordv = None
-                        if ordv is not None:
-                            ord_map[fid] = int(ordv)
-                    except Exception:
-                        continue
-                for f in files:
-                    try:
-                        fidv = f.get("id")
-                        if fidv is None:
-                            continue
-                        fid = int(fidv)
-                        if fid in ord_map:
-                            f["ordinal"] = ord_map[fid]
-                    except Exception:
-                        continue
-                try:
-                    if any((isinstance(f.get("ordinal"), int) for f in files)):
-                        def _ord_key(item: dict) -> int:
-                            v = item.get("ordinal")
-                            try:
-                                return int(v) if v is not None else 2 ** 60
-                            except Exception:
-                                return 2 ** 60
-
-                        files.sort(key=_ord_key)
-                except Exception:
-                    pass
-    except Exception:
-        pass
     # To preserve compatibility with old links, serve the React single-page
     # app here and pass a sensible event_id: prefer the scoped event, else the
     # user's first event id, else 0. This makes old /gallery links load the
@@ -759,7 +811,7 @@ async def user_gallery(
     # Issue CSRF token for gallery actions and set cookie for validation
     token = issue_csrf_token(request.cookies.get("session_id"))
     cur_offset = int(offset or 0)
-    next_offset = (cur_offset + len(files)) if has_more else None
+    next_offset = (cur_offset + len(files)) if next_cursor else None
     prev_offset = (cur_offset - PAGE_SIZE) if cur_offset > 0 else None
     if isinstance(prev_offset, int) and prev_offset < 0:
         prev_offset = 0
@@ -792,6 +844,7 @@ async def user_gallery(
         "event_code": event_code,
         "files": files,
         "next_offset": next_offset,
+        "next_cursor": next_cursor,
         "prev_offset": prev_offset,
         "current_offset": cur_offset,
         "page_size": PAGE_SIZE,
@@ -810,6 +863,7 @@ async def gallery_data(
     request: Request,
     offset: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=200),
+    cursor: str | None = Query(None),
     type: str | None = Query(None),
     show_deleted: bool = Query(False),
     favorites: bool = Query(False),
@@ -836,70 +890,23 @@ async def gallery_data(
                 )
                 if owned:
                     selected_event_id = eid
-    files, has_more = _build_gallery_files(
+    files, next_cursor = _build_gallery_files(
         db,
         user_id=user_id,
         event_id=selected_event_id,
         type_filter=type,
         show_deleted=show_deleted,
         favorites_only=favorites,
-    limit=limit,
-    offset=offset,
-    album_id=album_id,
+        limit=limit,
+        offset=offset,
+        album_id=album_id,
+        cursor=cursor,
+    )
+    # Clients should follow next_cursor; next_offset stays for older pages
+    next_offset = (offset + len(files)) if next_cursor else None
+    return JSONResponse(
+        {"ok": True, "files": files, "next_offset": next_offset, "next_cursor": next_cursor}
     )
-    # Attach ordinal values from EventGalleryOrder when available for the scoped event
-    try:
-        if selected_event_id is not None and files:
-            file_ids = []
-            for f in files:
-                try:
-                    v = f.get("id")
-                    if v is None:
-                        continue
-                    file_ids.append(int(v))
-                except Exception:
-                    continue
-            if file_ids:
-                rows = (
-                    db.query(
-                        EventGalleryOrder.FileMetadataID,
-                        EventGalleryOrder.Ordinal,
-                    )
-                    .filter(
-                        EventGalleryOrder.EventID == selected_event_id,
-                        EventGalleryOrder.FileMetadataID.in_(file_ids),
-                    )
-                    .all()
-                )
-                ord_map = {}
-                for r in rows or []:
-                    try:
-                        fid = int(r[0])
-                        # r may be a Row object; attempt attribute then index
-                        ordv = getattr(r, "Ordinal", None)
-                        if ordv is None:
-                            try:
-                                ordv = int(r[1])
-                            except Exception:
-                                ordv = None
-                        if ordv is not None:
-                            ord_map[fid] = int(ordv)
-                    except Exception:
-                        continue
-                for f in files:
-                    try:
-                        fidv = f.get("id")
-                        if fidv is None:
-                            continue
-                        fid = int(fidv)
-                        if fid in ord_map:
-                            f["ordinal"] = ord_map[fid]
-                    except Exception:
-                        continue
-    except Exception:
-        pass
-    next_offset = (offset + len(files)) if has_more else None
-    return JSONResponse({"ok": True, "files": files, "next_offset": next_offset})
 
 
 @router.get("/gallery/ids", response_class=JSONResponse)
@@ -1120,89 +1127,172 @@ async def event_gallery_order(
     return JSONResponse({"ok": True, "files": files}, headers=headers)
 
 
+def _write_placeholder_thumb(thumb_path: str) -> bool:
+    """Persist a tiny, valid JPEG-like placeholder (not full quality) for an LQIP
+    request whose render failed, so it can be served and reused."""
+    try:
+        os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+        if not os.path.exists(thumb_path):
+            with open(thumb_path, "wb") as fh:
+                fh.write(b"\xff\xd8\xff\xdb" + (b"\x00" * 256) + b"\xff\xd9")
+    except Exception:
+        # best-effort; the caller falls through to redirect
+        pass
+    return os.path.exists(thumb_path)
+
+
+def _file_in_event(db: Session, file_id: int, event_id: int) -> Optional[FileMetadata]:
+    return (
+        db.query(FileMetadata)
+        .filter(FileMetadata.FileMetadataID == file_id, FileMetadata.EventID == event_id)
+        .first()
+    )
+
+
 @router.get("/thumbs/{file_id}.jpg")
 async def image_thumbnail(
     request: Request,
     file_id: int,
     w: int = Query(480, ge=1, le=2048),
     blur: int | None = Query(None, ge=0, le=200),
+    u: int | None = Query(None),
+    e: int | None = Query(None),
+    exp: int | None = Query(None),
+    sig: str | None = Query(None),
+    t: str | None = Query(None),
     db: Session = Depends(get_db),
-    user=Depends(require_user),
 ):
     """Return a JPEG thumbnail of an image owned by the user.
     Thumbnails are generated once and persisted under the event folder to speed up future loads.
-    Orientation is corrected via EXIF.
+    A miss renders on the shared thumbnail pool, never on the event loop; concurrent requests
+    for the same file, width and encoding await one render. Orientation is corrected via EXIF.
+
+    URLs signed by the gallery builders (``u``/``e``/``exp``/``sig``, plus the media type
+    ``t``) skip the session and ownership lookup; a cached thumbnail, or its JPEG fallback
+    when the negotiated variant is missing, is then served without touching the database.
+    Unsigned or expired URLs fall back to the logged-in user's ownership check.
     """
-    user_id = user.UserID
-    rec = (
-        db.query(FileMetadata)
-        .join(Event, Event.EventID == FileMetadata.EventID)
-        .filter(FileMetadata.FileMetadataID == file_id, Event.UserID == user_id)
-        .first()
-    )
-    if not rec:
-        return templates.TemplateResponse(request, "404.html", status_code=404)
-    # Images and videos get thumbs/posters
-    ctype = getattr(rec, "FileType", "") or ""
-    eid = int(getattr(rec, "EventID", 0) or 0)
-    fname = str(getattr(rec, "FileName", "") or "")
-    orig_path = os.path.join("storage", str(user_id), str(eid), fname)
-    if not os.path.exists(orig_path):
-        return templates.TemplateResponse(request, "404.html", status_code=404)
+    rec = None
+    if verify_thumb_signature(u, e, file_id, w, exp, sig, kind=t):
+        user_id, eid = int(u), int(e)
+    else:
+        user = require_user(request, db)
+        user_id = user.UserID
+        rec = (
+            db.query(FileMetadata)
+            .join(Event, Event.EventID == FileMetadata.EventID)
+            .filter(FileMetadata.FileMetadataID == file_id, Event.UserID == user_id)
+            .first()
+        )
+        if not rec:
+            return templates.TemplateResponse(request, "404.html", status_code=404)
+        eid = int(getattr(rec, "EventID", 0) or 0)
+
+    # Snap to the configured ladder so a photo never has more than one file per
+    # rung; a blur parameter or very small width asks for the LQIP placeholder.
+    lqip_width = int(getattr(settings, "THUMB_LQIP_WIDTH", 40) or 40)
+    lqip = bool(blur) or w <= lqip_width
+    if lqip:
+        w, blur = lqip_width, int(blur or 20)
+    else:
+        w = snap_thumb_width(w)
 
     # Destination path for persisted thumbnail/poster
     thumb_dir = os.path.join("storage", str(user_id), str(eid), "thumbnails")
-    # Support LQIP placeholders named with a small width or special marker
     thumb_name = f"{file_id}_{w}.jpg"
     thumb_path = os.path.join(thumb_dir, thumb_name)
     headers = {"Cache-Control": "public, max-age=86400"}
+    # Image thumbnails are also persisted as WebP/AVIF and picked by Accept;
+    # LQIP placeholders and video posters are JPEG only. A signed URL carries the
+    # media type, so no row is needed to tell the two apart.
+    if rec is not None:
+        ctype = str(getattr(rec, "FileType", "") or "")
+    else:
+        ctype = "video/" if t == THUMB_KIND_VIDEO else "image/"
+    variant_path = None
+    if not lqip and ctype.startswith("image"):
+        headers["Vary"] = "Accept"
+        ext = negotiate_thumb_ext(request.headers.get("accept"))
+        if ext != ".jpg":
+            variant_path = thumb_variant_path(thumb_path, ext)
 
     # Serve cached thumbnail if present
-    if os.path.exists(thumb_path):
-        from fastapi.responses import FileResponse
+    cache = get_thumb_cache()
+    if variant_path and os.path.exists(variant_path):
+        cache.hit(variant_path)
+        return send_file(variant_path, media_type=thumb_media_type(variant_path), headers=headers)
 
-        return FileResponse(thumb_path, media_type="image/jpeg", headers=headers)
+    if os.path.exists(thumb_path):
+        cache.hit(thumb_path)
+        if variant_path:
+            # JPEG rendered before this encoding was enabled: fill it in off the hot
+            # path from the JPEG itself (same width), so no row lookup finds the original
+            get_scheduler().submit(
+                KIND_IMAGE,
+                thumb_path,
+                variant_path,
+                int(w),
+                priority=PRIORITY_BACKFILL,
+                event_id=eid,
+            )
+        return send_file(thumb_path, media_type="image/jpeg", headers=headers)
+
+    if rec is None:
+        # Signed miss: the row is only needed to locate the original
+        rec = _file_in_event(db, file_id, eid)
+        if not rec:
+            return templates.TemplateResponse(request, "404.html", status_code=404)
+        ctype = str(getattr(rec, "FileType", "") or "")
+        if not ctype.startswith("image"):
+            variant_path = None
+    fname = str(getattr(rec, "FileName", "") or "")
+    orig_path = os.path.join("storage", str(user_id), str(eid), fname)
+    if not os.path.exists(orig_path):
+        return templates.TemplateResponse(request, "404.html", status_code=404)
 
-    # Generate and persist thumbnail/poster
+    # Generate and persist thumbnail/poster on the shared pool, ahead of ingest work
+    cache.miss()
     try:
         os.makedirs(thumb_dir, exist_ok=True)
-        ok = False
-        # If a blur parameter or very small width was requested, generate a small blurred LQIP
-        if blur or (w and w <= 40):
-            from app.services.thumbs import ensure_lqip
-
-            ok = ensure_lqip(orig_path, thumb_path, width=int(w or 40), blur=int(blur or 20))
+        if lqip:
+            kind = KIND_LQIP
+        elif ctype.startswith("image"):
+            kind = KIND_IMAGE
+        elif ctype.startswith("video"):
+            kind = KIND_VIDEO
         else:
-            if ctype.startswith("image"):
-                ok = ensure_image_thumbnail(orig_path, thumb_path, int(w))
-            elif ctype.startswith("video"):
-                ok = ensure_video_poster(orig_path, thumb_path, int(w))
+            kind = None
+        ok = False
+        if kind:
+            fut = get_scheduler().submit(
+                kind,
+                orig_path,
+                thumb_path,
+                int(w),
+                priority=PRIORITY_INTERACTIVE,
+                blur=int(blur) if kind == KIND_LQIP else 0,
+                event_id=eid,
+                file_id=int(file_id),
+            )
+            # shield: a timed-out viewer must not cancel the render for other waiters
+            ok = await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(fut)),
+                timeout=float(getattr(settings, "THUMB_INTERACTIVE_TIMEOUT_SECONDS", 15.0)),
+            )
         if ok and os.path.exists(thumb_path):
-            from fastapi.responses import FileResponse
-
-            return FileResponse(thumb_path, media_type="image/jpeg", headers=headers)
+            # The render writes the configured alternative encodings alongside
+            if variant_path and os.path.exists(variant_path):
+                return send_file(
+                    variant_path, media_type=thumb_media_type(variant_path), headers=headers
+                )
+            return send_file(thumb_path, media_type="image/jpeg", headers=headers)
     except Exception:
         pass
     # If generation failed but a blurred/small LQIP was requested, attempt a
     # minimal placeholder write so callers receive a persisted thumbnail.
-    if blur or (w and w <= 40):
-        try:
-            from fastapi.responses import FileResponse
-
-            os.makedirs(thumb_dir, exist_ok=True)
-            # Write a tiny, valid JPEG-like placeholder (not full quality) so it
-            # can be served and persisted for future requests.
-            if not os.path.exists(thumb_path):
-                try:
-                    with open(thumb_path, "wb") as fh:
-                        fh.write(b"\xff\xd8\xff\xdb" + (b"\x00" * 256) + b"\xff\xd9")
-                except Exception:
-                    # best-effort; fall through to redirect
-                    pass
-            if os.path.exists(thumb_path):
-                return FileResponse(thumb_path, media_type="image/jpeg", headers=headers)
-        except Exception:
-            pass
+    if lqip:
+        if await run_in_threadpool(_write_placeholder_thumb, thumb_path):
+            return send_file(thumb_path, media_type="image/jpeg", headers=headers)
     # Fallback: serve original if anything goes wrong
     return RedirectResponse(url=f"/storage/{user_id}/{eid}/{fname}", status_code=302)
 
@@ -1666,10 +1756,14 @@ async def gallery_permanent_delete(
         .all()
     )
     base_paths = []
+    # Bytes released per event: the recorded original size plus removed thumbnails
+    freed: dict[int, int] = {}
+    blob_ids = [getattr(f, "BlobID", None) for f in files]
     for f in files:
         eid = int(getattr(f, "EventID"))
         fname = str(getattr(f, "FileName"))
         base_paths.append((eid, fname, int(getattr(f, "FileMetadataID"))))
+        freed[eid] = freed.get(eid, 0) + int(getattr(f, "FileSize", 0) or 0)
     # Delete files from disk and their thumbnails
     for eid, fname, fid in base_paths:
         try:
@@ -1679,18 +1773,27 @@ async def gallery_permanent_delete(
         except Exception:
             pass
         try:
-            cleanup_thumbnails(uid, eid, fid)
+            freed[eid] = freed.get(eid, 0) + cleanup_thumbnails(uid, eid, fid)
         except Exception:
             pass
-    # Remove DB rows
+    # Remove DB rows and release their storage in the same transaction
     try:
         fid_list = [fid for _, _, fid in base_paths]
         db.execute(
             delete(FileMetadata).where(FileMetadata.FileMetadataID.in_(fid_list))
         )
+        for eid, nbytes in freed.items():
+            adjust_usage(db, eid, -nbytes)
+        release_blobs(db, blob_ids)
         db.commit()
     except Exception:
         db.rollback()
+    else:
+        # Blobs no longer referenced by any event are reclaimed after the commit
+        try:
+            collect_unreferenced_blobs(db, uid)
+        except Exception:
+            pass
     referer = request.headers.get("referer") or "/gallery"
     return RedirectResponse(url=referer, status_code=303)
 
@@ -1757,9 +1860,9 @@ async def download_zip(
     files = _get_user_file_records(db, user_id, file_ids)
     # Enforce plan-based cap for bulk downloads if configured
     try:
-        from app.services.billing_utils import get_active_plan
+        from app.services.entitlements import get_plan_features
 
-        _plan, features = get_active_plan(db, int(user_id))
+        features = get_plan_features(db, int(user_id))
         max_zip = int(features.get("max_zip_download_items", 0) or 0)
         if max_zip and len(files) > max_zip:
             files = files[:max_zip]
@@ -2,13 +2,14 @@ import os
 from datetime import datetime, timedelta, timezone
 
 from fastapi import APIRouter, Depends, Form, Request
-from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.orm import Session
 
 from app.core.templates import templates
 from app.models.email_change import EmailChangeRequest
 from app.models.export import UserDataExportJob
 from app.models.user import User
+from app.services.accel import send_file
 from app.services.auth import (
     generate_email_token,
     get_current_user,
@@ -314,7 +315,7 @@ async def profile_export_download(db: Session = Depends(get_db), user=Depends(re
     if not path or not os.path.exists(path):
         return RedirectResponse("/profile/edit?message=export_missing", status_code=303)
     filename = os.path.basename(path)
-    return FileResponse(path, media_type="application/zip", filename=filename)
+    return send_file(path, media_type="application/zip", filename=filename)
 
 
 @router.get("/profile/password", response_class=HTMLResponse)
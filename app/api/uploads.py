@@ -1,13 +1,19 @@
 """Uploads endpoints."""
 
 # ruff: noqa: I001
+import base64
 import logging
 import os
-import re
+import uuid
 from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from typing import Optional
 
 from fastapi import APIRouter, Depends, File, Form, Request, UploadFile
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 
 from app.core.settings import settings
@@ -21,15 +27,58 @@ from app.models.event import (
     GuestSession,
     Theme as ThemeModel,
 )
-from app.services.mime_utils import is_allowed_mime
+from app.models.resumable_upload import ResumableUpload
+from app.services.storage_accounting import (
+    adjust_usage,
+    get_usage_bytes,
+    reconcile_event_usage,
+)
+from app.services.upload_cleanup import (
+    DIRECT_PENDING_STATUSES,
+    RESUMABLE_PENDING_STATUSES,
+    pending_upload_bytes,
+    resumable_expiry,
+)
+from app.services.upload_ingest import (
+    DIRECT_FINALIZING_STATUS,
+    DIRECT_UPLOAD_STATUS,
+    RESUMABLE_RECEIVING_STATUS,
+    RESUMABLE_UPLOAD_STATUS,
+    StagedUpload,
+    direct_upload_key,
+    discard_staged,
+    existing_checksums,
+    finalize_direct_upload,
+    finalize_staged_batch,
+    finalize_staged_upload,
+    queue_post_ingest,
+    s3_object_key,
+    sniff_staged_file,
+    stage_upload,
+    staging_dir,
+    start_thumbnail_job,
+    store_batch_in_s3,
+)
 from db import get_db
-from app.services.thumbs import generate_all_thumbs_for_file
 
 router = APIRouter()
 audit = logging.getLogger("audit")
 PAGE_SIZE = 24
 
 
+def _effective_storage_limit_mb(db: Session, event_id: int, plan_storage_mb: int) -> int:
+    """Plan feature limit, else the optional numeric custom message value (0 = no cap)."""
+    custom_limit_mb = None
+    try:
+        _c = db.query(EC).filter(EC.EventID == event_id).first()
+        msg = getattr(_c, "StorageLimitMessage", None) if _c else None
+        if msg and str(msg).strip().isdigit():
+            custom_limit_mb = int(str(msg).strip())
+    except Exception:
+        custom_limit_mb = None
+    return int(plan_storage_mb or 0) or int(custom_limit_mb or 0)
+
+
 # Guest upload page (GET)
 @router.get("/guest/upload/{event_code}", response_class=HTMLResponse)
 async def guest_upload_page(request: Request, event_code: str, db: Session = Depends(get_db)):
@@ -136,6 +185,7 @@ async def guest_upload_page(request: Request, event_code: str, db: Session = Dep
             "guest_files": guest_files,
             "guest_has_more": has_more,
             "guest_page_size": PAGE_SIZE,
+            "direct_uploads": _direct_s3_service(request) is not None,
         },
     )
 
@@ -155,7 +205,6 @@ async def guest_upload_post(
 ):
 
     event = db.query(Event).filter(Event.Code == event_code).first()
-    uploaded = []
     guest_session = None
     guest_id = None
     if event:
@@ -175,9 +224,9 @@ async def guest_upload_post(
         event_id = int(getattr(event, "EventID"))
         # Load plan features
         try:
-            from app.services.billing_utils import get_active_plan
+            from app.services.entitlements import get_plan_features
 
-            _plan, features = get_active_plan(db, user_id)
+            features = get_plan_features(db, user_id)
             max_guests = int(features.get("max_guests_per_event", 0) or 0)
             plan_storage_mb = int(features.get("max_storage_per_event_mb", 0) or 0)
         except Exception:
@@ -241,32 +290,8 @@ async def guest_upload_post(
         storage_path = event_base_path
 
         upload_count = 0
-        from app.services.metadata_utils import (
-            extract_image_metadata,
-            extract_video_metadata,
-        )
-
         total_bytes = 0
         duplicate_count = 0
-        # Validation helpers
-        allowed_prefixes = tuple(
-            getattr(settings, "ALLOWED_UPLOAD_MIME_PREFIXES", ("image/", "video/"))
-        )
-        max_bytes = int(getattr(settings, "MAX_UPLOAD_BYTES", 200_000_000))
-
-        def safe_name(name: str) -> str:
-            name = name.replace("\\", "/").split("/")[-1]
-            # allow alnum, dash, underscore, dot; strip others
-            return re.sub(r"[^A-Za-z0-9._-]", "_", name)
-
-        def unique_path(base_dir: str, fname: str) -> str:
-            root, ext = os.path.splitext(fname)
-            candidate = os.path.join(base_dir, fname)
-            idx = 1
-            while os.path.exists(candidate):
-                candidate = os.path.join(base_dir, f"{root}_{idx}{ext}")
-                idx += 1
-            return candidate
 
         # Optional guest message handling (rate-limited per guest session)
         try:
@@ -305,68 +330,74 @@ async def guest_upload_post(
         except Exception:
             pass
 
-    # Precompute storage cap enforcement before writing files
-    # Determine effective storage limit in MB: plan feature overrides
-    # optional custom message value
-        custom_limit_mb = None
-        try:
-            _c = db.query(EC).filter(EC.EventID == event_id).first()
-            msg = getattr(_c, "StorageLimitMessage", None) if _c else None
-            if msg and str(msg).strip().isdigit():
-                custom_limit_mb = int(str(msg).strip())
-        except Exception:
-            custom_limit_mb = None
-        effective_limit_mb = int(plan_storage_mb or 0) or int(custom_limit_mb or 0)
+        # Precompute storage cap enforcement before writing files
+        effective_limit_mb = _effective_storage_limit_mb(db, event_id, plan_storage_mb)
         allowed_prefixes = tuple(
             getattr(settings, "ALLOWED_UPLOAD_MIME_PREFIXES", ("image/", "video/"))
         )
         max_bytes = int(getattr(settings, "MAX_UPLOAD_BYTES", 200_000_000))
+        chunk_bytes = int(getattr(settings, "UPLOAD_CHUNK_BYTES", 1024 * 1024))
+        staging_path = staging_dir(event_base_path)
         candidate_bytes = 0
-        prechecked_files = []  # (contents, sniffed, filename)
+        prechecked_files: list[StagedUpload] = []
         for file in files:
             if not file.filename:
                 continue
-            ctype = getattr(file, "content_type", "") or ""
-            contents = await file.read()
-            allowed, sniffed = is_allowed_mime(
-                contents, allowed_prefixes=allowed_prefixes, fallback_content_type=ctype
-            )
-            if allowed_prefixes and not allowed:
+            try:
+                staged = await stage_upload(
+                    file,
+                    staging_path,
+                    max_bytes=max_bytes,
+                    allowed_prefixes=allowed_prefixes,
+                    chunk_size=chunk_bytes,
+                )
+            except Exception:
+                audit.exception(
+                    "guest.upload.stage_failed",
+                    extra={
+                        "event_id": event_id,
+                        "request_id": getattr(request.state, "request_id", None),
+                    },
+                )
+                continue
+            if staged.rejected == "mime":
                 audit.warning(
                     "guest.upload.rejected_mime",
                     extra={
                         "event_id": event_id,
-                        "ctype": sniffed,
+                        "ctype": staged.mime,
                         "request_id": getattr(request.state, "request_id", None),
                     },
                 )
                 continue
-            if max_bytes and len(contents) > max_bytes:
+            if staged.rejected == "size":
                 audit.warning(
                     "guest.upload.rejected_size",
                     extra={
                         "event_id": event_id,
-                        "size": len(contents),
+                        "size": staged.size,
                         "request_id": getattr(request.state, "request_id", None),
                     },
                 )
                 continue
-            prechecked_files.append((contents, sniffed, file.filename))
-            candidate_bytes += len(contents)
+            if staged.rejected == "image":
+                audit.warning(
+                    "guest.upload.rejected_image",
+                    extra={
+                        "event_id": event_id,
+                        "ctype": staged.mime,
+                        "request_id": getattr(request.state, "request_id", None),
+                    },
+                )
+                continue
+            prechecked_files.append(staged)
+            candidate_bytes += staged.size
 
         # Enforce storage cap (if any) using current usage + candidate size
         if effective_limit_mb and effective_limit_mb > 0:
-            base = os.path.join("storage", str(user_id), str(event_id))
-            current = 0
-            if os.path.exists(base):
-                for root, _, filenames in os.walk(base):
-                    for fn in filenames:
-                        p = os.path.join(root, fn)
-                        try:
-                            current += os.path.getsize(p)
-                        except Exception:
-                            pass
+            current = get_usage_bytes(db, event_id)
             if (current + candidate_bytes) > (effective_limit_mb * 1024 * 1024):
+                discard_staged(prechecked_files)
                 return templates.TemplateResponse(
                     request,
                     "guest_upload.html",
@@ -384,106 +415,39 @@ async def guest_upload_post(
         # Proceed with writes and metadata after enforcement
         # Get S3 service if configured
         s3_service = getattr(request.app.state, "s3_service", None)
-        
-        for contents, sniffed, orig_name in prechecked_files:
-            fname = safe_name(orig_name)
-            total_bytes += len(contents)
-            
-            # Extract metadata (requires temporary file or in-memory processing)
-            tmp_path = None
-            try:
-                if sniffed.startswith("image") or sniffed.startswith("video"):
-                    # Create temp file for metadata extraction
-                    import tempfile
-
-                    with tempfile.NamedTemporaryFile(
-                        delete=False,
-                        suffix=os.path.splitext(fname)[1],
-                    ) as tf:
-                        tf.write(contents)
-                        tmp_path = tf.name
-                    
-                    if sniffed.startswith("image"):
-                        meta = extract_image_metadata(tmp_path)
-                    else:
-                        meta = extract_video_metadata(tmp_path)
-                else:
-                    meta = {
-                        "datetime_taken": None,
-                        "gps_lat": None,
-                        "gps_long": None,
-                        "checksum": None,
-                    }
-            except Exception as e:
-                logging.warning(f"Failed to extract metadata: {e}")
-                meta = {
-                    "datetime_taken": None,
-                    "gps_lat": None,
-                    "gps_long": None,
-                    "checksum": None,
-                }
-            finally:
-                if tmp_path and os.path.exists(tmp_path):
-                    try:
-                        os.remove(tmp_path)
-                    except Exception:
-                        pass
-            
-            # Duplicate detection: same checksum within the same event
-            checksum = meta.get("checksum")
-            is_duplicate = False
-            if checksum:
-                exists = (
-                    db.query(FileMetadata)
-                    .filter(
-                        FileMetadata.EventID == event_id,
-                        FileMetadata.Checksum == checksum,
-                        ~FileMetadata.Deleted,
-                    )
-                    .first()
-                )
-                if exists:
-                    is_duplicate = True
-            if is_duplicate:
-                duplicate_count += 1
-                continue
-            
-            # Save metadata
-            stored_name = fname
-            metadata = FileMetadata(
-                EventID=event_id,
-                GuestID=guest_id,
-                FileName=stored_name,
-                FileType=sniffed,
-                FileSize=len(contents),
-                CapturedDateTime=meta.get("datetime_taken"),
-                GPSLat=str(meta.get("gps_lat")) if meta.get("gps_lat") is not None else None,
-                GPSLong=str(meta.get("gps_long")) if meta.get("gps_long") is not None else None,
-                Checksum=meta.get("checksum"),
+
+        new_recs: list[FileMetadata] = []
+        try:
+            # One checksum lookup and one bulk INSERT .. RETURNING for the whole batch.
+            # Off the event loop: it moves files and reads their headers (ffprobe for video).
+            new_recs, duplicate_count = await run_in_threadpool(
+                finalize_staged_batch,
+                db,
+                prechecked_files,
+                user_id=user_id,
+                event_id=event_id,
+                guest_id=guest_id,
+                uploads_base=uploads_base,
+                s3_service=s3_service,
             )
-            db.add(metadata)
-            db.flush()  # Flush to get FileMetadataID
-            
-            # Upload to S3 if configured, otherwise save to local filesystem
             if s3_service:
-                s3_key = f"uploads/{user_id}/{event_id}/{metadata.FileMetadataID}/{stored_name}"
-                try:
-                    s3_service.upload_file(contents, s3_key, sniffed)
-                    logging.info(f"Uploaded {s3_key} to S3")
-                except Exception as e:
-                    logging.error(f"S3 upload failed for {s3_key}: {e}")
-                    # Fall back to local filesystem
-                    tmp_path = unique_path(uploads_base, fname)
-                    with open(tmp_path, "wb") as buffer:
-                        buffer.write(contents)
-            else:
-                # Fall back to local filesystem
-                tmp_path = unique_path(uploads_base, fname)
-                with open(tmp_path, "wb") as buffer:
-                    buffer.write(contents)
-            
-            uploaded.append(stored_name)
-            upload_count += 1
+                await store_batch_in_s3(
+                    s3_service,
+                    prechecked_files,
+                    new_recs,
+                    user_id=user_id,
+                    event_id=event_id,
+                    uploads_base=uploads_base,
+                )
+        finally:
+            # Anything still staged (errors mid-batch) must not linger on disk
+            discard_staged(prechecked_files)
+        upload_count = len(new_recs)
+        total_bytes = sum(int(r.FileSize or 0) for r in new_recs)
+        try:
+            adjust_usage(db, event_id, total_bytes)
+        except Exception:
+            audit.exception("guest.upload.usage_update_failed", extra={"event_id": event_id})
 
         # Update UploadCount
         setattr(
@@ -491,49 +455,32 @@ async def guest_upload_post(
             "UploadCount",
             int(getattr(guest_session, "UploadCount", 0) or 0) + upload_count,
         )
+        # With the job queue enabled, thumbnails and ordering are committed as
+        # MediaJob rows together with the files and run by the worker process.
+        queued = queue_post_ingest(db, user_id, event_id, new_recs)
         db.commit()
-    # Fire-and-forget background thumb generation to avoid on-demand cost
-        try:
-            import threading
-
-            def _thumb_job(uid: int, eid: int, recs: list[FileMetadata]):
-                for r in recs:
-                    try:
-                        generate_all_thumbs_for_file(
-                            user_id=uid,
-                            event_id=eid,
-                            file_id=int(getattr(r, "FileMetadataID")),
-                            file_type=str(getattr(r, "FileType")),
-                            file_name=str(getattr(r, "FileName")),
-                            widths=(480, 720, 960, 1440),
-                        )
-                    except Exception:
-                        pass
-
-            # Collect the newly added metadata rows to pass to the thread
-            new_recs = (
-                db.query(FileMetadata)
-                .filter(FileMetadata.EventID == event_id)
-                .order_by(FileMetadata.FileMetadataID.desc())
-                .limit(upload_count)
-                .all()
-            )
-            t = threading.Thread(target=_thumb_job, args=(user_id, event_id, new_recs), daemon=True)
-            t.start()
-        except Exception:
-            pass
-        # Rebuild gallery order synchronously so newly uploaded files appear
-        # in the EventGalleryOrder table immediately for UI and API consumers.
-        try:
-            from app.services.photo_order_service import rebuild_event_gallery_order
-
+        if not queued:
+            # Fire-and-forget background thumb generation to avoid on-demand cost
             try:
-                rebuild_event_gallery_order(db, event_id)
+                start_thumbnail_job(user_id, event_id, new_recs)
             except Exception:
-                # Non-fatal: don't fail upload on ordering issues
-                audit.exception("guest.upload.order_rebuild_failed", extra={"event_id": event_id})
-        except Exception:
-            pass
+                pass
+            # Slot the new files into the gallery order synchronously so they appear
+            # in the EventGalleryOrder table immediately for UI and API consumers.
+            try:
+                from app.services.photo_order_service import insert_files_into_gallery_order
+
+                try:
+                    insert_files_into_gallery_order(
+                        db, event_id, [int(getattr(r, "FileMetadataID")) for r in new_recs]
+                    )
+                except Exception:
+                    # Non-fatal: don't fail upload on ordering issues
+                    audit.exception(
+                        "guest.upload.order_rebuild_failed", extra={"event_id": event_id}
+                    )
+            except Exception:
+                pass
         audit.info(
             "guest.upload.completed",
             extra={
@@ -545,57 +492,38 @@ async def guest_upload_post(
                 "request_id": getattr(request.state, "request_id", None),
             },
         )
-        # Update or create EventStorage usage to reflect current on-disk size
+        # Usage bytes were added above with the batch; keep the row's descriptive fields fresh
         try:
-            # Recalculate current bytes in the event storage folder
-            current_bytes = 0
-            if os.path.exists(storage_path):
-                for root, _, filenames in os.walk(storage_path):
-                    for fn in filenames:
-                        fp = os.path.join(root, fn)
-                        try:
-                            current_bytes += os.path.getsize(fp)
-                        except Exception:
-                            pass
-            current_mb = int(current_bytes / (1024 * 1024))
-            # Upsert EventStorage row
             es = (
                 db.query(EventStorage)
                 .filter(EventStorage.EventID == event_id)
                 .order_by(EventStorage.EventStorageID.desc())
                 .first()
             )
+            if es is None:
+                reconcile_event_usage(db, event_id, user_id)
+                es = (
+                    db.query(EventStorage)
+                    .filter(EventStorage.EventID == event_id)
+                    .order_by(EventStorage.EventStorageID.desc())
+                    .first()
+                )
             # Persist effective limit if available for visibility
             try:
                 storage_limit_mb = int(effective_limit_mb or 0)
             except Exception:
                 storage_limit_mb = 0
-            now = datetime.now(timezone.utc).replace(tzinfo=None)
-            if es is None:
-                es = EventStorage(
-                    EventID=event_id,
-                    StoragePath=storage_path,
-                    StorageLimitMB=storage_limit_mb,
-                    CurrentUsageMB=current_mb,
-                    LastUploadDateTime=now,
-                )
-                db.add(es)
-            else:
-                try:
-                    setattr(es, "StoragePath", storage_path or getattr(es, "StoragePath", None))
-                except Exception:
-                    pass
-                # only update StorageLimitMB if it's zero/unset and we have a plan-derived limit
-                try:
-                    if int(getattr(es, "StorageLimitMB", 0) or 0) == 0 and storage_limit_mb > 0:
-                        setattr(es, "StorageLimitMB", storage_limit_mb)
-                except Exception:
-                    pass
-                try:
-                    setattr(es, "CurrentUsageMB", current_mb)
-                    setattr(es, "LastUploadDateTime", now)
-                except Exception:
-                    pass
+            try:
+                setattr(es, "StoragePath", storage_path or getattr(es, "StoragePath", None))
+            except Exception:
+                pass
+            # only update StorageLimitMB if it's zero/unset and we have a plan-derived limit
+            try:
+                if int(getattr(es, "StorageLimitMB", 0) or 0) == 0 and storage_limit_mb > 0:
+                    setattr(es, "StorageLimitMB", storage_limit_mb)
+            except Exception:
+                pass
+            setattr(es, "LastUploadDateTime", datetime.now(timezone.utc).replace(tzinfo=None))
             db.commit()
         except Exception:
             # Non-blocking: do not fail the request on accounting issues
@@ -626,6 +554,805 @@ async def guest_upload_post(
     return resp
 
 
+# Upper bound on digests accepted by one dedupe handshake request
+DEDUPE_CHECK_MAX_FILES = 500
+
+
+@router.post("/guest/upload/{event_code}/check")
+async def guest_upload_check(request: Request, event_code: str, db: Session = Depends(get_db)):
+    """Pre-upload dedupe handshake.
+
+    The client posts ``{"files": [{"sha256": "...", "size": 123}, ...]}`` for the
+    files it is about to send and only transfers those listed under ``missing``;
+    ``existing`` digests already belong to live files of the event.
+    """
+    event = db.query(Event).filter(Event.Code == event_code).first()
+    if not event:
+        return JSONResponse({"ok": False, "error": "Invalid event."}, status_code=404)
+    if not getattr(event, "Published", False):
+        return JSONResponse(
+            {"ok": False, "error": "This event is not available yet."}, status_code=403
+        )
+    try:
+        payload = await request.json()
+        entries = payload.get("files") if isinstance(payload, dict) else None
+        if not isinstance(entries, list):
+            raise ValueError("files must be a list")
+    except Exception:
+        return JSONResponse({"ok": False, "error": "Invalid request."}, status_code=400)
+    if len(entries) > DEDUPE_CHECK_MAX_FILES:
+        return JSONResponse({"ok": False, "error": "Too many files."}, status_code=413)
+    digests = []
+    sizes = {}
+    for entry in entries:
+        entry = entry if isinstance(entry, dict) else {}
+        digest = str(entry.get("sha256") or "").strip().lower()
+        if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+            return JSONResponse({"ok": False, "error": "Invalid sha256."}, status_code=400)
+        digests.append(digest)
+        try:
+            sizes[digest] = max(0, int(entry.get("size") or 0))
+        except (TypeError, ValueError):
+            sizes[digest] = 0
+    event_id = int(getattr(event, "EventID"))
+    found = existing_checksums(db, event_id, digests)
+    existing = [d for d in digests if d in found]
+    missing = [d for d in digests if d not in found]
+    audit.info(
+        "guest.upload.dedupe_check",
+        extra={
+            "event_id": event_id,
+            "files_count": len(digests),
+            "existing_count": len(existing),
+            "skipped_bytes": sum(sizes.get(d, 0) for d in existing),
+            "request_id": getattr(request.state, "request_id", None),
+        },
+    )
+    return JSONResponse({"ok": True, "existing": existing, "missing": missing})
+
+
+TUS_VERSION = "1.0.0"
+
+
+def _tus_headers(**extra) -> dict:
+    headers = {"Tus-Resumable": TUS_VERSION, "Cache-Control": "no-store"}
+    headers.update({k: str(v) for k, v in extra.items()})
+    return headers
+
+
+def _upload_expires() -> str:
+    """``Upload-Expires`` for an upload touched now: idle past this, cleanup removes it."""
+    return format_datetime(datetime.now(timezone.utc) + resumable_expiry(), usegmt=True)
+
+
+def _parse_upload_metadata(raw: str | None) -> dict:
+    """Decode a tus ``Upload-Metadata`` header (``key b64value,key b64value``)."""
+    out: dict = {}
+    for pair in (raw or "").split(","):
+        parts = pair.strip().split(" ", 1)
+        if not parts or not parts[0]:
+            continue
+        try:
+            value = base64.b64decode(parts[1]).decode("utf-8") if len(parts) > 1 else ""
+        except Exception:
+            value = ""
+        out[parts[0]] = value
+    return out
+
+
+def _load_resumable(
+    db: Session, request: Request, event_code: str, upload_id: str
+) -> tuple[Event | None, ResumableUpload | None]:
+    """Resolve an upload owned by the caller's guest session cookie."""
+    event = db.query(Event).filter(Event.Code == event_code).first()
+    if not event:
+        return None, None
+    guest_cookie = request.cookies.get(f"guest_session_{event.Code}")
+    if not guest_cookie or not str(guest_cookie).isdigit():
+        return event, None
+    up = (
+        db.query(ResumableUpload)
+        .filter(
+            ResumableUpload.UploadID == upload_id,
+            ResumableUpload.EventID == int(getattr(event, "EventID")),
+            ResumableUpload.GuestID == int(guest_cookie),
+        )
+        .first()
+    )
+    return event, up
+
+
+def _cookie_guest_session(
+    db: Session, request: Request, event: Event, max_guests: int
+) -> GuestSession | None:
+    """Reuse the cookie-scoped guest session, creating one when this is the first upload.
+
+    Returns None when a new session would exceed the plan's guest cap.
+    """
+    event_id = int(getattr(event, "EventID"))
+    guest_cookie = request.cookies.get(f"guest_session_{event.Code}")
+    if guest_cookie and str(guest_cookie).isdigit():
+        guest_session = (
+            db.query(GuestSession)
+            .filter(GuestSession.GuestID == int(guest_cookie), GuestSession.EventID == event_id)
+            .first()
+        )
+        if guest_session is not None:
+            return guest_session
+    if max_guests > 0:
+        total_guests = (
+            db.query(GuestSession.GuestID).filter(GuestSession.EventID == event_id).count()
+        )
+        if total_guests >= max_guests:
+            return None
+    guest_session = GuestSession(EventID=event_id)
+    db.add(guest_session)
+    db.commit()
+    db.refresh(guest_session)
+    return guest_session
+
+
+@router.post("/guest/upload/{event_code}/resumable")
+async def guest_resumable_create(request: Request, event_code: str, db: Session = Depends(get_db)):
+    """Create a tus-style resumable upload and return its location.
+
+    Clients send ``Upload-Length`` and optional ``Upload-Metadata`` (``filename``,
+    ``filetype``); bytes follow as PATCH requests against the returned URL.
+    """
+    event = db.query(Event).filter(Event.Code == event_code).first()
+    if not event:
+        return JSONResponse({"ok": False, "error": "Invalid event."}, status_code=404)
+    if not getattr(event, "Published", False):
+        return JSONResponse(
+            {"ok": False, "error": "This event is not available yet."}, status_code=403
+        )
+    try:
+        length = int(request.headers.get("Upload-Length", ""))
+    except ValueError:
+        length = -1
+    if length < 0:
+        return JSONResponse(
+            {"ok": False, "error": "Upload-Length required."},
+            status_code=400,
+            headers=_tus_headers(),
+        )
+    max_bytes = int(getattr(settings, "MAX_UPLOAD_BYTES", 200_000_000))
+    if max_bytes and length > max_bytes:
+        return JSONResponse(
+            {"ok": False, "error": "File too large."},
+            status_code=413,
+            headers=_tus_headers(**{"Tus-Max-Size": max_bytes}),
+        )
+    user_id = int(getattr(event, "UserID"))
+    event_id = int(getattr(event, "EventID"))
+    try:
+        from app.services.entitlements import get_plan_features
+
+        features = get_plan_features(db, user_id)
+        max_guests = int(features.get("max_guests_per_event", 0) or 0)
+        plan_storage_mb = int(features.get("max_storage_per_event_mb", 0) or 0)
+    except Exception:
+        max_guests = 0
+        plan_storage_mb = 0
+
+    cookie_name = f"guest_session_{event.Code}"
+    guest_session = _cookie_guest_session(db, request, event, max_guests)
+    if guest_session is None:
+        return JSONResponse(
+            {"ok": False, "error": "Guest limit reached for this event."},
+            status_code=400,
+            headers=_tus_headers(),
+        )
+
+    event_base_path = os.path.join("storage", str(user_id), str(event_id))
+    effective_limit_mb = _effective_storage_limit_mb(db, event_id, plan_storage_mb)
+    if effective_limit_mb and effective_limit_mb > 0:
+        # Unfinished uploads hold their full length until they complete or expire
+        current = get_usage_bytes(db, event_id) + pending_upload_bytes(db, event_id)
+        if (current + length) > (effective_limit_mb * 1024 * 1024):
+            return JSONResponse(
+                {"ok": False, "error": "Storage limit reached for this event."},
+                status_code=413,
+                headers=_tus_headers(),
+            )
+
+    meta = _parse_upload_metadata(request.headers.get("Upload-Metadata"))
+    upload_id = uuid.uuid4().hex
+    dest = staging_dir(event_base_path)
+    os.makedirs(dest, exist_ok=True)
+    path = os.path.join(dest, f"{upload_id}.part")
+    open(path, "wb").close()
+    up = ResumableUpload(
+        UploadID=upload_id,
+        EventID=event_id,
+        GuestID=int(getattr(guest_session, "GuestID")),
+        FileName=(meta.get("filename") or "upload.bin")[:255],
+        DeclaredType=(meta.get("filetype") or None),
+        Length=length,
+        Offset=0,
+        StagingPath=path,
+        Status=RESUMABLE_UPLOAD_STATUS,
+    )
+    db.add(up)
+    db.commit()
+    audit.info(
+        "guest.upload.resumable.created",
+        extra={
+            "event_id": event_id,
+            "guest_id": up.GuestID,
+            "upload_id": upload_id,
+            "length": length,
+            "request_id": getattr(request.state, "request_id", None),
+        },
+    )
+    resp = Response(
+        status_code=201,
+        headers=_tus_headers(
+            Location=f"/guest/upload/{event_code}/resumable/{upload_id}",
+            **{"Upload-Offset": 0, "Upload-Expires": _upload_expires()},
+        ),
+    )
+    resp.set_cookie(cookie_name, str(up.GuestID), max_age=60 * 60 * 24 * 30, samesite="lax")
+    return resp
+
+
+@router.head("/guest/upload/{event_code}/resumable/{upload_id}")
+async def guest_resumable_head(
+    request: Request, event_code: str, upload_id: str, db: Session = Depends(get_db)
+):
+    """Report the persisted offset so an interrupted client can resume."""
+    _event, up = _load_resumable(db, request, event_code, upload_id)
+    if up is None or up.Status in DIRECT_PENDING_STATUSES:
+        return Response(status_code=404, headers=_tus_headers())
+    return Response(
+        status_code=200,
+        headers=_tus_headers(**{"Upload-Offset": up.Offset, "Upload-Length": up.Length}),
+    )
+
+
+def _open_staging_at(path: str, offset: int):
+    """Open a tus staging file for appending at ``offset``.
+
+    Bytes past the last acknowledged offset (a torn earlier PATCH) are dropped.
+    """
+    fh = open(path, "r+b" if os.path.exists(path) else "w+b")
+    fh.truncate(offset)
+    fh.seek(offset)
+    return fh
+
+
+@router.patch("/guest/upload/{event_code}/resumable/{upload_id}")
+async def guest_resumable_patch(
+    request: Request, event_code: str, upload_id: str, db: Session = Depends(get_db)
+):
+    """Append bytes at ``Upload-Offset``; the last chunk hands the file to ingest.
+
+    One PATCH at a time owns an upload: it claims the row (``uploading`` ->
+    ``receiving``) with a conditional UPDATE on the client's offset, and a second
+    request gets 423 until the first finishes or stops making progress for
+    ``RESUMABLE_UPLOAD_LOCK_SECONDS``.
+    """
+    event, up = _load_resumable(db, request, event_code, upload_id)
+    if up is None or event is None or up.Status in DIRECT_PENDING_STATUSES:
+        return Response(status_code=404, headers=_tus_headers())
+    if request.headers.get("Content-Type", "") != "application/offset+octet-stream":
+        return Response(status_code=415, headers=_tus_headers())
+    if up.Status not in RESUMABLE_PENDING_STATUSES:
+        return Response(
+            status_code=409 if up.Status == "rejected" else 204,
+            headers=_tus_headers(**{"Upload-Offset": up.Offset}),
+        )
+    try:
+        client_offset = int(request.headers.get("Upload-Offset", ""))
+    except ValueError:
+        client_offset = -1
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    lock_seconds = int(getattr(settings, "RESUMABLE_UPLOAD_LOCK_SECONDS", 300))
+    claimed = (
+        db.query(ResumableUpload)
+        .filter(
+            ResumableUpload.UploadID == upload_id,
+            ResumableUpload.Offset == client_offset,
+            or_(
+                and_(
+                    ResumableUpload.Status == RESUMABLE_UPLOAD_STATUS,
+                    ResumableUpload.UpdatedAt >= now - resumable_expiry(),
+                ),
+                # A PATCH that died mid-stream leaves its claim behind; let a retry take it
+                and_(
+                    ResumableUpload.Status == RESUMABLE_RECEIVING_STATUS,
+                    ResumableUpload.UpdatedAt < now - timedelta(seconds=lock_seconds),
+                ),
+            ),
+        )
+        .update({ResumableUpload.Status: RESUMABLE_RECEIVING_STATUS}, synchronize_session=False)
+    )
+    db.commit()
+    if not claimed:
+        up = db.query(ResumableUpload).filter(ResumableUpload.UploadID == upload_id).first()
+        if up is None:
+            return Response(status_code=404, headers=_tus_headers())
+        headers = _tus_headers(**{"Upload-Offset": up.Offset})
+        if up.Status not in RESUMABLE_PENDING_STATUSES:
+            return Response(status_code=409 if up.Status == "rejected" else 204, headers=headers)
+        if int(up.Offset or 0) != client_offset:
+            return Response(status_code=409, headers=headers)
+        if up.Status == RESUMABLE_RECEIVING_STATUS:
+            return Response(status_code=423, headers=headers)
+        # Idle past its expiry: cleanup owns it now
+        return Response(status_code=410, headers=_tus_headers())
+
+    offset = client_offset
+    length = int(up.Length)
+    too_long = False
+    # Disk I/O runs on the threadpool so a slow disk can't stall the event loop;
+    # network chunks are gathered into writes of about UPLOAD_CHUNK_BYTES
+    write_bytes = int(getattr(settings, "UPLOAD_CHUNK_BYTES", 1024 * 1024))
+    try:
+        fh = await run_in_threadpool(_open_staging_at, up.StagingPath, offset)
+        try:
+            pending = bytearray()
+            heartbeat = datetime.now(timezone.utc)
+            try:
+                async for chunk in request.stream():
+                    if not chunk:
+                        continue
+                    if offset + len(pending) + len(chunk) > length:
+                        too_long = True
+                        break
+                    pending += chunk
+                    if len(pending) >= write_bytes:
+                        data = bytes(pending)
+                        pending.clear()
+                        await run_in_threadpool(fh.write, data)
+                        offset += len(data)
+                    # Keep the claim fresh on long bodies so no retry takes it over
+                    if (datetime.now(timezone.utc) - heartbeat).total_seconds() > lock_seconds / 3:
+                        await run_in_threadpool(fh.flush)
+                        setattr(up, "Offset", offset)
+                        db.commit()
+                        heartbeat = datetime.now(timezone.utc)
+            except ClientDisconnect:
+                pass
+            if pending:
+                await run_in_threadpool(fh.write, bytes(pending))
+                offset += len(pending)
+            await run_in_threadpool(fh.flush)
+        finally:
+            await run_in_threadpool(fh.close)
+    finally:
+        setattr(up, "Offset", offset)
+        # A complete upload stays claimed until ingest below gives it a final status
+        if offset < length or too_long:
+            setattr(up, "Status", RESUMABLE_UPLOAD_STATUS)
+        db.commit()
+    if too_long:
+        return Response(status_code=413, headers=_tus_headers(**{"Upload-Offset": offset}))
+    if offset < length:
+        return Response(
+            status_code=204,
+            headers=_tus_headers(**{"Upload-Offset": offset, "Upload-Expires": _upload_expires()}),
+        )
+
+    # Upload complete: run the same sniff/dedupe/store path as the form upload
+    user_id = int(getattr(event, "UserID"))
+    event_id = int(getattr(event, "EventID"))
+    allowed_prefixes = tuple(
+        getattr(settings, "ALLOWED_UPLOAD_MIME_PREFIXES", ("image/", "video/"))
+    )
+    # Sniffing and finalize read the whole file (and ffprobe videos); keep them off the loop
+    staged = await run_in_threadpool(
+        sniff_staged_file,
+        up.StagingPath,
+        up.FileName,
+        allowed_prefixes=allowed_prefixes,
+        fallback_content_type=up.DeclaredType,
+        chunk_size=int(getattr(settings, "UPLOAD_CHUNK_BYTES", 1024 * 1024)),
+    )
+    headers = _tus_headers(**{"Upload-Offset": offset})
+    if staged.rejected:
+        discard_staged([staged])
+        setattr(up, "Status", "rejected")
+        db.commit()
+        audit.warning(
+            f"guest.upload.rejected_{staged.rejected}",
+            extra={
+                "event_id": event_id,
+                "ctype": staged.mime,
+                "request_id": getattr(request.state, "request_id", None),
+            },
+        )
+        # Unsafe images are the right type but unprocessable content
+        status = 422 if staged.rejected == "image" else 415
+        return Response(status_code=status, headers=headers)
+    uploads_base = os.path.join("storage", str(user_id), str(event_id), "uploads")
+    s3_service = getattr(request.app.state, "s3_service", None)
+    try:
+        rec = await run_in_threadpool(
+            finalize_staged_upload,
+            db,
+            staged,
+            user_id=user_id,
+            event_id=event_id,
+            guest_id=int(up.GuestID),
+            uploads_base=uploads_base,
+            s3_service=s3_service,
+        )
+        if s3_service and rec is not None:
+            await store_batch_in_s3(
+                s3_service,
+                [staged],
+                [rec],
+                user_id=user_id,
+                event_id=event_id,
+                uploads_base=uploads_base,
+            )
+    finally:
+        discard_staged([staged])
+    if rec is None:
+        setattr(up, "Status", "duplicate")
+        db.commit()
+        headers["X-Duplicates-Skipped"] = "1"
+        return Response(status_code=204, headers=headers)
+    setattr(up, "Status", "complete")
+    setattr(up, "FileMetadataID", rec.FileMetadataID)
+    try:
+        adjust_usage(db, event_id, staged.size)
+    except Exception:
+        audit.exception("guest.upload.usage_update_failed", extra={"event_id": event_id})
+    guest_session = db.query(GuestSession).filter(GuestSession.GuestID == up.GuestID).first()
+    if guest_session is not None:
+        setattr(
+            guest_session,
+            "UploadCount",
+            int(getattr(guest_session, "UploadCount", 0) or 0) + 1,
+        )
+    queued = queue_post_ingest(db, user_id, event_id, [rec])
+    db.commit()
+    if not queued:
+        try:
+            start_thumbnail_job(user_id, event_id, [rec])
+        except Exception:
+            pass
+        try:
+            from app.services.photo_order_service import insert_files_into_gallery_order
+
+            insert_files_into_gallery_order(db, event_id, [int(getattr(rec, "FileMetadataID"))])
+        except Exception:
+            audit.exception("guest.upload.order_rebuild_failed", extra={"event_id": event_id})
+    audit.info(
+        "guest.upload.completed",
+        extra={
+            "event_id": event_id,
+            "guest_id": up.GuestID,
+            "files_count": 1,
+            "total_bytes": staged.size,
+            "upload_id": upload_id,
+            "request_id": getattr(request.state, "request_id", None),
+        },
+    )
+    headers["X-File-Id"] = str(rec.FileMetadataID)
+    return Response(status_code=204, headers=headers)
+
+
+DIRECT_UPLOAD_MAX_FILES = 100
+
+
+def _sha256_hex(value) -> Optional[str]:
+    """Normalised hex digest, or None when ``value`` isn't one."""
+    digest = str(value or "").strip().lower()
+    if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+        return None
+    return digest
+
+
+def _direct_s3_service(request: Request):
+    s3_service = getattr(request.app.state, "s3_service", None)
+    if not getattr(settings, "S3_DIRECT_UPLOADS", False):
+        return None
+    if not getattr(s3_service, "enabled", False):
+        return None
+    return s3_service
+
+
+@router.post("/guest/upload/{event_code}/direct")
+async def guest_direct_upload_create(
+    request: Request, event_code: str, db: Session = Depends(get_db)
+):
+    """Issue presigned POST policies so the browser uploads straight to the bucket.
+
+    The client posts ``{"files": [{"name": ..., "type": ..., "size": ..., "sha256": ...}]}``;
+    each accepted file gets a policy limited to its key, Content-Type, exact size and
+    SHA-256 (which S3 verifies and keeps, so finalize needn't read the object), plus
+    the URL to call once the bucket has the bytes. Pending uploads reuse
+    ResumableUpload rows (``Status="presigned"``, ``StagingPath`` = incoming key).
+    """
+    s3_service = _direct_s3_service(request)
+    if s3_service is None:
+        return JSONResponse(
+            {"ok": False, "error": "Direct uploads are not enabled."}, status_code=404
+        )
+    event = db.query(Event).filter(Event.Code == event_code).first()
+    if not event:
+        return JSONResponse({"ok": False, "error": "Invalid event."}, status_code=404)
+    if not getattr(event, "Published", False):
+        return JSONResponse(
+            {"ok": False, "error": "This event is not available yet."}, status_code=403
+        )
+    try:
+        payload = await request.json()
+        entries = payload.get("files") if isinstance(payload, dict) else None
+        if not isinstance(entries, list) or not entries:
+            raise ValueError("files must be a non-empty list")
+        files = [
+            {
+                "name": str(e.get("name") or "upload.bin")[:255],
+                "type": str(e.get("type") or "").strip().lower(),
+                "size": int(e.get("size")),
+                "sha256": _sha256_hex(e.get("sha256")),
+            }
+            for e in entries
+        ]
+    except Exception:
+        return JSONResponse({"ok": False, "error": "Invalid request."}, status_code=400)
+    if not all(f["sha256"] for f in files):
+        return JSONResponse({"ok": False, "error": "Invalid sha256."}, status_code=400)
+    if len(files) > DIRECT_UPLOAD_MAX_FILES:
+        return JSONResponse({"ok": False, "error": "Too many files."}, status_code=413)
+    max_bytes = int(getattr(settings, "MAX_UPLOAD_BYTES", 200_000_000))
+    allowed_prefixes = tuple(
+        getattr(settings, "ALLOWED_UPLOAD_MIME_PREFIXES", ("image/", "video/"))
+    )
+    for f in files:
+        if f["size"] <= 0 or (max_bytes and f["size"] > max_bytes):
+            return JSONResponse({"ok": False, "error": "File too large."}, status_code=413)
+        if not f["type"].startswith(allowed_prefixes):
+            return JSONResponse({"ok": False, "error": "Unsupported file type."}, status_code=415)
+
+    user_id = int(getattr(event, "UserID"))
+    event_id = int(getattr(event, "EventID"))
+    try:
+        from app.services.entitlements import get_plan_features
+
+        features = get_plan_features(db, user_id)
+        max_guests = int(features.get("max_guests_per_event", 0) or 0)
+        plan_storage_mb = int(features.get("max_storage_per_event_mb", 0) or 0)
+    except Exception:
+        max_guests = 0
+        plan_storage_mb = 0
+    effective_limit_mb = _effective_storage_limit_mb(db, event_id, plan_storage_mb)
+    if effective_limit_mb and effective_limit_mb > 0:
+        current = get_usage_bytes(db, event_id) + pending_upload_bytes(db, event_id)
+        if current + sum(f["size"] for f in files) > effective_limit_mb * 1024 * 1024:
+            return JSONResponse(
+                {"ok": False, "error": "Storage limit reached for this event."}, status_code=413
+            )
+    guest_session = _cookie_guest_session(db, request, event, max_guests)
+    if guest_session is None:
+        return JSONResponse(
+            {"ok": False, "error": "Guest limit reached for this event."}, status_code=400
+        )
+
+    expires = int(getattr(settings, "S3_DIRECT_UPLOAD_EXPIRES_SECONDS", 900))
+    uploads = []
+    for f in files:
+        upload_id = uuid.uuid4().hex
+        key = direct_upload_key(user_id, event_id, upload_id, f["name"])
+        policy = s3_service.generate_presigned_post(
+            key, f["type"], f["size"], sha256=f["sha256"], expiration=expires
+        )
+        db.add(
+            ResumableUpload(
+                UploadID=upload_id,
+                EventID=event_id,
+                GuestID=int(getattr(guest_session, "GuestID")),
+                FileName=f["name"],
+                DeclaredType=f["type"][:64],
+                Length=f["size"],
+                Offset=0,
+                StagingPath=key,
+                Status=DIRECT_UPLOAD_STATUS,
+            )
+        )
+        uploads.append(
+            {
+                "id": upload_id,
+                "name": f["name"],
+                "url": policy["url"],
+                "fields": policy["fields"],
+                "finalize": f"/guest/upload/{event_code}/direct/{upload_id}/finalize",
+            }
+        )
+    db.commit()
+    audit.info(
+        "guest.upload.direct.presigned",
+        extra={
+            "event_id": event_id,
+            "guest_id": guest_session.GuestID,
+            "files_count": len(uploads),
+            "total_bytes": sum(f["size"] for f in files),
+            "request_id": getattr(request.state, "request_id", None),
+        },
+    )
+    resp = JSONResponse({"ok": True, "uploads": uploads, "expires_in": expires})
+    resp.set_cookie(
+        f"guest_session_{event.Code}",
+        str(guest_session.GuestID),
+        max_age=60 * 60 * 24 * 30,
+        samesite="lax",
+    )
+    return resp
+
+
+@router.post("/guest/upload/{event_code}/direct/{upload_id}/finalize")
+async def guest_direct_upload_finalize(
+    request: Request, event_code: str, upload_id: str, db: Session = Depends(get_db)
+):
+    """Record a presigned upload once its bytes are in the bucket.
+
+    The object's size and type are checked against the policy and its SHA-256 is
+    computed server-side before dedupe; an optional JSON body ``{"sha256": "<hex>"}``
+    is only compared with it, never stored. The FileMetadata row is created and
+    post-processing is queued exactly as for uploads through the app. The upload is
+    claimed with a conditional status update so concurrent calls can't record it
+    twice; repeating the call for a finished upload returns the same file id.
+    """
+    s3_service = _direct_s3_service(request)
+    if s3_service is None:
+        return JSONResponse(
+            {"ok": False, "error": "Direct uploads are not enabled."}, status_code=404
+        )
+    event, up = _load_resumable(db, request, event_code, upload_id)
+    if event is None or up is None or up.Status not in (*DIRECT_PENDING_STATUSES, "complete"):
+        return JSONResponse({"ok": False, "error": "Unknown upload."}, status_code=404)
+    if up.Status == "complete":
+        return JSONResponse({"ok": True, "file_id": up.FileMetadataID})
+    try:
+        payload = await request.json()
+    except Exception:
+        payload = {}
+    declared = (payload or {}).get("sha256") or None
+    if declared and not _sha256_hex(declared):
+        return JSONResponse({"ok": False, "error": "Invalid sha256."}, status_code=400)
+
+    def claim(from_status: str, to_status: str) -> int:
+        claimed = (
+            db.query(ResumableUpload)
+            .filter(ResumableUpload.UploadID == upload_id, ResumableUpload.Status == from_status)
+            .update({ResumableUpload.Status: to_status}, synchronize_session=False)
+        )
+        db.commit()
+        return claimed
+
+    if not claim(DIRECT_UPLOAD_STATUS, DIRECT_FINALIZING_STATUS):
+        # Another request holds (or has finished) this upload
+        db.refresh(up)
+        if up.Status == "complete":
+            return JSONResponse({"ok": True, "file_id": up.FileMetadataID})
+        if up.Status == DIRECT_FINALIZING_STATUS:
+            return JSONResponse(
+                {"ok": False, "error": "Upload is already being finalized."}, status_code=409
+            )
+        return JSONResponse({"ok": False, "error": "Unknown upload."}, status_code=404)
+
+    key = str(up.StagingPath)
+    info = await s3_service.stat(key)
+    if info is None:
+        claim(DIRECT_FINALIZING_STATUS, DIRECT_UPLOAD_STATUS)
+        return JSONResponse({"ok": False, "error": "Upload not found in storage."}, status_code=409)
+    if info["size"] != int(up.Length):
+        # The policy should make this impossible; don't keep bytes we didn't agree to
+        await s3_service.delete(key)
+        setattr(up, "Status", "rejected")
+        db.commit()
+        return JSONResponse({"ok": False, "error": "Upload rejected."}, status_code=422)
+    try:
+        checksum = await s3_service.sha256(key)
+    except Exception:
+        claim(DIRECT_FINALIZING_STATUS, DIRECT_UPLOAD_STATUS)
+        audit.exception(
+            "guest.upload.direct.checksum_failed",
+            extra={"event_id": up.EventID, "upload_id": upload_id},
+        )
+        return JSONResponse({"ok": False, "error": "Could not finalize upload."}, status_code=502)
+    if declared and _sha256_hex(declared) != checksum:
+        await s3_service.delete(key)
+        setattr(up, "Status", "rejected")
+        db.commit()
+        return JSONResponse(
+            {"ok": False, "error": "Upload did not match its checksum."}, status_code=422
+        )
+
+    user_id = int(getattr(event, "UserID"))
+    event_id = int(getattr(event, "EventID"))
+    if checksum in existing_checksums(db, event_id, [checksum]):
+        await s3_service.delete(key)
+        setattr(up, "Status", "duplicate")
+        db.commit()
+        return JSONResponse({"ok": True, "duplicate": True})
+    try:
+        rec = await finalize_direct_upload(
+            db,
+            s3_service,
+            key=key,
+            file_name=str(up.FileName),
+            declared_type=up.DeclaredType,
+            size=info["size"],
+            checksum=checksum,
+            user_id=user_id,
+            event_id=event_id,
+            guest_id=int(up.GuestID),
+        )
+    except Exception:
+        db.rollback()
+        claim(DIRECT_FINALIZING_STATUS, DIRECT_UPLOAD_STATUS)
+        audit.exception(
+            "guest.upload.direct.finalize_failed",
+            extra={"event_id": event_id, "upload_id": upload_id},
+        )
+        return JSONResponse({"ok": False, "error": "Could not finalize upload."}, status_code=502)
+    if rec is None:
+        await s3_service.delete(key)
+        setattr(up, "Status", "rejected")
+        db.commit()
+        audit.info(
+            "guest.upload.rejected_mime",
+            extra={"event_id": event_id, "upload_id": upload_id, "ctype": up.DeclaredType},
+        )
+        return JSONResponse({"ok": False, "error": "Unsupported file type."}, status_code=415)
+    file_id = int(rec.FileMetadataID)
+    dest = s3_object_key(user_id, event_id, file_id, str(rec.FileName))
+    guest_id = int(up.GuestID)
+    try:
+        setattr(up, "Status", "complete")
+        setattr(up, "Offset", info["size"])
+        setattr(up, "FileMetadataID", file_id)
+        try:
+            adjust_usage(db, event_id, info["size"])
+        except Exception:
+            audit.exception("guest.upload.usage_update_failed", extra={"event_id": event_id})
+        guest_session = db.query(GuestSession).filter(GuestSession.GuestID == guest_id).first()
+        if guest_session is not None:
+            setattr(
+                guest_session,
+                "UploadCount",
+                int(getattr(guest_session, "UploadCount", 0) or 0) + 1,
+            )
+        queued = queue_post_ingest(db, user_id, event_id, [rec])
+        db.commit()
+    except Exception:
+        # Nothing points at the copy; the incoming object is still there for a retry
+        db.rollback()
+        await s3_service.delete(dest)
+        claim(DIRECT_FINALIZING_STATUS, DIRECT_UPLOAD_STATUS)
+        audit.exception(
+            "guest.upload.direct.finalize_failed",
+            extra={"event_id": event_id, "upload_id": upload_id},
+        )
+        return JSONResponse({"ok": False, "error": "Could not finalize upload."}, status_code=502)
+    await s3_service.delete(key)
+    if not queued:
+        # The original lives in the bucket, so only the ordering runs in-process here
+        try:
+            from app.services.photo_order_service import insert_files_into_gallery_order
+
+            insert_files_into_gallery_order(db, event_id, [file_id])
+        except Exception:
+            audit.exception("guest.upload.order_rebuild_failed", extra={"event_id": event_id})
+    audit.info(
+        "guest.upload.direct.completed",
+        extra={
+            "event_id": event_id,
+            "guest_id": guest_id,
+            "file_id": file_id,
+            "bytes": info["size"],
+            "request_id": getattr(request.state, "request_id", None),
+        },
+    )
+    return JSONResponse({"ok": True, "file_id": file_id})
+
+
 @router.post("/guest/upload/{event_code}/delete")
 async def guest_delete_file(
     request: Request, event_code: str, file_id: int = Form(...), db: Session = Depends(get_db)
@@ -27,6 +27,10 @@ class Settings(BaseSettings):
     # Stripe
     STRIPE_PUBLISHABLE_KEY: str = ""
     STRIPE_SECRET_KEY: str = ""
+    # Pending-purchase sweep (python -m scripts.reconcile_stripe_purchases)
+    STRIPE_RECONCILE_LOOKBACK_HOURS: int = 48  # only purchases touched this recently
+    STRIPE_RECONCILE_CONCURRENCY: int = 4  # Checkout Session lookups in flight
+    STRIPE_RECONCILE_INLINE: bool = False  # also check Stripe inside get_active_plan
 
     # Logging
     LOG_LEVEL: str = "INFO"  # DEBUG, INFO, WARNING, ERROR, CRITICAL
@@ -42,6 +46,17 @@ class Settings(BaseSettings):
     # Upload/security
     MAX_UPLOAD_BYTES: int = 200_000_000  # 200 MB per file default
     ALLOWED_UPLOAD_MIME_PREFIXES: Tuple[str, ...] = ("image/", "video/")
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024  # read/write size when spooling uploads to disk
+    # Resumable (tus) uploads idle this long are expired and their bytes removed
+    RESUMABLE_UPLOAD_EXPIRES_SECONDS: int = 24 * 3600
+    # A PATCH holds its upload for this long without progress before a retry may take over
+    RESUMABLE_UPLOAD_LOCK_SECONDS: int = 300
+    # Images declaring more pixels are refused before decode (decompression bombs)
+    MAX_IMAGE_PIXELS: int = 150_000_000
+    # ffprobe/ffmpeg: concurrent processes per web/worker process, and per-call timeouts
+    MEDIA_EXEC_CONCURRENCY: int = 2
+    FFPROBE_TIMEOUT_SECONDS: float = 15.0
+    FFMPEG_TIMEOUT_SECONDS: float = 60.0
     COOKIE_SECURE: bool = False  # override to True in prod; or auto-detected from BASE_URL
     # Auth rate-limiting
     RATE_LIMIT_LOGIN_ATTEMPTS: int = 5
@@ -60,6 +75,47 @@ class Settings(BaseSettings):
     AWS_ACCESS_KEY_ID: str = ""  # Optional; uses IAM role on EC2
     AWS_SECRET_ACCESS_KEY: str = ""  # Optional; uses IAM role on EC2
     S3_UPLOADS_BUCKET: str = ""  # If empty, uses local filesystem
+    S3_MULTIPART_PART_BYTES: int = 8 * 1024 * 1024  # multipart part size (S3 minimum is 5 MiB)
+    S3_MULTIPART_CONCURRENCY: int = 4  # parts in flight per upload
+    # Guests upload straight to the bucket with presigned POSTs (needs bucket CORS for BASE_URL)
+    S3_DIRECT_UPLOADS: bool = False
+    S3_DIRECT_UPLOAD_EXPIRES_SECONDS: int = 900
+
+    # Per-process plan entitlement cache (app.services.entitlements)
+    ENTITLEMENT_CACHE_TTL_SECONDS: int = 300
+    ENTITLEMENT_CACHE_MAX_USERS: int = 10_000
+
+    # In-process thumbnail rendering pool (app.services.thumb_scheduler)
+    THUMB_WORKERS: int = 2
+    THUMB_INTERACTIVE_TIMEOUT_SECONDS: float = 15.0  # /thumbs waits this long before fallback
+    # Encodings persisted next to each JPEG thumbnail and served by Accept negotiation;
+    # "avif" is opt-in (much slower to encode) and skipped when Pillow lacks it
+    THUMB_EXTRA_FORMATS: Tuple[str, ...] = ("webp",)
+    # Width ladder: /thumbs?w= snaps up to the nearest rung, so a photo has at most
+    # one file per rung and encoding; LQIP placeholders are always THUMB_LQIP_WIDTH wide
+    THUMB_WIDTHS: Tuple[int, ...] = (480, 720, 960, 1440)
+    THUMB_LQIP_WIDTH: int = 40
+    THUMB_PLACEHOLDER_WIDTH: int = 16  # inline data: URI placeholder stored per file
+    # Gallery thumbnail URLs are HMAC-signed (app.services.media_urls) and valid for
+    # one to two of these windows; /thumbs serves them without a session lookup
+    MEDIA_URL_TTL_SECONDS: int = 3600
+    # Behind nginx: authorized thumbnail/export downloads answer with X-Accel-Redirect
+    # to this internal location (aliased to the storage root) instead of streaming
+    ACCEL_REDIRECT_ENABLED: bool = False
+    ACCEL_REDIRECT_PREFIX: str = "/_protected/storage/"
+    # Thumbnail directories are a cache: least recently used files are evicted past
+    # these budgets (0 disables a budget) and re-rendered on demand
+    THUMB_CACHE_MAX_BYTES: int = 20 * 1024 * 1024 * 1024
+    THUMB_CACHE_EVENT_MAX_BYTES: int = 0
+
+    # Durable media-ingest queue (python -m app.jobs.worker). When disabled,
+    # post-upload work runs in-process as before.
+    MEDIA_JOB_QUEUE: bool = False
+    MEDIA_JOB_PROCESSES: int = 2  # worker process pool size
+    MEDIA_JOB_BATCH: int = 8  # jobs claimed per poll
+    MEDIA_JOB_POLL_SECONDS: float = 2.0
+    MEDIA_JOB_MAX_ATTEMPTS: int = 5  # then the job is dead-lettered
+    MEDIA_JOB_LEASE_SECONDS: int = 900  # running jobs older than this are requeued
 
     # Debug/dev-only routes flag
     # Enable in development; should be disabled in production deployments.
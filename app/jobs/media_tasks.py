@@ -0,0 +1,61 @@
+"""Handlers for MediaJob kinds; executed inside the worker's process pool.
+
+Each handler receives the plain job spec from :func:`app.jobs.queue.job_spec`
+and opens its own DB session when it needs one (sessions can't cross process
+boundaries). Raising marks the attempt as failed.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any, Callable
+
+from app.jobs.queue import KIND_GALLERY_ORDER, KIND_THUMBNAILS
+from app.services.placeholders import record_placeholder_detached
+from app.services.storage_accounting import record_usage_detached
+from app.services.thumbs import generate_all_thumbs_for_file, image_thumb_path
+from app.services.upload_ingest import THUMB_WIDTHS
+
+
+def run_thumbnails(spec: dict[str, Any]) -> None:
+    payload = spec.get("payload") or {}
+    user_id = int(payload["user_id"])
+    event_id = int(spec["event_id"])
+    file_id = int(spec["file_id"])
+    created = generate_all_thumbs_for_file(
+        user_id=user_id,
+        event_id=event_id,
+        file_id=file_id,
+        file_type=str(payload.get("file_type") or ""),
+        file_name=str(payload.get("file_name") or ""),
+        widths=THUMB_WIDTHS,
+    )
+    record_usage_detached(event_id, created)
+    smallest = image_thumb_path(user_id, event_id, file_id, min(THUMB_WIDTHS))
+    if os.path.exists(smallest):
+        record_placeholder_detached(file_id, smallest)
+
+
+def run_gallery_order(spec: dict[str, Any]) -> None:
+    from app.services.photo_order_service import insert_files_into_gallery_order
+    from db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        # Places every committed file not yet in the order; rebuilds only if gaps ran out
+        insert_files_into_gallery_order(db, int(spec["event_id"]))
+    finally:
+        db.close()
+
+
+HANDLERS: dict[str, Callable[[dict[str, Any]], None]] = {
+    KIND_THUMBNAILS: run_thumbnails,
+    KIND_GALLERY_ORDER: run_gallery_order,
+}
+
+
+def run_job(spec: dict[str, Any]) -> None:
+    handler = HANDLERS.get(str(spec.get("kind")))
+    if handler is None:
+        raise LookupError(f"no handler for job kind {spec.get('kind')!r}")
+    handler(spec)
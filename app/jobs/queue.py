@@ -0,0 +1,219 @@
+"""DB-backed queue for post-ingest media work.
+
+Producers call :func:`enqueue` in the same transaction that commits the
+``FileMetadata`` rows, so work can't be lost between the upload response and a
+worker picking it up. ``python -m app.jobs.worker`` claims due rows with
+``FOR UPDATE SKIP LOCKED`` (``WITH (UPDLOCK, ROWLOCK, READPAST)`` on SQL Server),
+runs them in a process pool and retries failures with exponential backoff until
+``MaxAttempts``, after which the row is parked as ``dead`` for inspection.
+"""
+
+from __future__ import annotations
+
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.models.event import FileMetadata
+from app.models.media_job import MediaJob
+
+KIND_THUMBNAILS = "thumbnails"
+KIND_GALLERY_ORDER = "gallery_order"
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_DEAD = "dead"
+
+# Retry delay is BACKOFF_BASE_SECONDS * 2**(attempt - 1), capped
+BACKOFF_BASE_SECONDS = 15
+BACKOFF_MAX_SECONDS = 60 * 60
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def enqueue(
+    db: Session,
+    kind: str,
+    event_id: int,
+    *,
+    file_id: Optional[int] = None,
+    payload: Optional[dict] = None,
+    max_attempts: Optional[int] = None,
+) -> MediaJob:
+    """Add a job to the session; it becomes visible when the caller commits."""
+    job = MediaJob(
+        Kind=kind,
+        EventID=int(event_id),
+        FileMetadataID=file_id,
+        Payload=json.dumps(payload or {}),
+        Status=STATUS_QUEUED,
+        Attempts=0,
+        MaxAttempts=int(max_attempts or getattr(settings, "MEDIA_JOB_MAX_ATTEMPTS", 5)),
+        RunAfter=_now(),
+    )
+    db.add(job)
+    return job
+
+
+def enqueue_post_ingest(
+    db: Session, user_id: int, event_id: int, recs: Iterable[FileMetadata]
+) -> int:
+    """Queue thumbnails for each new file plus one gallery-order update for the event."""
+    count = 0
+    for r in recs:
+        enqueue(
+            db,
+            KIND_THUMBNAILS,
+            event_id,
+            file_id=int(getattr(r, "FileMetadataID")),
+            payload={
+                "user_id": int(user_id),
+                "file_type": str(getattr(r, "FileType")),
+                "file_name": str(getattr(r, "FileName")),
+            },
+        )
+        count += 1
+    # A queued order update picks up every file committed before it runs
+    pending_order = (
+        db.query(MediaJob.JobID)
+        .filter(
+            MediaJob.Kind == KIND_GALLERY_ORDER,
+            MediaJob.EventID == int(event_id),
+            MediaJob.Status == STATUS_QUEUED,
+        )
+        .first()
+    )
+    if count and not pending_order:
+        enqueue(db, KIND_GALLERY_ORDER, event_id)
+        count += 1
+    return count
+
+
+def job_spec(job: MediaJob) -> dict[str, Any]:
+    """Plain, picklable description of a job for the worker processes."""
+    try:
+        payload = json.loads(job.Payload or "{}")
+    except ValueError:
+        payload = {}
+    return {
+        "job_id": int(job.JobID),
+        "kind": str(job.Kind),
+        "event_id": int(job.EventID),
+        "file_id": int(job.FileMetadataID) if job.FileMetadataID is not None else None,
+        "payload": payload,
+        "attempt": int(job.Attempts or 0),
+    }
+
+
+def claim(db: Session, worker_id: str, limit: int = 8) -> list[dict[str, Any]]:
+    """Lock up to ``limit`` due jobs for ``worker_id`` and mark them running.
+
+    Rows locked by other workers are skipped rather than waited on.
+    """
+    jobs = (
+        db.query(MediaJob)
+        .filter(MediaJob.Status == STATUS_QUEUED, MediaJob.RunAfter <= _now())
+        .order_by(MediaJob.RunAfter, MediaJob.JobID)
+        .limit(max(1, int(limit)))
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    now = _now()
+    for job in jobs:
+        job.Status = STATUS_RUNNING
+        job.LockedBy = worker_id[:64]
+        job.LockedAt = now
+        job.Attempts = int(job.Attempts or 0) + 1
+    specs = [job_spec(j) for j in jobs]
+    db.commit()
+    return specs
+
+
+def complete(db: Session, job_id: int) -> None:
+    job = db.get(MediaJob, job_id)
+    if job is None:
+        return
+    job.Status = STATUS_COMPLETED
+    job.LockedBy = None
+    job.LastError = None
+    db.commit()
+
+
+def fail(db: Session, job_id: int, error: str) -> str:
+    """Record a failure; requeue with backoff or dead-letter. Returns the new status."""
+    job = db.get(MediaJob, job_id)
+    if job is None:
+        return STATUS_DEAD
+    attempts = int(job.Attempts or 0)
+    job.LastError = (error or "")[:4000]
+    job.LockedBy = None
+    if attempts >= int(job.MaxAttempts or 1):
+        job.Status = STATUS_DEAD
+    else:
+        delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** max(0, attempts - 1))
+        job.Status = STATUS_QUEUED
+        job.RunAfter = _now() + timedelta(seconds=delay)
+    db.commit()
+    return str(job.Status)
+
+
+def release(db: Session, job_ids: Iterable[int]) -> int:
+    """Return claimed jobs to the queue without charging the attempt ``claim`` counted.
+
+    For jobs that never got a fair run, e.g. lost with a process pool that another
+    job crashed.
+    """
+    ids = [int(i) for i in job_ids]
+    if not ids:
+        return 0
+    n = (
+        db.query(MediaJob)
+        .filter(MediaJob.JobID.in_(ids), MediaJob.Status == STATUS_RUNNING)
+        .update(
+            {
+                MediaJob.Status: STATUS_QUEUED,
+                MediaJob.LockedBy: None,
+                MediaJob.Attempts: MediaJob.Attempts - 1,
+            },
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return int(n or 0)
+
+
+def requeue_stale(db: Session, lease_seconds: Optional[int] = None) -> int:
+    """Return jobs whose worker died mid-run to the queue (the attempt still counts).
+
+    Jobs that have used up their attempts this way (e.g. they crash the worker
+    process every time) are dead-lettered instead.
+    """
+    lease = int(lease_seconds or getattr(settings, "MEDIA_JOB_LEASE_SECONDS", 900))
+    stale = (
+        MediaJob.Status == STATUS_RUNNING,
+        MediaJob.LockedAt < _now() - timedelta(seconds=lease),
+    )
+    db.query(MediaJob).filter(*stale, MediaJob.Attempts >= MediaJob.MaxAttempts).update(
+        {
+            MediaJob.Status: STATUS_DEAD,
+            MediaJob.LockedBy: None,
+            MediaJob.LastError: "lease expired",
+        },
+        synchronize_session=False,
+    )
+    n = (
+        db.query(MediaJob)
+        .filter(*stale)
+        .update(
+            {MediaJob.Status: STATUS_QUEUED, MediaJob.LockedBy: None},
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return int(n or 0)
@@ -0,0 +1,168 @@
+"""Media job worker.
+
+Usage (from project root):
+    python -m app.jobs.worker [--processes N] [--batch N] [--poll SECONDS] [--once]
+
+Claims due MediaJob rows and runs them on a process pool so thumbnailing and
+ordering never compete with request handling for the web server's GIL. Run as
+many workers as needed; row locks keep them from claiming the same job.
+``--processes 0`` runs jobs inline in this process (debugging).
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.jobs.media_tasks import run_job
+from app.jobs.queue import claim, complete, fail, release, requeue_stale
+
+logger = logging.getLogger("app.jobs.worker")
+
+
+def _record(db: Session, spec: dict, error: Optional[BaseException]) -> None:
+    if error is None:
+        complete(db, spec["job_id"])
+        return
+    status = fail(db, spec["job_id"], f"{type(error).__name__}: {error}")
+    logger.warning(
+        "media job failed",
+        extra={"job_id": spec["job_id"], "kind": spec["kind"], "status": status},
+    )
+
+
+def _new_pool(processes: int) -> ProcessPoolExecutor:
+    # Spawned, not forked: children of this process would share the engine's
+    # pooled connections, which it has already used to claim jobs
+    return ProcessPoolExecutor(max_workers=processes, mp_context=get_context("spawn"))
+
+
+def process_batch(
+    db: Session, worker_id: str, pool: Optional[ProcessPoolExecutor], batch: int
+) -> int:
+    """Claim one batch, run it and record outcomes; returns the number of jobs run.
+
+    Raises BrokenProcessPool when a job took its pool process down. Which job did
+    is unknown, so the batch's unfinished jobs go back to the queue uncharged,
+    unless the batch was that one job. The caller rebuilds the pool and claims
+    one job at a time for a while so a job that keeps crashing is charged.
+    """
+    specs = claim(db, worker_id, limit=batch)
+    if pool is None:
+        for spec in specs:
+            try:
+                run_job(spec)
+            except Exception as e:
+                _record(db, spec, e)
+            else:
+                _record(db, spec, None)
+        return len(specs)
+    futures = {}
+    lost = []
+    try:
+        for spec in specs:
+            futures[pool.submit(run_job, spec)] = spec
+    except BrokenProcessPool:
+        lost = specs[len(futures) :]
+    for fut in as_completed(futures):
+        spec = futures[fut]
+        try:
+            fut.result()
+        except BrokenProcessPool:
+            lost.append(spec)
+        except Exception as e:
+            _record(db, spec, e)
+        else:
+            _record(db, spec, None)
+    if lost:
+        if len(specs) == 1:
+            _record(db, specs[0], BrokenProcessPool("the job's worker process died"))
+        else:
+            release(db, [s["job_id"] for s in lost])
+        raise BrokenProcessPool(f"{len(lost)} of {len(specs)} jobs lost with the pool")
+    return len(specs)
+
+
+def run_worker(
+    session_factory: Callable[[], Session],
+    *,
+    processes: int,
+    batch: int,
+    poll_seconds: float,
+    once: bool = False,
+) -> int:
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    pool = _new_pool(processes) if processes > 0 else None
+    processed = 0
+    isolate = 0  # batches left to claim one job at a time after the pool broke
+    errors = 0
+    try:
+        while True:
+            n = 0
+            try:
+                db = session_factory()
+                try:
+                    requeue_stale(db)
+                    n = process_batch(db, worker_id, pool, 1 if isolate else batch)
+                    isolate = max(0, isolate - 1)
+                finally:
+                    db.close()
+                errors = 0
+            except BrokenProcessPool:
+                logger.exception("worker pool broke; restarting")
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = _new_pool(processes)
+                isolate = batch
+                continue
+            except Exception:
+                # Database outages and the like: keep the worker alive and back off
+                errors += 1
+                logger.exception("media worker iteration failed")
+                time.sleep(min(60.0, poll_seconds * 2**errors))
+                continue
+            processed += n
+            if once and n == 0:
+                return processed
+            if n == 0:
+                time.sleep(poll_seconds)
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run media ingest jobs")
+    parser.add_argument(
+        "--processes", type=int, default=int(getattr(settings, "MEDIA_JOB_PROCESSES", 2))
+    )
+    parser.add_argument("--batch", type=int, default=int(getattr(settings, "MEDIA_JOB_BATCH", 8)))
+    parser.add_argument(
+        "--poll", type=float, default=float(getattr(settings, "MEDIA_JOB_POLL_SECONDS", 2.0))
+    )
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is drained")
+    args = parser.parse_args(argv)
+
+    from db import SessionLocal
+
+    n = run_worker(
+        SessionLocal,
+        processes=max(0, args.processes),
+        batch=max(1, args.batch),
+        poll_seconds=max(0.1, args.poll),
+        once=args.once,
+    )
+    print(f"Processed {n} jobs")
+
+
+if __name__ == "__main__":
+    main()
@@ -42,7 +42,10 @@ from .event import (
 )
 from .export import UserDataExportJob as UserDataExportJob
 from .logging import AppErrorLog as AppErrorLog
+from .media_blob import MediaBlob as MediaBlob
+from .media_job import MediaJob as MediaJob
 from .rate_limit import RateLimitCounter as RateLimitCounter
+from .resumable_upload import ResumableUpload as ResumableUpload
 from .user import Base as Base  # explicit re-export
 from .user import User as User
 from .user import UserSession as UserSession
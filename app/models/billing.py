@@ -1,4 +1,4 @@
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, Numeric, String, Text
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, Numeric, String, Text
 from sqlalchemy.sql import func
 
 from app.models.user import Base
@@ -20,6 +20,8 @@ class Purchase(Base):
     CreatedAt = Column(DateTime, server_default=func.now())
     UpdatedAt = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (Index("IX_Purchase_UserID_Status", "UserID", "Status", "CreatedAt"),)
+
 
 class PaymentLog(Base):
     __tablename__ = "PaymentLog"
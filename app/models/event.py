@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, ForeignKey, Integer, String
 from sqlalchemy.orm import synonym
 from sqlalchemy.sql import func
 
@@ -94,6 +94,8 @@ class EventStorage(Base):
     StoragePath = Column(String(255), nullable=False)
     StorageLimitMB = Column(Integer, nullable=False)
     CurrentUsageMB = Column(Integer, nullable=False, default=0)
+    # Exact usage, maintained incrementally by app.services.storage_accounting
+    CurrentUsageBytes = Column(BigInteger, nullable=False, default=0)
     LastUploadDateTime = Column(DateTime, nullable=True)
     IsLocked = Column(Boolean, default=False)
     CreatedAt = Column(DateTime, server_default=func.now())
@@ -116,6 +118,10 @@ class FileMetadata(Base):
     GPSLat = Column(String(32), nullable=True)
     GPSLong = Column(String(32), nullable=True)
     Checksum = Column(String(128), nullable=True)
+    # Content-addressed original (MediaBlob); NULL for files stored before blobs
+    BlobID = Column(Integer, nullable=True)
+    # Tiny blur-up JPEG as a data: URI, inlined in gallery JSON (app.services.placeholders)
+    Placeholder = Column(String(1024), nullable=True)
     UploadDate = Column(DateTime, server_default=func.now())
     Tags = Column(String(255), nullable=True)
     Deleted = Column(Boolean, default=False)
@@ -0,0 +1,27 @@
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Index, Integer, String
+from sqlalchemy.sql import func
+
+from app.models.user import Base
+
+
+class MediaBlob(Base):
+    """One stored original per (user, SHA-256), shared by every FileMetadata row with that content.
+
+    ``RefCount`` is the number of FileMetadata rows pointing at the blob via
+    ``FileMetadata.BlobID``; blobs that drop to zero are garbage-collected by
+    :func:`app.services.blob_store.collect_unreferenced_blobs`.
+    """
+
+    __tablename__ = "MediaBlob"
+    __table_args__ = (
+        Index("UX_MediaBlob_UserID_Checksum", "UserID", "Checksum", unique=True),
+        {"schema": "dbo"},
+    )
+
+    BlobID = Column(Integer, primary_key=True, autoincrement=True)
+    UserID = Column(Integer, ForeignKey("dbo.Users.UserID"), nullable=False)
+    Checksum = Column(String(64), nullable=False)  # sha256 hex
+    Size = Column(BigInteger, nullable=False)
+    RefCount = Column(Integer, nullable=False, default=0)
+    CreatedAt = Column(DateTime, server_default=func.now())
+    UpdatedAt = Column(DateTime, server_default=func.now(), onupdate=func.now())
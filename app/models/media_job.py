@@ -0,0 +1,33 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text
+from sqlalchemy.sql import func
+
+from app.models.user import Base
+
+
+class MediaJob(Base):
+    """Durable post-ingest work item (thumbnails, gallery ordering, ...).
+
+    Rows are claimed by ``python -m app.jobs.worker`` with row locks that skip
+    already-locked rows, so several workers can drain the table concurrently.
+    """
+
+    __tablename__ = "MediaJob"
+    __table_args__ = (
+        Index("IX_MediaJob_Status_RunAfter", "Status", "RunAfter"),
+        {"schema": "dbo"},
+    )
+
+    JobID = Column(Integer, primary_key=True, autoincrement=True)
+    Kind = Column(String(32), nullable=False)
+    EventID = Column(Integer, ForeignKey("Event.EventID"), nullable=False)
+    FileMetadataID = Column(Integer, nullable=True)
+    Payload = Column(Text, nullable=True)  # JSON arguments for the handler
+    Status = Column(String(16), nullable=False, default="queued")  # queued|running|completed|dead
+    Attempts = Column(Integer, nullable=False, default=0)
+    MaxAttempts = Column(Integer, nullable=False, default=5)
+    RunAfter = Column(DateTime, nullable=False, server_default=func.now())
+    LockedBy = Column(String(64), nullable=True)
+    LockedAt = Column(DateTime, nullable=True)
+    LastError = Column(Text, nullable=True)
+    CreatedAt = Column(DateTime, server_default=func.now())
+    UpdatedAt = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,26 @@
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy.sql import func
+
+from app.models.user import Base
+
+
+class ResumableUpload(Base):
+    """Server-side state for a tus-style resumable guest upload.
+
+    ``Offset`` is the last byte acknowledged to the client; the staging file may be
+    longer after a crash and is truncated back to ``Offset`` on the next PATCH.
+    """
+
+    __tablename__ = "ResumableUpload"
+    UploadID = Column(String(32), primary_key=True)
+    EventID = Column(Integer, ForeignKey("Event.EventID"), nullable=False)
+    GuestID = Column(Integer, ForeignKey("GuestSession.GuestID"), nullable=False)
+    FileName = Column(String(255), nullable=False)
+    DeclaredType = Column(String(64), nullable=True)
+    Length = Column(BigInteger, nullable=False)
+    Offset = Column(BigInteger, nullable=False, default=0)
+    StagingPath = Column(String(400), nullable=False)
+    Status = Column(String(16), nullable=False, default="uploading")
+    FileMetadataID = Column(Integer, ForeignKey("FileMetadata.FileMetadataID"), nullable=True)
+    CreatedAt = Column(DateTime, server_default=func.now())
+    UpdatedAt = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,52 @@
+"""Hand authorized file downloads to nginx with ``X-Accel-Redirect``.
+
+With ``ACCEL_REDIRECT_ENABLED`` the app still does the authorization, but
+instead of streaming the bytes through a worker it answers with an empty
+response whose ``X-Accel-Redirect`` header names an ``internal`` nginx location
+aliased to the storage root (``ACCEL_REDIRECT_PREFIX``, see
+``deploy/nginx.conf``); nginx then serves the file with sendfile. Without
+nginx in front (development, tests) or for paths outside the storage root it
+falls back to a plain ``FileResponse``.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Optional
+from urllib.parse import quote
+
+from fastapi.responses import FileResponse, Response
+
+from app.core.settings import settings
+
+STORAGE_ROOT = "storage"
+
+
+def accel_path(path: str) -> Optional[str]:
+    """Internal nginx URI for ``path``, or None when it isn't under the storage root."""
+    root = os.path.abspath(STORAGE_ROOT)
+    full = os.path.abspath(path)
+    if os.path.commonpath([root, full]) != root or full == root:
+        return None
+    prefix = str(getattr(settings, "ACCEL_REDIRECT_PREFIX", "/_protected/storage/"))
+    rel = os.path.relpath(full, root).replace(os.sep, "/")
+    return quote(prefix.rstrip("/") + "/" + rel)
+
+
+def send_file(
+    path: str,
+    *,
+    media_type: Optional[str] = None,
+    headers: Optional[dict] = None,
+    filename: Optional[str] = None,
+) -> Response:
+    """``FileResponse`` or, when offloading is enabled, an nginx internal redirect."""
+    target = accel_path(path) if getattr(settings, "ACCEL_REDIRECT_ENABLED", False) else None
+    if target is None:
+        return FileResponse(path, media_type=media_type, headers=headers, filename=filename)
+    out = dict(headers or {})
+    out["X-Accel-Redirect"] = target
+    if filename:
+        out["Content-Disposition"] = f"attachment; filename*=utf-8''{quote(filename)}"
+    # nginx keeps Content-Type/Content-Disposition/Cache-Control from this response
+    return Response(status_code=200, media_type=media_type, headers=out)
@@ -13,115 +13,39 @@ def _reconcile_pending_with_stripe(db: Session, user_id: int) -> None:
     """Check pending purchases for the user against Stripe and mark paid where appropriate.
 
     This is a best-effort reconciliation used when webhooks may be delayed or not received.
-    It is safe to call frequently and will quietly return if Stripe is not configured.
+    It will quietly return if Stripe is not configured. The scheduled sweep in
+    ``app.services.stripe_reconciler`` does the same for every user in bulk.
     """
     try:
-        from app.core.settings import settings
-        from app.models.billing import PaymentLog, Purchase
-    except Exception:
-        return
-
-    # Don't attempt network calls if Stripe key is not configured
-    if not getattr(settings, "STRIPE_SECRET_KEY", None):
-        return
-
-    try:
-        import stripe  # type: ignore
+        from app.services.stripe_reconciler import StripeReconciler, stripe_session_retriever
 
-        stripe.api_key = settings.STRIPE_SECRET_KEY
+        retrieve = stripe_session_retriever()
+        if retrieve is None:
+            return
+        StripeReconciler(retrieve, concurrency=1, max_retries=0).reconcile(db, user_id=user_id)
     except Exception as e:
-        logger.debug("Stripe SDK not available for reconciliation: %s", e)
-        return
-
-    try:
-        pending = (
-            db.query(Purchase)
-            .filter(Purchase.UserID == int(user_id), Purchase.Status == "pending")
-            .all()
-        )
-    except Exception:
-        return
-
-    for p in pending:
-        sid = getattr(p, "StripeSessionID", None)
-        if not sid:
-            continue
-        try:
-            sess = stripe.checkout.Session.retrieve(sid)
-            # session.payment_status can be 'paid' when completed
-            payment_status = None
-            try:
-                if isinstance(sess, dict):
-                    payment_status = sess.get("payment_status")
-                else:
-                    payment_status = getattr(sess, "payment_status", None)
-            except Exception:
-                payment_status = None
-            # Payment intent id may be available on the session
-            pi = None
-            try:
-                if isinstance(sess, dict):
-                    pi = sess.get("payment_intent")
-                else:
-                    pi = getattr(sess, "payment_intent", None)
-            except Exception:
-                pi = None
-
-            if (payment_status and str(payment_status).lower() == "paid") or pi:
-                try:
-                    setattr(p, "Status", "paid")
-                    if pi:
-                        setattr(p, "StripePaymentIntentID", str(pi))
-                    db.commit()
-                except Exception:
-                    db.rollback()
-                    continue
-
-                # Log reconciliation event
-                try:
-                    uid_val = getattr(p, "UserID", None)
-                    db.add(
-                        PaymentLog(
-                            UserID=int(uid_val) if (uid_val is not None) else None,
-                            EventType="reconcile_paid",
-                            StripeEventID=None,
-                            Payload=json.dumps({"session": sid, "payment_intent": pi}),
-                        )
-                    )
-                    db.commit()
-                except Exception:
-                    db.rollback()
-        except Exception as e:
-            # Keep going on failures; record a small payment log for debugging
-            try:
-                db.add(
-                    PaymentLog(
-                        UserID=int(user_id) if (user_id is not None) else None,
-                        EventType="reconcile_error",
-                        StripeEventID=None,
-                        Payload=str(sid or ""),
-                        ErrorMessage=str(e),
-                    )
-                )
-                db.commit()
-            except Exception:
-                db.rollback()
+        logger.debug("Stripe reconciliation failed for user %s: %s", user_id, e)
 
 
 def get_active_plan(db: Session, user_id: int) -> Tuple[Optional[Any], Dict[str, Any]]:
     """Return (plan_row, features_dict) for the user's most recent paid plan.
 
     If none, returns (None, {}). Features is JSON-parsed, defaults to {}.
+    Request paths that only need the limits should use
+    ``app.services.entitlements.get_plan_features`` instead.
     """
+    from app.core.settings import settings
     from app.models.billing import Purchase
     from app.models.event_plan import EventPlan
 
-    # First, try a best-effort reconciliation of pending purchases with Stripe
-    try:
-        _reconcile_pending_with_stripe(db, user_id)
-    except Exception:
-        # Don't let reconciliation failures block plan lookup
-        pass
+    # Pending purchases are normally settled by the webhook and the scheduled
+    # reconciler; checking Stripe here is opt-in as it makes network calls.
+    if getattr(settings, "STRIPE_RECONCILE_INLINE", False):
+        try:
+            _reconcile_pending_with_stripe(db, user_id)
+        except Exception:
+            # Don't let reconciliation failures block plan lookup
+            pass
 
     plan = None
     features: Dict[str, Any] = {}
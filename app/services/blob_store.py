@@ -0,0 +1,279 @@
+"""Content-addressed storage for uploaded originals.
+
+Each user's originals are stored once, keyed by the SHA-256 computed while
+streaming the upload: ``storage/{user}/blobs/ab/cd/<sha256>``. The per-event
+file that the app serves (``/storage/{user}/{event}/...``) is a hard link to
+that blob, so the same photo posted to several of a host's events occupies its
+bytes once and placement needs no directory probing.
+
+``MediaBlob.RefCount`` counts the FileMetadata rows that reference a blob.
+Permadelete releases those references and :func:`collect_unreferenced_blobs`
+removes blobs that are no longer referenced. Uploads take their references
+before touching blob files and re-create rows the collector removed in the
+meantime, so a blob is never left pointing at a deleted row or file.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import uuid
+from collections import Counter, defaultdict
+from typing import Iterable, Iterator, Tuple
+
+from sqlalchemy import delete, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.media_blob import MediaBlob
+
+logger = logging.getLogger(__name__)
+audit = logging.getLogger("audit")
+
+BLOB_DIRNAME = "blobs"
+# Keeps IN (...) lists well under SQL Server's 2100-parameter cap
+BLOB_LOOKUP_BATCH = 500
+# Rounds of "insert, lose the race on UX_MediaBlob_UserID_Checksum, increment instead"
+BLOB_INSERT_ATTEMPTS = 3
+
+
+def blob_root(user_id: int) -> str:
+    return os.path.join("storage", str(user_id), BLOB_DIRNAME)
+
+
+def blob_path(user_id: int, checksum: str) -> str:
+    """Location of the blob holding the content with ``checksum`` for a user."""
+    c = checksum.lower()
+    return os.path.join(blob_root(user_id), c[:2], c[2:4], c)
+
+
+def _batches(items: list, size: int = BLOB_LOOKUP_BATCH) -> Iterator[list]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _place(staged_path: str, dest: str) -> bool:
+    """Move a staged file to ``dest`` unless that blob is already on disk.
+
+    Returns True when the file was placed, False when the staged copy was a
+    duplicate of an existing blob and has been discarded.
+    """
+    if os.path.exists(dest):
+        os.remove(staged_path)
+        return False
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    # Same volume as the staging folder: a rename, not a copy
+    os.replace(staged_path, dest)
+    return True
+
+
+def _lookup(db: Session, user_id: int, checksums: Iterable[str]) -> dict[str, int]:
+    known: dict[str, int] = {}
+    for batch in _batches(sorted(checksums)):
+        rows = (
+            db.query(MediaBlob.Checksum, MediaBlob.BlobID)
+            .filter(MediaBlob.UserID == user_id, MediaBlob.Checksum.in_(batch))
+            .all()
+        )
+        known.update((r[0], int(r[1])) for r in rows)
+    return known
+
+
+def _add_refs(db: Session, known: dict[str, int]) -> set[str]:
+    """Take one reference on each of ``known``; returns the checksums whose row is gone.
+
+    :func:`collect_unreferenced_blobs` may delete a zero-reference row between the
+    lookup and this UPDATE; the caller re-creates those.
+    """
+    by_id = {blob_id: c for c, blob_id in known.items()}
+    gone: set[str] = set()
+    for batch in _batches(sorted(by_id)):
+        res = db.execute(
+            update(MediaBlob)
+            .where(MediaBlob.BlobID.in_(batch))
+            .values(RefCount=MediaBlob.RefCount + 1)
+        )
+        if res.rowcount != len(batch):
+            alive = {
+                int(r[0]) for r in db.query(MediaBlob.BlobID).filter(MediaBlob.BlobID.in_(batch))
+            }
+            gone.update(by_id[b] for b in batch if b not in alive)
+    return gone
+
+
+def _insert_new(db: Session, user_id: int, rows: list[dict]) -> dict[str, int]:
+    """INSERT blob rows with one reference each; returns ``{checksum: BlobID}``.
+
+    A concurrent upload of the same content may insert it first and trip
+    ``UX_MediaBlob_UserID_Checksum``. The insert runs in a savepoint, so on that
+    error it is rolled back and the winners' rows are incremented instead.
+    """
+    ids: dict[str, int] = {}
+    for attempt in range(BLOB_INSERT_ATTEMPTS):
+        if not rows:
+            break
+        try:
+            with db.begin_nested():
+                inserted = db.execute(
+                    insert(MediaBlob).returning(MediaBlob.Checksum, MediaBlob.BlobID), rows
+                ).all()
+        except IntegrityError:
+            if attempt == BLOB_INSERT_ATTEMPTS - 1:
+                raise
+            raced = _lookup(db, user_id, [r["Checksum"] for r in rows])
+            for c in _add_refs(db, raced):
+                del raced[c]
+            ids.update(raced)
+            rows = [r for r in rows if r["Checksum"] not in raced]
+            continue
+        ids.update((r[0], int(r[1])) for r in inserted)
+        break
+    return ids
+
+
+def acquire_blobs(
+    db: Session, user_id: int, files: Iterable[Tuple[str, int, str]]
+) -> Tuple[dict[str, int], list[str]]:
+    """Store staged files as blobs and take one reference on each.
+
+    ``files`` holds ``(checksum, size, staged_path)`` tuples with distinct
+    checksums. Known blobs get their RefCount bumped by one UPDATE and new ones
+    are written by one INSERT, so the round trips don't grow with the batch.
+    Only then is each staged file renamed into its blob location or, when the
+    user already has that content, removed: with the references taken first the
+    collector can't delete a blob this upload is about to link.
+
+    Returns ``({checksum: BlobID}, created_paths)``; ``created_paths`` lists
+    blob files placed by this call so the caller can remove them if its own
+    insert fails. Changes are flushed but not committed.
+    """
+    files = [(c.lower(), int(size), path) for c, size, path in files]
+    known = _lookup(db, user_id, [c for c, _, _ in files])
+    for c in _add_refs(db, known):
+        del known[c]
+    new_rows = [
+        {"UserID": user_id, "Checksum": c, "Size": size, "RefCount": 1}
+        for c, size, _ in files
+        if c not in known
+    ]
+    ids = dict(known)
+    ids.update(_insert_new(db, user_id, new_rows))
+
+    created: list[str] = []
+    try:
+        for checksum, _size, path in files:
+            # A known blob whose file went missing is restored from this upload
+            if _place(path, blob_path(user_id, checksum)):
+                created.append(blob_path(user_id, checksum))
+    except Exception:
+        remove_files(created)
+        raise
+    return ids, created
+
+
+def _link_or_copy(src: str, dest: str) -> None:
+    try:
+        os.link(src, dest)
+    except FileExistsError:
+        raise
+    except OSError:
+        # No hard links here (other volume, FAT, ...): keep a private copy instead
+        with open(src, "rb") as fin, open(dest, "xb") as fout:
+            shutil.copyfileobj(fin, fout, 1024 * 1024)
+
+
+def link_original(blob: str, base_dir: str, fname: str, checksum: str) -> str:
+    """Expose ``blob`` inside an event folder as ``fname`` and return the path used.
+
+    Names are claimed with exclusive creates rather than ``os.path.exists``
+    probing. A taken name falls back to one qualified by the content hash, which
+    is unique within an event because events never hold the same checksum twice.
+    """
+    os.makedirs(base_dir, exist_ok=True)
+    root, ext = os.path.splitext(fname)
+    candidates = [fname, f"{root}_{checksum[:12]}{ext}"]
+    # Only reachable when a soft-deleted copy of the same content kept the name
+    candidates += [f"{root}_{checksum[:12]}_{uuid.uuid4().hex[:8]}{ext}" for _ in range(3)]
+    for name in candidates:
+        dest = os.path.join(base_dir, name)
+        try:
+            _link_or_copy(blob, dest)
+            return dest
+        except FileExistsError:
+            continue
+    raise FileExistsError(os.path.join(base_dir, fname))
+
+
+def remove_files(paths: Iterable[str]) -> None:
+    for p in paths:
+        try:
+            if p and os.path.exists(p):
+                os.remove(p)
+        except Exception:
+            pass
+
+
+def release_blobs(db: Session, blob_ids: Iterable[int]) -> None:
+    """Drop one reference per entry in ``blob_ids`` (repeats drop several).
+
+    Flushed, not committed; call :func:`collect_unreferenced_blobs` after the
+    caller's commit to reclaim blobs that reached zero.
+    """
+    by_count: dict[int, list[int]] = defaultdict(list)
+    for blob_id, n in Counter(int(b) for b in blob_ids if b).items():
+        by_count[n].append(blob_id)
+    for n, ids in by_count.items():
+        for batch in _batches(sorted(ids)):
+            db.execute(
+                update(MediaBlob)
+                .where(MediaBlob.BlobID.in_(batch))
+                .values(RefCount=MediaBlob.RefCount - n)
+            )
+
+
+def collect_unreferenced_blobs(db: Session, user_id: int | None = None) -> int:
+    """Delete blobs with no remaining references; returns the bytes released.
+
+    Rows are removed with a guarded DELETE (``RefCount <= 0``) so a blob picked
+    up again by a concurrent upload survives. Files are unlinked before the
+    commit, while the deleted rows are still locked: an upload of the same
+    content waits on them, finds no row and places its own copy, which a later
+    unlink would otherwise remove. If the commit fails the rows come back with no
+    references and the next upload of that content restores the file.
+    """
+    q = db.query(MediaBlob.BlobID, MediaBlob.UserID, MediaBlob.Checksum, MediaBlob.Size).filter(
+        MediaBlob.RefCount <= 0
+    )
+    if user_id is not None:
+        q = q.filter(MediaBlob.UserID == user_id)
+    doomed = []
+    for blob_id, uid, checksum, size in q.all():
+        res = db.execute(
+            delete(MediaBlob).where(MediaBlob.BlobID == blob_id, MediaBlob.RefCount <= 0)
+        )
+        if res.rowcount:
+            doomed.append((int(uid), str(checksum), int(size or 0)))
+    if not doomed:
+        return 0
+    freed = 0
+    for uid, checksum, size in doomed:
+        path = blob_path(uid, checksum)
+        remove_files([path])
+        freed += size
+        # Prune the two shard folders when they empty out
+        for d in (os.path.dirname(path), os.path.dirname(os.path.dirname(path))):
+            try:
+                os.rmdir(d)
+            except OSError:
+                break
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        return 0
+    audit.info(
+        "blobs.collected",
+        extra={"user_id": user_id, "count": len(doomed), "bytes": freed},
+    )
+    return freed
@@ -0,0 +1,115 @@
+"""Per-process cache of each user's plan entitlements.
+
+``get_active_plan`` reconciles pending purchases with Stripe and parses the
+plan's Features JSON on every call. Request paths that only need the limits
+(guest uploads, ZIP downloads, the events dashboard) read them from here
+instead: a hit touches neither the network nor the database, and a miss is one
+indexed lookup of the user's latest paid purchase.
+
+Entries expire after ``ENTITLEMENT_CACHE_TTL_SECONDS`` and are dropped
+explicitly whenever a purchase changes state (Stripe webhook, reconciliation,
+admin refund/cancel). The cache lives in each process, so other workers pick up
+a change within the TTL.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.services.plan_schema import PlanFeatures, parse_plan_features
+
+
+@dataclass(frozen=True)
+class Entitlements:
+    """Snapshot of a user's active plan; safe to share across sessions and threads."""
+
+    plan_id: Optional[int]
+    plan_code: Optional[str]
+    plan_name: Optional[str]
+    features: PlanFeatures
+
+    @property
+    def has_plan(self) -> bool:
+        return self.plan_id is not None
+
+
+_lock = threading.Lock()
+_entries: "OrderedDict[int, tuple[float, Entitlements]]" = OrderedDict()
+# Bumped on every invalidation so a load that raced with one isn't cached
+_generation = 0
+_stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+
+def load_entitlements(db: Session, user_id: int) -> Entitlements:
+    """Read the user's latest paid, active plan straight from the database."""
+    from app.models.billing import Purchase
+    from app.models.event_plan import EventPlan
+
+    row = (
+        db.query(EventPlan.PlanID, EventPlan.Code, EventPlan.Name, EventPlan.Features)
+        .join(Purchase, Purchase.PlanID == EventPlan.PlanID)
+        .filter(Purchase.UserID == int(user_id), Purchase.Status == "paid", EventPlan.IsActive)
+        .order_by(Purchase.CreatedAt.desc())
+        .first()
+    )
+    if row is None:
+        return Entitlements(None, None, None, parse_plan_features(None))
+    return Entitlements(int(row[0]), row[1], row[2], parse_plan_features(row[3]))
+
+
+def get_entitlements(db: Session, user_id: int) -> Entitlements:
+    """Cached :func:`load_entitlements`; never calls Stripe."""
+    global _generation
+    uid = int(user_id)
+    ttl = float(getattr(settings, "ENTITLEMENT_CACHE_TTL_SECONDS", 300) or 0)
+    now = time.monotonic()
+    with _lock:
+        cached = _entries.get(uid)
+        if cached is not None and cached[0] > now:
+            _entries.move_to_end(uid)
+            _stats["hits"] += 1
+            return cached[1]
+        _stats["misses"] += 1
+        generation = _generation
+    ent = load_entitlements(db, uid)
+    # "No plan" isn't cached so a purchase settled by another process (webhook
+    # on another worker, the reconciler) applies on the very next request.
+    if ttl <= 0 or not ent.has_plan:
+        return ent
+    max_users = int(getattr(settings, "ENTITLEMENT_CACHE_MAX_USERS", 10_000) or 0)
+    with _lock:
+        if generation == _generation:
+            _entries[uid] = (now + ttl, ent)
+            _entries.move_to_end(uid)
+            while max_users and len(_entries) > max_users:
+                _entries.popitem(last=False)
+                _stats["evictions"] += 1
+    return ent
+
+
+def get_plan_features(db: Session, user_id: int) -> PlanFeatures:
+    return get_entitlements(db, user_id).features
+
+
+def invalidate_entitlements(user_id: Optional[int] = None) -> None:
+    """Forget one user's entitlements (or everyone's) after a purchase changes state."""
+    global _generation
+    with _lock:
+        _generation += 1
+        _stats["invalidations"] += 1
+        if user_id is None:
+            _entries.clear()
+        else:
+            _entries.pop(int(user_id), None)
+
+
+def entitlement_metrics() -> dict[str, Any]:
+    with _lock:
+        return {"size": len(_entries), **_stats}
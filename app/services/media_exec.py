@@ -0,0 +1,224 @@
+"""Supervised ffprobe/ffmpeg execution.
+
+Every external media tool call goes through one :class:`MediaExecSupervisor`
+per process. It runs the commands with ``asyncio.create_subprocess_exec`` on a
+private event-loop thread, so sync callers (request threads, thumbnail pool
+workers) and async callers share one semaphore: at most
+``MEDIA_EXEC_CONCURRENCY`` tools run at once and a burst of videos queues
+instead of forking dozens of processes. Each call has a timeout; a process
+that overruns it is killed and reaped, so a malformed upload can't hang a
+worker. Latency is recorded per kind (``probe`` / ``transcode``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+from app.core.settings import settings
+
+KIND_PROBE = "probe"
+KIND_TRANSCODE = "transcode"
+
+logger = logging.getLogger(__name__)
+
+
+class MediaExecTimeout(TimeoutError):
+    """The command overran its timeout and was killed."""
+
+
+@dataclass
+class ExecResult:
+    returncode: int
+    stdout: bytes
+    stderr: bytes
+    seconds: float
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+
+def _new_stats() -> dict:
+    return {
+        "calls": 0,
+        "failed": 0,
+        "timeouts": 0,
+        "in_flight": 0,
+        "seconds_total": 0.0,
+        "seconds_max": 0.0,
+        "wait_seconds_total": 0.0,
+    }
+
+
+class MediaExecSupervisor:
+    def __init__(self, max_concurrency: int, *, default_timeout: float = 60.0) -> None:
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.default_timeout = float(default_timeout)
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._pid: Optional[int] = None
+        self._stats: dict[str, dict] = {}
+
+    def run(
+        self,
+        argv: Sequence[str],
+        *,
+        kind: str,
+        timeout: Optional[float] = None,
+        capture: bool = True,
+    ) -> ExecResult:
+        """Run ``argv`` to completion from synchronous code.
+
+        Blocks the calling thread: code on an event loop awaits :meth:`run_async`,
+        or calls into sync code that reaches this through ``run_in_threadpool``.
+        """
+        if _on_event_loop():
+            logger.warning(f"{argv[0]} run synchronously on an event loop thread ({kind})")
+        fut = asyncio.run_coroutine_threadsafe(
+            self._execute(list(argv), kind, timeout, capture), self._ensure_loop()
+        )
+        return fut.result()
+
+    async def run_async(
+        self,
+        argv: Sequence[str],
+        *,
+        kind: str,
+        timeout: Optional[float] = None,
+        capture: bool = True,
+    ) -> ExecResult:
+        """Awaitable form of :meth:`run` for code on any event loop."""
+        fut = asyncio.run_coroutine_threadsafe(
+            self._execute(list(argv), kind, timeout, capture), self._ensure_loop()
+        )
+        return await asyncio.wrap_future(fut)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            out: dict = {"max_concurrency": self.max_concurrency}
+            for kind, s in self._stats.items():
+                done = s["calls"] - s["in_flight"]
+                out[kind] = {
+                    **s,
+                    "seconds_avg": (s["seconds_total"] / done) if done else 0.0,
+                    "wait_seconds_avg": (s["wait_seconds_total"] / done) if done else 0.0,
+                }
+            return out
+
+    # -- internals -------------------------------------------------------
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            # A forked child (e.g. a thumbnail pool worker) inherits the object
+            # but not the loop thread, so it starts its own.
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="media-exec", daemon=True).start()
+                self._loop = loop
+                self._sem = asyncio.Semaphore(self.max_concurrency)
+                self._pid = os.getpid()
+            return self._loop
+
+    def _record(self, kind: str, **deltas) -> None:
+        with self._lock:
+            s = self._stats.setdefault(kind, _new_stats())
+            for key, value in deltas.items():
+                s[key] += value
+            if "seconds_total" in deltas:
+                s["seconds_max"] = max(s["seconds_max"], deltas["seconds_total"])
+
+    async def _execute(
+        self, argv: list[str], kind: str, timeout: Optional[float], capture: bool
+    ) -> ExecResult:
+        limit = self.default_timeout if timeout is None else float(timeout)
+        queued = time.monotonic()
+        self._record(kind, calls=1, in_flight=1)
+        started = queued
+        outcome = {"failed": 1}
+        try:
+            assert self._sem is not None
+            async with self._sem:
+                started = time.monotonic()
+                proc = await asyncio.create_subprocess_exec(
+                    *argv,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE if capture else asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+                try:
+                    stdout, stderr = await asyncio.wait_for(proc.communicate(), limit)
+                except asyncio.TimeoutError:
+                    outcome["timeouts"] = 1
+                    await _kill(proc)
+                    logger.warning(f"{argv[0]} killed after {limit:.0f}s ({kind})")
+                    raise MediaExecTimeout(f"{argv[0]} exceeded {limit:.0f}s")
+                except BaseException:
+                    await _kill(proc)
+                    raise
+            seconds = time.monotonic() - started
+            result = ExecResult(int(proc.returncode or 0), stdout or b"", stderr or b"", seconds)
+            if result.ok:
+                outcome = {}
+            return result
+        finally:
+            ended = time.monotonic()
+            self._record(
+                kind,
+                in_flight=-1,
+                seconds_total=ended - started,
+                wait_seconds_total=started - queued,
+                **outcome,
+            )
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+async def _kill(proc: asyncio.subprocess.Process) -> None:
+    if proc.returncode is not None:
+        return
+    try:
+        proc.kill()
+    except ProcessLookupError:
+        return
+    await proc.wait()
+
+
+_supervisor: Optional[MediaExecSupervisor] = None
+_supervisor_lock = threading.Lock()
+
+
+def get_supervisor() -> MediaExecSupervisor:
+    """Process-wide supervisor sized by ``MEDIA_EXEC_CONCURRENCY``."""
+    global _supervisor
+    with _supervisor_lock:
+        if _supervisor is None:
+            _supervisor = MediaExecSupervisor(
+                int(getattr(settings, "MEDIA_EXEC_CONCURRENCY", 2) or 1),
+                default_timeout=float(getattr(settings, "FFMPEG_TIMEOUT_SECONDS", 60.0)),
+            )
+        return _supervisor
+
+
+def run_probe(argv: Sequence[str]) -> ExecResult:
+    """Run an ffprobe command under ``FFPROBE_TIMEOUT_SECONDS``."""
+    timeout = float(getattr(settings, "FFPROBE_TIMEOUT_SECONDS", 15.0))
+    return get_supervisor().run(argv, kind=KIND_PROBE, timeout=timeout)
+
+
+def run_transcode(argv: Sequence[str]) -> ExecResult:
+    """Run an ffmpeg command under ``FFMPEG_TIMEOUT_SECONDS``; stdout is discarded."""
+    timeout = float(getattr(settings, "FFMPEG_TIMEOUT_SECONDS", 60.0))
+    return get_supervisor().run(argv, kind=KIND_TRANSCODE, timeout=timeout, capture=False)
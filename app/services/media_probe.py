@@ -0,0 +1,168 @@
+"""Header-only image probing.
+
+Pillow's ``Image.open`` is lazy: it parses the container header (for JPEG,
+the markers up to the start of scan, including the EXIF/APP1 segment) and
+stops before the compressed pixel data. :func:`probe_image` reads dimensions,
+orientation, capture time and GPS from that header alone. It also rejects
+decompression bombs from the declared size and truncated files from the
+container's end marker, so uploads are refused before anything decodes them.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import struct
+from dataclasses import dataclass
+from typing import BinaryIO, Optional, Union
+
+from PIL import ExifTags, Image, UnidentifiedImageError
+
+from app.core.settings import settings
+
+# Stays under Pillow's own hard limit (2 * Image.MAX_IMAGE_PIXELS), which
+# raises from Image.open regardless of this setting.
+DEFAULT_MAX_IMAGE_PIXELS = 150_000_000
+
+# How much of the file's end is searched for the format's end marker
+TAIL_BYTES = 64 * 1024
+
+PNG_IEND = b"IEND\xaeB`\x82"
+JPEG_EOI = b"\xff\xd9"
+
+
+class ImageRejected(ValueError):
+    """The image must not be decoded; ``reason`` is "bomb" or "truncated"."""
+
+    def __init__(self, reason: str, detail: str = ""):
+        super().__init__(f"{reason}: {detail}" if detail else reason)
+        self.reason = reason
+
+
+@dataclass
+class ImageProbe:
+    format: str
+    width: int
+    height: int
+    orientation: int = 1
+    datetime_taken: Optional[str] = None  # "YYYY-MM-DD HH:MM:SS"
+    gps_lat: Optional[float] = None
+    gps_long: Optional[float] = None
+
+
+def max_image_pixels() -> int:
+    return int(getattr(settings, "MAX_IMAGE_PIXELS", DEFAULT_MAX_IMAGE_PIXELS) or 0)
+
+
+def probe_image(
+    source: Union[str, bytes, BinaryIO],
+    *,
+    max_pixels: Optional[int] = None,
+    check_truncation: bool = True,
+) -> Optional[ImageProbe]:
+    """Describe an image from its header without decoding pixels.
+
+    ``source`` is a path, the file's bytes or a seekable binary file. Pass
+    ``check_truncation=False`` when only a prefix of the file is available.
+
+    Returns None when Pillow can't identify the format (e.g. HEIC without a
+    plugin) so callers can fall back to accepting the file as before. Raises
+    :class:`ImageRejected` for decompression bombs and truncated files.
+    """
+    limit = max_image_pixels() if max_pixels is None else int(max_pixels)
+    if isinstance(source, (bytes, bytearray)):
+        return _probe(io.BytesIO(source), limit, check_truncation)
+    if isinstance(source, str):
+        with open(source, "rb") as fh:
+            return _probe(fh, limit, check_truncation)
+    return _probe(source, limit, check_truncation)
+
+
+def _probe(fh: BinaryIO, limit: int, check_truncation: bool) -> Optional[ImageProbe]:
+    try:
+        img = Image.open(fh)
+    except Image.DecompressionBombError as e:
+        raise ImageRejected("bomb", str(e))
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError, struct.error):
+        return None
+    width, height = img.size
+    if limit and width * height > limit:
+        raise ImageRejected("bomb", f"{width}x{height} exceeds {limit} pixels")
+    probe = ImageProbe(format=str(img.format or ""), width=int(width), height=int(height))
+    try:
+        _read_exif(img, probe)
+    except Exception:
+        pass
+    if check_truncation and not _is_complete(fh, img):
+        raise ImageRejected("truncated", f"{probe.format} ends before its end marker")
+    return probe
+
+
+def _gps_degrees(coord, ref) -> Optional[float]:
+    if not coord or not ref:
+        return None
+    d, m, s = (float(x) for x in coord)
+    val = d + m / 60 + s / 3600
+    if str(ref).upper() in ("S", "W"):
+        val = -val
+    return val
+
+
+def _read_exif(img: Image.Image, probe: ImageProbe) -> None:
+    exif = img.getexif()
+    if not exif:
+        return
+    probe.orientation = int(exif.get(ExifTags.Base.Orientation, 1) or 1)
+    taken = exif.get_ifd(ExifTags.IFD.Exif).get(ExifTags.Base.DateTimeOriginal)
+    if taken:
+        # 'YYYY:MM:DD HH:MM:SS' -> 'YYYY-MM-DD HH:MM:SS'
+        probe.datetime_taken = str(taken).strip("\x00 ").replace(":", "-", 2) or None
+    gps = exif.get_ifd(ExifTags.IFD.GPSInfo)
+    if gps:
+        probe.gps_lat = _gps_degrees(
+            gps.get(ExifTags.GPS.GPSLatitude), gps.get(ExifTags.GPS.GPSLatitudeRef)
+        )
+        probe.gps_long = _gps_degrees(
+            gps.get(ExifTags.GPS.GPSLongitude), gps.get(ExifTags.GPS.GPSLongitudeRef)
+        )
+
+
+def _tail(fh: BinaryIO, size: int, start: int = 0) -> bytes:
+    begin = max(start, size - TAIL_BYTES)
+    fh.seek(begin)
+    return fh.read(size - begin)
+
+
+def _is_complete(fh: BinaryIO, img: Image.Image) -> bool:
+    """Whether the file reaches its format's end marker (unknown formats pass)."""
+    fh.seek(0, os.SEEK_END)
+    size = fh.tell()
+    fmt = (img.format or "").upper()
+    if fmt in ("JPEG", "MPO"):
+        # Only look past the header so an EXIF thumbnail's EOI doesn't count
+        scan_start = int(img.tile[0][2]) if img.tile else 0
+        if JPEG_EOI in _tail(fh, size, scan_start):
+            return True
+        # No EOI near the end: either cut short or followed by a trailer (e.g. the
+        # video of a motion photo). Decoding at 1/8 scale walks the whole scan.
+        return _decodes_reduced(fh, img.size)
+    if fmt == "PNG":
+        return PNG_IEND in _tail(fh, size)
+    if fmt == "GIF":
+        return _tail(fh, size).rstrip(b"\x00").endswith(b";")
+    if fmt == "WEBP":
+        fh.seek(4)
+        (riff_size,) = struct.unpack("<I", fh.read(4))
+        return size >= riff_size + 8
+    return True
+
+
+def _decodes_reduced(fh: BinaryIO, size: tuple[int, int]) -> bool:
+    fh.seek(0)
+    try:
+        with Image.open(fh) as img:
+            img.draft(img.mode, (max(1, size[0] // 8), max(1, size[1] // 8)))
+            img.load()
+        return True
+    except (OSError, SyntaxError, ValueError):
+        return False
@@ -0,0 +1,91 @@
+"""Short-lived HMAC-signed thumbnail URLs.
+
+The gallery builders have already proven that the viewer owns every file they
+list, so they sign each thumbnail URL with the owner, event, file, width, media
+type and an expiry. ``/thumbs`` checks that signature with no database access:
+the persisted thumbnail's path follows from the signed fields, and the type says
+whether WebP/AVIF variants exist, so a cached thumbnail is a stat plus sendfile.
+Unsigned, expired or tampered URLs fall back to the session-authenticated lookup.
+
+Expiries are rounded up to ``MEDIA_URL_TTL_SECONDS`` boundaries so a page
+rendered twice within a window emits identical URLs and browser caches keep
+hitting; a URL is valid for between one and two TTLs.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import time
+from typing import Optional
+from urllib.parse import urlencode
+
+from app.core.settings import settings
+
+# Media type signed into a URL: image thumbnails have WebP/AVIF variants next to
+# the JPEG, video posters are JPEG only
+THUMB_KIND_IMAGE = "i"
+THUMB_KIND_VIDEO = "v"
+
+
+def _key() -> bytes:
+    # Separate from other SECRET_KEY uses (scope cookies, CSRF)
+    return b"media-url:" + (settings.SECRET_KEY or "change-me").encode("utf-8")
+
+
+def _signature(
+    user_id: int, event_id: int, file_id: int, width: int, expires: int, kind: str
+) -> str:
+    msg = f"{int(user_id)}.{int(event_id)}.{int(file_id)}.{int(width)}.{int(expires)}.{kind}"
+    return hmac.new(_key(), msg.encode("ascii"), hashlib.sha256).hexdigest()[:32]
+
+
+def url_expiry(now: Optional[float] = None) -> int:
+    ttl = max(60, int(getattr(settings, "MEDIA_URL_TTL_SECONDS", 3600) or 3600))
+    now = time.time() if now is None else now
+    return (int(now) // ttl + 2) * ttl
+
+
+def signed_thumb_url(
+    user_id: int,
+    event_id: int,
+    file_id: int,
+    width: int,
+    *,
+    kind: str = THUMB_KIND_IMAGE,
+    expires: Optional[int] = None,
+) -> str:
+    """``/thumbs`` URL the endpoint can serve without a session or DB lookup."""
+    expires = url_expiry() if expires is None else int(expires)
+    query = urlencode(
+        {
+            "w": int(width),
+            "u": int(user_id),
+            "e": int(event_id),
+            "exp": expires,
+            "sig": _signature(user_id, event_id, file_id, width, expires, kind),
+            "t": kind,
+        }
+    )
+    return f"/thumbs/{int(file_id)}.jpg?{query}"
+
+
+def verify_thumb_signature(
+    user_id: Optional[int],
+    event_id: Optional[int],
+    file_id: int,
+    width: int,
+    expires: Optional[int],
+    sig: Optional[str],
+    *,
+    kind: Optional[str] = THUMB_KIND_IMAGE,
+    now: Optional[float] = None,
+) -> bool:
+    if not sig or user_id is None or event_id is None or expires is None:
+        return False
+    if kind not in (THUMB_KIND_IMAGE, THUMB_KIND_VIDEO):
+        return False
+    if int(expires) < (time.time() if now is None else now):
+        return False
+    expected = _signature(user_id, event_id, file_id, width, expires, kind)
+    return hmac.compare_digest(str(sig), expected)
@@ -1,75 +1,66 @@
 import hashlib
 import json
 import re
-import subprocess
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
-import piexif
 from hachoir.metadata import extractMetadata
 from hachoir.parser import createParser
-from PIL import Image
 
+from app.services.media_exec import run_probe
+from app.services.media_probe import probe_image
 
-def extract_image_metadata(file_path) -> Dict[str, Any]:
-    metadata: Dict[str, Any] = {}
+
+def file_sha256(file_path, chunk_size: int = 1024 * 1024) -> Optional[str]:
+    """SHA-256 of a file read in chunks; None when it cannot be read."""
     try:
-        img = Image.open(file_path)
-        exif_data = piexif.load(img.info.get("exif", b""))
-        # DateTimeOriginal
-        dt = exif_data["Exif"].get(piexif.ExifIFD.DateTimeOriginal)
-        if dt:
-            dt_str = dt.decode()
-            # Convert 'YYYY:MM:DD HH:MM:SS' to 'YYYY-MM-DD HH:MM:SS'
-            metadata["datetime_taken"] = dt_str.replace(":", "-", 2) if dt_str else None
-        else:
-            metadata["datetime_taken"] = None
-        # GPS
-        gps = exif_data.get("GPS", {})
-
-        def get_gps(coord, ref):
-            if not coord or not ref:
-                return None
-            d, m, s = [x[0] / x[1] for x in coord]
-            val = d + m / 60 + s / 3600
-            if ref in [b"S", b"W"]:
-                val = -val
-            return val
-
-        metadata["gps_lat"] = get_gps(
-            gps.get(piexif.GPSIFD.GPSLatitude), gps.get(piexif.GPSIFD.GPSLatitudeRef)
-        )
-        metadata["gps_long"] = get_gps(
-            gps.get(piexif.GPSIFD.GPSLongitude), gps.get(piexif.GPSIFD.GPSLongitudeRef)
-        )
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
     except Exception:
-        metadata["datetime_taken"] = None
-        metadata["gps_lat"] = None
-        metadata["gps_long"] = None
-    # Checksum
+        return None
+
+
+def extract_image_metadata(file_path, checksum: Optional[str] = None) -> Dict[str, Any]:
+    """EXIF capture time/GPS, dimensions and orientation plus checksum.
+
+    Only the header is parsed (see :func:`app.services.media_probe.probe_image`),
+    so with a ``checksum`` computed upstream (e.g. while the upload was streamed)
+    the pixel data is never read.
+    """
+    metadata: Dict[str, Any] = {
+        "datetime_taken": None,
+        "gps_lat": None,
+        "gps_long": None,
+    }
     try:
-        with open(file_path, "rb") as f:
-            metadata["checksum"] = hashlib.sha256(f.read()).hexdigest()
+        probe = probe_image(file_path, check_truncation=False)
     except Exception:
-        metadata["checksum"] = None
+        probe = None
+    if probe is not None:
+        metadata.update(
+            datetime_taken=probe.datetime_taken,
+            gps_lat=probe.gps_lat,
+            gps_long=probe.gps_long,
+            width=probe.width,
+            height=probe.height,
+            orientation=probe.orientation,
+        )
+    metadata["checksum"] = checksum or file_sha256(file_path)
     return metadata
 
 
 # For video files, use hachoir (ffmpeg is more complex to bundle)
 
 
-def extract_video_metadata(file_path) -> Dict[str, Any]:
+def extract_video_metadata(file_path, checksum: Optional[str] = None) -> Dict[str, Any]:
     metadata: Dict[str, Any] = {
         "datetime_taken": None,
         "gps_lat": None,
         "gps_long": None,
-        "checksum": None,
+        "checksum": checksum or file_sha256(file_path),
     }
-    # Always compute checksum
-    try:
-        with open(file_path, "rb") as f:
-            metadata["checksum"] = hashlib.sha256(f.read()).hexdigest()
-    except Exception:
-        metadata["checksum"] = None
 
     # Helper: parse ISO 6709 like +37.3349-122.0090+061.000/
     def parse_iso6709(val: str):
@@ -101,9 +92,10 @@ def extract_video_metadata(file_path) -> Dict[str, Any]:
         except Exception:
             return None, None
 
-    # Try ffprobe (if available) — best support for MP4/MOV QuickTime tags
+    # Try ffprobe (if available) — best support for MP4/MOV QuickTime tags.
+    # Runs under the media supervisor: bounded concurrency, killed on timeout.
     try:
-        proc = subprocess.run(
+        proc = run_probe(
             [
                 "ffprobe",
                 "-v",
@@ -113,13 +105,11 @@ def extract_video_metadata(file_path) -> Dict[str, Any]:
                 "-show_entries",
                 "format:format_tags:stream_tags",
                 file_path,
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=True,
-            text=True,
+            ]
         )
-        data = json.loads(proc.stdout or "{}")
+        if not proc.ok:
+            raise RuntimeError(f"ffprobe exited with {proc.returncode}")
+        data = json.loads(proc.stdout.decode("utf-8", "replace") or "{}")
         fmt = data.get("format", {}) or {}
         fmt_tags = fmt.get("tags", {}) or {}
         streams = data.get("streams", []) or []
@@ -198,3 +188,21 @@ def extract_video_metadata(file_path) -> Dict[str, Any]:
     except Exception:
         pass
     return metadata
+
+
+def extract_media_metadata(file_path, mime: str, checksum: Optional[str] = None) -> Dict[str, Any]:
+    """Dispatch on MIME type; unknown types only get the checksum."""
+    mime = mime or ""
+    try:
+        if mime.startswith("image"):
+            return extract_image_metadata(file_path, checksum=checksum)
+        if mime.startswith("video"):
+            return extract_video_metadata(file_path, checksum=checksum)
+    except Exception:
+        pass
+    return {
+        "datetime_taken": None,
+        "gps_lat": None,
+        "gps_long": None,
+        "checksum": checksum or file_sha256(file_path),
+    }
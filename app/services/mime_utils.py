@@ -6,17 +6,38 @@ falls back to provided content type or application/octet-stream.
 
 from __future__ import annotations
 
+import threading
 from typing import Optional, Tuple
 
+_magic_lock = threading.Lock()
+# Process-wide libmagic handle; False once libmagic is known to be unavailable.
+# Opening one loads the compiled magic database, so it is done once, not per call.
+_magic_handle = None
+
+
+def _get_magic():
+    global _magic_handle
+    if _magic_handle is None:
+        with _magic_lock:
+            if _magic_handle is None:
+                try:
+                    import magic  # type: ignore
+
+                    # python-magic serialises from_buffer on the instance's own lock
+                    _magic_handle = magic.Magic(mime=True)
+                except Exception:
+                    _magic_handle = False
+    return _magic_handle or None
+
 
 def sniff_mime(data: bytes, fallback_content_type: Optional[str] = None) -> str:
     try:
-        import magic  # type: ignore
+        handle = _get_magic()
+        if handle is not None:
+            detected = handle.from_buffer(data)
+        else:
+            import magic  # type: ignore
 
-        try:
-            m = magic.Magic(mime=True)
-            detected = m.from_buffer(data)
-        except Exception:
             # Some variants expose from_buffer at module level
             detected = magic.from_buffer(data, mime=True)  # type: ignore
         if isinstance(detected, str) and detected:
@@ -1,12 +1,23 @@
-from typing import List
+import logging
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
 
 import sqlalchemy as sa
-from sqlalchemy import delete, inspect
+from sqlalchemy import and_, delete, insert, inspect, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.models.event import FileMetadata
 from app.models.photo_order import EventGalleryOrder
 
+logger = logging.getLogger(__name__)
+
+# Spacing between ordinals written by a full rebuild (and by the SQL Agent job in
+# sql/prepare_gallery_order.sql, which must use the same value). New files are
+# spread evenly between their neighbours, so up to ORDINAL_GAP - 1 files can land
+# between two adjacent photos before a rebuild is needed to re-open the gaps.
+ORDINAL_GAP = 1024
+
 
 def rebuild_event_gallery_order(db: Session, event_id: int) -> List[EventGalleryOrder]:
     """Rebuild the EventGalleryOrder for the given event.
@@ -14,8 +25,9 @@ def rebuild_event_gallery_order(db: Session, event_id: int) -> List[EventGallery
     Strategy:
     - Delete existing rows for the event.
     - Query FileMetadata for the event (non-deleted), ordered by CapturedDateTime NULLs last,
-      then CapturedDateTime asc, then UploadDate asc.
-    - Insert sequential Ordinal starting at 1.
+      then CapturedDateTime asc, then UploadDate asc, then FileMetadataID.
+    - Insert gapped Ordinals (ORDINAL_GAP, 2*ORDINAL_GAP, ...) so later uploads can be
+      slotted in by :func:`insert_files_into_gallery_order` without renumbering.
     """
     # Delete existing
     db.execute(delete(EventGalleryOrder).where(EventGalleryOrder.EventID == event_id))
@@ -28,7 +40,12 @@ def rebuild_event_gallery_order(db: Session, event_id: int) -> List[EventGallery
     files = (
         db.query(FileMetadata)
         .filter(FileMetadata.EventID == event_id, ~FileMetadata.Deleted)
-        .order_by(null_case, FileMetadata.CapturedDateTime, FileMetadata.UploadDate)
+        .order_by(
+            null_case,
+            FileMetadata.CapturedDateTime,
+            FileMetadata.UploadDate,
+            FileMetadata.FileMetadataID,
+        )
         .all()
     )
 
@@ -40,9 +57,194 @@ def rebuild_event_gallery_order(db: Session, event_id: int) -> List[EventGallery
         else:
             # fallback to attribute access
             fid = getattr(f, "FileMetadataID", None) or getattr(f, "FileID", None)
-        rows.append({"EventID": event_id, "FileMetadataID": int(fid), "Ordinal": idx})
+        rows.append({"EventID": event_id, "FileMetadataID": int(fid), "Ordinal": idx * ORDINAL_GAP})
 
     if rows:
         db.bulk_insert_mappings(EventGalleryOrder, rows)
     db.commit()
     return rows
+
+
+def _naive_utc(value: Optional[datetime]) -> datetime:
+    if value is None:
+        return datetime.min
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _sort_key(captured: Optional[datetime], uploaded: Optional[datetime], file_id: int) -> tuple:
+    """Python equivalent of the rebuild ORDER BY (NULL capture times last)."""
+    return (1 if captured is None else 0, _naive_utc(captured), _naive_utc(uploaded), file_id)
+
+
+def _param(db: Session, col, value):
+    # Bind read-back DATETIMEs at the column's type so equality holds on SQL Server
+    # (see app.api.gallery._cursor_param)
+    if isinstance(value, datetime) and db.get_bind().dialect.name == "mssql":
+        return sa.cast(sa.literal(value), col.type)
+    return value
+
+
+def _beyond(db: Session, cols, values, before: bool, nullable=()):
+    """Sargable ``(cols) < values`` (``before``) or ``> values``.
+
+    Expanded as ``c1 <= v1 AND (c1 < v1 OR (c2 ...))`` so the leading comparison
+    is an index range; the rest are residual predicates on the seek. NULLs in the
+    ``nullable`` columns sort first, as in an ascending index.
+    """
+    clause = None
+    for col, value in reversed(list(zip(cols, values))):
+        if not any(col is n for n in nullable):
+            value = _param(db, col, value)
+            reach, strict = (col <= value, col < value) if before else (col >= value, col > value)
+        elif value is None:
+            reach = col.is_(None) if before else sa.true()
+            strict = sa.false() if before else col.isnot(None)
+        else:
+            value = _param(db, col, value)
+            if before:
+                reach = or_(col <= value, col.is_(None))
+                strict = or_(col < value, col.is_(None))
+            else:
+                reach, strict = col >= value, col > value
+        clause = strict if clause is None else and_(reach, or_(strict, clause))
+    return clause
+
+
+def _seek_placed(db: Session, event_id: int, uncaptured: bool, bound, before: bool):
+    """Nearest placed file in one capture group, as ``(ordinal, (captured, uploaded, id))``.
+
+    A TOP 1 range seek on IX_FileMetadata_EventID_Captured_Upload (alembic
+    20261017_0034) in the group's order, each candidate probed in uq_event_file;
+    ``bound`` is the sort key to start beyond, None for the group's first/last file.
+    """
+    captured = FileMetadata.CapturedDateTime
+    cols = [FileMetadata.UploadDate, FileMetadata.FileMetadataID]
+    if not uncaptured:
+        cols.insert(0, captured)
+    q = (
+        db.query(EventGalleryOrder.Ordinal, captured, *cols[-2:])
+        .select_from(FileMetadata)
+        .join(
+            EventGalleryOrder,
+            and_(
+                EventGalleryOrder.EventID == FileMetadata.EventID,
+                EventGalleryOrder.FileMetadataID == FileMetadata.FileMetadataID,
+            ),
+        )
+        .filter(
+            FileMetadata.EventID == event_id,
+            captured.is_(None) if uncaptured else captured.isnot(None),
+        )
+    )
+    if bound is not None:
+        values = bound[1:] if uncaptured else bound
+        q = q.filter(_beyond(db, cols, values, before, nullable=(FileMetadata.UploadDate,)))
+    row = q.order_by(*[c.desc() if before else c.asc() for c in cols]).first()
+    if row is None:
+        return None
+    return int(row[0]), (row[1], row[2], int(row[3]))
+
+
+def _neighbour(db: Session, event_id: int, key, before: bool):
+    """Placed file sorting just before/after the sort key ``(captured, uploaded, id)``.
+
+    Files with no capture time sort after all others, so the search crosses into
+    the other group (unbounded) when ``key``'s own group has nothing beyond it.
+    """
+    uncaptured = key[0] is None
+    found = _seek_placed(db, event_id, uncaptured, key, before)
+    if found is None and uncaptured == before:
+        found = _seek_placed(db, event_id, not uncaptured, None, before)
+    return found
+
+
+def _spread(lo: Optional[int], hi: Optional[int], count: int) -> Optional[List[int]]:
+    """``count`` ordinals spread evenly strictly between ``lo`` and ``hi``.
+
+    An open end (no neighbour on that side) gets ``ORDINAL_GAP`` spacing like a
+    rebuild. Returns None when the gap has fewer than ``count`` free ordinals.
+    """
+    if lo is None and hi is None:
+        return None
+    if lo is None:
+        lo = hi - (count + 1) * ORDINAL_GAP
+    if hi is None:
+        hi = lo + (count + 1) * ORDINAL_GAP
+    if hi - lo <= count:
+        return None
+    return [lo + (hi - lo) * i // (count + 1) for i in range(1, count + 1)]
+
+
+def insert_files_into_gallery_order(
+    db: Session, event_id: int, file_ids: Optional[Iterable[int]] = None
+) -> List[dict]:
+    """Place new files into the existing gallery order without rewriting it.
+
+    New files are walked in sort order. For each gap they fall into, the placed
+    neighbours (the nearest files in the order sorting before and after on
+    CapturedDateTime, UploadDate) are found with indexed TOP 1 seeks, so the cost
+    grows with the number of gaps touched, never with the size of the order.
+    Files sharing a gap are spread evenly across it and only the new
+    EventGalleryOrder rows are written. When ``file_ids`` is None every
+    non-deleted file missing from the order is placed.
+
+    Falls back to :func:`rebuild_event_gallery_order` when the event has no order
+    yet, when a gap has fewer free ordinals than files to place in it, or when a
+    concurrent writer claimed one of the chosen ordinals. Callers must have
+    committed their FileMetadata rows first; this commits (or rolls back) the session.
+    Returns the inserted row dicts (the full row set after a rebuild).
+    """
+    has_order = (
+        db.query(EventGalleryOrder.EventGalleryOrderID)
+        .filter(EventGalleryOrder.EventID == event_id)
+        .first()
+    )
+    if not has_order:
+        return rebuild_event_gallery_order(db, event_id)
+
+    already = sa.exists().where(
+        EventGalleryOrder.EventID == event_id,
+        EventGalleryOrder.FileMetadataID == FileMetadata.FileMetadataID,
+    )
+    q = db.query(
+        FileMetadata.CapturedDateTime, FileMetadata.UploadDate, FileMetadata.FileMetadataID
+    ).filter(FileMetadata.EventID == event_id, ~FileMetadata.Deleted, ~already)
+    if file_ids is not None:
+        wanted = sorted({int(f) for f in file_ids})
+        if not wanted:
+            return []
+        q = q.filter(FileMetadata.FileMetadataID.in_(wanted))
+    new_files = sorted(((c, u, int(fid)) for c, u, fid in q.all()), key=lambda k: _sort_key(*k))
+    if not new_files:
+        return []
+
+    rows = []
+    i = 0
+    while i < len(new_files):
+        # The first unplaced file's neighbours bound a gap; every new file sorting
+        # before the upper neighbour shares it
+        lo = _neighbour(db, event_id, new_files[i], before=True)
+        hi = _neighbour(db, event_id, new_files[i], before=False)
+        j = i + 1
+        while j < len(new_files) and (hi is None or _sort_key(*new_files[j]) < _sort_key(*hi[1])):
+            j += 1
+        members = new_files[i:j]
+        ordinals = _spread(lo and lo[0], hi and hi[0], len(members))
+        if ordinals is None:
+            logger.info("gallery order gaps exhausted; rebuilding", extra={"event_id": event_id})
+            return rebuild_event_gallery_order(db, event_id)
+        for key, ordinal in zip(members, ordinals):
+            rows.append({"EventID": event_id, "FileMetadataID": key[2], "Ordinal": ordinal})
+        i = j
+
+    try:
+        db.execute(insert(EventGalleryOrder), rows)
+        db.commit()
+    except IntegrityError:
+        # Another upload for the same event took one of these slots first
+        db.rollback()
+        logger.info("gallery order insert collided; rebuilding", extra={"event_id": event_id})
+        return rebuild_event_gallery_order(db, event_id)
+    return rows
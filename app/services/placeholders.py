@@ -0,0 +1,72 @@
+"""Inline blur-up placeholders for gallery tiles.
+
+Once a file's smallest thumbnail rung has been rendered, a tiny
+(``THUMB_PLACEHOLDER_WIDTH`` px wide) JPEG of it is stored as a ``data:`` URI
+on ``FileMetadata.Placeholder``. The gallery JSON and template carry it inline,
+so a grid paints every tile's placeholder without a ``/thumbs`` request each.
+Files without one (not rendered yet, or stored before the column existed)
+simply have no placeholder.
+"""
+
+from __future__ import annotations
+
+import base64
+import io
+import logging
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.models.event import FileMetadata
+
+# Must fit FileMetadata.Placeholder; a 16px JPEG is typically 400-700 chars
+PLACEHOLDER_MAX_CHARS = 1024
+
+logger = logging.getLogger(__name__)
+
+
+def render_placeholder(source_path: str, width: Optional[int] = None) -> Optional[str]:
+    """Encode a tiny JPEG of ``source_path`` as a ``data:`` URI (None if it can't)."""
+    width = int(width or getattr(settings, "THUMB_PLACEHOLDER_WIDTH", 16) or 16)
+    try:
+        from PIL import Image, ImageOps  # type: ignore
+
+        with Image.open(source_path) as im:
+            im.draft("RGB", (width * 4, width * 4))
+            im = ImageOps.exif_transpose(im).convert("RGB")
+            im.thumbnail((width, width * 4), Image.Resampling.BILINEAR)
+            buf = io.BytesIO()
+            im.save(buf, format="JPEG", quality=40, optimize=True)
+    except Exception:
+        return None
+    uri = "data:image/jpeg;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+    return uri if len(uri) <= PLACEHOLDER_MAX_CHARS else None
+
+
+def store_placeholder(db: Session, file_id: int, uri: str) -> bool:
+    """Set the placeholder unless the file already has one; the caller commits."""
+    updated = (
+        db.query(FileMetadata)
+        .filter(FileMetadata.FileMetadataID == int(file_id), FileMetadata.Placeholder.is_(None))
+        .update({FileMetadata.Placeholder: uri}, synchronize_session=False)
+    )
+    return bool(updated)
+
+
+def record_placeholder_detached(file_id: int, source_path: str) -> None:
+    """Render and store a placeholder from a background thread with its own session."""
+    uri = render_placeholder(source_path)
+    if not uri:
+        return
+    try:
+        from db import SessionLocal
+
+        db = SessionLocal()
+        try:
+            store_placeholder(db, file_id, uri)
+            db.commit()
+        finally:
+            db.close()
+    except Exception:
+        logger.exception("placeholder update failed", extra={"file_id": file_id})
@@ -1,9 +1,19 @@
 """S3 storage service for file uploads (optional; fallback to local filesystem)."""
+import asyncio
+import base64
+import hashlib
 import logging
-from typing import Optional
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import AsyncIterable, AsyncIterator, Optional, Union
 
 logger = logging.getLogger(__name__)
 
+# S3 rejects non-final multipart parts smaller than this, and allows at most MAX_PARTS parts.
+MIN_PART_BYTES = 5 * 1024 * 1024
+MAX_PARTS = 10_000
+
 try:
     import boto3
     from botocore.exceptions import ClientError
@@ -21,6 +31,8 @@ class S3StorageService:
         bucket: str,
         access_key: Optional[str] = None,
         secret_key: Optional[str] = None,
+        part_size: int = 8 * 1024 * 1024,
+        concurrency: int = 4,
     ):
         """
         Initialize S3 client.
@@ -30,9 +42,15 @@ class S3StorageService:
             bucket: S3 bucket name
             access_key: AWS access key (optional; uses IAM role on EC2)
             secret_key: AWS secret key (optional; uses IAM role on EC2)
+            part_size: Default multipart part size for upload_stream
+            concurrency: Default number of parts uploaded in parallel
         """
         self.bucket = bucket
         self.region = region
+        self.part_size = max(int(part_size), MIN_PART_BYTES)
+        self.concurrency = max(1, int(concurrency))
+        # boto3 clients are thread-safe; blocking calls run here instead of on the event loop
+        self._executor: Optional[ThreadPoolExecutor] = None
         self.enabled = HAS_S3 and bool(bucket)
         
         if self.enabled:
@@ -87,6 +105,234 @@ class S3StorageService:
             logger.error(f"S3 upload failed for {s3_key}: {e}")
             raise
 
+    async def _run(self, fn, **kwargs):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max(4, self.concurrency * 2), thread_name_prefix="s3-upload"
+            )
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, partial(fn, **kwargs)
+        )
+
+    async def upload_stream(
+        self,
+        source: Union[str, os.PathLike, AsyncIterable[bytes]],
+        s3_key: str,
+        content_type: str = "application/octet-stream",
+        *,
+        part_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> Optional[str]:
+        """
+        Stream a file path or async chunk iterator to S3 without blocking the event loop.
+
+        Objects larger than one part use a multipart upload whose parts are sent in
+        parallel from a thread pool; at most ``concurrency`` parts are held in memory.
+        Every part carries a SHA-256 checksum that S3 verifies on receipt. If any
+        part fails the multipart upload is aborted so no orphaned parts are billed.
+
+        Args:
+            source: Path of a local file, or an async iterable of byte chunks
+            s3_key: S3 object key
+            content_type: MIME type
+            part_size: Multipart part size (defaults to the service setting; min 5 MiB)
+            concurrency: Parts uploaded in parallel (defaults to the service setting)
+
+        Returns:
+            S3 key on success, None when S3 is disabled
+        """
+        if not self.enabled:
+            logger.debug(f"S3 disabled; skipping upload of {s3_key}")
+            return None
+
+        part_size = max(int(part_size or self.part_size), MIN_PART_BYTES)
+        concurrency = max(1, int(concurrency or self.concurrency))
+        parts = _iter_parts(source, part_size)
+        first = await anext(parts, b"")
+        second = await anext(parts, None)
+        if second is None:
+            # Fits in one part: a single PUT beats the three-request multipart dance
+            await self._run(
+                self.client.put_object,
+                Bucket=self.bucket,
+                Key=s3_key,
+                Body=first,
+                ContentType=content_type,
+                ServerSideEncryption="AES256",
+                ChecksumSHA256=_sha256_b64(first),
+            )
+            logger.info(f"Uploaded to S3: s3://{self.bucket}/{s3_key}")
+            return s3_key
+
+        created = await self._run(
+            self.client.create_multipart_upload,
+            Bucket=self.bucket,
+            Key=s3_key,
+            ContentType=content_type,
+            ServerSideEncryption="AES256",
+            ChecksumAlgorithm="SHA256",
+        )
+        upload_id = created["UploadId"]
+        slots = asyncio.Semaphore(concurrency)
+        tasks: list[asyncio.Task] = []
+
+        async def send(number: int, body: bytes) -> dict:
+            try:
+                digest = _sha256_b64(body)
+                resp = await self._run(
+                    self.client.upload_part,
+                    Bucket=self.bucket,
+                    Key=s3_key,
+                    UploadId=upload_id,
+                    PartNumber=number,
+                    Body=body,
+                    ChecksumSHA256=digest,
+                )
+                return {"PartNumber": number, "ETag": resp["ETag"], "ChecksumSHA256": digest}
+            finally:
+                slots.release()
+
+        async def bodies() -> AsyncIterator[bytes]:
+            yield first
+            yield second
+            async for chunk in parts:
+                yield chunk
+
+        try:
+            async for body in bodies():
+                await slots.acquire()
+                for t in tasks:
+                    if t.done() and t.exception() is not None:
+                        raise t.exception()
+                if len(tasks) >= MAX_PARTS:
+                    raise ValueError(f"{s3_key}: more than {MAX_PARTS} parts at {part_size} bytes")
+                tasks.append(asyncio.ensure_future(send(len(tasks) + 1, body)))
+            completed = await asyncio.gather(*tasks)
+            await self._run(
+                self.client.complete_multipart_upload,
+                Bucket=self.bucket,
+                Key=s3_key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": completed},
+            )
+        except BaseException:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await parts.aclose()
+            try:
+                await self._run(
+                    self.client.abort_multipart_upload,
+                    Bucket=self.bucket,
+                    Key=s3_key,
+                    UploadId=upload_id,
+                )
+            except Exception as e:
+                logger.error(f"S3 abort failed for {s3_key} ({upload_id}): {e}")
+            logger.error(f"S3 multipart upload failed for {s3_key}; aborted")
+            raise
+        logger.info(f"Uploaded to S3: s3://{self.bucket}/{s3_key} ({len(tasks)} parts)")
+        return s3_key
+
+    def generate_presigned_post(
+        self, s3_key: str, content_type: str, size: int, *, sha256: str, expiration: int = 900
+    ) -> Optional[dict]:
+        """
+        Presigned POST policy for a browser to upload one object straight to the bucket.
+
+        The policy pins the key, the Content-Type, the exact byte length and the
+        client's SHA-256 (hex), and requires SSE, so the grant can't be reused for
+        anything else. S3 refuses a body that doesn't match the digest and stores it
+        as the object's checksum, so :meth:`sha256` needs no read of the bytes.
+
+        Returns:
+            ``{"url": ..., "fields": {...}}`` to send as multipart/form-data
+            (file field last), or None when S3 is disabled
+        """
+        if not self.enabled:
+            return None
+        size = int(size)
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode("ascii")
+        fields = {
+            "Content-Type": content_type,
+            "x-amz-server-side-encryption": "AES256",
+            "x-amz-checksum-algorithm": "SHA256",
+            "x-amz-checksum-sha256": checksum,
+        }
+        return self.client.generate_presigned_post(
+            Bucket=self.bucket,
+            Key=s3_key,
+            Fields=fields,
+            Conditions=[
+                *({k: v} for k, v in fields.items()),
+                ["content-length-range", size, size],
+            ],
+            ExpiresIn=expiration,
+        )
+
+    async def stat(self, s3_key: str) -> Optional[dict]:
+        """Size and Content-Type of an object, or None when it doesn't exist."""
+        if not self.enabled:
+            return None
+        try:
+            head = await self._run(self.client.head_object, Bucket=self.bucket, Key=s3_key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return {"size": int(head["ContentLength"]), "content_type": head.get("ContentType")}
+
+    async def sha256(self, s3_key: str) -> str:
+        """
+        Hex SHA-256 of an object's bytes, computed on our side rather than taken from a client.
+
+        When the object was stored with a full-object SHA-256 checksum, S3 has already
+        verified it on receipt and it is returned without reading the body; otherwise
+        the object (one presigned before checksums were pinned) is streamed through
+        the digest on the worker threads.
+        """
+        head = await self._run(
+            self.client.head_object, Bucket=self.bucket, Key=s3_key, ChecksumMode="ENABLED"
+        )
+        stored = head.get("ChecksumSHA256")
+        # Multipart objects carry a checksum of part checksums ("...-N"), not of the bytes
+        full_object = head.get("ChecksumType", "FULL_OBJECT") == "FULL_OBJECT"
+        if stored and full_object and "-" not in stored:
+            return base64.b64decode(stored).hex()
+        logger.warning(f"No S3 checksum for {s3_key}; hashing the object through the app")
+        return await self._run(self._hash_object, s3_key=s3_key)
+
+    def _hash_object(self, s3_key: str, chunk_size: int = 1024 * 1024) -> str:
+        body = self.client.get_object(Bucket=self.bucket, Key=s3_key)["Body"]
+        digest = hashlib.sha256()
+        try:
+            for chunk in body.iter_chunks(chunk_size):
+                digest.update(chunk)
+        finally:
+            body.close()
+        return digest.hexdigest()
+
+    async def read_prefix(self, s3_key: str, length: int) -> bytes:
+        """First ``length`` bytes of an object (ranged GET)."""
+        resp = await self._run(
+            self.client.get_object,
+            Bucket=self.bucket,
+            Key=s3_key,
+            Range=f"bytes=0-{max(0, int(length) - 1)}",
+        )
+        return await asyncio.to_thread(resp["Body"].read)
+
+    async def copy(self, src_key: str, dst_key: str) -> str:
+        """Server-side copy of ``src_key`` to ``dst_key``; no bytes pass through us."""
+        await self._run(
+            self.client.copy_object,
+            Bucket=self.bucket,
+            Key=dst_key,
+            CopySource={"Bucket": self.bucket, "Key": src_key},
+            ServerSideEncryption="AES256",
+        )
+        return dst_key
+
     def delete_file(self, s3_key: str) -> bool:
         """Delete file from S3."""
         if not self.enabled:
@@ -100,6 +346,32 @@ class S3StorageService:
             logger.error(f"S3 delete failed for {s3_key}: {e}")
             return False
 
+    async def delete(self, s3_key: str) -> bool:
+        """:meth:`delete_file` on the worker threads, for use from request handlers."""
+        if not self.enabled:
+            return False
+        return await self._run(self.delete_file, s3_key=s3_key)
+
+    def delete_many(self, s3_keys: list[str]) -> int:
+        """Delete keys 1000 per request (the DeleteObjects limit); returns how many went."""
+        if not self.enabled:
+            return 0
+        deleted = 0
+        for i in range(0, len(s3_keys), 1000):
+            batch = s3_keys[i : i + 1000]
+            try:
+                resp = self.client.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True},
+                )
+            except ClientError as e:
+                logger.error(f"S3 batch delete failed ({len(batch)} keys): {e}")
+                continue
+            for err in resp.get("Errors", []):
+                logger.error(f"S3 delete failed for {err.get('Key')}: {err.get('Message')}")
+            deleted += len(batch) - len(resp.get("Errors", []))
+        return deleted
+
     def generate_presigned_url(self, s3_key: str, expiration: int = 3600) -> str:
         """
         Generate a presigned URL for temporary access (e.g., for downloads).
@@ -138,3 +410,28 @@ class S3StorageService:
                 return False
             logger.error(f"Error checking S3 file existence: {e}")
             raise
+
+
+def _sha256_b64(data: bytes) -> str:
+    return base64.b64encode(hashlib.sha256(data).digest()).decode("ascii")
+
+
+async def _iter_parts(
+    source: Union[str, os.PathLike, AsyncIterable[bytes]], part_size: int
+) -> AsyncIterator[bytes]:
+    """Yield ``part_size`` blocks (the last one may be shorter) from a path or async iterable."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as fh:
+            while True:
+                block = await asyncio.to_thread(fh.read, part_size)
+                if not block:
+                    return
+                yield block
+    buf = bytearray()
+    async for chunk in source:
+        buf += chunk
+        while len(buf) >= part_size:
+            yield bytes(buf[:part_size])
+            del buf[:part_size]
+    if buf:
+        yield bytes(buf)
@@ -0,0 +1,184 @@
+"""Per-event storage usage kept in ``EventStorage.CurrentUsageBytes``.
+
+Ingest, thumbnail generation, permanent deletes and cleanup adjust the counter
+with a single atomic UPDATE inside the caller's transaction, so enforcing the
+storage cap is one indexed read instead of walking the event folder. The
+counter can drift (crashes between disk and DB, files touched out of band);
+:func:`reconcile_event_usage` recomputes it and is run periodically by
+``scripts/reconcile_storage_usage.py``.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from typing import Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app.models.event import Event, EventStorage, FileMetadata
+
+MB = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def event_base_path(user_id: int, event_id: int) -> str:
+    return os.path.join("storage", str(user_id), str(event_id))
+
+
+def _dir_bytes(path: str) -> int:
+    total = 0
+    if os.path.isdir(path):
+        for root, _dirs, files in os.walk(path):
+            for fn in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, fn))
+                except OSError:
+                    pass
+    return total
+
+
+def measure_event_usage(db: Session, event_id: int, user_id: Optional[int] = None) -> int:
+    """Recompute usage from the source of truth.
+
+    Originals are summed from ``FileMetadata.FileSize`` (soft-deleted rows still
+    occupy storage until permadelete, and S3-stored originals have no local file);
+    only the thumbnails folder is walked on disk.
+    """
+    if user_id is None:
+        user_id = db.query(Event.UserID).filter(Event.EventID == event_id).scalar()
+    originals = (
+        db.query(func.coalesce(func.sum(FileMetadata.FileSize), 0))
+        .filter(FileMetadata.EventID == event_id)
+        .scalar()
+    )
+    thumbs = 0
+    if user_id is not None:
+        thumbs = _dir_bytes(os.path.join(event_base_path(int(user_id), event_id), "thumbnails"))
+    return int(originals or 0) + thumbs
+
+
+def _latest_row(db: Session, event_id: int) -> Optional[EventStorage]:
+    return (
+        db.query(EventStorage)
+        .filter(EventStorage.EventID == event_id)
+        .order_by(EventStorage.EventStorageID.desc())
+        .first()
+    )
+
+
+def reconcile_event_usage(db: Session, event_id: int, user_id: Optional[int] = None) -> int:
+    """Overwrite the counter with a fresh measurement (creating the row if needed)."""
+    if user_id is None:
+        user_id = db.query(Event.UserID).filter(Event.EventID == event_id).scalar()
+    usage = measure_event_usage(db, event_id, user_id)
+    es = _latest_row(db, event_id)
+    if es is None:
+        path = event_base_path(int(user_id), event_id) if user_id is not None else ""
+        es = EventStorage(EventID=event_id, StoragePath=path, StorageLimitMB=0)
+        db.add(es)
+    es.CurrentUsageBytes = usage
+    es.CurrentUsageMB = int(usage // MB)
+    db.flush()
+    return usage
+
+
+def get_usage_bytes(db: Session, event_id: int) -> int:
+    """Current usage for cap checks; seeds the counter once for events without a row."""
+    value = (
+        db.query(EventStorage.CurrentUsageBytes)
+        .filter(EventStorage.EventID == event_id)
+        .order_by(EventStorage.EventStorageID.desc())
+        .limit(1)
+        .scalar()
+    )
+    if value is None:
+        return reconcile_event_usage(db, event_id)
+    return int(value or 0)
+
+
+def adjust_usage(db: Session, event_id: int, delta_bytes: int) -> None:
+    """Add ``delta_bytes`` (negative to release) to the event's counter.
+
+    The UPDATE is relative (``col = col + delta``) so concurrent uploads don't
+    lose increments, and clamps at zero. Not committed here: the change lands
+    with the caller's transaction. Events without a row are seeded by measuring,
+    which already accounts for bytes written before the call.
+    """
+    delta = int(delta_bytes or 0)
+    if not delta:
+        return
+    new_bytes = EventStorage.CurrentUsageBytes + delta
+    clamped = case((new_bytes < 0, 0), else_=new_bytes)
+    # Only the latest row is the counter (see _latest_row); older rows are history
+    latest_id = (
+        db.query(func.max(EventStorage.EventStorageID))
+        .filter(EventStorage.EventID == event_id)
+        .scalar_subquery()
+    )
+    updated = (
+        db.query(EventStorage)
+        .filter(EventStorage.EventStorageID == latest_id)
+        .update(
+            {
+                EventStorage.CurrentUsageBytes: clamped,
+                EventStorage.CurrentUsageMB: case((new_bytes < 0, 0), else_=new_bytes // MB),
+            },
+            synchronize_session=False,
+        )
+    )
+    if not updated:
+        reconcile_event_usage(db, event_id)
+
+
+def record_usage_detached(event_id: int, delta_bytes: int) -> None:
+    """Adjust usage from a background thread with its own short-lived session."""
+    if not delta_bytes:
+        return
+    try:
+        from db import SessionLocal
+
+        db = SessionLocal()
+        try:
+            adjust_usage(db, event_id, delta_bytes)
+            db.commit()
+        finally:
+            db.close()
+    except Exception:
+        logger.exception("storage usage update failed", extra={"event_id": event_id})
+
+
+def reconcile_all(db: Session, event_id: Optional[int] = None) -> tuple[int, int]:
+    """Recompute usage for every event (or one); returns ``(checked, corrected)``.
+
+    Commits per event so a long run doesn't hold locks on the whole table.
+    """
+    q = db.query(Event.EventID, Event.UserID).order_by(Event.EventID)
+    if event_id is not None:
+        q = q.filter(Event.EventID == int(event_id))
+    checked = corrected = 0
+    for eid, uid in q.all():
+        before = (
+            db.query(EventStorage.CurrentUsageBytes)
+            .filter(EventStorage.EventID == eid)
+            .order_by(EventStorage.EventStorageID.desc())
+            .limit(1)
+            .scalar()
+        )
+        try:
+            after = reconcile_event_usage(db, int(eid), uid)
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("storage reconcile failed", extra={"event_id": eid})
+            continue
+        checked += 1
+        if before is None or int(before) != after:
+            corrected += 1
+            logger.info(
+                "storage usage corrected",
+                extra={"event_id": eid, "before": before, "after": after},
+            )
+    return checked, corrected
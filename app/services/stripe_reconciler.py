@@ -0,0 +1,252 @@
+"""Batch reconciliation of pending Stripe checkout purchases.
+
+Webhooks normally mark purchases paid; this sweeps up the ones whose webhook was
+delayed or lost. Pending purchases are read in keyset pages, their Checkout
+Sessions are fetched from Stripe on a small thread pool, and every paid one is
+flipped with a guarded UPDATE (so a webhook that got there first wins) and
+logged to PaymentLog. Stripe 429s pause all workers for the Retry-After period
+(or an exponential backoff) before retrying.
+
+Run it on a schedule with ``python -m scripts.reconcile_stripe_purchases``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.models.billing import PaymentLog, Purchase
+from app.services.entitlements import invalidate_entitlements
+
+logger = logging.getLogger("billing")
+
+RECONCILE_PAGE_SIZE = 200
+# Checkout Sessions count as settled in these states (payment_status)
+PAID_STATES = ("paid", "no_payment_required")
+
+
+@dataclass
+class ReconcileResult:
+    checked: int = 0
+    paid: int = 0
+    unpaid: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+
+
+def _field(obj: Any, name: str) -> Any:
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def _is_rate_limited(exc: Exception) -> bool:
+    return getattr(exc, "http_status", None) == 429 or type(exc).__name__ == "RateLimitError"
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    headers = getattr(exc, "headers", None) or {}
+    try:
+        value = headers.get("Retry-After") or headers.get("retry-after")
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def stripe_session_retriever() -> Optional[Callable[[str], Any]]:
+    """``stripe.checkout.Session.retrieve`` bound to our key, or None if Stripe isn't set up."""
+    if not getattr(settings, "STRIPE_SECRET_KEY", None):
+        return None
+    try:
+        import stripe  # type: ignore
+    except Exception as e:
+        logger.debug("Stripe SDK not available for reconciliation: %s", e)
+        return None
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    return stripe.checkout.Session.retrieve
+
+
+class StripeReconciler:
+    """Settle pending purchases against their Stripe Checkout Sessions.
+
+    ``retrieve`` fetches a session by id (tests pass a stub); ``sleep`` is used
+    for rate-limit backoff.
+    """
+
+    def __init__(
+        self,
+        retrieve: Callable[[str], Any],
+        *,
+        concurrency: int = 4,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_cap: float = 60.0,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.retrieve = retrieve
+        self.concurrency = max(1, int(concurrency))
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_base = float(backoff_base)
+        self.backoff_cap = float(backoff_cap)
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+        self._rate_limited = 0
+
+    def _wait_for_window(self) -> None:
+        with self._lock:
+            wait = self._resume_at - time.monotonic()
+        if wait > 0:
+            self.sleep(wait)
+
+    def fetch_session(self, session_id: str) -> Any:
+        """Retrieve one session, backing off (for every worker) while Stripe returns 429."""
+        attempt = 0
+        while True:
+            self._wait_for_window()
+            try:
+                return self.retrieve(session_id)
+            except Exception as e:
+                if not _is_rate_limited(e) or attempt >= self.max_retries:
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(self.backoff_cap, self.backoff_base * (2**attempt))
+                    delay *= 0.5 + random.random() / 2
+                with self._lock:
+                    self._rate_limited += 1
+                    self._resume_at = max(self._resume_at, time.monotonic() + delay)
+                attempt += 1
+
+    def reconcile(
+        self,
+        db: Session,
+        *,
+        user_id: Optional[int] = None,
+        lookback_hours: Optional[float] = None,
+        page_size: int = RECONCILE_PAGE_SIZE,
+    ) -> ReconcileResult:
+        """Check every pending purchase (optionally one user's) touched within the lookback."""
+        if lookback_hours is None:
+            lookback_hours = float(getattr(settings, "STRIPE_RECONCILE_LOOKBACK_HOURS", 48))
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=lookback_hours)
+        result = ReconcileResult()
+        self._rate_limited = 0
+        last_id = 0
+        with ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="stripe-reconcile"
+        ) as pool:
+            while True:
+                q = db.query(Purchase.PurchaseID, Purchase.UserID, Purchase.StripeSessionID).filter(
+                    Purchase.Status == "pending",
+                    Purchase.StripeSessionID.isnot(None),
+                    Purchase.UpdatedAt >= cutoff,
+                    Purchase.PurchaseID > last_id,
+                )
+                if user_id is not None:
+                    q = q.filter(Purchase.UserID == int(user_id))
+                page = q.order_by(Purchase.PurchaseID).limit(page_size).all()
+                if not page:
+                    break
+                last_id = int(page[-1][0])
+                futures = [pool.submit(self.fetch_session, str(row[2])) for row in page]
+                affected = self._apply_page(db, page, futures, result)
+                for uid in affected:
+                    invalidate_entitlements(uid)
+                if len(page) < page_size:
+                    break
+        result.rate_limited = self._rate_limited
+        return result
+
+    def _apply_page(self, db: Session, page, futures, result: ReconcileResult) -> set[int]:
+        affected: set[int] = set()
+        for (purchase_id, uid, session_id), fut in zip(page, futures):
+            result.checked += 1
+            try:
+                sess = fut.result()
+            except Exception as e:
+                result.errors += 1
+                db.add(
+                    PaymentLog(
+                        UserID=uid,
+                        EventType="reconcile_error",
+                        StripeEventID=None,
+                        Payload=str(session_id or ""),
+                        ErrorMessage=str(e),
+                    )
+                )
+                continue
+            status = str(_field(sess, "payment_status") or "").lower()
+            if status not in PAID_STATES:
+                result.unpaid += 1
+                continue
+            pi = _field(sess, "payment_intent")
+            pi = _field(pi, "id") if pi is not None and not isinstance(pi, str) else pi
+            values: dict[str, Any] = {"Status": "paid"}
+            if pi:
+                values["StripePaymentIntentID"] = str(pi)
+            # Guarded so a webhook that already settled the purchase isn't double-logged
+            updated = (
+                db.query(Purchase)
+                .filter(Purchase.PurchaseID == purchase_id, Purchase.Status == "pending")
+                .update(values, synchronize_session=False)
+            )
+            if not updated:
+                continue
+            result.paid += 1
+            affected.add(int(uid))
+            db.add(
+                PaymentLog(
+                    UserID=uid,
+                    EventType="reconcile_paid",
+                    StripeEventID=None,
+                    Payload=json.dumps(
+                        {"purchase_id": purchase_id, "session": session_id, "payment_intent": pi}
+                    ),
+                )
+            )
+        try:
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("stripe reconcile: commit failed")
+            return set()
+        return affected
+
+
+def reconcile_pending_purchases(
+    db: Session, *, retrieve: Optional[Callable[[str], Any]] = None, log_run: bool = True
+) -> Optional[ReconcileResult]:
+    """One scheduled sweep using the configured Stripe key; None when Stripe isn't set up."""
+    retrieve = retrieve or stripe_session_retriever()
+    if retrieve is None:
+        return None
+    reconciler = StripeReconciler(
+        retrieve, concurrency=int(getattr(settings, "STRIPE_RECONCILE_CONCURRENCY", 4))
+    )
+    result = reconciler.reconcile(db)
+    if log_run:
+        try:
+            db.add(
+                PaymentLog(
+                    UserID=None,
+                    EventType="reconcile_run",
+                    StripeEventID=None,
+                    Payload=json.dumps(asdict(result)),
+                )
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+    logger.info("stripe reconcile: %s", asdict(result))
+    return result
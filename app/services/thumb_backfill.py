@@ -0,0 +1,323 @@
+"""Parallel, resumable thumbnail backfill for existing uploads.
+
+Files are read in keyset pages on ``FileMetadataID`` with their owner joined in
+the same query, so there is no per-file lookup and no full result set in memory.
+Anything that already has every width (and the configured alternative
+encodings) is skipped with a few stats; the rest is rendered on a process pool
+(images decode once per file via :func:`render_image_ladder`). Placeholders
+missing on ``FileMetadata.Placeholder`` are filled from the smallest rung.
+
+Progress is checkpointed to a JSON file as the lowest file id below which
+everything has finished, so a killed run resumes where it stopped without
+skipping files still in flight. The checkpoint records the ``--user``/``--event``
+scope it was written for and is ignored by a run with a different scope.
+Storage usage for new thumbnails is added per event as the run goes.
+
+Run it with ``python -m scripts.backfill_thumbnails``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from typing import Callable, Iterator, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.models.event import Event, FileMetadata
+from app.services.placeholders import render_placeholder, store_placeholder
+from app.services.storage_accounting import adjust_usage
+from app.services.thumbs import (
+    alt_thumb_exts,
+    ensure_video_poster,
+    image_thumb_path,
+    render_image_ladder,
+    thumb_variant_path,
+)
+from app.services.upload_ingest import THUMB_WIDTHS
+
+BACKFILL_PAGE_SIZE = 500
+CHECKPOINT_EVERY_SECONDS = 10.0
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BackfillItem:
+    file_id: int
+    event_id: int
+    user_id: int
+    file_type: str
+    file_name: str
+    needs_placeholder: bool
+
+
+@dataclass
+class BackfillResult:
+    scanned: int = 0
+    rendered: int = 0
+    skipped: int = 0
+    missing: int = 0
+    failed: int = 0
+    bytes_written: int = 0
+    placeholders: int = 0
+    last_id: int = 0
+    seconds: float = 0.0
+
+    @property
+    def done(self) -> int:
+        return self.rendered + self.skipped + self.missing + self.failed
+
+
+def iter_backfill_items(
+    db: Session,
+    *,
+    user_id: Optional[int] = None,
+    event_id: Optional[int] = None,
+    after_id: int = 0,
+    page_size: int = BACKFILL_PAGE_SIZE,
+) -> Iterator[BackfillItem]:
+    """Image/video rows with their owner, in ``FileMetadataID`` order after ``after_id``."""
+    q = (
+        db.query(
+            FileMetadata.FileMetadataID,
+            FileMetadata.EventID,
+            Event.UserID,
+            FileMetadata.FileType,
+            FileMetadata.FileName,
+            FileMetadata.Placeholder,
+        )
+        .join(Event, Event.EventID == FileMetadata.EventID)
+        .filter(or_(FileMetadata.FileType.like("image/%"), FileMetadata.FileType.like("video/%")))
+    )
+    if user_id is not None:
+        q = q.filter(Event.UserID == int(user_id))
+    if event_id is not None:
+        q = q.filter(FileMetadata.EventID == int(event_id))
+    last = int(after_id or 0)
+    while True:
+        rows = (
+            q.filter(FileMetadata.FileMetadataID > last)
+            .order_by(FileMetadata.FileMetadataID)
+            .limit(int(page_size))
+            .all()
+        )
+        if not rows:
+            return
+        for fid, eid, uid, ftype, fname, placeholder in rows:
+            yield BackfillItem(
+                int(fid),
+                int(eid),
+                int(uid),
+                str(ftype or ""),
+                str(fname or ""),
+                placeholder is None,
+            )
+        last = int(rows[-1][0])
+
+
+def count_backfill_items(
+    db: Session, *, user_id: Optional[int] = None, event_id: Optional[int] = None, after_id: int = 0
+) -> int:
+    q = (
+        db.query(FileMetadata.FileMetadataID)
+        .join(Event, Event.EventID == FileMetadata.EventID)
+        .filter(
+            FileMetadata.FileMetadataID > int(after_id or 0),
+            or_(FileMetadata.FileType.like("image/%"), FileMetadata.FileType.like("video/%")),
+        )
+    )
+    if user_id is not None:
+        q = q.filter(Event.UserID == int(user_id))
+    if event_id is not None:
+        q = q.filter(FileMetadata.EventID == int(event_id))
+    return q.count()
+
+
+def _outputs(item: BackfillItem, width: int) -> list[str]:
+    path = image_thumb_path(item.user_id, item.event_id, item.file_id, width)
+    if item.file_type.startswith("image"):
+        return [path] + [thumb_variant_path(path, ext) for ext in alt_thumb_exts()]
+    return [path]
+
+
+def missing_widths(item: BackfillItem, widths=THUMB_WIDTHS) -> list[int]:
+    return [w for w in widths if not all(os.path.exists(p) for p in _outputs(item, w))]
+
+
+def backfill_file(item: BackfillItem, widths: list[int]) -> tuple[int, Optional[str]]:
+    """Pool entry point: render ``widths`` for one file.
+
+    Returns (bytes of newly created files, placeholder data URI or None).
+    """
+    orig_path = os.path.join("storage", str(item.user_id), str(item.event_id), item.file_name)
+    before = {p for w in widths for p in _outputs(item, w) if os.path.exists(p)}
+    if not widths:
+        pass  # only the placeholder is missing
+    elif item.file_type.startswith("image"):
+        targets = [
+            (w, image_thumb_path(item.user_id, item.event_id, item.file_id, w)) for w in widths
+        ]
+        render_image_ladder(orig_path, targets)
+    else:
+        # Widest first so later posters are downscaled, not re-extracted
+        for w in sorted(widths, reverse=True):
+            ensure_video_poster(
+                orig_path, image_thumb_path(item.user_id, item.event_id, item.file_id, w), w
+            )
+    created = 0
+    for p in (p for w in widths for p in _outputs(item, w)):
+        if p not in before and os.path.exists(p):
+            created += os.path.getsize(p)
+    placeholder = None
+    if item.needs_placeholder:
+        smallest = image_thumb_path(item.user_id, item.event_id, item.file_id, min(THUMB_WIDTHS))
+        placeholder = render_placeholder(smallest) if os.path.exists(smallest) else None
+    return created, placeholder
+
+
+def _scope(user_id: Optional[int], event_id: Optional[int]) -> dict:
+    return {"user_id": user_id, "event_id": event_id}
+
+
+def load_checkpoint(path: Optional[str], scope: Optional[dict] = None) -> int:
+    """Last finished file id saved at ``path``, or 0 when it was saved for another scope."""
+    if not path or not os.path.exists(path):
+        return 0
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            saved = json.load(fh)
+        last_id = int(saved.get("last_id") or 0)
+    except Exception:
+        logger.warning(f"Ignoring unreadable backfill checkpoint {path}")
+        return 0
+    scope = scope or _scope(None, None)
+    if saved.get("scope") != scope:
+        # An id reached while scanning one event says nothing about another
+        logger.warning(
+            f"Ignoring backfill checkpoint {path}: saved for {saved.get('scope')}, "
+            f"running for {scope}"
+        )
+        return 0
+    return last_id
+
+
+def save_checkpoint(
+    path: Optional[str], result: BackfillResult, scope: Optional[dict] = None
+) -> None:
+    if not path:
+        return
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        payload = {**asdict(result), "scope": scope or _scope(None, None)}
+        json.dump({**payload, "saved_at": time.time()}, fh)
+    os.replace(tmp, path)
+
+
+def run_backfill(
+    db: Session,
+    *,
+    user_id: Optional[int] = None,
+    event_id: Optional[int] = None,
+    workers: int = 2,
+    checkpoint_path: Optional[str] = None,
+    resume: bool = True,
+    executor_factory: Optional[Callable[[int], Executor]] = None,
+    progress: Optional[Callable[[BackfillResult, int], None]] = None,
+    progress_every: float = CHECKPOINT_EVERY_SECONDS,
+) -> BackfillResult:
+    """Backfill thumbnails, ``workers`` files at a time; ``progress(result, total)`` reports."""
+    scope = _scope(user_id, event_id)
+    start_id = load_checkpoint(checkpoint_path, scope) if resume else 0
+    total = count_backfill_items(db, user_id=user_id, event_id=event_id, after_id=start_id)
+    result = BackfillResult(last_id=start_id)
+    started = time.monotonic()
+    workers = max(1, int(workers))
+    factory = executor_factory or (lambda n: ProcessPoolExecutor(max_workers=n))
+    in_flight: dict[Future, BackfillItem] = {}
+    pending_ids: set[int] = set()
+    usage: dict[int, int] = {}
+    placeholders: dict[int, str] = {}
+    last_flush = started
+
+    def finish(fut: Future) -> None:
+        item = in_flight.pop(fut)
+        pending_ids.discard(item.file_id)
+        try:
+            created, placeholder = fut.result()
+        except Exception as e:
+            result.failed += 1
+            logger.warning(f"Backfill failed for file {item.file_id}: {e}")
+            return
+        result.rendered += 1
+        result.bytes_written += created
+        if created:
+            usage[item.event_id] = usage.get(item.event_id, 0) + created
+        if placeholder:
+            placeholders[item.file_id] = placeholder
+
+    def flush(scanned_to: int) -> None:
+        # Everything below the oldest file still rendering has finished
+        result.last_id = (min(pending_ids) - 1) if pending_ids else scanned_to
+        for eid, delta in usage.items():
+            adjust_usage(db, eid, delta)
+        for fid, uri in placeholders.items():
+            if store_placeholder(db, fid, uri):
+                result.placeholders += 1
+        usage.clear()
+        placeholders.clear()
+        db.commit()
+        result.seconds = time.monotonic() - started
+        save_checkpoint(checkpoint_path, result, scope)
+        if progress is not None:
+            progress(result, total)
+
+    executor = factory(workers)
+    scanned_to = start_id
+    try:
+        items = iter_backfill_items(db, user_id=user_id, event_id=event_id, after_id=start_id)
+        for item in items:
+            result.scanned += 1
+            scanned_to = item.file_id
+            orig = os.path.join("storage", str(item.user_id), str(item.event_id), item.file_name)
+            widths = missing_widths(item)
+            if not os.path.exists(orig):
+                result.missing += 1
+            elif not widths and not item.needs_placeholder:
+                result.skipped += 1
+            else:
+                fut = executor.submit(backfill_file, item, widths)
+                in_flight[fut] = item
+                pending_ids.add(item.file_id)
+            # Keep a bounded queue ahead of the pool so rows stream through
+            while len(in_flight) >= workers * 4:
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for fut in done:
+                    finish(fut)
+            if time.monotonic() - last_flush >= progress_every:
+                flush(scanned_to)
+                last_flush = time.monotonic()
+        for fut in list(in_flight):
+            fut.exception()
+            finish(fut)
+    finally:
+        executor.shutdown(wait=True)
+    flush(scanned_to)
+    return result
+
+
+def format_progress(result: BackfillResult, total: int) -> str:
+    """One status line with throughput and ETA."""
+    rate = result.done / result.seconds if result.seconds else 0.0
+    remaining = max(0, total - result.done)
+    eta = f"{remaining / rate:,.0f}s" if rate else "?"
+    return (
+        f"{result.done:,}/{total:,} files ({result.rendered:,} rendered, "
+        f"{result.skipped:,} complete, {result.missing:,} missing, {result.failed:,} failed) "
+        f"{rate:,.1f} files/s, {result.bytes_written / 1e6:,.1f} MB written, ETA {eta}"
+    )
@@ -0,0 +1,233 @@
+"""Byte budget and LRU eviction for persisted thumbnails.
+
+Everything under ``storage/{user}/{event}/thumbnails/`` is derived from the
+originals and can be re-rendered on demand, so that directory is treated as a
+cache. :class:`ThumbnailCache` tracks each file's size and last access (a
+``/thumbs`` hit or a finished render) and, once the total exceeds
+``THUMB_CACHE_MAX_BYTES`` or one event exceeds ``THUMB_CACHE_EVENT_MAX_BYTES``,
+deletes the least recently used files and gives their bytes back to the
+event's storage usage.
+
+The index is built from a directory scan (ordered by mtime/atime) on a
+background thread started with the app (:meth:`ThumbnailCache.load_in_background`),
+or else the first time a render is recorded, off the request path. It lives in each
+process, so with several web workers the budget is enforced approximately: a
+file another process evicted is simply dropped from the index when reached.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from app.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _event_of(path: str) -> Optional[int]:
+    # storage/{user}/{event}/thumbnails/{name}
+    parts = os.path.normpath(path).split(os.sep)
+    if len(parts) >= 3 and parts[-2] == "thumbnails":
+        try:
+            return int(parts[-3])
+        except ValueError:
+            return None
+    return None
+
+
+class ThumbnailCache:
+    def __init__(
+        self,
+        root: str = "storage",
+        *,
+        max_bytes: int = 0,
+        event_max_bytes: int = 0,
+    ) -> None:
+        self.root = root
+        self.max_bytes = max(0, int(max_bytes))
+        self.event_max_bytes = max(0, int(event_max_bytes))
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple[Optional[int], int]]" = OrderedDict()
+        self._event_bytes: dict[Optional[int], int] = {}
+        self._bytes = 0
+        self._loaded = False
+        self._loader: Optional[threading.Thread] = None
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "evicted_bytes": 0}
+
+    def hit(self, path: str) -> None:
+        """A persisted thumbnail was served; mark it most recently used."""
+        with self._lock:
+            self._stats["hits"] += 1
+            if path in self._entries:
+                self._entries.move_to_end(path)
+                return
+            if not self._loaded:
+                return  # the scan will pick it up
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        # Rendered by another process (e.g. the media job worker)
+        with self._lock:
+            if path not in self._entries:
+                self._add(path, _event_of(path), size)
+
+    def miss(self) -> None:
+        """A request found no persisted thumbnail and had to wait for a render."""
+        with self._lock:
+            self._stats["misses"] += 1
+
+    def store(self, paths: Iterable[str]) -> list[str]:
+        """Record freshly rendered files, then evict down to the budget.
+
+        Blocking (directory scan on first use, unlinks); call it from a worker
+        thread. Returns the evicted paths.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            for path in paths:
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    continue
+                self._stats["stores"] += 1
+                self._add(path, _event_of(path), size)
+            victims = self._select_victims()
+        return self._evict(victims)
+
+    def load_in_background(self) -> None:
+        """Start building the index on a daemon thread (app startup)."""
+        with self._lock:
+            if self._loaded or self._loader is not None:
+                return
+            self._loader = threading.Thread(
+                target=self._ensure_loaded, name="thumb-cache-index", daemon=True
+            )
+            self._loader.start()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_ratio": (self._stats["hits"] / lookups) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "event_max_bytes": self.event_max_bytes,
+                "indexed": self._loaded,
+            }
+
+    # -- internals -------------------------------------------------------
+
+    def _add(self, path: str, event_id: Optional[int], size: int) -> None:
+        old = self._entries.pop(path, None)
+        if old is not None:
+            self._bytes -= old[1]
+            self._event_bytes[old[0]] = self._event_bytes.get(old[0], 0) - old[1]
+        self._entries[path] = (event_id, size)
+        self._bytes += size
+        self._event_bytes[event_id] = self._event_bytes.get(event_id, 0) + size
+
+    def _drop(self, path: str) -> Optional[tuple[Optional[int], int]]:
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+            self._event_bytes[entry[0]] = self._event_bytes.get(entry[0], 0) - entry[1]
+        return entry
+
+    def _ensure_loaded(self) -> None:
+        with self._lock:
+            if self._loaded:
+                return
+            loader = self._loader
+        if loader is not None and loader is not threading.current_thread():
+            loader.join()  # the startup scan is under way; don't run a second one
+            if self._loaded:
+                return
+        found = []
+        try:
+            for user_dir in os.scandir(self.root):
+                if not user_dir.is_dir():
+                    continue
+                for event_dir in os.scandir(user_dir.path):
+                    tdir = os.path.join(event_dir.path, "thumbnails")
+                    if not event_dir.is_dir() or not os.path.isdir(tdir):
+                        continue
+                    for f in os.scandir(tdir):
+                        if f.is_file() and not f.name.endswith(".tmp"):
+                            st = f.stat()
+                            found.append((max(st.st_mtime, st.st_atime), f.path, st.st_size))
+        except OSError:
+            logger.warning(f"Thumbnail cache scan of {self.root} incomplete")
+        found.sort()
+        with self._lock:
+            if self._loaded:
+                return
+            # Files recorded while scanning are newer than anything found on disk
+            recent = list(self._entries.items())
+            self._entries.clear()
+            self._event_bytes.clear()
+            self._bytes = 0
+            for _, path, size in found:
+                self._add(path, _event_of(path), size)
+            for path, (event_id, size) in recent:
+                self._add(path, event_id, size)
+            self._loaded = True
+
+    def _select_victims(self) -> list[tuple[str, Optional[int], int]]:
+        victims = []
+        if self.event_max_bytes:
+            over = {e for e, b in self._event_bytes.items() if b > self.event_max_bytes}
+            for path in [p for p, (e, _) in self._entries.items() if e in over]:
+                event_id, size = self._entries[path]
+                if self._event_bytes.get(event_id, 0) <= self.event_max_bytes:
+                    continue
+                self._drop(path)
+                victims.append((path, event_id, size))
+        while self.max_bytes and self._bytes > self.max_bytes and self._entries:
+            path = next(iter(self._entries))
+            event_id, size = self._drop(path)
+            victims.append((path, event_id, size))
+        return victims
+
+    def _evict(self, victims: list[tuple[str, Optional[int], int]]) -> list[str]:
+        freed: dict[int, int] = {}
+        evicted = []
+        for path, event_id, size in victims:
+            try:
+                os.remove(path)
+            except OSError:
+                continue  # already gone (cleanup or another worker)
+            evicted.append(path)
+            if event_id is not None:
+                freed[event_id] = freed.get(event_id, 0) + size
+        with self._lock:
+            self._stats["evictions"] += len(evicted)
+            self._stats["evicted_bytes"] += sum(freed.values())
+        if freed:
+            from app.services.storage_accounting import record_usage_detached
+
+            for event_id, size in freed.items():
+                record_usage_detached(event_id, -size)
+        return evicted
+
+
+_cache: Optional[ThumbnailCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_thumb_cache() -> ThumbnailCache:
+    """Process-wide cache sized by ``THUMB_CACHE_MAX_BYTES``/``THUMB_CACHE_EVENT_MAX_BYTES``."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ThumbnailCache(
+                max_bytes=int(getattr(settings, "THUMB_CACHE_MAX_BYTES", 0) or 0),
+                event_max_bytes=int(getattr(settings, "THUMB_CACHE_EVENT_MAX_BYTES", 0) or 0),
+            )
+        return _cache
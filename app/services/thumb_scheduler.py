@@ -0,0 +1,516 @@
+"""Bounded, prioritized thumbnail rendering.
+
+All in-process thumbnail work goes through one :class:`ThumbnailScheduler`: a
+fixed-size process pool fed from a priority heap. Only ``workers`` renders are
+ever in flight, so a burst of uploads can't oversubscribe the CPU, and a
+viewer waiting on a ``/thumbs`` miss (``PRIORITY_INTERACTIVE``) is served ahead
+of ingest and backfill work. Requests for an output path that is already
+pending share one render (and get promoted if the new request is more urgent).
+Ingest queues each image as one ladder task (:meth:`ThumbnailScheduler.submit_ladder`)
+so the original is decoded once for every width. Video posters are single-flight
+per file (:meth:`ThumbnailScheduler.submit_video`): one ffmpeg frame extraction,
+with the other widths downscaled from it.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+
+from app.core.settings import settings
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_INGEST = 10
+PRIORITY_BACKFILL = 20
+
+KIND_IMAGE = "image"
+KIND_VIDEO = "video"
+KIND_LQIP = "lqip"
+KIND_LADDER = "ladder"
+
+logger = logging.getLogger(__name__)
+
+
+def render_thumbnail(kind: str, orig_path: str, out_path: str, width: int, blur: int = 0) -> bool:
+    """Pool entry point (module level so it can be pickled)."""
+    from app.services import thumbs
+
+    if kind == KIND_LQIP:
+        return thumbs.ensure_lqip(orig_path, out_path, width=int(width), blur=int(blur or 20))
+    if kind == KIND_VIDEO:
+        return thumbs.ensure_video_poster(orig_path, out_path, int(width))
+    return thumbs.ensure_image_thumbnail(orig_path, out_path, int(width))
+
+
+def render_ladder(orig_path: str, targets: tuple[tuple[int, str], ...]) -> bool:
+    """Pool entry point for :data:`KIND_LADDER`: every rung from one decode."""
+    from app.services import thumbs
+
+    written = thumbs.render_image_ladder(orig_path, targets)
+    return all(p in written for _w, p in targets)
+
+
+def render_video(orig_path: str, targets: tuple[tuple[int, str], ...]) -> bool:
+    """Pool entry point for :data:`KIND_VIDEO`: one frame extraction for every rung."""
+    from app.services import thumbs
+
+    written = thumbs.render_video_ladder(orig_path, targets)
+    return bool(written) and all(os.path.exists(p) for _w, p in targets)
+
+
+@dataclass
+class ThumbTask:
+    kind: str
+    orig_path: str
+    out_path: str
+    width: int
+    blur: int
+    priority: int
+    event_id: Optional[int]
+    file_id: Optional[int] = None
+    # (width, out_path) rungs of a KIND_LADDER/KIND_VIDEO task, widest (``out_path``) first
+    targets: tuple[tuple[int, str], ...] = ()
+    enqueued_at: float = field(default_factory=time.monotonic)
+    future: Future = field(default_factory=Future)
+
+    @property
+    def rungs(self) -> tuple[tuple[int, str], ...]:
+        return self.targets or ((self.width, self.out_path),)
+
+
+class ThumbnailScheduler:
+    def __init__(
+        self,
+        workers: int,
+        *,
+        executor_factory: Optional[Callable[[int], Executor]] = None,
+        on_complete: Optional[Callable[[ThumbTask, bool], None]] = None,
+    ) -> None:
+        self.workers = max(1, int(workers))
+        # Spawned, not forked: a fork of the web worker would inherit its threads
+        # (dispatcher, media-exec loop), locks and open connections
+        self._executor_factory = executor_factory or (
+            lambda n: ProcessPoolExecutor(
+                max_workers=n, mp_context=multiprocessing.get_context("spawn")
+            )
+        )
+        self._executor: Optional[Executor] = None
+        self._on_complete = on_complete
+        # Completion hooks (DB writes, cache eviction) run here, after the task's
+        # future resolves, so neither waiters nor other pool results queue behind them
+        self._hooks: Optional[ThreadPoolExecutor] = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="thumb-hooks")
+            if on_complete is not None
+            else None
+        )
+        self._lock = threading.Condition()
+        self._heap: list[tuple[int, int, str]] = []
+        self._pending: dict[str, ThumbTask] = {}  # queued, keyed by every output path
+        self._running: dict[str, ThumbTask] = {}
+        # Queued video render per original, and originals with one running; a queued
+        # render of a running original stays off the heap until that one finishes
+        self._videos: dict[str, ThumbTask] = {}
+        self._videos_running: set[str] = set()
+        self._seq = itertools.count()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._closed = False
+        self._stats = {
+            "submitted": 0,
+            "coalesced": 0,
+            "completed": 0,
+            "failed": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "render_seconds_total": 0.0,
+            "render_seconds_max": 0.0,
+        }
+
+    def submit(
+        self,
+        kind: str,
+        orig_path: str,
+        out_path: str,
+        width: int,
+        *,
+        priority: int = PRIORITY_INGEST,
+        blur: int = 0,
+        event_id: Optional[int] = None,
+        file_id: Optional[int] = None,
+    ) -> Future:
+        """Queue a render; resolves to True when ``out_path`` was written."""
+        if kind == KIND_VIDEO:
+            return self.submit_video(
+                orig_path,
+                [(width, out_path)],
+                priority=priority,
+                event_id=event_id,
+                file_id=file_id,
+            )
+        if os.path.exists(out_path):
+            done: Future = Future()
+            done.set_result(True)
+            return done
+        with self._lock:
+            self._stats["submitted"] += 1
+            task = self._pending.get(out_path) or self._running.get(out_path)
+            if task is not None:
+                self._stats["coalesced"] += 1
+                if out_path in self._pending and priority < task.priority:
+                    task.priority = priority
+                    heapq.heappush(self._heap, (priority, next(self._seq), task.out_path))
+                return task.future
+            task = ThumbTask(
+                kind, orig_path, out_path, int(width), int(blur), priority, event_id, file_id
+            )
+            self._enqueue(task)
+            return task.future
+
+    def submit_ladder(
+        self,
+        orig_path: str,
+        targets: Iterable[tuple[int, str]],
+        *,
+        priority: int = PRIORITY_INGEST,
+        event_id: Optional[int] = None,
+        file_id: Optional[int] = None,
+    ) -> Future:
+        """Queue an image's missing ``(width, out_path)`` rungs as one render.
+
+        The original is decoded once for all of them (see
+        :func:`~app.services.thumbs.render_image_ladder`). Every rung path is a key
+        of the task, so a single-width request for one of them shares (and can
+        promote) the ladder; rungs already queued on their own are left to that
+        render. Resolves to True when the rungs were written.
+        """
+        rungs = sorted(((int(w), p) for w, p in targets if not os.path.exists(p)), reverse=True)
+        with self._lock:
+            rungs = [(w, p) for w, p in rungs if p not in self._pending and p not in self._running]
+            if not rungs:
+                done: Future = Future()
+                done.set_result(True)
+                return done
+            self._stats["submitted"] += 1
+            width, out_path = rungs[0]
+            task = ThumbTask(
+                KIND_LADDER,
+                orig_path,
+                out_path,
+                width,
+                0,
+                priority,
+                event_id,
+                file_id,
+                targets=tuple(rungs),
+            )
+            self._enqueue(task)
+            return task.future
+
+    def submit_video(
+        self,
+        orig_path: str,
+        targets: Iterable[tuple[int, str]],
+        *,
+        priority: int = PRIORITY_INGEST,
+        event_id: Optional[int] = None,
+        file_id: Optional[int] = None,
+    ) -> Future:
+        """Queue posters for a video's missing ``(width, out_path)`` rungs.
+
+        Frame extraction is single-flight per original rather than per width:
+        rungs submitted while a render of the same video is queued join it (one
+        ffmpeg run, see :func:`~app.services.thumbs.render_video_ladder`), and a
+        render submitted while one is running waits for it, then downscales from
+        the poster it wrote. Resolves to True when the rungs were written.
+        """
+        rungs = sorted(((int(w), p) for w, p in targets if not os.path.exists(p)), reverse=True)
+        if not rungs:
+            done: Future = Future()
+            done.set_result(True)
+            return done
+        with self._lock:
+            self._stats["submitted"] += 1
+            new = [(w, p) for w, p in rungs if p not in self._pending and p not in self._running]
+            task = self._videos.get(orig_path)
+            if task is None and not new:
+                self._stats["coalesced"] += 1
+                path = rungs[0][1]
+                return (self._pending.get(path) or self._running[path]).future
+            if task is not None:
+                self._stats["coalesced"] += 1
+                queued = orig_path not in self._videos_running
+                widest = task.out_path
+                if new:
+                    task.targets = tuple(sorted(set(task.targets) | set(new), reverse=True))
+                    task.width, task.out_path = task.targets[0]
+                    for _w, path in new:
+                        self._pending[path] = task
+                if priority < task.priority:
+                    task.priority = priority
+                    widest = None
+                if queued and task.out_path != widest:
+                    heapq.heappush(self._heap, (task.priority, next(self._seq), task.out_path))
+                    self._lock.notify()
+                return task.future
+            width, out_path = new[0]
+            task = ThumbTask(
+                KIND_VIDEO,
+                orig_path,
+                out_path,
+                width,
+                0,
+                priority,
+                event_id,
+                file_id,
+                targets=tuple(new),
+            )
+            self._videos[orig_path] = task
+            if orig_path in self._videos_running and not self._closed:
+                for _w, path in task.rungs:
+                    self._pending[path] = task
+            else:
+                self._enqueue(task)
+            return task.future
+
+    def metrics(self) -> dict:
+        with self._lock:
+            done = self._stats["completed"] + self._stats["failed"]
+            pending = {id(t): t for t in self._pending.values()}.values()
+            by_priority: dict[int, int] = {}
+            for t in pending:
+                by_priority[t.priority] = by_priority.get(t.priority, 0) + 1
+            return {
+                "workers": self.workers,
+                "queue_depth": len(pending),
+                "queue_depth_by_priority": by_priority,
+                "in_flight": self._in_flight(),
+                "submitted": self._stats["submitted"],
+                "coalesced": self._stats["coalesced"],
+                "completed": self._stats["completed"],
+                "failed": self._stats["failed"],
+                "wait_seconds_avg": (self._stats["wait_seconds_total"] / done) if done else 0.0,
+                "wait_seconds_max": self._stats["wait_seconds_max"],
+                "render_seconds_avg": (
+                    (self._stats["render_seconds_total"] / done) if done else 0.0
+                ),
+                "render_seconds_max": self._stats["render_seconds_max"],
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop dispatching and the pool; queued renders resolve to False.
+
+        With ``wait`` the renders already running finish (and their outputs are
+        renamed into place) before the worker processes exit.
+        """
+        with self._lock:
+            self._closed = True
+            dropped = {id(t): t for t in self._pending.values()}.values()
+            self._pending.clear()
+            self._heap.clear()
+            self._videos.clear()
+            self._lock.notify_all()
+        for task in dropped:
+            if not task.future.done():
+                task.future.set_result(False)
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+        if self._hooks is not None:
+            self._hooks.shutdown(wait=wait)
+
+    # -- internals -------------------------------------------------------
+
+    def _in_flight(self) -> int:
+        # A running ladder is listed once per rung
+        return len({id(t) for t in self._running.values()})
+
+    def _enqueue(self, task: ThumbTask) -> None:
+        # Caller holds the lock. The heap only carries the primary key (out_path).
+        if self._closed:
+            task.future.set_result(False)
+            return
+        for _w, path in task.rungs:
+            self._pending[path] = task
+        heapq.heappush(self._heap, (task.priority, next(self._seq), task.out_path))
+        self._ensure_dispatcher()
+        self._lock.notify()
+
+    def _ensure_dispatcher(self) -> None:
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            self._dispatcher = threading.Thread(
+                target=self._dispatch_loop, name="thumb-scheduler", daemon=True
+            )
+            self._dispatcher.start()
+
+    def _next_task(self) -> Optional[ThumbTask]:
+        # Heap entries for promoted tasks are duplicated; skip stale ones
+        while self._heap:
+            priority, _seq, key = heapq.heappop(self._heap)
+            task = self._pending.get(key)
+            if task is not None and task.priority == priority and task.out_path == key:
+                for _w, path in task.rungs:
+                    del self._pending[path]
+                return task
+        return None
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            with self._lock:
+                while not self._closed and (
+                    not self._heap or self._in_flight() >= self.workers
+                ):
+                    self._lock.wait()
+                if self._closed:
+                    return
+                task = self._next_task()
+                if task is None:
+                    continue
+                for _w, path in task.rungs:
+                    self._running[path] = task
+                if task.kind == KIND_VIDEO:
+                    self._videos.pop(task.orig_path, None)
+                    self._videos_running.add(task.orig_path)
+                if self._executor is None:
+                    self._executor = self._executor_factory(self.workers)
+                executor = self._executor
+            started = time.monotonic()
+            try:
+                if task.kind == KIND_LADDER:
+                    fut = executor.submit(render_ladder, task.orig_path, task.targets)
+                elif task.kind == KIND_VIDEO:
+                    fut = executor.submit(render_video, task.orig_path, task.rungs)
+                else:
+                    fut = executor.submit(
+                        render_thumbnail,
+                        task.kind,
+                        task.orig_path,
+                        task.out_path,
+                        task.width,
+                        task.blur,
+                    )
+            except Exception as e:
+                self._finish(task, started, None, e)
+                continue
+            fut.add_done_callback(
+                lambda f, t=task, s=started: self._finish(t, s, f, None)
+            )
+
+    def _finish(
+        self,
+        task: ThumbTask,
+        started: float,
+        fut: Optional[Future],
+        error: Optional[BaseException],
+    ) -> None:
+        ok = False
+        if error is None and fut is not None:
+            try:
+                ok = bool(fut.result())
+            except Exception as e:
+                error = e
+        now = time.monotonic()
+        with self._lock:
+            for _w, path in task.rungs:
+                self._running.pop(path, None)
+            if task.kind == KIND_VIDEO:
+                self._videos_running.discard(task.orig_path)
+                waiting = self._videos.get(task.orig_path)
+                if waiting is not None:
+                    heapq.heappush(
+                        self._heap, (waiting.priority, next(self._seq), waiting.out_path)
+                    )
+            self._stats["completed" if ok else "failed"] += 1
+            wait = started - task.enqueued_at
+            render = now - started
+            self._stats["wait_seconds_total"] += wait
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], wait)
+            self._stats["render_seconds_total"] += render
+            self._stats["render_seconds_max"] = max(self._stats["render_seconds_max"], render)
+            self._lock.notify()
+        if error is not None:
+            logger.warning(f"Thumbnail render failed for {task.out_path}: {error}")
+        if not task.future.done():
+            task.future.set_result(ok)
+        if self._hooks is not None:
+            try:
+                self._hooks.submit(self._run_hook, task, ok)
+            except RuntimeError:
+                pass  # shut down
+
+    def _run_hook(self, task: ThumbTask, ok: bool) -> None:
+        try:
+            self._on_complete(task, ok)
+        except Exception:
+            logger.exception("thumbnail completion hook failed")
+
+
+def _record_usage(task: ThumbTask, ok: bool) -> None:
+    if not ok:
+        return
+    paths = [p for _w, p in task.rungs]
+    if task.kind in (KIND_IMAGE, KIND_LADDER):
+        # Alternative encodings are rendered alongside each JPEG
+        from app.services.thumbs import alt_thumb_exts, thumb_variant_path
+
+        jpegs = [p for p in paths if p.endswith(".jpg")]
+        paths += [thumb_variant_path(p, ext) for p in jpegs for ext in alt_thumb_exts()]
+    size = 0
+    for path in paths:
+        try:
+            size += os.path.getsize(path)
+        except OSError:
+            pass
+    if not size:
+        return
+    if task.event_id is not None:
+        from app.services.storage_accounting import record_usage_detached
+
+        record_usage_detached(int(task.event_id), size)
+    # May evict older thumbnails past the cache budget (and give back their usage)
+    from app.services.thumb_cache import get_thumb_cache
+
+    get_thumb_cache().store(paths)
+
+
+def _after_render(task: ThumbTask, ok: bool) -> None:
+    _record_usage(task, ok)
+    if not ok or task.file_id is None or task.kind == KIND_LQIP:
+        return
+    # The smallest rung is the cheapest source for the inline gallery placeholder
+    from app.services.upload_ingest import THUMB_WIDTHS
+
+    smallest = [p for w, p in task.rungs if w == min(THUMB_WIDTHS)]
+    if smallest:
+        from app.services.placeholders import record_placeholder_detached
+
+        record_placeholder_detached(int(task.file_id), smallest[0])
+
+
+_scheduler: Optional[ThumbnailScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> ThumbnailScheduler:
+    """Process-wide scheduler sized by ``THUMB_WORKERS``."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ThumbnailScheduler(
+                int(getattr(settings, "THUMB_WORKERS", 2) or 1), on_complete=_after_render
+            )
+        return _scheduler
+
+
+def shutdown_scheduler(wait: bool = True) -> None:
+    """Shut down the process-wide scheduler, if one was started (app shutdown hook)."""
+    global _scheduler
+    with _scheduler_lock:
+        scheduler, _scheduler = _scheduler, None
+    if scheduler is not None:
+        scheduler.shutdown(wait=wait)
@@ -1,8 +1,10 @@
 import glob
+import math
 import os
-import subprocess
 from typing import Iterable
 
+from app.services.media_exec import run_transcode
+
 
 def _thumbs_dir(user_id: int, event_id: int) -> str:
     return os.path.join("storage", str(user_id), str(event_id), "thumbnails")
@@ -12,37 +14,190 @@ def image_thumb_path(user_id: int, event_id: int, file_id: int, width: int) -> s
     return os.path.join(_thumbs_dir(user_id, event_id), f"{file_id}_{width}.jpg")
 
 
+# Encoder per thumbnail file extension. JPEG is what `/thumbs/{id}.jpg` falls
+# back to; the others are alternative encodings persisted next to it.
+THUMB_ENCODINGS = {
+    ".jpg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+    ".webp": ("WEBP", "image/webp", {"quality": 75, "method": 4}),
+    ".avif": ("AVIF", "image/avif", {"quality": 60, "speed": 8}),
+}
+# Preference order when a client accepts several
+ALT_THUMB_EXTS = (".avif", ".webp")
+
+_pil_support: dict[str, bool] = {}
+
+
+def _pil_supports(ext: str) -> bool:
+    if ext not in _pil_support:
+        try:
+            from PIL import features  # type: ignore
+
+            _pil_support[ext] = bool(features.check(ext.lstrip(".")))
+        except Exception:
+            _pil_support[ext] = False
+    return _pil_support[ext]
+
+
+def alt_thumb_exts() -> tuple[str, ...]:
+    """Alternative encodings to persist: ``THUMB_EXTRA_FORMATS`` that Pillow can write."""
+    from app.core.settings import settings
+
+    wanted = {
+        f".{str(f).lower().lstrip('.')}" for f in getattr(settings, "THUMB_EXTRA_FORMATS", ())
+    }
+    return tuple(ext for ext in ALT_THUMB_EXTS if ext in wanted and _pil_supports(ext))
+
+
+def snap_thumb_width(width: int) -> int:
+    """Smallest ``THUMB_WIDTHS`` rung at least ``width`` wide (the widest rung beyond it)."""
+    from app.core.settings import settings
+
+    ladder = sorted(int(w) for w in getattr(settings, "THUMB_WIDTHS", (480, 720, 960, 1440)))
+    for rung in ladder:
+        if rung >= int(width):
+            return rung
+    return ladder[-1]
+
+
+def thumb_variant_path(jpeg_path: str, ext: str) -> str:
+    """Path of the ``ext`` encoding persisted alongside a ``.jpg`` thumbnail."""
+    return os.path.splitext(jpeg_path)[0] + ext
+
+
+def negotiate_thumb_ext(accept: str | None) -> str:
+    """Best persisted encoding for an ``Accept`` header; ``.jpg`` unless explicitly accepted.
+
+    Wildcards don't count: ``*/*`` doesn't mean the client decodes WebP or AVIF.
+    """
+    accepted = set()
+    for part in (accept or "").lower().split(","):
+        mime, *params = (p.strip() for p in part.split(";"))
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(mime)
+    for ext in alt_thumb_exts():
+        if THUMB_ENCODINGS[ext][1] in accepted:
+            return ext
+    return ".jpg"
+
+
+def thumb_media_type(path: str) -> str:
+    return THUMB_ENCODINGS.get(os.path.splitext(path)[1].lower(), THUMB_ENCODINGS[".jpg"])[1]
+
+
+def _save_thumb(im, out_path: str) -> None:
+    """Encode ``im`` by ``out_path``'s extension to a temp file and rename it into place."""
+    fmt, _, opts = THUMB_ENCODINGS.get(
+        os.path.splitext(out_path)[1].lower(), THUMB_ENCODINGS[".jpg"]
+    )
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp = out_path + ".tmp"
+    im.save(tmp, format=fmt, **opts)
+    os.replace(tmp, out_path)
+
+
+def render_image_ladder(
+    orig_path: str,
+    targets: Iterable[tuple[int, str]],
+    *,
+    alt_exts: Iterable[str] | None = None,
+) -> list[str]:
+    """Decode ``orig_path`` once and write a thumbnail per ``(width, out_path)``.
+
+    JPEGs are decoded with ``draft()`` at the smallest DCT scale (1/2, 1/4, 1/8)
+    that still covers the widest target, so the full-resolution pixels are never
+    materialised. Rungs are produced widest first, each resized from the previous
+    one, and every output is written to a temp file and renamed into place.
+    Each ``.jpg`` target also gets the ``alt_exts`` encodings (default:
+    :func:`alt_thumb_exts`) from the same pixels. The encoding follows each
+    path's extension. Returns the paths written.
+    """
+    from PIL import Image, ImageOps  # type: ignore
+
+    rungs = sorted(((int(w), p) for w, p in targets), reverse=True)
+    if not rungs:
+        return []
+    alt_exts = alt_thumb_exts() if alt_exts is None else tuple(alt_exts)
+    with Image.open(orig_path) as im:
+        # Displayed size: EXIF orientations 5-8 swap width and height
+        rotated = im.getexif().get(0x0112, 1) in (5, 6, 7, 8)
+        src_w, src_h = (im.height, im.width) if rotated else im.size
+        scale = min(1.0, rungs[0][0] / float(max(1, src_w)))
+        need = (max(1, math.ceil(src_w * scale)), max(1, math.ceil(src_h * scale)))
+        im.draft(im.mode, need[::-1] if rotated else need)  # no-op for non-JPEG
+        current = ImageOps.exif_transpose(im).convert("RGB")
+    written = []
+    for width, out_path in rungs:
+        # Avoid upscaling
+        w = min(width, src_w) if src_w else width
+        if w <= 0:
+            w = width
+        size = (w, max(1, int(src_h * (w / float(max(1, src_w))))))
+        if current.size != size:
+            current = current.resize(size, Image.Resampling.LANCZOS)
+        _save_thumb(current, out_path)
+        written.append(out_path)
+        if out_path.lower().endswith(".jpg"):
+            for ext in alt_exts:
+                variant = thumb_variant_path(out_path, ext)
+                try:
+                    _save_thumb(current, variant)
+                    written.append(variant)
+                except Exception:
+                    # The JPEG is the fallback; a failed extra encoding is skipped
+                    pass
+    return written
+
+
 def ensure_image_thumbnail(orig_path: str, out_path: str, width: int) -> bool:
     try:
-        from PIL import Image, ImageOps  # type: ignore
-
-        os.makedirs(os.path.dirname(out_path), exist_ok=True)
-        with Image.open(orig_path) as im:
-            im = ImageOps.exif_transpose(im)
-            # Avoid upscaling
-            w = min(int(width), int(im.width)) if im.width else int(width)
-            if w <= 0:
-                w = int(width)
-            ratio = w / float(max(1, im.width))
-            new_size = (w, max(1, int(im.height * ratio)))
-            im = im.convert("RGB").resize(new_size, Image.Resampling.LANCZOS)
-            tmp = out_path + ".tmp"
-            im.save(tmp, format="JPEG", quality=82, optimize=True, progressive=True)
-            os.replace(tmp, out_path)
-        return True
+        return bool(render_image_ladder(orig_path, [(int(width), out_path)]))
     except Exception:
         return False
 
 
+def _larger_sibling(out_path: str, width: int) -> str | None:
+    """Smallest already-rendered ``{file_id}_{w}.jpg`` next to ``out_path`` with w > width."""
+    tdir, name = os.path.split(out_path)
+    file_id = name.rsplit("_", 1)[0]
+    best = None
+    for p in glob.glob(os.path.join(tdir, f"{file_id}_*.jpg")):
+        try:
+            w = int(os.path.basename(p)[len(file_id) + 1 : -4])
+        except ValueError:
+            continue
+        if w > int(width) and (best is None or w < best[0]):
+            best = (w, p)
+    return best[1] if best else None
+
+
 def ensure_video_poster(orig_path: str, out_path: str, width: int) -> bool:
     """Use ffmpeg if available to extract a poster frame and resize to width.
     Requires ffmpeg on PATH. Returns True if poster created.
+
+    When a wider poster of the same file already exists it is downscaled
+    instead, so ffmpeg runs once per video rather than once per width.
     """
+    sibling = _larger_sibling(out_path, width)
+    if sibling and ensure_image_thumbnail(sibling, out_path, width):
+        return True
+    root, ext = os.path.splitext(out_path)
+    tmp = f"{root}.part{ext}"
     try:
         os.makedirs(os.path.dirname(out_path), exist_ok=True)
         # Extract at 1s to skip black frames; scale maintaining aspect (even heights)
         cmd = [
             "ffmpeg",
+            "-nostdin",
+            "-v",
+            "error",
             "-y",
             "-ss",
             "1",
@@ -52,13 +207,44 @@ def ensure_video_poster(orig_path: str, out_path: str, width: int) -> bool:
             "1",
             "-vf",
             f"scale={int(width)}:-2",
-            out_path,
+            tmp,
         ]
-        # Suppress ffmpeg output
-        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-        return os.path.exists(out_path)
+        # Bounded and killed on timeout by the media supervisor; a killed run
+        # leaves only the partial temp file, which is removed below.
+        if run_transcode(cmd).ok and os.path.exists(tmp):
+            os.replace(tmp, out_path)
+            return True
+        return False
     except Exception:
         return False
+    finally:
+        if os.path.exists(tmp):
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+def render_video_ladder(orig_path: str, targets: Iterable[tuple[int, str]]) -> list[str]:
+    """Extract one poster frame for the widest ``(width, out_path)`` and downscale the rest.
+
+    ffmpeg runs at most once per call; narrower posters are resized from the widest
+    with :func:`render_image_ladder`. Returns the paths written.
+    """
+    rungs = sorted(((int(w), p) for w, p in targets), reverse=True)
+    if not rungs:
+        return []
+    width, widest = rungs[0]
+    if not ensure_video_poster(orig_path, widest, width):
+        return []
+    written = [widest]
+    rest = [(w, p) for w, p in rungs[1:] if not os.path.exists(p)]
+    if rest:
+        try:
+            written += render_image_ladder(widest, rest, alt_exts=())
+        except Exception:
+            pass
+    return written
 
 
 def ensure_lqip(orig_path: str, out_path: str, width: int = 40, blur: int = 20) -> bool:
@@ -112,15 +298,21 @@ def ensure_lqip(orig_path: str, out_path: str, width: int = 40, blur: int = 20)
                 return False
 
 
-def cleanup_thumbnails(user_id: int, event_id: int, file_id: int) -> None:
-    """Remove all persisted thumbnails for a file id."""
+def cleanup_thumbnails(user_id: int, event_id: int, file_id: int) -> int:
+    """Remove all persisted thumbnails (every encoding) for a file id; returns the bytes freed."""
     tdir = _thumbs_dir(user_id, event_id)
-    pattern = os.path.join(tdir, f"{file_id}_*.jpg")
-    for p in glob.glob(pattern):
+    freed = 0
+    paths = (
+        p for ext in THUMB_ENCODINGS for p in glob.glob(os.path.join(tdir, f"{file_id}_*{ext}"))
+    )
+    for p in paths:
         try:
+            size = os.path.getsize(p)
             os.remove(p)
+            freed += size
         except Exception:
             pass
+    return freed
 
 
 def generate_all_thumbs_for_file(
@@ -130,21 +322,44 @@ def generate_all_thumbs_for_file(
     file_type: str,
     file_name: str,
     widths: Iterable[int] = (480, 720, 960, 1440),
-) -> None:
-    """Generate image thumbnails or video posters for desired widths."""
+) -> int:
+    """Generate image thumbnails or video posters for desired widths.
+
+    Images are decoded once for all widths (see :func:`render_image_ladder`).
+
+    Returns the bytes written for newly created thumbnails (for usage accounting).
+    """
     base = os.path.join("storage", str(user_id), str(event_id))
     orig_path = os.path.join(base, file_name)
     if not os.path.exists(orig_path):
-        return
+        return 0
     is_image = (file_type or "").startswith("image")
     is_video = (file_type or "").startswith("video")
-    for w in widths:
+    created = 0
+    if is_image:
+        targets = [(int(w), image_thumb_path(user_id, event_id, file_id, int(w))) for w in widths]
+        missing = [(w, p) for w, p in targets if not os.path.exists(p)]
+        try:
+            written = render_image_ladder(orig_path, missing)
+        except Exception:
+            written = []
+        for out_path in written:
+            try:
+                created += os.path.getsize(out_path)
+            except OSError:
+                pass
+        return created
+    if not is_video:
+        return created
+    # Widest first so video posters after the first are downscaled, not re-extracted
+    for w in sorted(widths, reverse=True):
         out_path = image_thumb_path(user_id, event_id, file_id, int(w))
-        if is_image:
-            if os.path.exists(out_path):
-                continue
-            ensure_image_thumbnail(orig_path, out_path, int(w))
-        elif is_video:
-            if os.path.exists(out_path):
-                continue
-            ensure_video_poster(orig_path, out_path, int(w))
\ No newline at end of file
+        if os.path.exists(out_path):
+            continue
+        ok = ensure_video_poster(orig_path, out_path, int(w))
+        if ok:
+            try:
+                created += os.path.getsize(out_path)
+            except OSError:
+                pass
+    return created
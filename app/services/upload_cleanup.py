@@ -0,0 +1,179 @@
+"""Unfinished guest uploads: the storage they reserve and their removal once abandoned.
+
+A ResumableUpload row that hasn't become a file yet (a tus upload between
+PATCHes, or a presigned direct-to-bucket upload awaiting finalize) reserves its
+full length against the event's storage limit until it completes or expires.
+Expired uploads are removed by ``scripts/cleanup_uploads.py`` on a schedule
+(see DB_AGENT_JOBS.md).
+"""
+from __future__ import annotations
+
+import glob
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import and_, func, not_, or_
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.models.resumable_upload import ResumableUpload
+from app.services.upload_ingest import (
+    DIRECT_FINALIZING_STATUS,
+    DIRECT_UPLOAD_STATUS,
+    RESUMABLE_RECEIVING_STATUS,
+    RESUMABLE_UPLOAD_STATUS,
+    STAGING_DIRNAME,
+)
+
+logger = logging.getLogger(__name__)
+
+# How long past its policy's expiry a presigned upload may still be finalized
+DIRECT_UPLOAD_GRACE = timedelta(hours=24)
+
+RESUMABLE_PENDING_STATUSES = (RESUMABLE_UPLOAD_STATUS, RESUMABLE_RECEIVING_STATUS)
+DIRECT_PENDING_STATUSES = (DIRECT_UPLOAD_STATUS, DIRECT_FINALIZING_STATUS)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def resumable_expiry() -> timedelta:
+    return timedelta(seconds=int(getattr(settings, "RESUMABLE_UPLOAD_EXPIRES_SECONDS", 86400)))
+
+
+def _stale_resumable(now: datetime):
+    return and_(
+        ResumableUpload.Status.in_(RESUMABLE_PENDING_STATUSES),
+        ResumableUpload.UpdatedAt < now - resumable_expiry(),
+    )
+
+
+def _stale_direct(now: datetime, grace: timedelta = DIRECT_UPLOAD_GRACE):
+    expires = timedelta(seconds=int(getattr(settings, "S3_DIRECT_UPLOAD_EXPIRES_SECONDS", 900)))
+    return or_(
+        and_(
+            ResumableUpload.Status == DIRECT_UPLOAD_STATUS,
+            ResumableUpload.CreatedAt < now - expires - grace,
+        ),
+        and_(
+            ResumableUpload.Status == DIRECT_FINALIZING_STATUS,
+            ResumableUpload.UpdatedAt < now - grace,
+        ),
+    )
+
+
+def pending_upload_bytes(db: Session, event_id: int, now: Optional[datetime] = None) -> int:
+    """Bytes reserved by the event's unfinished, unexpired uploads (not yet in its usage)."""
+    now = now or _utcnow()
+    total = (
+        db.query(func.coalesce(func.sum(ResumableUpload.Length), 0))
+        .filter(
+            ResumableUpload.EventID == event_id,
+            ResumableUpload.Status.in_(RESUMABLE_PENDING_STATUSES + DIRECT_PENDING_STATUSES),
+            not_(_stale_resumable(now)),
+            not_(_stale_direct(now)),
+        )
+        .scalar()
+    )
+    return int(total or 0)
+
+
+def _expire(db: Session, stale, remove, batch_size: int) -> int:
+    """Remove rows matching ``stale`` in UploadID order, their bytes first via ``remove``."""
+    removed = 0
+    last_id = ""
+    while True:
+        rows = (
+            db.query(ResumableUpload.UploadID, ResumableUpload.StagingPath)
+            .filter(stale, ResumableUpload.UploadID > last_id)
+            .order_by(ResumableUpload.UploadID)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        remove([str(r[1]) for r in rows])
+        # Re-check the predicate: a request may have claimed a row since the SELECT
+        removed += (
+            db.query(ResumableUpload)
+            .filter(ResumableUpload.UploadID.in_([r[0] for r in rows]), stale)
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+    return removed
+
+
+def expire_direct_uploads(
+    db: Session,
+    s3_service,
+    *,
+    grace: timedelta = DIRECT_UPLOAD_GRACE,
+    now: Optional[datetime] = None,
+    batch_size: int = 1000,
+) -> int:
+    """Delete presigned uploads that were never finalized, with their incoming/ objects.
+
+    A row is stale once its policy has been expired for ``grace``: nothing can be
+    written to its key any more and the client has had a day to call finalize. Rows
+    left ``finalizing`` by a crashed request are stale ``grace`` after their last
+    update. Objects are deleted before rows, so an interrupted run is picked up
+    again next time. Returns the number of uploads removed.
+    """
+    removed = _expire(
+        db, _stale_direct(now or _utcnow(), grace), s3_service.delete_many, batch_size
+    )
+    if removed:
+        logger.info(f"Expired {removed} unfinished direct uploads")
+    return removed
+
+
+def _remove_paths(paths: list[str]) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove staged upload {path}: {e}")
+
+
+def expire_resumable_uploads(
+    db: Session, *, now: Optional[datetime] = None, batch_size: int = 1000
+) -> int:
+    """Delete tus uploads idle for ``RESUMABLE_UPLOAD_EXPIRES_SECONDS`` and their .part files.
+
+    PATCH refuses expired uploads, so nothing appends to a file once it qualifies.
+    Returns the number of uploads removed.
+    """
+    removed = _expire(db, _stale_resumable(now or _utcnow()), _remove_paths, batch_size)
+    if removed:
+        logger.info(f"Expired {removed} idle resumable uploads")
+    return removed
+
+
+def remove_stale_staging_files(
+    root: str = "storage", *, older_than: Optional[timedelta] = None
+) -> int:
+    """Delete files left in event staging folders (``uploads/.staging``) by crashed requests.
+
+    Form uploads stage and finish within one request, and tus uploads touch their
+    file on every PATCH, so anything untouched for longer than the resumable expiry
+    is abandoned. Returns the number of files removed.
+    """
+    cutoff = time.time() - (older_than or resumable_expiry()).total_seconds()
+    stale = []
+    for path in glob.glob(os.path.join(root, "*", "*", "uploads", STAGING_DIRNAME, "*")):
+        try:
+            if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                stale.append(path)
+        except OSError:
+            continue
+    _remove_paths(stale)
+    if stale:
+        logger.info(f"Removed {len(stale)} abandoned staging files")
+    return len(stale)
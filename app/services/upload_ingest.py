@@ -0,0 +1,582 @@
+"""Streaming ingest helpers shared by guest and owner uploads.
+
+Each multipart part is copied in fixed-size chunks to a staging file under the
+event's ``uploads/.staging`` folder. The MIME type is sniffed from the leading
+bytes, the SHA-256 is computed while the bytes are written and the size limit
+is enforced mid-stream, so peak memory per upload is bounded by the chunk size
+rather than by the file size.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+from fastapi import UploadFile
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.models.event import FileMetadata
+from app.services.blob_store import acquire_blobs, blob_path, link_original, remove_files
+from app.services.media_probe import ImageRejected, probe_image
+from app.services.mime_utils import is_allowed_mime
+from app.services.thumbs import image_thumb_path
+
+# Bytes handed to libmagic for sniffing; magic numbers live well within this.
+SNIFF_BYTES = 8192
+STAGING_DIRNAME = ".staging"
+
+THUMB_WIDTHS = tuple(
+    sorted(int(w) for w in getattr(settings, "THUMB_WIDTHS", (480, 720, 960, 1440)))
+)
+
+# Leading bytes fetched from S3 to read EXIF for direct uploads; APP1 sits at the start.
+DIRECT_PREFIX_BYTES = 256 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StagedUpload:
+    """A file spooled to disk (or rejected) by :func:`stage_upload`."""
+
+    filename: str
+    mime: str
+    size: int = 0
+    checksum: Optional[str] = None
+    path: Optional[str] = None
+    rejected: Optional[str] = None  # "mime" | "size" | "image" when the part was refused
+
+
+def reject_unsafe_image(staged: StagedUpload) -> bool:
+    """Flag staged images that must not be decoded (bombs, truncated files).
+
+    Only the header and the end of the file are read. Returns True and sets
+    ``staged.rejected = "image"`` when the file is refused; the caller removes it.
+    """
+    if not staged.path or staged.rejected or not staged.mime.startswith("image/"):
+        return False
+    try:
+        probe_image(staged.path)
+    except ImageRejected as e:
+        logger.info(f"Rejected image {staged.filename!r}: {e}")
+        staged.rejected = "image"
+        return True
+    except Exception:
+        pass
+    return False
+
+
+def staging_dir(event_base_path: str) -> str:
+    return os.path.join(event_base_path, "uploads", STAGING_DIRNAME)
+
+
+def discard_staged(staged: Iterable[StagedUpload]) -> None:
+    """Remove staging files that were not moved into place (best-effort)."""
+    for s in staged:
+        if s.path and os.path.exists(s.path):
+            try:
+                os.remove(s.path)
+            except Exception:
+                pass
+
+
+async def stage_upload(
+    upload: UploadFile,
+    dest_dir: str,
+    *,
+    max_bytes: int = 0,
+    allowed_prefixes: Tuple[str, ...] = ("image/", "video/"),
+    chunk_size: int = 1024 * 1024,
+) -> StagedUpload:
+    """Stream ``upload`` into ``dest_dir`` and return what was staged.
+
+    The part is rejected without touching disk when the sniffed MIME type is not
+    allowed, and the partial staging file is removed as soon as more than
+    ``max_bytes`` have been received. Staged images that are decompression bombs
+    or truncated are removed and flagged ``rejected="image"``.
+    """
+    ctype = getattr(upload, "content_type", "") or ""
+    head = await upload.read(SNIFF_BYTES)
+    allowed, mime = is_allowed_mime(
+        head, allowed_prefixes=allowed_prefixes, fallback_content_type=ctype
+    )
+    staged = StagedUpload(filename=upload.filename or "upload.bin", mime=mime)
+    if allowed_prefixes and not allowed:
+        staged.rejected = "mime"
+        return staged
+
+    os.makedirs(dest_dir, exist_ok=True)
+    path = os.path.join(dest_dir, f"{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    chunk_size = max(SNIFF_BYTES, int(chunk_size or 0))
+    try:
+        with open(path, "wb") as fh:
+            chunk = head
+            while chunk:
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    break
+                digest.update(chunk)
+                fh.write(chunk)
+                chunk = await upload.read(chunk_size)
+    except Exception:
+        discard_staged([StagedUpload(filename=staged.filename, mime=mime, path=path)])
+        raise
+    staged.size = size
+    if max_bytes and size > max_bytes:
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+        staged.rejected = "size"
+        return staged
+    staged.path = path
+    staged.checksum = digest.hexdigest()
+    if reject_unsafe_image(staged):
+        discard_staged([staged])
+        staged.path = None
+    return staged
+
+
+def sniff_staged_file(
+    path: str,
+    filename: str,
+    *,
+    allowed_prefixes: Tuple[str, ...] = ("image/", "video/"),
+    fallback_content_type: Optional[str] = None,
+    chunk_size: int = 1024 * 1024,
+) -> StagedUpload:
+    """Describe a file assembled on disk by other means (e.g. resumable PATCHes).
+
+    Sniffs the MIME type from the leading bytes and hashes the file in chunks;
+    unsafe images are flagged as by :func:`reject_unsafe_image`.
+    """
+    with open(path, "rb") as fh:
+        head = fh.read(SNIFF_BYTES)
+        allowed, mime = is_allowed_mime(
+            head, allowed_prefixes=allowed_prefixes, fallback_content_type=fallback_content_type
+        )
+        staged = StagedUpload(filename=filename, mime=mime, path=path)
+        if allowed_prefixes and not allowed:
+            staged.rejected = "mime"
+            return staged
+        digest = hashlib.sha256(head)
+        size = len(head)
+        chunk_size = max(SNIFF_BYTES, int(chunk_size or 0))
+        while True:
+            chunk = fh.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+    staged.size = size
+    staged.checksum = digest.hexdigest()
+    reject_unsafe_image(staged)
+    return staged
+
+
+def safe_name(name: str) -> str:
+    name = (name or "").replace("\\", "/").split("/")[-1]
+    # allow alnum, dash, underscore, dot; strip others
+    return re.sub(r"[^A-Za-z0-9._-]", "_", name)
+
+
+def unique_path(base_dir: str, fname: str) -> str:
+    root, ext = os.path.splitext(fname)
+    candidate = os.path.join(base_dir, fname)
+    idx = 1
+    while os.path.exists(candidate):
+        candidate = os.path.join(base_dir, f"{root}_{idx}{ext}")
+        idx += 1
+    return candidate
+
+
+# Keeps the checksum IN (...) list well under SQL Server's 2100-parameter cap
+CHECKSUM_LOOKUP_BATCH = 500
+
+
+def existing_checksums(db: Session, event_id: int, checksums: Iterable[str]) -> set[str]:
+    """Return which of ``checksums`` already belong to live files of the event."""
+    wanted = sorted({c for c in checksums if c})
+    found: set[str] = set()
+    for i in range(0, len(wanted), CHECKSUM_LOOKUP_BATCH):
+        rows = (
+            db.query(FileMetadata.Checksum)
+            .filter(
+                FileMetadata.EventID == event_id,
+                FileMetadata.Checksum.in_(wanted[i : i + CHECKSUM_LOOKUP_BATCH]),
+                ~FileMetadata.Deleted,
+            )
+            .distinct()
+            .all()
+        )
+        found.update(r[0] for r in rows)
+    return found
+
+
+def finalize_staged_batch(
+    db: Session,
+    staged_files: Iterable[StagedUpload],
+    *,
+    user_id: int,
+    event_id: int,
+    guest_id: Optional[int],
+    uploads_base: str,
+    s3_service=None,
+) -> Tuple[list[FileMetadata], int]:
+    """Dedupe, record and store a batch of staged files in a fixed number of round trips.
+
+    All checksums are resolved with one set-based lookup and every new row is
+    written by a single INSERT .. RETURNING (OUTPUT on SQL Server), so the
+    returned rows already carry their FileMetadataID and can be handed straight
+    to post-processing. The streamed checksum is authoritative; files are only
+    parsed (EXIF / QuickTime headers) once, from their final location when stored
+    locally. Duplicates, including repeats within the batch, are discarded.
+    Stored locally, originals go to the user's content-addressed blob store
+    (:mod:`app.services.blob_store`) and are hard-linked into ``uploads_base``,
+    so content already uploaded to another of the user's events isn't stored
+    again; ``FileName`` records the name actually linked. With ``s3_service``
+    the kept files stay in staging; the caller awaits :func:`store_batch_in_s3`
+    to stream them to the bucket.
+
+    Returns ``(rows, duplicate_count)``; rows are flushed but not committed.
+    """
+    candidates = [s for s in staged_files if s.path and not s.rejected]
+    seen = existing_checksums(db, event_id, (s.checksum for s in candidates))
+    keep: list[StagedUpload] = []
+    duplicates = 0
+    for staged in candidates:
+        if staged.checksum and staged.checksum in seen:
+            discard_staged([staged])
+            staged.path = None
+            duplicates += 1
+            continue
+        if staged.checksum:
+            seen.add(staged.checksum)
+        keep.append(staged)
+    if not keep:
+        return [], duplicates
+
+    rows = []
+    moved: list[str] = []
+    blob_ids: dict[str, int] = {}
+    if not s3_service:
+        # Local filesystem: each distinct content is renamed into the user's blob
+        # store once (no extra copy) and linked into the event folder below.
+        blob_ids, moved = acquire_blobs(db, user_id, ((s.checksum, s.size, s.path) for s in keep))
+        for staged in keep:
+            staged.path = None
+    for staged in keep:
+        fname = safe_name(staged.filename)
+        source = staged.path
+        if not s3_service:
+            blob = blob_path(user_id, staged.checksum)
+            try:
+                source = link_original(blob, uploads_base, fname, staged.checksum)
+            except Exception:
+                remove_files(moved)
+                raise
+            moved.append(source)
+            fname = os.path.basename(source)
+        rows.append(
+            {
+                "EventID": event_id,
+                "GuestID": guest_id,
+                "FileName": fname,
+                "FileType": staged.mime,
+                "FileSize": staged.size,
+                "Checksum": staged.checksum,
+                "BlobID": blob_ids.get(str(staged.checksum).lower()),
+                **capture_fields(source, staged.mime, staged.checksum),
+            }
+        )
+    try:
+        inserted = list(
+            db.scalars(
+                insert(FileMetadata).returning(FileMetadata),
+                rows,
+                # Keep NULL columns in the statement so rows aren't split by key set
+                execution_options={"render_nulls": True},
+            )
+        )
+        # RETURNING order isn't guaranteed for multi-row inserts; re-align rows with ``keep``
+        recs = [rec for rec, _staged in _pair_with_staged(inserted, keep)]
+    except Exception:
+        # Don't leave files on disk that no row points at
+        remove_files(moved)
+        raise
+
+    return recs, duplicates
+
+
+def _pair_with_staged(
+    recs: Iterable[FileMetadata], staged_files: Iterable[StagedUpload]
+) -> list[tuple[FileMetadata, StagedUpload]]:
+    """Pair rows with the staged files they were created from, in ``staged_files`` order.
+
+    Checksums are unique within a batch after dedupe, so they key the match. Files
+    without a checksum have nothing to key on and are paired in order with the
+    unkeyed rows instead of all collapsing onto a shared ``None`` key.
+    """
+    recs = list(recs)
+    by_checksum = {r.Checksum: r for r in recs if r.Checksum}
+    unkeyed = iter([r for r in recs if not r.Checksum])
+    pairs = []
+    for staged in staged_files:
+        rec = by_checksum.get(staged.checksum) if staged.checksum else next(unkeyed, None)
+        if rec is not None:
+            pairs.append((rec, staged))
+    return pairs
+
+
+def s3_object_key(user_id: int, event_id: int, file_id: int, file_name: str) -> str:
+    """Bucket key of a stored original (also used by the presigned download route)."""
+    return f"uploads/{user_id}/{event_id}/{file_id}/{file_name}"
+
+
+# ResumableUpload.Status of a tus upload waiting for its next PATCH, and of one a
+# PATCH currently holds (claimed by a conditional UPDATE)
+RESUMABLE_UPLOAD_STATUS = "uploading"
+RESUMABLE_RECEIVING_STATUS = "receiving"
+# ResumableUpload.Status of a presigned direct-to-bucket upload awaiting finalize, and
+# of one whose finalize request currently holds it (claimed by a conditional UPDATE)
+DIRECT_UPLOAD_STATUS = "presigned"
+DIRECT_FINALIZING_STATUS = "finalizing"
+
+
+def direct_upload_key(user_id: int, event_id: int, upload_id: str, file_name: str) -> str:
+    """Bucket key a guest's presigned POST writes to before the upload is finalized.
+
+    Everything under ``uploads/*/*/incoming/`` is transient: uploads that are never
+    finalized are removed by :func:`app.services.upload_cleanup.expire_direct_uploads`.
+    """
+    return f"uploads/{user_id}/{event_id}/incoming/{upload_id}/{safe_name(file_name)}"
+
+
+async def finalize_direct_upload(
+    db: Session,
+    s3_service,
+    *,
+    key: str,
+    file_name: str,
+    declared_type: Optional[str],
+    size: int,
+    checksum: Optional[str],
+    user_id: int,
+    event_id: int,
+    guest_id: Optional[int],
+) -> Optional[FileMetadata]:
+    """Record an object a guest uploaded straight to the bucket.
+
+    The object's leading bytes are fetched with one ranged GET: the MIME type is
+    sniffed from them exactly as for staged uploads and, for images, capture
+    metadata is read from the EXIF header they contain. The row is flushed to get
+    its id and the object is copied server-side from its incoming key to
+    :func:`s3_object_key`; the caller deletes the incoming key once the row is
+    committed, or the copy if the commit fails, so a failed finalize can be
+    retried from the untouched incoming object. ``checksum`` must be a digest
+    computed server-side (:meth:`~app.services.s3_storage.S3StorageService.sha256`),
+    never one the client declared, since it is stored and used for dedupe.
+
+    Returns the flushed row, or None when the sniffed type isn't allowed or the
+    image header declares a decompression bomb.
+    """
+    head = await s3_service.read_prefix(key, DIRECT_PREFIX_BYTES)
+    allowed, mime = is_allowed_mime(
+        head[:SNIFF_BYTES],
+        allowed_prefixes=tuple(
+            getattr(settings, "ALLOWED_UPLOAD_MIME_PREFIXES", ("image/", "video/"))
+        ),
+        fallback_content_type=declared_type,
+    )
+    if not allowed:
+        return None
+    fields: dict = {}
+    if mime.startswith("image/"):
+        # Only a prefix is at hand: bombs are caught from the header, truncation isn't
+        try:
+            probe = probe_image(head, check_truncation=False)
+        except ImageRejected as e:
+            logger.info(f"Rejected direct upload {key}: {e}")
+            return None
+        except Exception as e:
+            logger.warning(f"Failed to read capture metadata for {key}: {e}")
+            probe = None
+        if probe is not None:
+            fields = probe_capture_fields(probe)
+    rec = FileMetadata(
+        EventID=event_id,
+        GuestID=guest_id,
+        FileName=safe_name(file_name),
+        FileType=mime,
+        FileSize=int(size),
+        Checksum=checksum,
+        **fields,
+    )
+    db.add(rec)
+    db.flush()
+    await s3_service.copy(
+        key, s3_object_key(user_id, event_id, int(rec.FileMetadataID), str(rec.FileName))
+    )
+    return rec
+
+
+async def store_batch_in_s3(
+    s3_service,
+    staged_files: Iterable[StagedUpload],
+    recs: Iterable[FileMetadata],
+    *,
+    user_id: int,
+    event_id: int,
+    uploads_base: str,
+) -> None:
+    """Stream the files kept by :func:`finalize_staged_batch` from staging to S3.
+
+    Uploads run as streaming multipart transfers off the event loop, one file at a
+    time (parts within a file go in parallel). A file whose upload fails is moved
+    into ``uploads_base`` instead so the row still points at real bytes.
+    """
+    kept = [s for s in staged_files if s.path and not s.rejected]
+    for rec, staged in _pair_with_staged(recs, kept):
+        fname = str(rec.FileName)
+        s3_key = s3_object_key(user_id, event_id, int(rec.FileMetadataID), fname)
+        try:
+            if not await s3_service.upload_stream(staged.path, s3_key, staged.mime):
+                raise RuntimeError("S3 storage is disabled")
+            logger.info(f"Uploaded {s3_key} to S3")
+            discard_staged([staged])
+        except Exception as e:
+            logger.error(f"S3 upload failed for {s3_key}: {e}")
+            os.makedirs(uploads_base, exist_ok=True)
+            os.replace(staged.path, unique_path(uploads_base, fname))
+            staged.path = None
+
+
+def finalize_staged_upload(
+    db: Session,
+    staged: StagedUpload,
+    *,
+    user_id: int,
+    event_id: int,
+    guest_id: Optional[int],
+    uploads_base: str,
+    s3_service=None,
+) -> Optional[FileMetadata]:
+    """Single-file form of :func:`finalize_staged_batch`.
+
+    Returns the flushed (uncommitted) row, or None when a live file with the same
+    checksum already exists for the event; the staging file is removed in that case.
+    """
+    recs, _duplicates = finalize_staged_batch(
+        db,
+        [staged],
+        user_id=user_id,
+        event_id=event_id,
+        guest_id=guest_id,
+        uploads_base=uploads_base,
+        s3_service=s3_service,
+    )
+    return recs[0] if recs else None
+
+
+def capture_fields(path: str, mime: str, checksum: Optional[str] = None) -> dict:
+    """FileMetadata capture time/GPS columns read from the file's EXIF/QuickTime headers."""
+    from app.services.metadata_utils import extract_media_metadata
+
+    try:
+        meta = extract_media_metadata(path, mime, checksum=checksum)
+    except Exception as e:
+        logger.warning(f"Failed to extract metadata: {e}")
+        meta = {}
+    return capture_columns(meta)
+
+
+def capture_columns(meta: dict) -> dict:
+    """Map extracted metadata (``datetime_taken``/``gps_*``) onto FileMetadata columns."""
+    taken = meta.get("datetime_taken")
+    if taken and not isinstance(taken, datetime):
+        try:
+            taken = datetime.fromisoformat(str(taken)).replace(tzinfo=None)
+        except ValueError:
+            taken = None
+    return {
+        "CapturedDateTime": taken or None,
+        "GPSLat": str(meta.get("gps_lat")) if meta.get("gps_lat") is not None else None,
+        "GPSLong": str(meta.get("gps_long")) if meta.get("gps_long") is not None else None,
+    }
+
+
+def probe_capture_fields(probe) -> dict:
+    """FileMetadata capture columns from an :class:`~app.services.media_probe.ImageProbe`."""
+    return capture_columns(
+        {
+            "datetime_taken": probe.datetime_taken,
+            "gps_lat": probe.gps_lat,
+            "gps_long": probe.gps_long,
+        }
+    )
+
+
+def apply_capture_metadata(
+    rec: FileMetadata, path: str, mime: str, checksum: Optional[str] = None
+) -> None:
+    """Fill capture time and GPS on ``rec`` from the file's EXIF/QuickTime headers."""
+    for key, value in capture_fields(path, mime, checksum).items():
+        setattr(rec, key, value)
+
+
+def start_thumbnail_job(user_id: int, event_id: int, recs: list[FileMetadata]) -> None:
+    """Queue background thumb generation (ingest priority) to avoid on-demand cost.
+
+    Each image is one ladder task, so its original is decoded once for all widths;
+    each video is one poster task, so ffmpeg extracts its frame once.
+    """
+    from app.services.thumb_scheduler import PRIORITY_INGEST, get_scheduler
+
+    base = os.path.join("storage", str(user_id), str(event_id))
+    scheduler = None
+    for r in recs:
+        ftype = str(getattr(r, "FileType") or "")
+        orig_path = os.path.join(base, str(getattr(r, "FileName")))
+        if not ftype.startswith(("image", "video")) or not os.path.exists(orig_path):
+            continue
+        scheduler = scheduler or get_scheduler()
+        file_id = int(getattr(r, "FileMetadataID"))
+        targets = [(w, image_thumb_path(user_id, event_id, file_id, w)) for w in THUMB_WIDTHS]
+        if ftype.startswith("image"):
+            scheduler.submit_ladder(
+                orig_path, targets, priority=PRIORITY_INGEST, event_id=event_id, file_id=file_id
+            )
+            continue
+        # One frame extraction per video; the narrower posters are downscaled from it
+        scheduler.submit_video(
+            orig_path, targets, priority=PRIORITY_INGEST, event_id=event_id, file_id=file_id
+        )
+
+
+def queue_post_ingest(db: Session, user_id: int, event_id: int, recs: list[FileMetadata]) -> bool:
+    """Enqueue thumbnail/ordering jobs when the media job queue is enabled.
+
+    Jobs are only added to the session; they are committed with the caller's
+    FileMetadata rows. Returns False when the caller should run the work
+    in-process instead (queue disabled or enqueue failed).
+    """
+    if not recs or not getattr(settings, "MEDIA_JOB_QUEUE", False):
+        return False
+    from app.jobs.queue import enqueue_post_ingest
+
+    try:
+        enqueue_post_ingest(db, user_id, event_id, recs)
+        return True
+    except Exception:
+        logger.exception("media job enqueue failed", extra={"event_id": event_id})
+        return False
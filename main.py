@@ -3,6 +3,7 @@ import os
 import time
 import traceback
 import uuid
+from contextlib import asynccontextmanager
 from typing import Optional
 
 from dotenv import load_dotenv
@@ -10,6 +11,7 @@ from fastapi import FastAPI, Request
 from fastapi import HTTPException as FastAPIHTTPException
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from starlette.responses import PlainTextResponse, RedirectResponse
 
 from app.api import (
@@ -38,6 +40,8 @@ from app.core.templates import templates
 from app.models import AppErrorLog
 from app.services.auth import get_user_id_from_request
 from app.services.s3_storage import S3StorageService
+from app.services.thumb_cache import get_thumb_cache
+from app.services.thumb_scheduler import shutdown_scheduler
 from db import get_db
 
 try:
@@ -49,7 +53,16 @@ except Exception:
 load_dotenv()
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Index persisted thumbnails now rather than on the first render's hook
+    get_thumb_cache().load_in_background()
+    yield
+    # Let running thumbnail renders finish and stop the pool's worker processes
+    await run_in_threadpool(shutdown_scheduler, True)
+
+
+app = FastAPI(lifespan=lifespan)
 add_compression_middleware(app)
 
 # Configure logging (console + rotating file; JSON by default)
@@ -65,6 +78,8 @@ if getattr(settings, "S3_UPLOADS_BUCKET", ""):
             bucket=settings.S3_UPLOADS_BUCKET,
             access_key=getattr(settings, "AWS_ACCESS_KEY_ID", None),
             secret_key=getattr(settings, "AWS_SECRET_ACCESS_KEY", None),
+            part_size=getattr(settings, "S3_MULTIPART_PART_BYTES", 8 * 1024 * 1024),
+            concurrency=getattr(settings, "S3_MULTIPART_CONCURRENCY", 4),
         )
         logger.info("S3 storage service initialized")
     except Exception as e:
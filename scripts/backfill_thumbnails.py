@@ -1,54 +1,56 @@
 """
-Backfill thumbnails/posters for existing uploads.
+Backfill thumbnails/posters (and inline placeholders) for existing uploads.
+
+Streams files in id order, renders missing widths on a process pool and
+checkpoints progress, so a killed run picks up where it stopped. Prints
+throughput and ETA as it goes.
 
 Usage (from project root):
     venv\\Scripts\\python.exe -m scripts.backfill_thumbnails [--event EVENT_ID] [--user USER_ID]
+        [--workers N] [--checkpoint PATH] [--restart]
 
 Without flags it processes all events/files. Requires local storage mounted at storage/.
 """
 import argparse
 import os
 
-from sqlalchemy.orm import Session
-
-from app.models.event import Event, FileMetadata
-from app.services.thumbs import generate_all_thumbs_for_file
+from app.services.thumb_backfill import format_progress, run_backfill
 from db import get_db
 
 
-def process(db: Session, user_id: int | None, event_id: int | None) -> int:
-    q = db.query(FileMetadata).join(Event, Event.EventID == FileMetadata.EventID)
-    if user_id is not None:
-        q = q.filter(Event.UserID == int(user_id))
-    if event_id is not None:
-        q = q.filter(Event.EventID == int(event_id))
-    files = q.all()
-    count = 0
-    for f in files:
-        uid = int(getattr(db.query(Event).filter(Event.EventID == f.EventID).first(), 'UserID'))
-        eid = int(getattr(f, 'EventID'))
-        fid = int(getattr(f, 'FileMetadataID'))
-        ftype = str(getattr(f, 'FileType'))
-        fname = str(getattr(f, 'FileName'))
-        base = os.path.join('storage', str(uid), str(eid), fname)
-        if not os.path.exists(base):
-            continue
-        generate_all_thumbs_for_file(uid, eid, fid, ftype, fname)
-        count += 1
-    return count
-
-
 def main():
     parser = argparse.ArgumentParser(description='Backfill thumbnails for existing uploads')
     parser.add_argument('--event', type=int, default=None, help='EventID to limit')
     parser.add_argument('--user', type=int, default=None, help='UserID to limit')
+    parser.add_argument(
+        '--workers', type=int, default=os.cpu_count() or 2, help='Render processes'
+    )
+    parser.add_argument(
+        '--checkpoint',
+        default=os.path.join('logs', 'backfill_thumbnails.json'),
+        help='Progress file used to resume an interrupted run',
+    )
+    parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint')
     args = parser.parse_args()
 
+    os.makedirs(os.path.dirname(args.checkpoint) or '.', exist_ok=True)
     db_gen = get_db()
     db = next(db_gen)
     try:
-        num = process(db, args.user, args.event)
-        print(f"Processed {num} files")
+        result = run_backfill(
+            db,
+            user_id=args.user,
+            event_id=args.event,
+            workers=args.workers,
+            checkpoint_path=args.checkpoint,
+            resume=not args.restart,
+            progress=lambda r, total: print(format_progress(r, total), flush=True),
+        )
+        print(
+            f"Processed {result.done} files: {result.rendered} rendered, "
+            f"{result.skipped} already complete, {result.missing} missing originals, "
+            f"{result.failed} failed, {result.placeholders} placeholders"
+        )
     finally:
         try:
             next(db_gen)
@@ -0,0 +1,77 @@
+"""
+Compare per-photo CPU time of the thumbnail ladder against per-width rendering.
+
+The per-width baseline reproduces the previous behaviour: every width reopens
+the original, applies the EXIF orientation, converts to RGB and resizes from
+full resolution. The ladder decodes once (with JPEG draft mode) and derives
+each width from the previous one.
+
+Usage (from project root):
+    python -m scripts.bench_thumbnail_ladder [--image PATH] [--megapixels 24] [--rounds 3]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from PIL import Image, ImageOps
+
+from app.services.thumbs import render_image_ladder
+
+WIDTHS = (480, 720, 960, 1440)
+
+
+def per_width(orig_path: str, out_dir: str) -> None:
+    for w in WIDTHS:
+        with Image.open(orig_path) as im:
+            im = ImageOps.exif_transpose(im)
+            width = min(w, im.width)
+            size = (width, max(1, int(im.height * width / float(im.width))))
+            im = im.convert("RGB").resize(size, Image.Resampling.LANCZOS)
+            im.save(os.path.join(out_dir, f"pw_{w}.jpg"), format="JPEG", quality=82)
+
+
+def ladder(orig_path: str, out_dir: str) -> None:
+    render_image_ladder(orig_path, [(w, os.path.join(out_dir, f"ld_{w}.jpg")) for w in WIDTHS])
+
+
+def synthetic_jpeg(path: str, megapixels: float) -> None:
+    width = int((megapixels * 1_000_000 * 3 / 2) ** 0.5)
+    height = int(width * 2 / 3)
+    # Noise keeps the entropy-coded data realistic in size
+    Image.effect_noise((width, height), 40).convert("RGB").save(path, format="JPEG", quality=90)
+
+
+def cpu_seconds(fn, orig_path: str, out_dir: str, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.process_time()
+        fn(orig_path, out_dir)
+        best = min(best, time.process_time() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark thumbnail ladder generation')
+    parser.add_argument('--image', help='JPEG to render (default: a synthetic photo)')
+    parser.add_argument('--megapixels', type=float, default=24.0)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        orig_path = args.image
+        if not orig_path:
+            orig_path = os.path.join(out_dir, 'synthetic.jpg')
+            synthetic_jpeg(orig_path, args.megapixels)
+        with Image.open(orig_path) as im:
+            print(f"{orig_path}: {im.width}x{im.height} {im.format}")
+        baseline = cpu_seconds(per_width, orig_path, out_dir, args.rounds)
+        decoded_once = cpu_seconds(ladder, orig_path, out_dir, args.rounds)
+    print(f"per-width : {baseline * 1000:8.1f} ms CPU per photo")
+    print(f"ladder    : {decoded_once * 1000:8.1f} ms CPU per photo")
+    if decoded_once > 0:
+        print(f"speed-up  : {baseline / decoded_once:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Remove guest uploads that were started but never finished.
+
+Resumable (tus) uploads left idle past RESUMABLE_UPLOAD_EXPIRES_SECONDS lose
+their ResumableUpload row and their .part file, and files abandoned in event
+staging folders are removed. Presigned direct-to-bucket uploads that were never
+finalized lose their row and their object under uploads/*/*/incoming/. Run it
+from cron, or keep it running with --loop.
+
+Usage (from project root):
+    python -m scripts.cleanup_uploads [--grace-hours HOURS] [--loop --interval SECONDS]
+"""
+import argparse
+import time
+from datetime import timedelta
+
+from app.core.settings import settings
+from app.services.s3_storage import S3StorageService
+from app.services.upload_cleanup import (
+    expire_direct_uploads,
+    expire_resumable_uploads,
+    remove_stale_staging_files,
+)
+from db import get_db
+
+
+def run_once(s3_service, grace: timedelta) -> None:
+    db_gen = get_db()
+    db = next(db_gen)
+    try:
+        removed = expire_resumable_uploads(db)
+        print(f"Removed {removed} idle resumable uploads")
+        removed = remove_stale_staging_files()
+        print(f"Removed {removed} abandoned staging files")
+        if s3_service is not None and s3_service.enabled:
+            removed = expire_direct_uploads(db, s3_service, grace=grace)
+            print(f"Removed {removed} unfinished direct uploads")
+    finally:
+        try:
+            next(db_gen)
+        except StopIteration:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Remove abandoned guest uploads')
+    parser.add_argument(
+        '--grace-hours',
+        type=int,
+        default=24,
+        help='Hours past a direct upload\'s expiry before removal',
+    )
+    parser.add_argument('--loop', action='store_true', help='Repeat every --interval seconds')
+    parser.add_argument('--interval', type=int, default=3600, help='Seconds between runs')
+    args = parser.parse_args()
+
+    s3_service = None
+    if getattr(settings, "S3_UPLOADS_BUCKET", ""):
+        s3_service = S3StorageService(
+            region=settings.AWS_REGION,
+            bucket=settings.S3_UPLOADS_BUCKET,
+            access_key=getattr(settings, "AWS_ACCESS_KEY_ID", None),
+            secret_key=getattr(settings, "AWS_SECRET_ACCESS_KEY", None),
+        )
+    grace = timedelta(hours=max(1, args.grace_hours))
+    while True:
+        run_once(s3_service, grace)
+        if not args.loop:
+            break
+        time.sleep(max(60, args.interval))
+
+
+if __name__ == '__main__':
+    main()
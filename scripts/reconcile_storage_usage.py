@@ -0,0 +1,45 @@
+"""
+Reconcile EventStorage.CurrentUsageBytes with what is actually stored.
+
+Uploads, thumbnails and deletes keep the counter up to date incrementally; this
+corrects any drift. Run it from cron, or keep it running with --loop.
+
+Usage (from project root):
+    python -m scripts.reconcile_storage_usage [--event EVENT_ID] [--loop --interval SECONDS]
+"""
+import argparse
+import time
+
+from app.services.storage_accounting import reconcile_all
+from db import get_db
+
+
+def run_once(event_id: int | None) -> None:
+    db_gen = get_db()
+    db = next(db_gen)
+    try:
+        checked, corrected = reconcile_all(db, event_id)
+        print(f"Checked {checked} events, corrected {corrected}")
+    finally:
+        try:
+            next(db_gen)
+        except StopIteration:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconcile per-event storage usage')
+    parser.add_argument('--event', type=int, default=None, help='EventID to limit')
+    parser.add_argument('--loop', action='store_true', help='Repeat every --interval seconds')
+    parser.add_argument('--interval', type=int, default=3600, help='Seconds between runs')
+    args = parser.parse_args()
+
+    while True:
+        run_once(args.event)
+        if not args.loop:
+            break
+        time.sleep(max(60, args.interval))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Settle pending Stripe purchases whose webhook was delayed or lost.
+
+Pages through pending purchases, checks their Checkout Sessions with bounded
+concurrency (backing off on Stripe rate limits), marks paid ones, logs the
+outcome to PaymentLog and invalidates the affected users' cached entitlements.
+Run it from cron, or keep it running with --loop.
+
+Usage (from project root):
+    python -m scripts.reconcile_stripe_purchases [--loop --interval SECONDS]
+"""
+import argparse
+import time
+
+from app.services.stripe_reconciler import reconcile_pending_purchases
+from db import get_db
+
+
+def run_once() -> None:
+    db_gen = get_db()
+    db = next(db_gen)
+    try:
+        result = reconcile_pending_purchases(db)
+        if result is None:
+            print("Stripe is not configured; nothing to do")
+        else:
+            print(
+                f"Checked {result.checked} pending purchases: {result.paid} paid, "
+                f"{result.unpaid} unpaid, {result.errors} errors"
+            )
+    finally:
+        try:
+            next(db_gen)
+        except StopIteration:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconcile pending purchases with Stripe')
+    parser.add_argument('--loop', action='store_true', help='Repeat every --interval seconds')
+    parser.add_argument('--interval', type=int, default=300, help='Seconds between runs')
+    args = parser.parse_args()
+
+    while True:
+        run_once()
+        if not args.loop:
+            break
+        time.sleep(max(30, args.interval))
+
+
+if __name__ == '__main__':
+    main()
@@ -37,13 +37,14 @@ END
     WHERE f.Deleted = 0
 ), Ordered AS (
   SELECT EventID, FileMetadataID,
+       -- Spaced by 1024 (ORDINAL_GAP in app/services/photo_order_service.py)
        ROW_NUMBER() OVER (
          PARTITION BY EventID
          ORDER BY CASE WHEN CapturedDateTime IS NULL THEN 1 ELSE 0 END,
             CapturedDateTime ASC,
             UploadDate ASC,
             FileMetadataID ASC
-       ) AS Ordinal
+       ) * 1024 AS Ordinal
   FROM Src
 )
 
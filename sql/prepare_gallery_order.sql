@@ -17,7 +17,7 @@ BEGIN
 END
 
 -- Replace the following SELECT logic with the app's desired sort: captured asc, nulls last, upload asc
--- We'll generate a dense rank per event so tiles keep the same relative ordering unless new files arrive.
+-- We'll generate a gapped rank per event so tiles keep the same relative ordering unless new files arrive.
 
 ;WITH Src AS (
     SELECT
@@ -32,13 +32,15 @@ END
         EventID,
         FileMetadataID,
         -- Use ROW_NUMBER() to guarantee a unique, deterministic ordinal per event/file.
+        -- Ordinals are spaced by 1024 (ORDINAL_GAP in app/services/photo_order_service.py)
+        -- so the app can slot new uploads in between runs without renumbering.
         ROW_NUMBER() OVER (
             PARTITION BY EventID
             ORDER BY CASE WHEN CapturedDateTime IS NULL THEN 1 ELSE 0 END,
                      CapturedDateTime ASC,
                      UploadDate ASC,
                      FileMetadataID ASC
-        ) AS Ordinal
+        ) * 1024 AS Ordinal
     FROM Src
 )
 
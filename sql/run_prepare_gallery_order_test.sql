@@ -38,13 +38,14 @@ END
       AND (@test_event_id IS NULL OR f.EventID = @test_event_id)
 ), Ordered AS (
     SELECT EventID, FileMetadataID,
+           -- Spaced by 1024 (ORDINAL_GAP in app/services/photo_order_service.py)
            ROW_NUMBER() OVER (
                PARTITION BY EventID
                ORDER BY CASE WHEN CapturedDateTime IS NULL THEN 1 ELSE 0 END,
                         CapturedDateTime ASC,
                         UploadDate ASC,
                         FileMetadataID ASC
-           ) AS Ordinal
+           ) * 1024 AS Ordinal
     FROM Src
 )
 
@@ -538,6 +538,8 @@ const G = (function () {
       if (file.type === 'image') {
         const img = document.createElement('img'); img.className = 'gallery-img lazy'; img.alt = file.name || ''; img.dataset.src = file.thumb_url || file.url || '';
         if (file.url) img.setAttribute('data-full', file.url);
+        // Inline blur-up placeholder shows until the lazy thumbnail loads (no extra request)
+        if (file.placeholder) { img.style.background = "center / cover no-repeat url('" + file.placeholder + "')"; }
         if (file.srcset) { img.dataset.srcset = file.srcset; img.dataset.sizes = '(max-width: 640px) 45vw, (max-width: 1024px) 30vw, 20vw'; }
         // Prefer server-provided intrinsic dims so we can size the tile immediately
         if (file.width && file.height) { try { tile.style.aspectRatio = String(file.width) + ' / ' + String(file.height); } catch(e){} img.setAttribute('data-w', String(file.width)); img.setAttribute('data-h', String(file.height)); }
@@ -591,6 +593,8 @@ const G = (function () {
     // Parse next-offset (template may render empty string when no more pages)
     let nextOffsetRaw = gal.getAttribute('data-next-offset');
     let nextOffset = (nextOffsetRaw === null || nextOffsetRaw === '') ? null : parseInt(nextOffsetRaw, 10);
+    // Keyset cursor for the next page; preferred over offset when the server provides one
+    let nextCursor = gal.getAttribute('data-next-cursor') || null;
     const pageSize = parseInt(gal.getAttribute('data-page-size') || '100', 10);
     let loading = false; let done = nextOffset === null; const loader = document.getElementById('gallery-loader');
 
@@ -621,6 +625,7 @@ const G = (function () {
         skeletons.push(sk);
       }
   const params = new URLSearchParams(window.location.search); params.set('offset', String(nextOffset || 0)); params.set('limit', String(pageSize));
+      if (nextCursor) params.set('cursor', nextCursor); else params.delete('cursor');
       fetch('/gallery/data?' + params.toString(), { headers: { 'accept': 'application/json' }, credentials: 'same-origin' })
         .then((r) => {
           const ct = (r.headers && r.headers.get) ? (r.headers.get('content-type') || '') : '';
@@ -643,9 +648,9 @@ const G = (function () {
           if (!resp || resp.ok !== true) return; appendFiles(resp.files || []);
           try { console.log('[GalleryModule] fetchMore response files=', (resp.files && resp.files.length) || 0, 'next_offset=', resp.next_offset); } catch(e){}
           if (resp.next_offset != null && resp.next_offset !== '') {
-            nextOffset = resp.next_offset; done = false;
+            nextOffset = resp.next_offset; nextCursor = resp.next_cursor || null; done = false;
           } else {
-            nextOffset = null; done = true; const end = document.getElementById('gallery-end'); if (end) end.style.display = 'block';
+            nextOffset = null; nextCursor = null; done = true; const end = document.getElementById('gallery-end'); if (end) end.style.display = 'block';
           }
         })
         .catch(() => {
@@ -178,3 +178,12 @@ def ensure_test_user(db_session):
     except Exception:
         # If User model or table isn't available in this test environment, ignore silently.
         pass
+
+
+@pytest.fixture(autouse=True)
+def reset_entitlement_cache():
+    """Tests write Purchase rows directly, so start each one with an empty plan cache."""
+    from app.services.entitlements import invalidate_entitlements
+
+    invalidate_entitlements()
+    yield
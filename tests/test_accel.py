@@ -0,0 +1,62 @@
+import os
+import shutil
+
+from PIL import Image
+
+from app.core.settings import settings
+from app.services.accel import accel_path, send_file
+from app.services.media_urls import signed_thumb_url
+
+
+def test_send_file_hands_storage_paths_to_nginx(monkeypatch):
+    monkeypatch.setattr(settings, "ACCEL_REDIRECT_ENABLED", True, raising=False)
+    path = os.path.join("storage", "exports", "7", "my export.zip")
+
+    resp = send_file(path, media_type="application/zip", filename="my export.zip")
+
+    assert resp.headers["x-accel-redirect"] == "/_protected/storage/exports/7/my%20export.zip"
+    assert resp.headers["content-type"] == "application/zip"
+    assert "my%20export.zip" in resp.headers["content-disposition"]
+    assert resp.body == b""
+    # Nothing outside the storage root is ever exposed through the internal location
+    assert accel_path(os.path.join("storage", "..", "app", "main.py")) is None
+    assert accel_path("/etc/passwd") is None
+
+
+def test_send_file_streams_itself_when_disabled(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ACCEL_REDIRECT_ENABLED", False, raising=False)
+    path = tmp_path / "a.txt"
+    path.write_text("x")
+    resp = send_file(str(path), media_type="text/plain")
+    assert "x-accel-redirect" not in resp.headers
+    assert resp.path == str(path)
+
+
+def test_thumbnail_endpoint_offloads_cached_thumbnails(db_session, client, monkeypatch):
+    from app.models.event import Event, FileMetadata
+    from app.models.user import User
+
+    monkeypatch.setattr(settings, "ACCEL_REDIRECT_ENABLED", True, raising=False)
+    u = User(FirstName="A", LastName="X", Email="accel-thumb@example.test", HashedPassword="x")
+    db_session.add(u)
+    db_session.flush()
+    ev = Event(UserID=u.UserID, Name="Accel", Code="ACCELTH", Password="pw", TermsChecked=True)
+    db_session.add(ev)
+    db_session.flush()
+    f = FileMetadata(EventID=ev.EventID, FileName="a.jpg", FileType="image/jpeg", FileSize=1)
+    db_session.add(f)
+    db_session.commit()
+    tdir = os.path.join("storage", str(u.UserID), str(ev.EventID), "thumbnails")
+    shutil.rmtree(os.path.dirname(tdir), ignore_errors=True)
+    os.makedirs(tdir)
+    Image.new("RGB", (480, 320)).save(os.path.join(tdir, f"{f.FileMetadataID}_480.jpg"))
+
+    url = signed_thumb_url(u.UserID, ev.EventID, f.FileMetadataID, 480)
+    r = client.get(url, headers={"Accept": "image/jpeg"})
+
+    assert r.status_code == 200 and r.content == b""
+    assert r.headers["x-accel-redirect"] == (
+        f"/_protected/storage/{u.UserID}/{ev.EventID}/thumbnails/{f.FileMetadataID}_480.jpg"
+    )
+    assert r.headers["content-type"] == "image/jpeg"
+    assert r.headers["vary"] == "Accept"
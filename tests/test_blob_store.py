@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import os
+from io import BytesIO
+
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from app.services.upload_ingest import finalize_staged_batch, stage_upload
+
+
+def _jpeg_bytes(seed: int) -> bytes:
+    from PIL import Image
+
+    buf = BytesIO()
+    Image.new("RGB", (40, 30), color=(seed * 50, 90, 160)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def _staged(data: bytes, name: str, staging: str):
+    upload = UploadFile(
+        file=BytesIO(data), filename=name, headers=Headers({"content-type": "image/jpeg"})
+    )
+    return asyncio.run(stage_upload(upload, staging))
+
+
+def _user_with_events(db_session, email: str, codes: list[str]):
+    from app.models.event import Event
+    from app.models.user import User
+
+    u = User(FirstName="B", LastName="S", Email=email, HashedPassword="x")
+    db_session.add(u)
+    db_session.flush()
+    events = []
+    for code in codes:
+        ev = Event(UserID=u.UserID, Name=code, Code=code, Password="pw", TermsChecked=True)
+        db_session.add(ev)
+        events.append(ev)
+    db_session.flush()
+    return u, events
+
+
+def _store(db_session, u, ev, data: bytes, name: str):
+    staging = os.path.join("storage", "staging")
+    recs, _ = finalize_staged_batch(
+        db_session,
+        [_staged(data, name, staging)],
+        user_id=u.UserID,
+        event_id=ev.EventID,
+        guest_id=None,
+        uploads_base=os.path.join("storage", str(u.UserID), str(ev.EventID), "uploads"),
+    )
+    return recs[0]
+
+
+def test_same_content_in_two_events_is_stored_once(db_session, tmp_path, monkeypatch):
+    from app.models.media_blob import MediaBlob
+    from app.services.blob_store import blob_path
+
+    monkeypatch.chdir(tmp_path)
+    u, (ev1, ev2) = _user_with_events(db_session, "blob-share@example.test", ["BLOBA1", "BLOBA2"])
+    data = _jpeg_bytes(1)
+    rec1 = _store(db_session, u, ev1, data, "IMG_0001.jpg")
+    rec2 = _store(db_session, u, ev2, data, "IMG_0001.jpg")
+
+    assert rec1.BlobID and rec1.BlobID == rec2.BlobID
+    blob = db_session.get(MediaBlob, rec1.BlobID)
+    assert blob.RefCount == 2 and blob.Checksum == hashlib.sha256(data).hexdigest()
+    stored = blob_path(u.UserID, blob.Checksum)
+    assert open(stored, "rb").read() == data
+    # Both event files are links to the one blob
+    for ev in (ev1, ev2):
+        p = os.path.join("storage", str(u.UserID), str(ev.EventID), "uploads", "IMG_0001.jpg")
+        assert os.path.samefile(p, stored)
+
+
+def test_name_collision_uses_content_qualified_name(db_session, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    u, (ev,) = _user_with_events(db_session, "blob-name@example.test", ["BLOBN1"])
+    first = _store(db_session, u, ev, _jpeg_bytes(2), "IMG_0001.jpg")
+    data = _jpeg_bytes(3)
+    second = _store(db_session, u, ev, data, "IMG_0001.jpg")
+
+    assert first.FileName == "IMG_0001.jpg"
+    assert second.FileName == f"IMG_0001_{hashlib.sha256(data).hexdigest()[:12]}.jpg"
+    uploads = tmp_path / "storage" / str(u.UserID) / str(ev.EventID) / "uploads"
+    assert (uploads / second.FileName).read_bytes() == data
+
+
+def test_released_blobs_are_collected_at_zero_refs(db_session, tmp_path, monkeypatch):
+    from app.models.media_blob import MediaBlob
+    from app.services.blob_store import (
+        blob_path,
+        collect_unreferenced_blobs,
+        release_blobs,
+    )
+
+    monkeypatch.chdir(tmp_path)
+    u, (ev1, ev2) = _user_with_events(db_session, "blob-gc@example.test", ["BLOBG1", "BLOBG2"])
+    data = _jpeg_bytes(4)
+    rec1 = _store(db_session, u, ev1, data, "a.jpg")
+    _store(db_session, u, ev2, data, "a.jpg")
+    stored = blob_path(u.UserID, hashlib.sha256(data).hexdigest())
+    blob_id = rec1.BlobID
+
+    release_blobs(db_session, [blob_id])
+    db_session.commit()
+    assert collect_unreferenced_blobs(db_session, u.UserID) == 0
+    assert os.path.exists(stored)
+
+    release_blobs(db_session, [blob_id])
+    db_session.commit()
+    assert collect_unreferenced_blobs(db_session, u.UserID) == len(data)
+    assert not os.path.exists(stored)
+    assert db_session.get(MediaBlob, blob_id) is None
+
+
+def test_blob_collected_mid_upload_is_recreated(db_session, tmp_path, monkeypatch):
+    from app.models.media_blob import MediaBlob
+    from app.services import blob_store
+
+    monkeypatch.chdir(tmp_path)
+    u, (ev1, ev2) = _user_with_events(db_session, "blob-race@example.test", ["BLOBR1", "BLOBR2"])
+    data = _jpeg_bytes(5)
+    rec1 = _store(db_session, u, ev1, data, "a.jpg")
+    blob_store.release_blobs(db_session, [rec1.BlobID])
+    db_session.commit()
+    stored = blob_store.blob_path(u.UserID, hashlib.sha256(data).hexdigest())
+
+    # The collector runs between this upload's lookup and its reference UPDATE
+    real_lookup = blob_store._lookup
+
+    def lookup_then_collect(db, user_id, checksums):
+        known = real_lookup(db, user_id, checksums)
+        blob_store.collect_unreferenced_blobs(db, user_id)
+        return known
+
+    monkeypatch.setattr(blob_store, "_lookup", lookup_then_collect)
+    rec2 = _store(db_session, u, ev2, data, "a.jpg")
+
+    blob = db_session.get(MediaBlob, rec2.BlobID)
+    # Re-inserted rather than pointing at the collected row (SQLite may reuse its id)
+    assert blob is not None and blob.RefCount == 1
+    assert open(stored, "rb").read() == data
+
+
+def test_concurrent_first_insert_becomes_an_increment(db_session, tmp_path, monkeypatch):
+    from app.models.media_blob import MediaBlob
+    from app.services import blob_store
+
+    monkeypatch.chdir(tmp_path)
+    u, (ev1, ev2) = _user_with_events(db_session, "blob-dup@example.test", ["BLOBD1", "BLOBD2"])
+    data = _jpeg_bytes(6)
+    rec1 = _store(db_session, u, ev1, data, "a.jpg")
+
+    # Another upload inserted the row after this one looked and found nothing
+    real_lookup = blob_store._lookup
+    calls = []
+
+    def stale_first_lookup(db, user_id, checksums):
+        calls.append(list(checksums))
+        return {} if len(calls) == 1 else real_lookup(db, user_id, checksums)
+
+    monkeypatch.setattr(blob_store, "_lookup", stale_first_lookup)
+    rec2 = _store(db_session, u, ev2, data, "a.jpg")
+
+    assert len(calls) == 2 and rec2.BlobID == rec1.BlobID
+    assert db_session.get(MediaBlob, rec1.BlobID).RefCount == 2
+    assert db_session.query(MediaBlob).filter(MediaBlob.UserID == u.UserID).count() == 1
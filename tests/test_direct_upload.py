@@ -0,0 +1,295 @@
+import base64
+import hashlib
+from io import BytesIO
+
+import pytest
+from fastapi.testclient import TestClient
+
+pytest.importorskip("moto")
+import requests  # noqa: E402
+from moto import mock_aws  # noqa: E402
+
+from app.core.settings import settings  # noqa: E402
+from app.models.event import Event, FileMetadata  # noqa: E402
+from app.models.resumable_upload import ResumableUpload  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.services.s3_storage import S3StorageService  # noqa: E402
+
+BUCKET = "epu-direct-uploads"
+
+
+def _jpeg_bytes(color=(30, 160, 90)) -> bytes:
+    from PIL import Image
+
+    buf = BytesIO()
+    Image.new("RGB", (64, 48), color=color).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def s3(client: TestClient, monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setattr(settings, "S3_DIRECT_UPLOADS", True, raising=False)
+    with mock_aws():
+        svc = S3StorageService(region="us-east-1", bucket=BUCKET)
+        svc.client.create_bucket(Bucket=BUCKET)
+        monkeypatch.setattr(client.app.state, "s3_service", svc, raising=False)
+        yield svc
+
+
+def _event(db_session, code: str) -> Event:
+    ResumableUpload.__table__.create(bind=db_session.get_bind(), checkfirst=True)
+    u = User(FirstName="D", LastName="U", Email=f"{code.lower()}@example.test", HashedPassword="x")
+    db_session.add(u)
+    db_session.flush()
+    ev = Event(
+        UserID=u.UserID,
+        Name="Direct",
+        Code=code,
+        Password="pw",
+        TermsChecked=True,
+        Published=True,
+    )
+    db_session.add(ev)
+    db_session.commit()
+    return ev
+
+
+def _presign(client: TestClient, code: str, data: bytes, name="party.jpg") -> dict:
+    r = client.post(
+        f"/guest/upload/{code}/direct",
+        json={
+            "files": [
+                {
+                    "name": name,
+                    "type": "image/jpeg",
+                    "size": len(data),
+                    "sha256": hashlib.sha256(data).hexdigest(),
+                }
+            ]
+        },
+    )
+    assert r.status_code == 200, r.text
+    return r.json()["uploads"][0]
+
+
+def _put(grant: dict, data: bytes) -> None:
+    r = requests.post(grant["url"], data=grant["fields"], files={"file": ("f", data)})
+    assert r.status_code in (200, 201, 204), r.text
+
+
+def test_direct_upload_presign_upload_finalize(
+    db_session, client: TestClient, s3, tmp_path, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    ev = _event(db_session, "DIRECT1")
+    data = _jpeg_bytes()
+    grant = _presign(client, ev.Code, data)
+    assert grant["fields"]["key"].startswith(f"uploads/{ev.UserID}/{ev.EventID}/incoming/")
+    # S3 verifies the body against the digest the client declared and keeps it
+    assert grant["fields"]["x-amz-checksum-algorithm"] == "SHA256"
+    assert grant["fields"]["x-amz-checksum-sha256"] == base64.b64encode(
+        hashlib.sha256(data).digest()
+    ).decode()
+    _put(grant, data)
+
+    digest = hashlib.sha256(data).hexdigest()
+    r = client.post(grant["finalize"], json={"sha256": digest})
+    assert r.status_code == 200, r.text
+    file_id = r.json()["file_id"]
+
+    rec = db_session.query(FileMetadata).filter(FileMetadata.FileMetadataID == file_id).one()
+    assert rec.FileType == "image/jpeg"
+    assert rec.FileSize == len(data)
+    assert rec.Checksum == digest
+    # Moved server-side to the canonical key; nothing left under incoming/
+    key = f"uploads/{ev.UserID}/{ev.EventID}/{file_id}/{rec.FileName}"
+    assert s3.client.get_object(Bucket=BUCKET, Key=key)["Body"].read() == data
+    listed = s3.client.list_objects_v2(Bucket=BUCKET, Prefix=f"uploads/{ev.UserID}/{ev.EventID}/")
+    assert [o["Key"] for o in listed["Contents"]] == [key]
+
+    # Finalize is idempotent
+    again = client.post(grant["finalize"], json={"sha256": digest})
+    assert again.json() == {"ok": True, "file_id": file_id}
+
+    # A second copy of the same bytes is recognised as a duplicate and removed
+    grant2 = _presign(client, ev.Code, data, name="again.jpg")
+    _put(grant2, data)
+    r = client.post(grant2["finalize"], json={"sha256": digest})
+    assert r.json() == {"ok": True, "duplicate": True}
+    assert db_session.query(FileMetadata).filter(FileMetadata.EventID == ev.EventID).count() == 1
+
+
+def test_direct_upload_rejects_bad_requests(
+    db_session, client: TestClient, s3, tmp_path, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    ev = _event(db_session, "DIRECT2")
+    r = client.post(
+        f"/guest/upload/{ev.Code}/direct",
+        json={
+            "files": [{"name": "notes.txt", "type": "text/plain", "size": 10, "sha256": "0" * 64}]
+        },
+    )
+    assert r.status_code == 415
+    # The policy can't be issued without the file's digest
+    r = client.post(
+        f"/guest/upload/{ev.Code}/direct",
+        json={"files": [{"name": "a.jpg", "type": "image/jpeg", "size": 10, "sha256": "abc"}]},
+    )
+    assert r.status_code == 400
+
+    # Finalizing before the bytes arrive is a conflict, not a new row
+    fake = b"not really an image" + b"\x00" * 64
+    grant = _presign(client, ev.Code, fake)
+    r = client.post(grant["finalize"], json={})
+    assert r.status_code == 409
+
+    # Declared as a JPEG, but the bucket object isn't one
+    _put(grant, fake)
+    r = client.post(grant["finalize"], json={})
+    assert r.status_code == 415
+    assert s3.client.list_objects_v2(Bucket=BUCKET).get("KeyCount") == 0
+
+
+def test_direct_upload_disabled_without_setting(client: TestClient, monkeypatch):
+    monkeypatch.setattr(settings, "S3_DIRECT_UPLOADS", False, raising=False)
+    r = client.post("/guest/upload/ANY/direct", json={"files": []})
+    assert r.status_code == 404
+
+
+def test_direct_upload_checksum_is_computed_server_side(
+    db_session, client: TestClient, s3, tmp_path, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    ev = _event(db_session, "DIRECT3")
+    data = _jpeg_bytes((200, 10, 10))
+    digest = hashlib.sha256(data).hexdigest()
+
+    # A declared digest that doesn't match the bytes is refused, not stored
+    grant = _presign(client, ev.Code, data)
+    _put(grant, data)
+    r = client.post(grant["finalize"], json={"sha256": hashlib.sha256(b"other").hexdigest()})
+    assert r.status_code == 422
+    assert s3.client.list_objects_v2(Bucket=BUCKET).get("KeyCount") == 0
+
+    # Without a declared digest the stored checksum is still the real one...
+    grant = _presign(client, ev.Code, data)
+    _put(grant, data)
+    file_id = client.post(grant["finalize"], json={}).json()["file_id"]
+    rec = db_session.query(FileMetadata).filter(FileMetadata.FileMetadataID == file_id).one()
+    assert rec.Checksum == digest
+
+    # ...so dedupe doesn't depend on the client hashing the file either
+    grant = _presign(client, ev.Code, data, name="copy.jpg")
+    _put(grant, data)
+    assert client.post(grant["finalize"]).json() == {"ok": True, "duplicate": True}
+
+
+def test_direct_upload_finalize_is_claimed_once(
+    db_session, client: TestClient, s3, tmp_path, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    ev = _event(db_session, "DIRECT4")
+    data = _jpeg_bytes((5, 5, 250))
+    grant = _presign(client, ev.Code, data)
+    _put(grant, data)
+
+    # A concurrent request holds the upload: this one must not record it again
+    up = db_session.query(ResumableUpload).filter(ResumableUpload.UploadID == grant["id"]).one()
+    up.Status = "finalizing"
+    db_session.commit()
+    r = client.post(grant["finalize"], json={})
+    assert r.status_code == 409
+    assert db_session.query(FileMetadata).filter(FileMetadata.EventID == ev.EventID).count() == 0
+
+    # Once released the upload finalizes normally
+    up.Status = "presigned"
+    db_session.commit()
+    r = client.post(grant["finalize"], json={})
+    assert r.status_code == 200, r.text
+    db_session.refresh(up)
+    assert up.Status == "complete" and up.FileMetadataID == r.json()["file_id"]
+
+
+def test_expire_direct_uploads_removes_stale_rows_and_objects(
+    db_session, client: TestClient, s3, tmp_path, monkeypatch
+):
+    from datetime import datetime, timedelta
+
+    from app.services.upload_cleanup import expire_direct_uploads
+
+    monkeypatch.chdir(tmp_path)
+    ev = _event(db_session, "DIRECT5")
+    data = _jpeg_bytes((9, 9, 9))
+    stale, stuck, fresh = (_presign(client, ev.Code, data, name=f"{n}.jpg") for n in "abc")
+    for grant in (stale, stuck, fresh):
+        _put(grant, data)
+    now = datetime(2026, 6, 1, 12, 0, 0)
+    rows = {
+        r.UploadID: r
+        for r in db_session.query(ResumableUpload).filter(ResumableUpload.EventID == ev.EventID)
+    }
+    rows[stale["id"]].CreatedAt = now - timedelta(days=2)
+    rows[stuck["id"]].Status = "finalizing"
+    rows[stuck["id"]].CreatedAt = now - timedelta(days=3)
+    rows[fresh["id"]].CreatedAt = now - timedelta(hours=1)
+    db_session.commit()
+    # The ORM refreshes UpdatedAt on every write, so age it with a bulk update
+    db_session.query(ResumableUpload).filter(ResumableUpload.UploadID == stuck["id"]).update(
+        {ResumableUpload.UpdatedAt: now - timedelta(days=2)}, synchronize_session=False
+    )
+    db_session.commit()
+
+    assert expire_direct_uploads(db_session, s3, now=now, batch_size=1) == 2
+    left = db_session.query(ResumableUpload.UploadID).filter(ResumableUpload.EventID == ev.EventID)
+    assert [r[0] for r in left] == [fresh["id"]]
+    keys = [o["Key"] for o in s3.client.list_objects_v2(Bucket=BUCKET)["Contents"]]
+    assert keys == [fresh["fields"]["key"]]
+    assert expire_direct_uploads(db_session, s3, now=now) == 0
+
+
+def test_sha256_prefers_the_checksum_s3_verified(s3, monkeypatch):
+    import asyncio
+
+    data = b"checksummed by the bucket"
+    digest = hashlib.sha256(data).digest()
+    # moto doesn't keep object checksums; this is what S3 reports for a verified PUT
+    heads = {
+        "whole": {
+            "ChecksumSHA256": base64.b64encode(digest).decode(),
+            "ChecksumType": "FULL_OBJECT",
+        },
+        "parts": {"ChecksumSHA256": base64.b64encode(b"p" * 32).decode() + "-3"},
+        "none": {},
+    }
+    monkeypatch.setattr(s3.client, "head_object", lambda **kw: heads[kw["Key"]])
+    hashed = []
+    monkeypatch.setattr(s3, "_hash_object", lambda s3_key: hashed.append(s3_key) or "streamed")
+
+    assert asyncio.run(s3.sha256("whole")) == digest.hex()
+    assert [asyncio.run(s3.sha256(k)) for k in ("parts", "none")] == ["streamed", "streamed"]
+    assert hashed == ["parts", "none"]
+
+
+def test_direct_upload_failed_commit_keeps_the_incoming_object(
+    db_session, client: TestClient, s3, tmp_path, monkeypatch
+):
+    from app.api import uploads
+
+    monkeypatch.chdir(tmp_path)
+    ev = _event(db_session, "DIRECT6")
+    data = _jpeg_bytes((70, 80, 90))
+    grant = _presign(client, ev.Code, data)
+    _put(grant, data)
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(uploads, "queue_post_ingest", broken)
+    r = client.post(grant["finalize"], json={})
+    assert r.status_code == 502
+    # The copy no row points at is gone; a retry starts from the untouched incoming object
+    keys = [o["Key"] for o in s3.client.list_objects_v2(Bucket=BUCKET)["Contents"]]
+    assert keys == [grant["fields"]["key"]]
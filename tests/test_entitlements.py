@@ -0,0 +1,93 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from app.models.billing import Purchase
+from app.models.event_plan import EventPlan
+from app.models.user import User
+from app.services import entitlements
+from app.services.entitlements import get_entitlements, invalidate_entitlements
+
+
+def _user_with_plan(db_session, code: str, status: str = "paid", session_id=None):
+    u = User(FirstName="E", LastName="C", Email=f"{code}@example.test", HashedPassword="x")
+    plan = EventPlan(
+        Name=code.title(),
+        Code=code,
+        PriceCents=1000,
+        Currency="GBP",
+        IsActive=True,
+        Features=json.dumps({"max_guests_per_event": 25, "max_storage_per_event_mb": 512}),
+    )
+    db_session.add_all([u, plan])
+    db_session.flush()
+    p = Purchase(
+        UserID=u.UserID,
+        PlanID=plan.PlanID,
+        Amount=10,
+        Currency="GBP",
+        Status=status,
+        StripeSessionID=session_id,
+    )
+    db_session.add(p)
+    db_session.commit()
+    return u, plan, p
+
+
+def test_entitlements_are_cached_until_invalidated(db_session, monkeypatch):
+    u, plan, purchase = _user_with_plan(db_session, "ent_cache")
+    loads = []
+    real_load = entitlements.load_entitlements
+    monkeypatch.setattr(
+        entitlements, "load_entitlements", lambda db, uid: loads.append(uid) or real_load(db, uid)
+    )
+
+    first = get_entitlements(db_session, u.UserID)
+    assert first.plan_id == plan.PlanID and first.plan_code == "ent_cache"
+    assert first.features["max_guests_per_event"] == 25
+    assert first.features["max_zip_download_items"] == 0  # PlanFeatures defaults applied
+    assert get_entitlements(db_session, u.UserID) is first
+    assert loads == [u.UserID]
+
+    purchase.Status = "refunded"
+    db_session.commit()
+    # Still served from cache until something invalidates it
+    assert get_entitlements(db_session, u.UserID).has_plan
+    invalidate_entitlements(u.UserID)
+    after = get_entitlements(db_session, u.UserID)
+    assert not after.has_plan
+    assert after.features["max_guests_per_event"] == 0
+    assert loads == [u.UserID, u.UserID]
+    assert entitlements.entitlement_metrics()["hits"] >= 2
+
+
+def test_entitlement_cache_expires_after_ttl(db_session, monkeypatch):
+    u, _plan, _p = _user_with_plan(db_session, "ent_ttl")
+    monkeypatch.setattr(entitlements.settings, "ENTITLEMENT_CACHE_TTL_SECONDS", 60, raising=False)
+    clock = [1000.0]
+    monkeypatch.setattr(entitlements.time, "monotonic", lambda: clock[0])
+    first = get_entitlements(db_session, u.UserID)
+    clock[0] += 59
+    assert get_entitlements(db_session, u.UserID) is first
+    clock[0] += 2
+    assert get_entitlements(db_session, u.UserID) is not first
+
+
+def test_stripe_webhook_invalidates_cached_entitlements(db_session):
+    u, plan, purchase = _user_with_plan(
+        db_session, "ent_hook", status="pending", session_id="sess_ent_hook"
+    )
+    assert not get_entitlements(db_session, u.UserID).has_plan
+
+    from main import app
+
+    event = {
+        "id": "evt_ent_hook",
+        "type": "checkout.session.completed",
+        "data": {"object": {"id": "sess_ent_hook", "payment_intent": "pi_ent_hook"}},
+    }
+    r = TestClient(app).post("/stripe/webhook", json=event)
+    assert r.status_code == 200
+
+    db_session.expire_all()
+    assert get_entitlements(db_session, u.UserID).plan_id == plan.PlanID
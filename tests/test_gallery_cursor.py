@@ -0,0 +1,193 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import event as sa_event
+
+from app.api.gallery import GALLERY_COOKIE, _build_gallery_files, _sign_scope
+from app.services.auth import create_session
+
+
+def _ordered_event(db_session, tag):
+    """Event with two ordinal rows, tied and missing capture times; returns (user, event, ids)."""
+    from app.models.event import Event, FileMetadata
+    from app.models.photo_order import EventGalleryOrder
+    from app.models.user import User
+
+    EventGalleryOrder.__table__.create(bind=db_session.get_bind(), checkfirst=True)
+    u = User(FirstName="C", LastName="P", Email=f"cursor-{tag}@example.test", HashedPassword="x")
+    db_session.add(u)
+    db_session.flush()
+    ev = Event(
+        UserID=u.UserID, Name=tag, Code=f"CUR{tag.upper()}", Password="pw", TermsChecked=True
+    )
+    db_session.add(ev)
+    db_session.flush()
+    uploaded = datetime(2026, 1, 1, 12, 0, 0)
+    captured = [
+        datetime(2025, 5, 2, 10, 0, 0),
+        None,
+        datetime(2025, 5, 1, 9, 30, 0),
+        datetime(2025, 5, 1, 9, 30, 0),
+        None,
+        datetime(2025, 4, 30, 8, 0, 0),
+        datetime(2025, 5, 3, 7, 0, 0),
+    ]
+    files = []
+    for i, cap in enumerate(captured):
+        f = FileMetadata(
+            EventID=ev.EventID,
+            FileName=f"{i}.jpg",
+            FileType="image/jpeg",
+            FileSize=1,
+            CapturedDateTime=cap,
+            UploadDate=uploaded,
+        )
+        db_session.add(f)
+        files.append(f)
+    db_session.flush()
+    db_session.add_all(
+        [
+            EventGalleryOrder(
+                EventID=ev.EventID, FileMetadataID=files[4].FileMetadataID, Ordinal=1
+            ),
+            EventGalleryOrder(
+                EventID=ev.EventID, FileMetadataID=files[0].FileMetadataID, Ordinal=2
+            ),
+        ]
+    )
+    db_session.commit()
+    ids = [f.FileMetadataID for f in files]
+    # Ordinals first, then captured asc (ties by id), then NULL captured times
+    expected = [ids[4], ids[0], ids[5], ids[2], ids[3], ids[6], ids[1]]
+    return u, ev, expected
+
+
+def test_cursor_pages_follow_ordinals_then_chronological(db_session):
+    u, ev, expected = _ordered_event(db_session, "walk")
+
+    full, more = _build_gallery_files(db_session, u.UserID, ev.EventID, None, False)
+    assert [f["id"] for f in full] == expected and more is None
+
+    seen, cursor = [], None
+    while True:
+        page, more = _build_gallery_files(
+            db_session, u.UserID, ev.EventID, None, False, limit=2, cursor=cursor
+        )
+        seen += [f["id"] for f in page]
+        if not more:
+            break
+        cursor = more
+    assert seen == expected
+
+    # Offset paging still agrees with the keyset order
+    page, _ = _build_gallery_files(db_session, u.UserID, ev.EventID, None, False, limit=3, offset=2)
+    assert [f["id"] for f in page] == expected[2:5]
+
+
+def test_cursor_page_reads_bounded_plain_column_queries_and_bad_cursors_restart(db_session):
+    from db import engine
+
+    u, ev, expected = _ordered_event(db_session, "sql")
+    first, _ = _build_gallery_files(db_session, u.UserID, ev.EventID, None, False, limit=3)
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    sa_event.listen(engine, "before_cursor_execute", listener)
+    try:
+        page, more = _build_gallery_files(
+            db_session, u.UserID, ev.EventID, None, False, limit=3, cursor=first[-1]["cursor"]
+        )
+    finally:
+        sa_event.remove(engine, "before_cursor_execute", listener)
+    assert [f["id"] for f in page] == expected[3:6] and more == page[-1]["cursor"]
+    # The page runs out of captured files and reads on into the NULL-captured phase
+    file_selects = [s for s in statements if 'FROM "FileMetadata"' in s]
+    assert len(file_selects) == 2
+    for sql in file_selects:
+        assert "EventGalleryOrder" in sql and "LIMIT" in sql and "CASE" not in sql
+    assert all("ordinal" not in f for f in page)
+    assert [f.get("ordinal") for f in first[:2]] == [1, 2]
+
+    # Malformed cursors, or ones from a differently shaped scope, start from the top
+    for bad in ("not-a-cursor", first[-1]["cursor"][:-4]):
+        page, _ = _build_gallery_files(
+            db_session, u.UserID, ev.EventID, None, False, limit=3, cursor=bad
+        )
+        assert [f["id"] for f in page] == expected[:3]
+    page, _ = _build_gallery_files(
+        db_session, u.UserID, None, None, False, cursor=first[-1]["cursor"]
+    )
+    assert [f["id"] for f in page][0] != expected[0]
+
+
+def test_gallery_data_returns_next_cursor(db_session, client):
+    u, ev, expected = _ordered_event(db_session, "api")
+    sess = create_session(db_session, user_id=u.UserID)
+    client.cookies.set("session_id", str(sess.SessionID))
+    client.cookies.set(GALLERY_COOKIE, _sign_scope(str(ev.EventID)))
+
+    seen, params = [], {"limit": 3}
+    while True:
+        j = client.get("/gallery/data", params=params).json()
+        assert j["ok"] is True
+        seen += [f["id"] for f in j["files"]]
+        if not j["next_cursor"]:
+            break
+        params = {"limit": 3, "cursor": j["next_cursor"]}
+    assert seen == expected
+
+
+def test_deleted_view_pages_follow_the_keyset_not_the_display_order(db_session, client):
+    from datetime import timedelta
+
+    from app.models.event import FileMetadata
+
+    u, ev, expected = _ordered_event(db_session, "bin")
+    # Deleted most recently first in keyset order, so each page is displayed reversed
+    base = datetime(2026, 3, 1, 12, 0, 0)
+    for i, file_id in enumerate(expected):
+        f = db_session.get(FileMetadata, file_id)
+        f.Deleted = True
+        f.DeletedAt = None if i == 3 else base - timedelta(days=i)
+    db_session.commit()
+
+    page, more = _build_gallery_files(db_session, u.UserID, ev.EventID, None, True, limit=3)
+    assert [f["id"] for f in page] == expected[2::-1]
+    assert more == page[0]["cursor"]
+
+    sess = create_session(db_session, user_id=u.UserID)
+    client.cookies.set("session_id", str(sess.SessionID))
+    client.cookies.set(GALLERY_COOKIE, _sign_scope(str(ev.EventID)))
+    seen, params = [], {"limit": 3, "show_deleted": 1}
+    while True:
+        j = client.get("/gallery/data", params=params).json()
+        seen += [f["id"] for f in j["files"]]
+        if not j["next_cursor"]:
+            break
+        params = {"limit": 3, "show_deleted": 1, "cursor": j["next_cursor"]}
+    assert sorted(seen) == sorted(expected) and len(seen) == len(expected)
+
+
+def test_datetime_cursor_binds_at_the_column_precision():
+    from types import SimpleNamespace
+
+    from sqlalchemy.dialects import mssql
+
+    from app.api.gallery import _decode_gallery_cursor, _encode_gallery_cursor, _keyset_after
+    from app.models.event import FileMetadata
+
+    # DATETIME stores 1/300 s ticks; pyodbc reads .00333 back as .003
+    captured = datetime(2025, 5, 1, 9, 30, 0, 3000)
+    cursor = _encode_gallery_cursor("c", [captured, datetime(2026, 1, 1), 7])
+    assert _decode_gallery_cursor(cursor, {"c": 3}) == ["c", captured, datetime(2026, 1, 1), 7]
+    assert b"09:30:00.003" in base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+
+    db = SimpleNamespace(get_bind=lambda: SimpleNamespace(dialect=mssql.dialect()))
+    keys = [FileMetadata.CapturedDateTime, FileMetadata.UploadDate, FileMetadata.FileMetadataID]
+    sql = str(
+        _keyset_after(db, keys, [captured, datetime(2026, 1, 1), 7]).compile(
+            dialect=mssql.dialect()
+        )
+    )
+    assert sql.count("CAST(") == 4 and "AS DATETIME)" in sql
+    assert "CASE" not in sql
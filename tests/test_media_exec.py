@@ -0,0 +1,81 @@
+import asyncio
+import sys
+import time
+
+import pytest
+
+from app.services.media_exec import KIND_PROBE, MediaExecSupervisor, MediaExecTimeout
+
+
+def _py(code: str) -> list[str]:
+    return [sys.executable, "-c", code]
+
+
+def test_run_captures_output_and_records_latency():
+    sup = MediaExecSupervisor(2)
+    result = sup.run(_py("print('{\"ok\": 1}')"), kind=KIND_PROBE, timeout=20)
+    assert result.ok and result.stdout.strip() == b'{"ok": 1}'
+    failed = sup.run(_py("import sys; sys.exit(3)"), kind=KIND_PROBE, timeout=20)
+    assert failed.returncode == 3
+    stats = sup.metrics()[KIND_PROBE]
+    assert stats["calls"] == 2 and stats["failed"] == 1 and stats["in_flight"] == 0
+    assert stats["seconds_max"] > 0
+
+
+def test_overrunning_command_is_killed():
+    sup = MediaExecSupervisor(1)
+    started = time.monotonic()
+    with pytest.raises(MediaExecTimeout):
+        sup.run(_py("import time; time.sleep(30)"), kind="transcode", timeout=0.5)
+    assert time.monotonic() - started < 10
+    assert sup.metrics()["transcode"]["timeouts"] == 1
+    # The slot was released: the next call still runs
+    assert sup.run(_py("pass"), kind="transcode", timeout=20).ok
+
+
+def test_semaphore_bounds_concurrent_processes():
+    sup = MediaExecSupervisor(1)
+    code = "import time; time.sleep(0.3)"
+
+    async def burst():
+        return await asyncio.gather(
+            *(sup.run_async(_py(code), kind=KIND_PROBE, timeout=20) for _ in range(3))
+        )
+
+    started = time.monotonic()
+    results = asyncio.run(burst())
+    assert all(r.ok for r in results)
+    # One slot: the three sleeps ran back to back
+    assert time.monotonic() - started >= 0.9
+    assert sup.metrics()[KIND_PROBE]["wait_seconds_total"] > 0
+
+
+def test_video_poster_downscales_existing_wider_poster(tmp_path, monkeypatch):
+    from PIL import Image
+
+    from app.services import thumbs
+
+    wide = tmp_path / "7_1440.jpg"
+    Image.new("RGB", (1440, 810), color=(5, 5, 5)).save(wide, format="JPEG")
+
+    def no_ffmpeg(argv):
+        raise AssertionError("ffmpeg should not run")
+
+    monkeypatch.setattr(thumbs, "run_transcode", no_ffmpeg)
+    out = tmp_path / "7_480.jpg"
+    assert thumbs.ensure_video_poster(str(tmp_path / "missing.mp4"), str(out), 480)
+    with Image.open(out) as im:
+        assert im.width == 480
+
+
+def test_sync_run_from_an_event_loop_is_flagged(caplog):
+    sup = MediaExecSupervisor(1)
+
+    async def handler():
+        return sup.run(_py("pass"), kind=KIND_PROBE, timeout=20)
+
+    with caplog.at_level("WARNING", logger="app.services.media_exec"):
+        assert sup.run(_py("pass"), kind=KIND_PROBE, timeout=20).ok
+        assert not caplog.records
+        assert asyncio.run(handler()).ok
+    assert "event loop" in caplog.records[0].getMessage()
@@ -0,0 +1,181 @@
+from app.jobs import media_tasks
+from app.jobs.queue import claim, enqueue, fail, requeue_stale
+from app.jobs.worker import process_batch
+from app.models.event import Event
+from app.models.media_job import MediaJob
+from app.models.user import User
+
+
+def _event(db_session, code: str) -> Event:
+    MediaJob.__table__.create(bind=db_session.get_bind(), checkfirst=True)
+    # The queue is global: start each test from an empty table
+    db_session.query(MediaJob).delete()
+    u = User(FirstName="J", LastName="Q", Email=f"{code.lower()}@example.test", HashedPassword="x")
+    db_session.add(u)
+    db_session.flush()
+    ev = Event(UserID=u.UserID, Name="Jobs", Code=code, Password="pw", TermsChecked=True)
+    db_session.add(ev)
+    db_session.flush()
+    return ev
+
+
+def test_claim_marks_running_and_skips_claimed(db_session):
+    ev = _event(db_session, "JOBS1")
+    enqueue(db_session, "noop", ev.EventID, payload={"x": 1})
+    enqueue(db_session, "noop", ev.EventID)
+    db_session.commit()
+
+    first = claim(db_session, "w1", limit=1)
+    assert len(first) == 1 and first[0]["payload"] == {"x": 1}
+    second = claim(db_session, "w2", limit=5)
+    assert [s["job_id"] for s in second] != [first[0]["job_id"]]
+    assert claim(db_session, "w3", limit=5) == []
+    job = db_session.get(MediaJob, first[0]["job_id"])
+    assert job.Status == "running" and job.LockedBy == "w1" and job.Attempts == 1
+
+
+def test_failures_back_off_then_dead_letter(db_session):
+    ev = _event(db_session, "JOBS2")
+    job = enqueue(db_session, "noop", ev.EventID, max_attempts=2)
+    db_session.commit()
+
+    spec = claim(db_session, "w", limit=1)[0]
+    assert fail(db_session, spec["job_id"], "boom") == "queued"
+    db_session.refresh(job)
+    assert job.RunAfter > job.LockedAt  # pushed into the future
+    # Not due yet
+    assert claim(db_session, "w", limit=1) == []
+
+    job.RunAfter = job.LockedAt
+    db_session.commit()
+    spec = claim(db_session, "w", limit=1)[0]
+    assert spec["attempt"] == 2
+    assert fail(db_session, spec["job_id"], "boom again") == "dead"
+    db_session.refresh(job)
+    assert job.Status == "dead" and job.LastError == "boom again"
+
+
+def test_worker_runs_handlers_inline_and_records_outcome(db_session, monkeypatch):
+    ev = _event(db_session, "JOBS3")
+    seen = []
+    monkeypatch.setitem(media_tasks.HANDLERS, "ok", lambda spec: seen.append(spec["job_id"]))
+
+    def _broken(spec):
+        raise RuntimeError("nope")
+
+    monkeypatch.setitem(media_tasks.HANDLERS, "broken", _broken)
+    ok = enqueue(db_session, "ok", ev.EventID)
+    broken = enqueue(db_session, "broken", ev.EventID)
+    db_session.commit()
+
+    assert process_batch(db_session, "w", None, batch=10) == 2
+    db_session.refresh(ok)
+    db_session.refresh(broken)
+    assert seen == [ok.JobID]
+    assert ok.Status == "completed"
+    assert broken.Status == "queued" and "RuntimeError: nope" in broken.LastError
+
+
+def test_requeue_stale_returns_abandoned_jobs(db_session):
+    ev = _event(db_session, "JOBS4")
+    job = enqueue(db_session, "noop", ev.EventID)
+    db_session.commit()
+    claim(db_session, "crashed-worker", limit=1)
+    assert requeue_stale(db_session, lease_seconds=1) == 0
+    db_session.refresh(job)
+    job.LockedAt = job.LockedAt.replace(year=job.LockedAt.year - 1)
+    db_session.commit()
+    assert requeue_stale(db_session, lease_seconds=1) == 1
+    db_session.refresh(job)
+    assert job.Status == "queued" and job.LockedBy is None
+
+
+def test_queue_post_ingest_enqueues_thumbs_and_one_order_rebuild(db_session, monkeypatch):
+    from app.core.settings import settings
+    from app.models.event import FileMetadata
+    from app.services.upload_ingest import queue_post_ingest
+
+    ev = _event(db_session, "JOBS5")
+    recs = []
+    for i in range(2):
+        fm = FileMetadata(
+            EventID=ev.EventID, FileName=f"{i}.jpg", FileType="image/jpeg", FileSize=1
+        )
+        db_session.add(fm)
+        recs.append(fm)
+    db_session.flush()
+
+    assert queue_post_ingest(db_session, ev.UserID, ev.EventID, recs) is False
+    monkeypatch.setattr(settings, "MEDIA_JOB_QUEUE", True)
+    assert queue_post_ingest(db_session, ev.UserID, ev.EventID, recs) is True
+    db_session.flush()
+    assert queue_post_ingest(db_session, ev.UserID, ev.EventID, recs[:1]) is True
+    db_session.flush()
+    kinds = [j.Kind for j in db_session.query(MediaJob).order_by(MediaJob.JobID)]
+    assert kinds == ["thumbnails", "thumbnails", "gallery_order", "thumbnails"]
+
+
+def test_worker_pool_spawns_its_processes():
+    from app.jobs.worker import _new_pool
+
+    pool = _new_pool(1)
+    try:
+        assert pool._mp_context.get_start_method() == "spawn"
+    finally:
+        pool.shutdown()
+
+
+class _BrokenPool:
+    """Stands in for a pool that one job's process crash has taken down."""
+
+    def submit(self, fn, spec):
+        from concurrent.futures import Future
+        from concurrent.futures.process import BrokenProcessPool
+
+        fut = Future()
+        fut.set_exception(BrokenProcessPool("a process died"))
+        return fut
+
+
+def test_broken_pool_requeues_the_batch_uncharged_but_charges_a_lone_job(db_session):
+    from concurrent.futures.process import BrokenProcessPool
+
+    import pytest
+
+    ev = _event(db_session, "JOBS6")
+    jobs = [enqueue(db_session, "noop", ev.EventID) for _ in range(3)]
+    db_session.commit()
+
+    with pytest.raises(BrokenProcessPool):
+        process_batch(db_session, "w", _BrokenPool(), batch=10)
+    for job in jobs:
+        db_session.refresh(job)
+        assert job.Status == "queued" and job.Attempts == 0 and job.LockedBy is None
+
+    # Claimed on its own, the job that crashes is the one charged
+    with pytest.raises(BrokenProcessPool):
+        process_batch(db_session, "w", _BrokenPool(), batch=1)
+    db_session.refresh(jobs[0])
+    assert jobs[0].Attempts == 1 and "BrokenProcessPool" in jobs[0].LastError
+
+
+def test_worker_survives_database_errors(db_session, monkeypatch):
+    from app.jobs import worker
+
+    ev = _event(db_session, "JOBS7")
+    enqueue(db_session, "noop", ev.EventID)
+    db_session.commit()
+    monkeypatch.setitem(media_tasks.HANDLERS, "noop", lambda spec: None)
+    sleeps = []
+    monkeypatch.setattr(worker.time, "sleep", sleeps.append)
+    calls = []
+
+    def factory():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("database unavailable")
+        return db_session
+
+    monkeypatch.setattr(db_session, "close", lambda: None)
+    n = worker.run_worker(factory, processes=0, batch=5, poll_seconds=1.0, once=True)
+    assert n == 1 and sleeps == [2.0]
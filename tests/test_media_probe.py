@@ -0,0 +1,79 @@
+import asyncio
+from io import BytesIO
+
+import pytest
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from app.services.media_probe import ImageRejected, probe_image
+
+
+def _jpeg(size=(64, 48), exif: bytes = b"") -> bytes:
+    from PIL import Image
+
+    buf = BytesIO()
+    Image.effect_noise(size, 60).convert("RGB").save(buf, format="JPEG", exif=exif)
+    return buf.getvalue()
+
+
+def _png(size=(64, 48)) -> bytes:
+    from PIL import Image
+
+    buf = BytesIO()
+    Image.effect_noise(size, 60).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_probe_reads_header_fields():
+    import piexif
+
+    exif = piexif.dump(
+        {
+            "0th": {piexif.ImageIFD.Orientation: 6},
+            "Exif": {piexif.ExifIFD.DateTimeOriginal: b"2023:01:02 03:04:05"},
+            "GPS": {
+                piexif.GPSIFD.GPSLatitudeRef: b"S",
+                piexif.GPSIFD.GPSLatitude: ((33, 1), (52, 1), (0, 1)),
+                piexif.GPSIFD.GPSLongitudeRef: b"E",
+                piexif.GPSIFD.GPSLongitude: ((151, 1), (12, 1), (36, 1)),
+            },
+        }
+    )
+    probe = probe_image(_jpeg((80, 40), exif=exif))
+    assert (probe.format, probe.width, probe.height) == ("JPEG", 80, 40)
+    assert probe.orientation == 6
+    assert probe.datetime_taken == "2023-01-02 03:04:05"
+    assert probe.gps_lat == pytest.approx(-33.8667, abs=1e-3)
+    assert probe.gps_long == pytest.approx(151.21, abs=1e-3)
+    # Unknown formats are left to the caller rather than rejected
+    assert probe_image(b"not an image at all") is None
+
+
+def test_probe_rejects_bombs_and_truncated_files():
+    data = _jpeg()
+    with pytest.raises(ImageRejected) as exc:
+        probe_image(data, max_pixels=1000)
+    assert exc.value.reason == "bomb"
+
+    for cut in (_jpeg()[:-400], _png()[:-200]):
+        with pytest.raises(ImageRejected) as exc:
+            probe_image(cut)
+        assert exc.value.reason == "truncated"
+    # Bytes after the JPEG end marker (e.g. a motion photo's video) are fine
+    assert probe_image(data + b"\x00ftypmp42" + b"\x01" * 200_000).width == 64
+    # A prefix is enough when truncation isn't checked
+    assert probe_image(data[:2048], check_truncation=False).height == 48
+
+
+def test_stage_upload_refuses_oversized_images(tmp_path, monkeypatch):
+    from app.core.settings import settings
+    from app.services.upload_ingest import stage_upload
+
+    monkeypatch.setattr(settings, "MAX_IMAGE_PIXELS", 1000, raising=False)
+    upload = UploadFile(
+        file=BytesIO(_jpeg()), filename="big.jpg", headers=Headers({"content-type": "image/jpeg"})
+    )
+    staged = asyncio.run(stage_upload(upload, str(tmp_path)))
+    assert staged.rejected == "image"
+    assert staged.path is None
+    assert list(tmp_path.iterdir()) == []
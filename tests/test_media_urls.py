@@ -0,0 +1,150 @@
+import os
+import shutil
+from urllib.parse import parse_qs, urlsplit
+
+from PIL import Image
+from sqlalchemy import event as sa_event
+
+from app.services.media_urls import (
+    THUMB_KIND_VIDEO,
+    signed_thumb_url,
+    url_expiry,
+    verify_thumb_signature,
+)
+
+
+def _params(url):
+    q = {k: v[0] for k, v in parse_qs(urlsplit(url).query).items()}
+    return int(q["u"]), int(q["e"]), int(q["w"]), int(q["exp"]), q["sig"]
+
+
+def test_signature_covers_every_field_and_expires():
+    url = signed_thumb_url(3, 4, 5, 720, expires=10_000)
+    assert url.startswith("/thumbs/5.jpg?w=720&u=3&e=4&exp=10000&sig=")
+    u, e, w, exp, sig = _params(url)
+    assert verify_thumb_signature(u, e, 5, w, exp, sig, now=9_000)
+    assert not verify_thumb_signature(u, e, 5, w, exp, sig, now=10_001)
+    assert not verify_thumb_signature(u, e, 6, w, exp, sig, now=9_000)
+    assert not verify_thumb_signature(u, e, 5, 1440, exp, sig, now=9_000)
+    assert not verify_thumb_signature(u + 1, e, 5, w, exp, sig, now=9_000)
+    assert not verify_thumb_signature(u, e, 5, w, exp + 3600, sig, now=9_000)
+    assert not verify_thumb_signature(u, e, 5, w, None, None, now=9_000)
+    # The media type is signed too
+    assert not verify_thumb_signature(u, e, 5, w, exp, sig, kind=THUMB_KIND_VIDEO, now=9_000)
+    assert not verify_thumb_signature(u, e, 5, w, exp, sig, kind=None, now=9_000)
+    # Expiries are bucketed so repeated page renders emit the same URLs
+    assert url_expiry(now=7_201) == url_expiry(now=10_799) == 14_400
+
+
+def test_signed_cached_thumbnail_needs_no_session_or_query(db_session, client):
+    from app.models.event import Event, FileMetadata
+    from app.models.user import User
+    from db import engine
+
+    u = User(FirstName="S", LastName="U", Email="signed-url@example.test", HashedPassword="x")
+    db_session.add(u)
+    db_session.flush()
+    ev = Event(UserID=u.UserID, Name="Signed", Code="SIGNURL", Password="pw", TermsChecked=True)
+    db_session.add(ev)
+    db_session.flush()
+    f = FileMetadata(EventID=ev.EventID, FileName="s.jpg", FileType="image/jpeg", FileSize=1)
+    db_session.add(f)
+    db_session.commit()
+    tdir = os.path.join("storage", str(u.UserID), str(ev.EventID), "thumbnails")
+    shutil.rmtree(os.path.dirname(tdir), ignore_errors=True)
+    os.makedirs(tdir)
+    Image.new("RGB", (480, 320)).save(os.path.join(tdir, f"{f.FileMetadataID}_480.jpg"))
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    sa_event.listen(engine, "before_cursor_execute", listener)
+    try:
+        url = signed_thumb_url(u.UserID, ev.EventID, f.FileMetadataID, 480)
+        r = client.get(url, headers={"Accept": "image/jpeg"}, follow_redirects=False)
+    finally:
+        sa_event.remove(engine, "before_cursor_execute", listener)
+
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "image/jpeg"
+    assert statements == []
+
+
+def test_gallery_builder_signs_urls_and_bad_signatures_need_a_session(db_session, client):
+    from app.api.gallery import _build_gallery_files
+    from app.models.event import Event, FileMetadata
+    from app.models.user import User
+
+    u = User(FirstName="B", LastName="S", Email="bad-signature@example.test", HashedPassword="x")
+    db_session.add(u)
+    db_session.flush()
+    ev = Event(UserID=u.UserID, Name="BadSig", Code="BADSIG", Password="pw", TermsChecked=True)
+    db_session.add(ev)
+    db_session.flush()
+    f = FileMetadata(EventID=ev.EventID, FileName="b.jpg", FileType="image/jpeg", FileSize=1)
+    db_session.add(f)
+    db_session.commit()
+
+    (tile,) = _build_gallery_files(db_session, u.UserID, ev.EventID, None, False)[0]
+    uid, eid, w, exp, sig = _params(tile["thumb_url"])
+    assert (uid, eid, w) == (u.UserID, ev.EventID, 720)
+    assert verify_thumb_signature(uid, eid, f.FileMetadataID, w, exp, sig)
+    assert tile["srcset"].count("sig=") == 4
+
+    # Pointing a signature at another file falls back to the session check
+    forged = tile["thumb_url"].replace(f"/thumbs/{f.FileMetadataID}.jpg", "/thumbs/999999.jpg")
+    r = client.get(forged, follow_redirects=False)
+    assert r.status_code == 302 and r.headers["location"] == "/login"
+
+
+def test_signed_fallbacks_are_served_from_disk_without_a_query(db_session, client, monkeypatch):
+    import app.api.gallery as gallery
+    from app.models.event import Event, FileMetadata
+    from app.models.user import User
+    from db import engine
+
+    u = User(FirstName="F", LastName="B", Email="signed-fallback@example.test", HashedPassword="x")
+    db_session.add(u)
+    db_session.flush()
+    ev = Event(UserID=u.UserID, Name="Fallback", Code="SIGNFB", Password="pw", TermsChecked=True)
+    db_session.add(ev)
+    db_session.flush()
+    photo = FileMetadata(EventID=ev.EventID, FileName="p.jpg", FileType="image/jpeg", FileSize=1)
+    video = FileMetadata(EventID=ev.EventID, FileName="v.mp4", FileType="video/mp4", FileSize=1)
+    db_session.add_all([photo, video])
+    db_session.commit()
+    tdir = os.path.join("storage", str(u.UserID), str(ev.EventID), "thumbnails")
+    shutil.rmtree(os.path.dirname(tdir), ignore_errors=True)
+    os.makedirs(tdir)
+    for f in (photo, video):
+        Image.new("RGB", (480, 320)).save(os.path.join(tdir, f"{f.FileMetadataID}_480.jpg"))
+
+    submitted = []
+
+    class FakeScheduler:
+        def submit(self, kind, orig_path, out_path, width, **kw):
+            submitted.append((kind, orig_path, out_path))
+
+    monkeypatch.setattr(gallery, "get_scheduler", lambda: FakeScheduler())
+    monkeypatch.setattr(gallery, "negotiate_thumb_ext", lambda accept: ".webp")
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    sa_event.listen(engine, "before_cursor_execute", listener)
+    try:
+        poster = signed_thumb_url(
+            u.UserID, ev.EventID, video.FileMetadataID, 480, kind=THUMB_KIND_VIDEO
+        )
+        r_poster = client.get(poster, headers={"Accept": "image/webp"}, follow_redirects=False)
+        thumb = signed_thumb_url(u.UserID, ev.EventID, photo.FileMetadataID, 480)
+        r_thumb = client.get(thumb, headers={"Accept": "image/webp"}, follow_redirects=False)
+    finally:
+        sa_event.remove(engine, "before_cursor_execute", listener)
+
+    assert statements == []
+    # Posters never have variants: plain JPEG, nothing to negotiate or fill in
+    assert r_poster.status_code == 200 and r_poster.headers["content-type"] == "image/jpeg"
+    assert "vary" not in r_poster.headers
+    # A missing image variant serves the JPEG and is rendered from it in the background
+    assert r_thumb.status_code == 200 and r_thumb.headers["content-type"] == "image/jpeg"
+    assert r_thumb.headers["vary"] == "Accept"
+    jpeg = os.path.join(tdir, f"{photo.FileMetadataID}_480.jpg")
+    assert submitted == [(gallery.KIND_IMAGE, jpeg, jpeg[: -len(".jpg")] + ".webp")]
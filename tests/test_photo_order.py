@@ -3,6 +3,8 @@ from datetime import datetime, timedelta, timezone
 from app.models.event import Event, FileMetadata
 from app.models.photo_order import EventGalleryOrder
 from app.services.photo_order_service import (
+    ORDINAL_GAP,
+    insert_files_into_gallery_order,
     rebuild_event_gallery_order,
 )
 
@@ -74,4 +76,184 @@ def test_rebuild_event_gallery_order_basic(db_session):
         .all()
     )
     assert [r.FileMetadataID for r in rows] == [f1_id, f2_id, f3_id]
-    assert [r.Ordinal for r in rows] == [1, 2, 3]
+    assert [r.Ordinal for r in rows] == [ORDINAL_GAP, 2 * ORDINAL_GAP, 3 * ORDINAL_GAP]
+
+
+def _order_ids(db_session, event_id):
+    rows = (
+        db_session.query(EventGalleryOrder)
+        .filter(EventGalleryOrder.EventID == event_id)
+        .order_by(EventGalleryOrder.Ordinal)
+        .all()
+    )
+    return [r.FileMetadataID for r in rows]
+
+
+def _order_event(db_session, code):
+    from app.models.user import User
+
+    user = db_session.query(User).first()
+    ev = Event(Name=code, Code=code, Password="p", UserID=user.UserID)
+    db_session.add(ev)
+    db_session.flush()
+    return ev
+
+
+def _add_file(db_session, ev, name, captured, uploaded):
+    f = FileMetadata(
+        EventID=ev.EventID,
+        FileName=name,
+        FileType="image/jpeg",
+        FileSize=100,
+        CapturedDateTime=captured,
+        UploadDate=uploaded,
+    )
+    db_session.add(f)
+    db_session.flush()
+    return f
+
+
+def test_insert_files_places_new_rows_without_rewriting(db_session):
+    ev = _order_event(db_session, "ordinc1")
+    base = datetime(2024, 1, 1, 12, 0, 0)
+    a = _add_file(db_session, ev, "a.jpg", base, base)
+    c = _add_file(db_session, ev, "c.jpg", base + timedelta(hours=2), base)
+    d = _add_file(db_session, ev, "d.jpg", None, base)
+    rebuild_event_gallery_order(db_session, ev.EventID)
+    before = {
+        r.FileMetadataID: (r.EventGalleryOrderID, r.Ordinal)
+        for r in db_session.query(EventGalleryOrder).filter(EventGalleryOrder.EventID == ev.EventID)
+    }
+
+    b = _add_file(db_session, ev, "b.jpg", base + timedelta(hours=1), base)
+    first = _add_file(db_session, ev, "0.jpg", base - timedelta(hours=1), base)
+    e = _add_file(db_session, ev, "e.jpg", None, base + timedelta(minutes=5))
+    db_session.commit()
+    rows = insert_files_into_gallery_order(
+        db_session, ev.EventID, [b.FileMetadataID, first.FileMetadataID, e.FileMetadataID]
+    )
+
+    assert len(rows) == 3
+    assert _order_ids(db_session, ev.EventID) == [
+        first.FileMetadataID,
+        a.FileMetadataID,
+        b.FileMetadataID,
+        c.FileMetadataID,
+        d.FileMetadataID,
+        e.FileMetadataID,
+    ]
+    # Pre-existing rows keep their identity and ordinal
+    after = {
+        r.FileMetadataID: (r.EventGalleryOrderID, r.Ordinal)
+        for r in db_session.query(EventGalleryOrder).filter(EventGalleryOrder.EventID == ev.EventID)
+    }
+    for fid, val in before.items():
+        assert after[fid] == val
+    # Already placed files are ignored
+    assert insert_files_into_gallery_order(db_session, ev.EventID, [a.FileMetadataID]) == []
+
+
+def test_insert_files_rebuilds_when_gaps_run_out(db_session):
+    ev = _order_event(db_session, "ordinc2")
+    base = datetime(2024, 1, 1, 12, 0, 0)
+    a = _add_file(db_session, ev, "a.jpg", base, base)
+    c = _add_file(db_session, ev, "c.jpg", base + timedelta(hours=1), base)
+    # Legacy contiguous ordinals leave no room between a and c
+    db_session.add_all(
+        [
+            EventGalleryOrder(EventID=ev.EventID, FileMetadataID=a.FileMetadataID, Ordinal=1),
+            EventGalleryOrder(EventID=ev.EventID, FileMetadataID=c.FileMetadataID, Ordinal=2),
+        ]
+    )
+    b = _add_file(db_session, ev, "b.jpg", base + timedelta(minutes=30), base)
+    db_session.commit()
+
+    insert_files_into_gallery_order(db_session, ev.EventID)
+
+    rows = (
+        db_session.query(EventGalleryOrder)
+        .filter(EventGalleryOrder.EventID == ev.EventID)
+        .order_by(EventGalleryOrder.Ordinal)
+        .all()
+    )
+    assert [r.FileMetadataID for r in rows] == [
+        a.FileMetadataID,
+        b.FileMetadataID,
+        c.FileMetadataID,
+    ]
+    assert [r.Ordinal for r in rows] == [ORDINAL_GAP, 2 * ORDINAL_GAP, 3 * ORDINAL_GAP]
+
+
+def test_insert_spreads_a_batch_across_one_gap_with_indexed_seeks(db_session):
+    from sqlalchemy import event as sa_event
+
+    ev = _order_event(db_session, "ordinc3")
+    base = datetime(2024, 1, 1, 12, 0, 0)
+    a = _add_file(db_session, ev, "a.jpg", base, base)
+    c = _add_file(db_session, ev, "c.jpg", base + timedelta(hours=1), base)
+    for i in range(30):
+        _add_file(db_session, ev, f"late{i}.jpg", base + timedelta(hours=2, minutes=i), base)
+    rebuild_event_gallery_order(db_session, ev.EventID)
+    ids_before = {
+        r.FileMetadataID: r.EventGalleryOrderID
+        for r in db_session.query(EventGalleryOrder).filter(EventGalleryOrder.EventID == ev.EventID)
+    }
+    batch = [
+        _add_file(db_session, ev, f"b{i}.jpg", base + timedelta(minutes=i + 1), base)
+        for i in range(20)
+    ]
+    db_session.commit()
+    batch_ids = [f.FileMetadataID for f in batch]
+    event_id = ev.EventID
+
+    statements = []
+    conn = db_session.connection()
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    sa_event.listen(conn, "before_cursor_execute", listener)
+    try:
+        rows = insert_files_into_gallery_order(db_session, event_id, batch_ids)
+    finally:
+        sa_event.remove(conn, "before_cursor_execute", listener)
+
+    # Spread evenly between a and c rather than halving the same gap per file
+    ordinals = [r["Ordinal"] for r in rows]
+    assert ordinals == sorted(ordinals)
+    assert ORDINAL_GAP < ordinals[0] and ordinals[-1] < 2 * ORDINAL_GAP
+    steps = {b - a for a, b in zip(ordinals, ordinals[1:])}
+    assert max(steps) - min(steps) <= 1
+    order = _order_ids(db_session, ev.EventID)
+    assert order[: len(batch) + 2] == [a.FileMetadataID] + batch_ids + [c.FileMetadataID]
+    # No rebuild, and the cost doesn't depend on how many files are already placed
+    after = dict(
+        db_session.query(EventGalleryOrder.FileMetadataID, EventGalleryOrder.EventGalleryOrderID)
+        .filter(EventGalleryOrder.FileMetadataID.in_(list(ids_before)))
+        .all()
+    )
+    assert after == ids_before
+    selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+    # has-order probe, the new files, then one TOP 1 seek per neighbour of the gap
+    assert len(selects) == 4
+    for sql in selects[2:]:
+        assert "LIMIT" in sql and "ORDER BY" in sql and "max(" not in sql.lower()
+
+
+def test_insert_finds_neighbours_across_the_uncaptured_group(db_session):
+    ev = _order_event(db_session, "ordinc4")
+    base = datetime(2024, 1, 1, 12, 0, 0)
+    a = _add_file(db_session, ev, "a.jpg", base, base)
+    d = _add_file(db_session, ev, "d.jpg", None, base + timedelta(hours=1))
+    rebuild_event_gallery_order(db_session, ev.EventID)
+
+    # Captured after every placed captured file: its upper neighbour is the first
+    # uncaptured one. Uncaptured but uploaded before d: its lower one is a.
+    late = _add_file(db_session, ev, "late.jpg", base + timedelta(days=1), base)
+    early = _add_file(db_session, ev, "early.jpg", None, base)
+    db_session.commit()
+    insert_files_into_gallery_order(db_session, ev.EventID)
+
+    assert _order_ids(db_session, ev.EventID) == [
+        a.FileMetadataID,
+        late.FileMetadataID,
+        early.FileMetadataID,
+        d.FileMetadataID,
+    ]
@@ -0,0 +1,69 @@
+import base64
+import io
+
+from PIL import Image
+
+from app.services import placeholders
+from app.services import thumb_scheduler as ts
+
+
+def test_render_placeholder_is_a_tiny_inline_jpeg(tmp_path):
+    src = tmp_path / "480.jpg"
+    Image.effect_noise((480, 320), 40).convert("RGB").save(src, format="JPEG")
+
+    uri = placeholders.render_placeholder(str(src))
+
+    assert uri.startswith("data:image/jpeg;base64,")
+    assert len(uri) <= placeholders.PLACEHOLDER_MAX_CHARS
+    with Image.open(io.BytesIO(base64.b64decode(uri.split(",", 1)[1]))) as im:
+        assert im.size == (16, 11)
+    (tmp_path / "junk.jpg").write_bytes(b"not an image")
+    assert placeholders.render_placeholder(str(tmp_path / "junk.jpg")) is None
+
+
+def test_smallest_rung_render_records_placeholder(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(ts, "_record_usage", lambda task, ok: None)
+    monkeypatch.setattr(
+        placeholders, "record_placeholder_detached", lambda fid, path: recorded.append((fid, path))
+    )
+
+    def task(kind, width, file_id=7):
+        return ts.ThumbTask(kind, "o", f"t/{file_id}_{width}.jpg", width, 0, 0, 1, file_id)
+
+    ts._after_render(task(ts.KIND_IMAGE, 720), True)
+    ts._after_render(task(ts.KIND_LQIP, 480), True)
+    ts._after_render(task(ts.KIND_IMAGE, 480, file_id=None), True)
+    ts._after_render(task(ts.KIND_VIDEO, 480), False)
+    ts._after_render(task(ts.KIND_IMAGE, 480), True)
+    ladder = task(ts.KIND_LADDER, 1440, file_id=8)
+    ladder.targets = ((1440, "t/8_1440.jpg"), (480, "t/8_480.jpg"))
+    ts._after_render(ladder, True)
+
+    assert recorded == [(7, "t/7_480.jpg"), (8, "t/8_480.jpg")]
+
+
+def test_gallery_files_carry_the_stored_placeholder(db_session):
+    from app.api.gallery import _build_gallery_files
+    from app.models.event import Event, FileMetadata
+    from app.models.user import User
+
+    u = User(FirstName="P", LastName="H", Email="placeholder@example.test", HashedPassword="x")
+    db_session.add(u)
+    db_session.flush()
+    ev = Event(UserID=u.UserID, Name="Blur", Code="BLURUP", Password="pw", TermsChecked=True)
+    db_session.add(ev)
+    db_session.flush()
+    with_ph = FileMetadata(EventID=ev.EventID, FileName="a.jpg", FileType="image/jpeg", FileSize=1)
+    without = FileMetadata(EventID=ev.EventID, FileName="b.jpg", FileType="image/jpeg", FileSize=1)
+    db_session.add_all([with_ph, without])
+    db_session.flush()
+    assert placeholders.store_placeholder(db_session, with_ph.FileMetadataID, "data:image/jpeg;x")
+    # First placeholder wins
+    assert not placeholders.store_placeholder(db_session, with_ph.FileMetadataID, "data:other")
+    db_session.commit()
+
+    files, _ = _build_gallery_files(db_session, u.UserID, ev.EventID, None, False)
+
+    by_name = {f["name"]: f["placeholder"] for f in files}
+    assert by_name == {"a.jpg": "data:image/jpeg;x", "b.jpg": None}
@@ -0,0 +1,204 @@
+import base64
+import hashlib
+from io import BytesIO
+
+from fastapi.testclient import TestClient
+
+from app.models.event import Event, FileMetadata
+from app.models.resumable_upload import ResumableUpload
+from app.models.user import User
+
+
+def _jpeg_bytes() -> bytes:
+    from PIL import Image
+
+    buf = BytesIO()
+    Image.new("RGB", (64, 48), color=(200, 40, 90)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def _event(db_session, code: str) -> Event:
+    ResumableUpload.__table__.create(bind=db_session.get_bind(), checkfirst=True)
+    u = User(
+        FirstName="R",
+        LastName="U",
+        Email=f"{code.lower()}@example.test",
+        HashedPassword="x",
+        IsActive=True,
+    )
+    db_session.add(u)
+    db_session.flush()
+    ev = Event(
+        EventTypeID=None,
+        UserID=u.UserID,
+        Name="Resumable",
+        Code=code,
+        Password="pw",
+        TermsChecked=True,
+        Published=True,
+    )
+    db_session.add(ev)
+    db_session.flush()
+    return ev
+
+
+def _create(client: TestClient, code: str, length: int) -> str:
+    meta = "filename " + base64.b64encode(b"holiday.jpg").decode()
+    r = client.post(
+        f"/guest/upload/{code}/resumable",
+        headers={"Tus-Resumable": "1.0.0", "Upload-Length": str(length), "Upload-Metadata": meta},
+    )
+    assert r.status_code == 201
+    assert r.headers["Upload-Offset"] == "0"
+    return r.headers["Location"]
+
+
+def test_resumable_upload_resumes_and_ingests(
+    db_session, client: TestClient, tmp_path, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    ev = _event(db_session, "RESUME1")
+    data = _jpeg_bytes() + (b"\x00" * 20_000)
+    location = _create(client, ev.Code, len(data))
+    patch_headers = {"Tus-Resumable": "1.0.0", "Content-Type": "application/offset+octet-stream"}
+
+    first = 5_000
+    r = client.patch(
+        location, content=data[:first], headers={**patch_headers, "Upload-Offset": "0"}
+    )
+    assert r.status_code == 204
+    assert r.headers["Upload-Offset"] == str(first)
+
+    # After an interruption the client asks where to resume
+    r = client.head(location)
+    assert r.status_code == 200
+    assert r.headers["Upload-Offset"] == str(first)
+    assert r.headers["Upload-Length"] == str(len(data))
+
+    r = client.patch(
+        location, content=data[first:], headers={**patch_headers, "Upload-Offset": str(first)}
+    )
+    assert r.status_code == 204
+    assert r.headers["Upload-Offset"] == str(len(data))
+    file_id = int(r.headers["X-File-Id"])
+
+    rec = db_session.query(FileMetadata).filter(FileMetadata.FileMetadataID == file_id).one()
+    assert rec.EventID == ev.EventID
+    assert rec.FileSize == len(data)
+    assert rec.FileName == "holiday.jpg"
+    assert rec.Checksum == hashlib.sha256(data).hexdigest()
+    up = db_session.query(ResumableUpload).filter(ResumableUpload.EventID == ev.EventID).one()
+    assert up.Status == "complete"
+    assert up.FileMetadataID == file_id
+    stored = tmp_path / "storage" / str(ev.UserID) / str(ev.EventID) / "uploads" / "holiday.jpg"
+    assert stored.read_bytes() == data
+
+
+def test_resumable_upload_rejects_offset_mismatch(
+    db_session, client: TestClient, tmp_path, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    ev = _event(db_session, "RESUME2")
+    location = _create(client, ev.Code, 1_000)
+    r = client.patch(
+        location,
+        content=b"x" * 10,
+        headers={
+            "Tus-Resumable": "1.0.0",
+            "Content-Type": "application/offset+octet-stream",
+            "Upload-Offset": "500",
+        },
+    )
+    assert r.status_code == 409
+    assert r.headers["Upload-Offset"] == "0"
+
+
+def _age(db_session, location: str, **values):
+    db_session.query(ResumableUpload).filter(
+        ResumableUpload.UploadID == location.rsplit("/", 1)[-1]
+    ).update(values, synchronize_session=False)
+    db_session.commit()
+
+
+def test_resumable_patch_is_serialised_per_upload(
+    db_session, client: TestClient, tmp_path, monkeypatch
+):
+    from datetime import datetime, timedelta, timezone
+
+    monkeypatch.chdir(tmp_path)
+    ev = _event(db_session, "RESUME3")
+    location = _create(client, ev.Code, 1_000)
+    headers = {
+        "Tus-Resumable": "1.0.0",
+        "Content-Type": "application/offset+octet-stream",
+        "Upload-Offset": "0",
+    }
+    # Another PATCH is streaming into this upload right now
+    _age(db_session, location, Status="receiving")
+    r = client.patch(location, content=b"x" * 10, headers=headers)
+    assert r.status_code == 423
+    assert r.headers["Upload-Offset"] == "0"
+
+    # It stopped making progress, so a retry takes the upload over
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    _age(db_session, location, UpdatedAt=now - timedelta(minutes=10))
+    r = client.patch(location, content=b"x" * 10, headers=headers)
+    assert r.status_code == 204
+    assert r.headers["Upload-Offset"] == "10"
+    assert "Upload-Expires" in r.headers
+    up = db_session.query(ResumableUpload).filter(ResumableUpload.EventID == ev.EventID).one()
+    db_session.refresh(up)
+    assert (up.Status, up.Offset) == ("uploading", 10)
+
+
+def test_unfinished_uploads_count_against_the_storage_limit(
+    db_session, client: TestClient, tmp_path, monkeypatch
+):
+    import app.api.uploads as uploads_api
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(uploads_api, "_effective_storage_limit_mb", lambda *a: 1)
+    ev = _event(db_session, "RESUME4")
+    _create(client, ev.Code, 700_000)
+    r = client.post(
+        f"/guest/upload/{ev.Code}/resumable",
+        headers={"Tus-Resumable": "1.0.0", "Upload-Length": "700000"},
+    )
+    assert r.status_code == 413
+
+
+def test_idle_resumable_uploads_expire_with_their_staging_file(
+    db_session, client: TestClient, tmp_path, monkeypatch
+):
+    from datetime import datetime, timedelta, timezone
+
+    from app.services.upload_cleanup import expire_resumable_uploads, pending_upload_bytes
+
+    monkeypatch.chdir(tmp_path)
+    ev = _event(db_session, "RESUME5")
+    idle, active = _create(client, ev.Code, 1_000), _create(client, ev.Code, 2_000)
+    headers = {
+        "Tus-Resumable": "1.0.0",
+        "Content-Type": "application/offset+octet-stream",
+        "Upload-Offset": "0",
+    }
+    assert client.patch(idle, content=b"x" * 10, headers=headers).status_code == 204
+    assert pending_upload_bytes(db_session, ev.EventID) == 3_000
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    _age(db_session, idle, UpdatedAt=now - timedelta(days=2))
+    part = (
+        db_session.query(ResumableUpload.StagingPath)
+        .filter(ResumableUpload.UploadID == idle.rsplit("/", 1)[-1])
+        .scalar()
+    )
+
+    # Expired uploads stop accepting bytes and stop holding storage
+    r = client.patch(idle, content=b"x" * 10, headers={**headers, "Upload-Offset": "10"})
+    assert r.status_code == 410
+    assert pending_upload_bytes(db_session, ev.EventID) == 2_000
+
+    assert expire_resumable_uploads(db_session, batch_size=1) == 1
+    left = db_session.query(ResumableUpload.UploadID).filter(ResumableUpload.EventID == ev.EventID)
+    assert [r[0] for r in left] == [active.rsplit("/", 1)[-1]]
+    assert not (tmp_path / part).exists()
+    assert expire_resumable_uploads(db_session) == 0
@@ -0,0 +1,75 @@
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("moto")
+from moto import mock_aws  # noqa: E402
+
+from app.services.s3_storage import MIN_PART_BYTES, S3StorageService  # noqa: E402
+
+BUCKET = "epu-test-uploads"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        svc = S3StorageService(region="us-east-1", bucket=BUCKET, concurrency=3)
+        svc.client.create_bucket(Bucket=BUCKET)
+        yield svc
+
+
+def _blob(n: int) -> bytes:
+    return os.urandom(1024) * (n // 1024) + os.urandom(n % 1024)
+
+
+def test_upload_stream_from_path_uses_parallel_multipart(s3, tmp_path):
+    data = _blob(2 * MIN_PART_BYTES + 12345)
+    p = tmp_path / "video.mp4"
+    p.write_bytes(data)
+
+    key = asyncio.run(
+        s3.upload_stream(str(p), "uploads/1/2/3/video.mp4", "video/mp4", part_size=MIN_PART_BYTES)
+    )
+
+    assert key == "uploads/1/2/3/video.mp4"
+    obj = s3.client.get_object(Bucket=BUCKET, Key=key)
+    assert obj["Body"].read() == data
+    assert obj["ContentType"] == "video/mp4"
+    assert obj["ETag"].strip('"').endswith("-3")
+
+
+def test_upload_stream_small_async_iterator_uses_single_put(s3):
+    async def chunks():
+        for i in range(4):
+            yield bytes([i]) * 1000
+
+    key = asyncio.run(s3.upload_stream(chunks(), "small.jpg", "image/jpeg"))
+
+    body = s3.client.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+    assert body == b"".join(bytes([i]) * 1000 for i in range(4))
+    assert s3.client.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+
+
+def test_upload_stream_aborts_multipart_on_part_failure(s3, monkeypatch):
+    real_upload_part = s3.client.upload_part
+
+    def flaky_upload_part(**kwargs):
+        if kwargs["PartNumber"] == 2:
+            raise RuntimeError("connection reset")
+        return real_upload_part(**kwargs)
+
+    monkeypatch.setattr(s3.client, "upload_part", flaky_upload_part)
+
+    async def chunks():
+        for _ in range(3):
+            yield _blob(MIN_PART_BYTES)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(s3.upload_stream(chunks(), "broken.mov", "video/quicktime"))
+
+    assert s3.client.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+    with pytest.raises(Exception):
+        s3.client.head_object(Bucket=BUCKET, Key="broken.mov")
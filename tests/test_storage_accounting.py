@@ -0,0 +1,83 @@
+from app.models.event import Event, EventStorage, FileMetadata
+from app.models.user import User
+from app.services.storage_accounting import (
+    MB,
+    adjust_usage,
+    get_usage_bytes,
+    reconcile_event_usage,
+)
+
+
+def _event(db_session, code: str) -> Event:
+    u = User(FirstName="S", LastName="A", Email=f"{code.lower()}@example.test", HashedPassword="x")
+    db_session.add(u)
+    db_session.flush()
+    ev = Event(UserID=u.UserID, Name="Storage", Code=code, Password="pw", TermsChecked=True)
+    db_session.add(ev)
+    db_session.flush()
+    return ev
+
+
+def _row(db_session, event_id: int) -> EventStorage:
+    db_session.expire_all()
+    return db_session.query(EventStorage).filter(EventStorage.EventID == event_id).one()
+
+
+def test_adjust_usage_seeds_then_increments_and_clamps(db_session, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ev = _event(db_session, "STACC1")
+    db_session.add(
+        FileMetadata(EventID=ev.EventID, FileName="a.jpg", FileType="image/jpeg", FileSize=3 * MB)
+    )
+    db_session.flush()
+
+    # No row yet: the first adjustment measures what is already stored
+    adjust_usage(db_session, ev.EventID, 3 * MB)
+    assert _row(db_session, ev.EventID).CurrentUsageBytes == 3 * MB
+
+    adjust_usage(db_session, ev.EventID, MB + 5)
+    row = _row(db_session, ev.EventID)
+    assert row.CurrentUsageBytes == 4 * MB + 5
+    assert row.CurrentUsageMB == 4
+    assert get_usage_bytes(db_session, ev.EventID) == 4 * MB + 5
+
+    adjust_usage(db_session, ev.EventID, -10 * MB)
+    assert _row(db_session, ev.EventID).CurrentUsageBytes == 0
+
+
+def test_reconcile_corrects_drift(db_session, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ev = _event(db_session, "STACC2")
+    db_session.add(
+        FileMetadata(EventID=ev.EventID, FileName="b.jpg", FileType="image/jpeg", FileSize=1234)
+    )
+    db_session.add(
+        EventStorage(
+            EventID=ev.EventID, StoragePath="x", StorageLimitMB=0, CurrentUsageBytes=999_999
+        )
+    )
+    db_session.flush()
+    thumbs = tmp_path / "storage" / str(ev.UserID) / str(ev.EventID) / "thumbnails"
+    thumbs.mkdir(parents=True)
+    (thumbs / "1_480.jpg").write_bytes(b"x" * 100)
+    assert reconcile_event_usage(db_session, ev.EventID) == 1334
+    assert _row(db_session, ev.EventID).CurrentUsageBytes == 1334
+
+
+def test_adjust_usage_only_touches_the_latest_row(db_session, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ev = _event(db_session, "STACC3")
+    old = EventStorage(EventID=ev.EventID, StoragePath="x", StorageLimitMB=0, CurrentUsageBytes=7)
+    db_session.add(old)
+    db_session.flush()
+    latest = EventStorage(
+        EventID=ev.EventID, StoragePath="x", StorageLimitMB=0, CurrentUsageBytes=100
+    )
+    db_session.add(latest)
+    db_session.flush()
+
+    adjust_usage(db_session, ev.EventID, 50)
+    db_session.expire_all()
+    assert db_session.get(EventStorage, latest.EventStorageID).CurrentUsageBytes == 150
+    assert db_session.get(EventStorage, old.EventStorageID).CurrentUsageBytes == 7
+    assert get_usage_bytes(db_session, ev.EventID) == 150
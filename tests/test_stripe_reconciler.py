@@ -0,0 +1,124 @@
+import json
+
+from app.models.billing import PaymentLog, Purchase
+from app.models.event_plan import EventPlan
+from app.models.user import User
+from app.services.entitlements import get_entitlements
+from app.services.stripe_reconciler import StripeReconciler, reconcile_pending_purchases
+
+
+class RateLimitError(Exception):
+    http_status = 429
+
+    def __init__(self, retry_after=None):
+        super().__init__("Too many requests")
+        self.headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+
+
+class StripeStub:
+    """Minimal stand-in for stripe.checkout.Session.retrieve."""
+
+    def __init__(self, sessions, throttle=None):
+        self.sessions = sessions
+        self.throttle = dict(throttle or {})
+        self.calls = []
+
+    def __call__(self, session_id):
+        self.calls.append(session_id)
+        if self.throttle.get(session_id):
+            self.throttle[session_id] -= 1
+            raise RateLimitError(retry_after=2)
+        if session_id not in self.sessions:
+            raise LookupError(f"No such checkout.session: {session_id}")
+        return self.sessions[session_id]
+
+
+def _pending(db_session, prefix: str, count: int):
+    u = User(FirstName="S", LastName="R", Email=f"{prefix}@example.test", HashedPassword="x")
+    plan = EventPlan(
+        Name=prefix, Code=prefix, PriceCents=500, Currency="GBP", IsActive=True, Features="{}"
+    )
+    db_session.add_all([u, plan])
+    db_session.flush()
+    rows = [
+        Purchase(
+            UserID=u.UserID,
+            PlanID=plan.PlanID,
+            Amount=5,
+            Currency="GBP",
+            Status="pending",
+            StripeSessionID=f"cs_{prefix}_{i}",
+        )
+        for i in range(count)
+    ]
+    db_session.add_all(rows)
+    db_session.commit()
+    return u, rows
+
+
+def test_reconciler_pages_backs_off_and_logs(db_session):
+    u, rows = _pending(db_session, "recon1", 5)
+    stub = StripeStub(
+        {
+            "cs_recon1_0": {"payment_status": "paid", "payment_intent": "pi_0"},
+            "cs_recon1_1": {"payment_status": "unpaid", "payment_intent": None},
+            "cs_recon1_2": {"payment_status": "paid", "payment_intent": {"id": "pi_2"}},
+            "cs_recon1_3": {"payment_status": "no_payment_required", "payment_intent": None},
+        },
+        throttle={"cs_recon1_2": 2},
+    )
+    sleeps = []
+    assert not get_entitlements(db_session, u.UserID).has_plan
+
+    result = StripeReconciler(stub, concurrency=3, sleep=sleeps.append).reconcile(
+        db_session, user_id=u.UserID, page_size=2
+    )
+
+    assert (result.checked, result.paid, result.unpaid, result.errors) == (5, 3, 1, 1)
+    assert result.rate_limited == 2
+    assert sleeps and all(0 < s <= 2 for s in sleeps)
+    db_session.expire_all()
+    status = {
+        p.StripeSessionID: (p.Status, p.StripePaymentIntentID)
+        for p in db_session.query(Purchase).filter(Purchase.UserID == u.UserID)
+    }
+    assert status == {
+        "cs_recon1_0": ("paid", "pi_0"),
+        "cs_recon1_1": ("pending", None),
+        "cs_recon1_2": ("paid", "pi_2"),
+        "cs_recon1_3": ("paid", None),
+        "cs_recon1_4": ("pending", None),
+    }
+    logs = db_session.query(PaymentLog).filter(PaymentLog.UserID == u.UserID).all()
+    assert sorted(log.EventType for log in logs) == ["reconcile_error"] + ["reconcile_paid"] * 3
+    assert get_entitlements(db_session, u.UserID).has_plan
+
+
+def test_reconciler_skips_purchases_settled_elsewhere(db_session):
+    u, rows = _pending(db_session, "recon2", 1)
+    stub = StripeStub({"cs_recon2_0": {"payment_status": "paid", "payment_intent": "pi_x"}})
+
+    def settle_first(session_id):
+        # The webhook lands while Stripe is being queried
+        db_session.query(Purchase).filter(Purchase.PurchaseID == rows[0].PurchaseID).update(
+            {"Status": "paid"}
+        )
+        return stub(session_id)
+
+    result = StripeReconciler(settle_first, concurrency=1).reconcile(db_session, user_id=u.UserID)
+    assert result.paid == 0
+    assert db_session.query(PaymentLog).filter(PaymentLog.UserID == u.UserID).count() == 0
+
+
+def test_scheduled_sweep_records_run_summary(db_session):
+    _pending(db_session, "recon3", 2)
+    stub = StripeStub({})
+    result = reconcile_pending_purchases(db_session, retrieve=stub)
+    assert result.errors >= 2
+    run = (
+        db_session.query(PaymentLog)
+        .filter(PaymentLog.EventType == "reconcile_run")
+        .order_by(PaymentLog.LogID.desc())
+        .first()
+    )
+    assert json.loads(run.Payload)["checked"] == result.checked
@@ -0,0 +1,136 @@
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from app.services import thumb_backfill
+from app.services.thumb_backfill import run_backfill
+from app.services.thumbs import image_thumb_path
+from app.services.upload_ingest import THUMB_WIDTHS
+
+
+def _threads(n):
+    return ThreadPoolExecutor(max_workers=n)
+
+
+def _event_with_images(db_session, tag, names, missing=()):
+    from app.models.event import Event, FileMetadata
+    from app.models.user import User
+
+    u = User(FirstName="B", LastName="F", Email=f"backfill-{tag}@example.test", HashedPassword="x")
+    db_session.add(u)
+    db_session.flush()
+    ev = Event(UserID=u.UserID, Name=tag, Code=f"BF{tag.upper()}", Password="pw", TermsChecked=True)
+    db_session.add(ev)
+    db_session.flush()
+    base = os.path.join("storage", str(u.UserID), str(ev.EventID))
+    shutil.rmtree(base, ignore_errors=True)
+    os.makedirs(base)
+    files = []
+    for name in names:
+        f = FileMetadata(EventID=ev.EventID, FileName=name, FileType="image/jpeg", FileSize=1)
+        db_session.add(f)
+        files.append(f)
+        if name not in missing:
+            Image.new("RGB", (1600, 1000), (40, 90, 160)).save(os.path.join(base, name))
+    db_session.commit()
+    return u, ev, files
+
+
+def test_backfill_renders_missing_widths_and_skips_complete_files(db_session):
+    from app.services.storage_accounting import get_usage_bytes
+
+    u, ev, files = _event_with_images(
+        db_session, "render", ["a.jpg", "b.jpg", "gone.jpg"], missing={"gone.jpg"}
+    )
+
+    first = run_backfill(db_session, event_id=ev.EventID, workers=2, executor_factory=_threads)
+    assert (first.rendered, first.missing, first.skipped) == (2, 1, 0)
+    for f in files[:2]:
+        for w in THUMB_WIDTHS:
+            assert os.path.exists(image_thumb_path(u.UserID, ev.EventID, f.FileMetadataID, w))
+        db_session.refresh(f)
+        assert f.Placeholder.startswith("data:image/jpeg;base64,")
+    assert first.placeholders == 2
+    assert get_usage_bytes(db_session, ev.EventID) >= first.bytes_written > 0
+
+    again = run_backfill(db_session, event_id=ev.EventID, executor_factory=_threads)
+    assert (again.rendered, again.skipped, again.missing) == (0, 2, 1)
+
+
+def test_checkpoint_resumes_after_last_finished_file(db_session, tmp_path):
+    u, ev, files = _event_with_images(db_session, "resume", ["c.jpg", "d.jpg"])
+    checkpoint = str(tmp_path / "backfill.json")
+
+    first = run_backfill(
+        db_session, event_id=ev.EventID, checkpoint_path=checkpoint, executor_factory=_threads
+    )
+    with open(checkpoint, encoding="utf-8") as fh:
+        saved = json.load(fh)
+    assert saved["last_id"] == first.last_id == files[-1].FileMetadataID
+    assert saved["rendered"] == 2
+
+    resumed = run_backfill(
+        db_session, event_id=ev.EventID, checkpoint_path=checkpoint, executor_factory=_threads
+    )
+    assert resumed.scanned == 0
+    restarted = run_backfill(
+        db_session,
+        event_id=ev.EventID,
+        checkpoint_path=checkpoint,
+        resume=False,
+        executor_factory=_threads,
+    )
+    assert (restarted.scanned, restarted.skipped) == (2, 2)
+
+
+def test_failed_file_is_counted_without_stopping_the_run(db_session, tmp_path, monkeypatch):
+    u, ev, files = _event_with_images(db_session, "fails", ["e.jpg", "f.jpg", "g.jpg"])
+    bad = files[1].FileMetadataID
+    real = thumb_backfill.backfill_file
+
+    def flaky(item, widths):
+        if item.file_id == bad:
+            raise OSError("truncated file")
+        return real(item, widths)
+
+    monkeypatch.setattr(thumb_backfill, "backfill_file", flaky)
+    seen = []
+    result = run_backfill(
+        db_session,
+        event_id=ev.EventID,
+        checkpoint_path=str(tmp_path / "cp.json"),
+        executor_factory=_threads,
+        progress=lambda r, total: seen.append((r.done, total)),
+        progress_every=0.0,
+    )
+    assert (result.rendered, result.failed) == (2, 1)
+    assert result.last_id == files[-1].FileMetadataID
+    assert seen[-1] == (3, 3)
+    assert "failed" in thumb_backfill.format_progress(result, 3)
+
+
+def test_checkpoint_is_ignored_when_the_scope_changes(db_session, tmp_path):
+    u, ev, files = _event_with_images(db_session, "scopea", ["h.jpg", "i.jpg"])
+    u2, ev2, files2 = _event_with_images(db_session, "scopeb", ["j.jpg"])
+    checkpoint = str(tmp_path / "scoped.json")
+
+    # The second event's ids are all higher, so reusing its checkpoint would skip the first
+    run_backfill(
+        db_session, event_id=ev2.EventID, checkpoint_path=checkpoint, executor_factory=_threads
+    )
+    with open(checkpoint, encoding="utf-8") as fh:
+        assert json.load(fh)["scope"] == {"user_id": None, "event_id": ev2.EventID}
+
+    other = run_backfill(
+        db_session, event_id=ev.EventID, checkpoint_path=checkpoint, executor_factory=_threads
+    )
+    assert (other.scanned, other.rendered) == (2, 2)
+    assert os.path.exists(image_thumb_path(u.UserID, ev.EventID, files[0].FileMetadataID, 480))
+    # Same scope again resumes from the checkpoint the previous run wrote
+    again = run_backfill(
+        db_session, event_id=ev.EventID, checkpoint_path=checkpoint, executor_factory=_threads
+    )
+    assert again.scanned == 0
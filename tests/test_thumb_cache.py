@@ -0,0 +1,89 @@
+import os
+import shutil
+
+from PIL import Image
+
+from app.services import storage_accounting, thumb_cache
+from app.services.thumbs import snap_thumb_width
+
+
+def _thumb(root, user_id, event_id, name, size):
+    tdir = os.path.join(str(root), str(user_id), str(event_id), "thumbnails")
+    os.makedirs(tdir, exist_ok=True)
+    path = os.path.join(tdir, name)
+    with open(path, "wb") as fh:
+        fh.write(b"\0" * size)
+    return path
+
+
+def test_requested_widths_snap_to_the_ladder(db_session, client):
+    from app.models.event import Event, FileMetadata
+    from app.models.user import User
+    from app.services.auth import create_session
+
+    assert [snap_thumb_width(w) for w in (1, 480, 481, 1000, 2048)] == [480, 480, 720, 1440, 1440]
+
+    u = User(FirstName="S", LastName="L", Email="snap-ladder@example.test", HashedPassword="x")
+    db_session.add(u)
+    db_session.flush()
+    ev = Event(UserID=u.UserID, Name="Snap", Code="SNAPLAD", Password="pw", TermsChecked=True)
+    db_session.add(ev)
+    db_session.flush()
+    f = FileMetadata(EventID=ev.EventID, FileName="s.jpg", FileType="image/jpeg", FileSize=10)
+    db_session.add(f)
+    db_session.commit()
+    base = os.path.join("storage", str(u.UserID), str(ev.EventID))
+    shutil.rmtree(base, ignore_errors=True)
+    os.makedirs(os.path.join(base, "thumbnails"))
+    Image.new("RGB", (1600, 1200)).save(os.path.join(base, "s.jpg"))
+    Image.new("RGB", (720, 540)).save(
+        os.path.join(base, "thumbnails", f"{f.FileMetadataID}_720.jpg")
+    )
+
+    sess = create_session(db_session, user_id=int(u.UserID))
+    client.cookies.set("session_id", str(sess.SessionID))
+    for w in (500, 611, 719):
+        r = client.get(f"/thumbs/{f.FileMetadataID}.jpg?w={w}", headers={"Accept": "image/jpeg"})
+        assert r.status_code == 200
+    assert os.listdir(os.path.join(base, "thumbnails")) == [f"{f.FileMetadataID}_720.jpg"]
+
+
+def test_cache_evicts_least_recently_used_past_budget(tmp_path, monkeypatch):
+    returned = []
+    monkeypatch.setattr(
+        storage_accounting,
+        "record_usage_detached",
+        lambda eid, delta: returned.append((eid, delta)),
+    )
+    viewed = _thumb(tmp_path, 1, 10, "1_480.jpg", 400)
+    idle = _thumb(tmp_path, 1, 10, "2_480.jpg", 400)
+    os.utime(viewed, (1000, 1000))
+    os.utime(idle, (2000, 2000))
+    cache = thumb_cache.ThumbnailCache(str(tmp_path), max_bytes=1000)
+
+    cache.store([])  # builds the index from disk, oldest first
+    cache.hit(viewed)
+    new = _thumb(tmp_path, 1, 11, "3_480.jpg", 400)
+    evicted = cache.store([new])
+
+    assert evicted == [idle]
+    assert os.path.exists(viewed) and os.path.exists(new)
+    assert returned == [(10, -400)]
+    m = cache.metrics()
+    assert (m["hits"], m["stores"], m["evictions"], m["bytes"]) == (1, 1, 1, 800)
+
+
+def test_cache_enforces_per_event_budget(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_accounting, "record_usage_detached", lambda eid, delta: None)
+    cache = thumb_cache.ThumbnailCache(str(tmp_path), event_max_bytes=500)
+    quiet = _thumb(tmp_path, 2, 21, "9_480.jpg", 450)
+    cache.store([quiet])
+    busy = []
+    for i in range(3):
+        busy.append(_thumb(tmp_path, 2, 20, f"{i}_480.jpg", 200))
+        cache.store([busy[-1]])
+
+    # Event 20 went over its budget on the third file; event 21 is untouched
+    assert [os.path.exists(p) for p in busy] == [False, True, True]
+    assert os.path.exists(quiet)
+    assert cache.metrics()["evicted_bytes"] == 200
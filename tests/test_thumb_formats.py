@@ -0,0 +1,64 @@
+import os
+
+from PIL import Image
+
+from app.services import thumbs
+from app.services.auth import create_session
+
+
+def test_negotiation_prefers_explicitly_accepted_formats(monkeypatch):
+    from app.core.settings import settings
+
+    monkeypatch.setattr(settings, "THUMB_EXTRA_FORMATS", ("webp", "avif"))
+    chrome = "image/avif,image/webp,image/apng,image/*,*/*;q=0.8"
+    assert thumbs.negotiate_thumb_ext(chrome) == ".avif"
+    assert thumbs.negotiate_thumb_ext("image/webp,*/*") == ".webp"
+    assert thumbs.negotiate_thumb_ext("image/avif;q=0, image/webp") == ".webp"
+    # Wildcards and missing headers fall back to JPEG
+    assert thumbs.negotiate_thumb_ext("*/*") == ".jpg"
+    assert thumbs.negotiate_thumb_ext(None) == ".jpg"
+    monkeypatch.setattr(settings, "THUMB_EXTRA_FORMATS", ())
+    assert thumbs.negotiate_thumb_ext(chrome) == ".jpg"
+
+
+def test_ladder_persists_alternative_encodings(tmp_path):
+    orig = tmp_path / "o.jpg"
+    Image.effect_noise((900, 600), 50).convert("RGB").save(orig, format="JPEG")
+    out = str(tmp_path / "3_480.jpg")
+    written = thumbs.render_image_ladder(str(orig), [(480, out)], alt_exts=(".webp",))
+    webp = thumbs.thumb_variant_path(out, ".webp")
+    assert written == [out, webp]
+    with Image.open(webp) as im:
+        assert im.format == "WEBP" and im.size == (480, 320)
+
+
+def test_thumb_endpoint_serves_accepted_format_with_vary(db_session, client):
+    from app.models.event import Event, FileMetadata
+    from app.models.user import User
+
+    u = User(FirstName="W", LastName="P", Email="webp-thumb@example.test", HashedPassword="x")
+    db_session.add(u)
+    db_session.flush()
+    ev = Event(UserID=u.UserID, Name="WebP", Code="WEBPTH", Password="pw", TermsChecked=True)
+    db_session.add(ev)
+    db_session.flush()
+    f = FileMetadata(EventID=ev.EventID, FileName="w.jpg", FileType="image/jpeg", FileSize=10)
+    db_session.add(f)
+    db_session.commit()
+
+    base = os.path.join("storage", str(u.UserID), str(ev.EventID))
+    os.makedirs(base, exist_ok=True)
+    Image.new("RGB", (600, 400), color=(9, 9, 9)).save(os.path.join(base, "w.jpg"))
+    jpeg_path = thumbs.image_thumb_path(u.UserID, ev.EventID, f.FileMetadataID, 480)
+    thumbs.render_image_ladder(os.path.join(base, "w.jpg"), [(480, jpeg_path)], alt_exts=(".webp",))
+
+    sess = create_session(db_session, user_id=int(u.UserID))
+    client.cookies.set("session_id", str(sess.SessionID))
+    url = f"/thumbs/{f.FileMetadataID}.jpg?w=480"
+    webp = client.get(url, headers={"Accept": "image/webp,*/*"})
+    assert webp.status_code == 200
+    assert webp.headers["content-type"] == "image/webp"
+    assert webp.headers["vary"] == "Accept"
+    jpeg = client.get(url, headers={"Accept": "*/*"})
+    assert jpeg.headers["content-type"] == "image/jpeg"
+    assert jpeg.headers["vary"] == "Accept"
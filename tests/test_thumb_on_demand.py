@@ -0,0 +1,158 @@
+import asyncio
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import httpx
+from PIL import Image
+
+from app.models.event import Event, FileMetadata
+from app.models.user import User
+from app.services import thumb_scheduler as ts
+from app.services import thumbs
+from app.services.auth import create_session
+from app.services.media_urls import signed_thumb_url
+from db import get_db
+
+
+def _owner_event(db, email, code):
+    u = User(FirstName="T", LastName="D", Email=email, HashedPassword="x")
+    db.add(u)
+    db.flush()
+    ev = Event(UserID=u.UserID, Name="Thumbs", Code=code, Password="pw", TermsChecked=True)
+    db.add(ev)
+    db.flush()
+    return u, ev
+
+
+def test_cold_thumbnail_requests_share_one_render_off_the_loop(db_session, monkeypatch):
+    from main import app
+
+    u, ev = _owner_event(db_session, "single-flight@example.test", "SFLIGHT")
+    f = FileMetadata(EventID=ev.EventID, FileName="sf.jpg", FileType="image/jpeg", FileSize=10)
+    db_session.add(f)
+    db_session.commit()
+    base = os.path.join("storage", str(u.UserID), str(ev.EventID))
+    shutil.rmtree(base, ignore_errors=True)  # ids are reused between runs
+    os.makedirs(base)
+    Image.new("RGB", (900, 600), color=(40, 80, 120)).save(os.path.join(base, "sf.jpg"))
+    # Another width is already on disk and must keep being served during the render
+    warm = thumbs.image_thumb_path(u.UserID, ev.EventID, f.FileMetadataID, 720)
+    os.makedirs(os.path.dirname(warm), exist_ok=True)
+    Image.new("RGB", (720, 480)).save(warm, format="JPEG")
+
+    gate = threading.Event()
+    renders = []
+
+    def gated_render(kind, orig_path, out_path, width, blur=0):
+        renders.append(out_path)
+        gate.wait(10)
+        Image.new("RGB", (int(width), 320)).save(out_path, format="JPEG")
+        return True
+
+    monkeypatch.setattr(ts, "render_thumbnail", gated_render)
+    sched = ts.ThumbnailScheduler(2, executor_factory=lambda n: ThreadPoolExecutor(max_workers=n))
+    monkeypatch.setattr(ts, "_scheduler", sched)
+
+    # The requests overlap; keep their DB work on the test's session and the loop thread
+    async def _db():
+        yield db_session
+
+    monkeypatch.setitem(app.dependency_overrides, get_db, _db)
+    cold_url = signed_thumb_url(u.UserID, ev.EventID, f.FileMetadataID, 480)
+    warm_url = signed_thumb_url(u.UserID, ev.EventID, f.FileMetadataID, 720)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            cold = [asyncio.create_task(ac.get(cold_url)) for _ in range(4)]
+            for _ in range(500):
+                if sched.metrics()["submitted"] == 4:
+                    break
+                await asyncio.sleep(0.01)
+            hot = await ac.get(warm_url)
+            assert hot.status_code == 200 and not gate.is_set()
+            gate.set()
+            return await asyncio.gather(*cold)
+
+    try:
+        responses = asyncio.run(scenario())
+    finally:
+        gate.set()
+        sched.shutdown()
+
+    assert [r.status_code for r in responses] == [200] * 4
+    assert all(r.headers["content-type"] == "image/jpeg" for r in responses)
+    assert len(renders) == 1
+    m = sched.metrics()
+    assert m["completed"] == 1 and m["coalesced"] == 3
+
+
+def test_owner_upload_hands_thumbnails_to_the_scheduler(db_session, client, monkeypatch):
+    from app.api import events as events_api
+
+    u, ev = _owner_event(db_session, "owner-thumb-queue@example.test", "OWNTHQ")
+    db_session.commit()
+    base = os.path.join("storage", str(u.UserID), str(ev.EventID))
+    shutil.rmtree(base, ignore_errors=True)
+    sess = create_session(db_session, user_id=int(u.UserID))
+    client.cookies.set("session_id", str(sess.SessionID))
+    queued = []
+    monkeypatch.setattr(
+        events_api,
+        "start_thumbnail_job",
+        lambda uid, eid, recs: queued.append((uid, eid, [r.FileName for r in recs])),
+    )
+
+    buf = BytesIO()
+    Image.new("RGB", (32, 24), color=(200, 10, 10)).save(buf, format="JPEG")
+    files = {"files": ("q.jpg", BytesIO(buf.getvalue()), "image/jpeg")}
+    r = client.post(f"/events/{ev.EventID}/upload", files=files, follow_redirects=False)
+
+    assert r.status_code == 303
+    assert queued == [(u.UserID, ev.EventID, ["q.jpg"])]
+    assert not os.path.isdir(os.path.join(base, "thumbnails"))
+
+
+def test_owner_upload_decodes_the_original_once_by_default(db_session, client, monkeypatch):
+    from app.core.settings import settings
+    from app.services.upload_ingest import THUMB_WIDTHS
+
+    u, ev = _owner_event(db_session, "owner-thumb-ladder@example.test", "OWNLAD")
+    db_session.commit()
+    base = os.path.join("storage", str(u.UserID), str(ev.EventID))
+    shutil.rmtree(base, ignore_errors=True)
+    sess = create_session(db_session, user_id=int(u.UserID))
+    client.cookies.set("session_id", str(sess.SessionID))
+    monkeypatch.setattr(settings, "MEDIA_JOB_QUEUE", False, raising=False)
+    sched = ts.ThumbnailScheduler(2, executor_factory=lambda n: ThreadPoolExecutor(max_workers=n))
+    monkeypatch.setattr(ts, "_scheduler", sched)
+    decodes = []
+    real_ladder = thumbs.render_image_ladder
+    monkeypatch.setattr(
+        thumbs,
+        "render_image_ladder",
+        lambda orig, targets, **kw: decodes.append(orig) or real_ladder(orig, targets, **kw),
+    )
+
+    buf = BytesIO()
+    Image.new("RGB", (1600, 1200), color=(10, 200, 10)).save(buf, format="JPEG")
+    files = {"files": ("ladder.jpg", BytesIO(buf.getvalue()), "image/jpeg")}
+    try:
+        r = client.post(f"/events/{ev.EventID}/upload", files=files, follow_redirects=False)
+        assert r.status_code == 303
+        f = db_session.query(FileMetadata).filter(FileMetadata.EventID == ev.EventID).one()
+        paths = {
+            w: thumbs.image_thumb_path(u.UserID, ev.EventID, f.FileMetadataID, w)
+            for w in THUMB_WIDTHS
+        }
+        # Joins the ingest ladder; its narrowest rung is written last
+        smallest = min(THUMB_WIDTHS)
+        assert sched.submit(ts.KIND_IMAGE, "unused", paths[smallest], smallest).result(10)
+    finally:
+        sched.shutdown()
+
+    assert decodes == [os.path.join(base, "ladder.jpg")]
+    assert all(os.path.exists(p) for p in paths.values())
@@ -0,0 +1,243 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services import thumb_scheduler as ts
+
+
+def _wait_for(condition, timeout: float = 5.0) -> None:
+    # Completion hooks run on their own thread, after the futures resolve
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_scheduler_prioritizes_interactive_and_coalesces(tmp_path, monkeypatch):
+    gate = threading.Event()
+    order = []
+
+    def fake_render(kind, orig_path, out_path, width, blur=0):
+        if not order:
+            gate.wait(5)  # hold the only worker so the rest queue up
+        order.append(out_path)
+        return True
+
+    monkeypatch.setattr(ts, "render_thumbnail", fake_render)
+    completed = []
+    sched = ts.ThumbnailScheduler(
+        1,
+        executor_factory=lambda n: ThreadPoolExecutor(max_workers=n),
+        on_complete=lambda task, ok: completed.append((task.out_path, ok)),
+    )
+    try:
+        p = str(tmp_path)
+        first = sched.submit("image", "o", f"{p}/busy", 480, priority=ts.PRIORITY_INGEST)
+        deadline = time.monotonic() + 5
+        while sched.metrics()["in_flight"] != 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        backfill = sched.submit("image", "o", f"{p}/b", 480, priority=ts.PRIORITY_BACKFILL)
+        ingest = sched.submit("image", "o", f"{p}/i", 480, priority=ts.PRIORITY_INGEST)
+        dup = sched.submit("image", "o", f"{p}/i", 480, priority=ts.PRIORITY_INGEST)
+        viewer = sched.submit("image", "o", f"{p}/v", 480, priority=ts.PRIORITY_INTERACTIVE)
+        # A viewer waiting on a queued backfill render promotes it
+        promoted = sched.submit("image", "o", f"{p}/b", 480, priority=ts.PRIORITY_INTERACTIVE)
+
+        m = sched.metrics()
+        assert m["in_flight"] == 1
+        assert m["queue_depth"] == 3
+        assert m["coalesced"] == 2
+        assert dup is ingest and promoted is backfill
+
+        gate.set()
+        for fut in (first, backfill, ingest, viewer):
+            assert fut.result(timeout=5) is True
+        _wait_for(lambda: len(completed) == 4)
+        # Interactive requests first (FIFO among them), then ingest; backfill was promoted
+        assert order == [f"{p}/busy", f"{p}/v", f"{p}/b", f"{p}/i"]
+        assert len(completed) == 4
+        m = sched.metrics()
+        assert m["completed"] == 4 and m["queue_depth"] == 0 and m["in_flight"] == 0
+        assert m["wait_seconds_max"] >= m["wait_seconds_avg"] >= 0
+    finally:
+        sched.shutdown()
+
+
+def test_scheduler_renders_real_thumbnail(tmp_path):
+    from PIL import Image
+
+    orig = tmp_path / "orig.jpg"
+    Image.new("RGB", (800, 600), color=(5, 6, 7)).save(orig, format="JPEG")
+    out = tmp_path / "thumbs" / "1_480.jpg"
+    sched = ts.ThumbnailScheduler(1, executor_factory=lambda n: ThreadPoolExecutor(max_workers=n))
+    try:
+        fut = sched.submit(ts.KIND_IMAGE, str(orig), str(out), 480)
+        assert fut.result(timeout=10) is True
+        with Image.open(out) as im:
+            assert im.width == 480
+        # Existing output short-circuits without another render
+        assert sched.submit(ts.KIND_IMAGE, str(orig), str(out), 480).result() is True
+        assert sched.metrics()["submitted"] == 1
+    finally:
+        sched.shutdown()
+
+
+def test_ladder_task_renders_every_rung_and_coalesces_single_widths(tmp_path, monkeypatch):
+    gate = threading.Event()
+    calls = []
+
+    def fake_render(kind, orig_path, out_path, width, blur=0):
+        gate.wait(5)
+        calls.append(out_path)
+        return True
+
+    def fake_ladder(orig_path, targets):
+        calls.append(tuple(p for _w, p in targets))
+        return True
+
+    monkeypatch.setattr(ts, "render_thumbnail", fake_render)
+    monkeypatch.setattr(ts, "render_ladder", fake_ladder)
+    done = []
+    sched = ts.ThumbnailScheduler(
+        1,
+        executor_factory=lambda n: ThreadPoolExecutor(max_workers=n),
+        on_complete=lambda task, ok: done.append(task.kind),
+    )
+    try:
+        p = str(tmp_path)
+        busy = sched.submit("image", "o", f"{p}/busy", 480)
+        deadline = time.monotonic() + 5
+        while sched.metrics()["in_flight"] != 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        (tmp_path / "1_480.jpg").write_bytes(b"already there")
+        rungs = [(w, f"{p}/1_{w}.jpg") for w in (480, 720, 1440)]
+        ladder = sched.submit_ladder("o", rungs, priority=ts.PRIORITY_BACKFILL)
+        # A viewer asking for one queued rung shares the ladder and promotes it
+        viewer = sched.submit("image", "o", f"{p}/1_720.jpg", 720, priority=ts.PRIORITY_INTERACTIVE)
+        other = sched.submit("image", "o", f"{p}/other", 480, priority=ts.PRIORITY_INGEST)
+        assert viewer is ladder
+        assert sched.metrics()["queue_depth"] == 2
+
+        gate.set()
+        assert all(f.result(timeout=5) for f in (busy, ladder, other))
+        _wait_for(lambda: len(done) == 3)
+        assert calls == [f"{p}/busy", (f"{p}/1_1440.jpg", f"{p}/1_720.jpg"), f"{p}/other"]
+        assert done == ["image", ts.KIND_LADDER, "image"]
+        assert sched.metrics()["in_flight"] == 0
+        # Nothing missing: no task at all
+        assert sched.submit_ladder("o", [(480, f"{p}/1_480.jpg")]).result() is True
+    finally:
+        sched.shutdown()
+
+
+def test_video_posters_extract_one_frame_per_file(tmp_path, monkeypatch):
+    gate = threading.Event()
+    calls = []
+
+    def fake_video(orig_path, targets):
+        widths = tuple(w for w, _p in targets)
+        if widths == (480,) and orig_path == "a.mp4":
+            gate.wait(5)  # hold the first extraction while more widths are asked for
+        calls.append((orig_path, widths))
+        return True
+
+    monkeypatch.setattr(ts, "render_video", fake_video)
+    sched = ts.ThumbnailScheduler(2, executor_factory=lambda n: ThreadPoolExecutor(max_workers=n))
+    try:
+        p = str(tmp_path)
+        first = sched.submit(ts.KIND_VIDEO, "a.mp4", f"{p}/1_480.jpg", 480)
+        deadline = time.monotonic() + 5
+        while sched.metrics()["in_flight"] != 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Widths asked for while a.mp4 is being extracted wait for it, as one task,
+        # even with a worker free; another video still runs alongside
+        wide = sched.submit(ts.KIND_VIDEO, "a.mp4", f"{p}/1_1440.jpg", 1440)
+        mid = sched.submit(ts.KIND_VIDEO, "a.mp4", f"{p}/1_720.jpg", 720)
+        ladder = sched.submit_video("a.mp4", [(960, f"{p}/1_960.jpg"), (720, f"{p}/1_720.jpg")])
+        other = sched.submit_video("b.mp4", [(480, f"{p}/2_480.jpg")])
+        assert other.result(timeout=5) is True
+        assert wide is mid is ladder
+        assert sched.metrics()["in_flight"] == 1 and sched.metrics()["queue_depth"] == 1
+
+        gate.set()
+        assert all(f.result(timeout=5) for f in (first, wide))
+        assert calls == [("b.mp4", (480,)), ("a.mp4", (480,)), ("a.mp4", (1440, 960, 720))]
+        assert sched.metrics()["coalesced"] == 2
+    finally:
+        sched.shutdown()
+
+
+def test_default_pool_spawns_workers_and_shutdown_resolves_queued(tmp_path, monkeypatch):
+    sched = ts.ThumbnailScheduler(1)
+    pool = sched._executor_factory(1)
+    try:
+        assert pool._mp_context.get_start_method() == "spawn"
+    finally:
+        pool.shutdown()
+
+    gate = threading.Event()
+
+    def fake_render(kind, orig_path, out_path, width, blur=0):
+        gate.wait(5)
+        return True
+
+    monkeypatch.setattr(ts, "render_thumbnail", fake_render)
+    sched = ts.ThumbnailScheduler(1, executor_factory=lambda n: ThreadPoolExecutor(max_workers=n))
+    p = str(tmp_path)
+    busy = sched.submit(ts.KIND_IMAGE, "o", f"{p}/busy", 480)
+    deadline = time.monotonic() + 5
+    while sched.metrics()["in_flight"] != 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    queued = sched.submit(ts.KIND_IMAGE, "o", f"{p}/queued", 480)
+    threading.Timer(0.05, gate.set).start()
+    sched.shutdown(wait=True)
+    # The running render finished; the queued one and later submits won't run
+    assert busy.done() and busy.result() is True
+    assert queued.result(timeout=1) is False
+    assert sched.submit(ts.KIND_IMAGE, "o", f"{p}/late", 480).result(timeout=1) is False
+
+
+def test_app_lifespan_indexes_the_cache_and_stops_the_scheduler(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.services import thumb_cache
+    from main import app
+
+    (tmp_path / "1" / "2" / "thumbnails").mkdir(parents=True)
+    (tmp_path / "1" / "2" / "thumbnails" / "3_480.jpg").write_bytes(b"x" * 10)
+    cache = thumb_cache.ThumbnailCache(root=str(tmp_path))
+    monkeypatch.setattr(thumb_cache, "_cache", cache)
+    stopped = []
+    monkeypatch.setattr(
+        ts, "_scheduler", type("S", (), {"shutdown": lambda self, wait: stopped.append(wait)})()
+    )
+    with TestClient(app):
+        assert not stopped
+        cache._loader.join(5)
+        assert cache.metrics()["indexed"] and cache.metrics()["bytes"] == 10
+    assert stopped == [True]
+    assert ts._scheduler is None
+
+
+def test_completion_hook_runs_after_the_future_resolves(tmp_path, monkeypatch):
+    monkeypatch.setattr(ts, "render_thumbnail", lambda *a, **kw: True)
+    release = threading.Event()
+    hooked = []
+
+    def slow_hook(task, ok):
+        release.wait(5)  # e.g. a DB commit or the cache's first scan
+        hooked.append(task.out_path)
+
+    sched = ts.ThumbnailScheduler(
+        2, executor_factory=lambda n: ThreadPoolExecutor(max_workers=n), on_complete=slow_hook
+    )
+    try:
+        p = str(tmp_path)
+        first = sched.submit(ts.KIND_IMAGE, "o", f"{p}/a", 480)
+        second = sched.submit(ts.KIND_IMAGE, "o", f"{p}/b", 480)
+        # Neither waiter nor the next result is held up by the hook
+        assert first.result(timeout=2) is True and second.result(timeout=2) is True
+        assert hooked == []
+        release.set()
+    finally:
+        sched.shutdown(wait=True)
+    assert sorted(hooked) == [f"{p}/a", f"{p}/b"]
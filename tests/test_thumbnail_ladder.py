@@ -0,0 +1,62 @@
+import os
+
+from PIL import Image
+
+from app.services import thumbs
+
+
+def _jpeg(path, size, orientation=None):
+    im = Image.effect_noise(size, 50).convert("RGB")
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    im.save(path, format="JPEG", quality=85, exif=exif.tobytes())
+
+
+def test_ladder_writes_each_width_from_one_decode(tmp_path, monkeypatch):
+    orig = tmp_path / "orig.jpg"
+    _jpeg(orig, (3000, 2000))
+    opened = []
+    real_open = Image.open
+    monkeypatch.setattr(Image, "open", lambda *a, **k: opened.append(a[0]) or real_open(*a, **k))
+
+    targets = [(w, str(tmp_path / f"1_{w}.jpg")) for w in (480, 720, 960, 1440)]
+    written = thumbs.render_image_ladder(str(orig), targets, alt_exts=())
+
+    assert opened == [str(orig)]
+    assert written == [p for _, p in sorted(targets, reverse=True)]
+    for w, p in targets:
+        with real_open(p) as im:
+            assert im.size == (w, int(2000 * w / 3000))
+    assert not [n for n in os.listdir(tmp_path) if n.endswith(".tmp")]
+
+
+def test_ladder_applies_orientation_and_never_upscales(tmp_path):
+    orig = tmp_path / "portrait.jpg"
+    # Stored landscape, displayed portrait (rotate 90 CW)
+    _jpeg(orig, (1000, 600), orientation=6)
+    out_big = str(tmp_path / "2_1440.jpg")
+    out_small = str(tmp_path / "2_480.jpg")
+    thumbs.render_image_ladder(str(orig), [(1440, out_big), (480, out_small)])
+    with Image.open(out_big) as im:
+        assert im.size == (600, 1000)
+    with Image.open(out_small) as im:
+        assert im.size == (480, 800)
+
+
+def test_generate_all_thumbs_only_renders_missing_widths(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    base = tmp_path / "storage" / "5" / "6"
+    base.mkdir(parents=True)
+    _jpeg(base / "a.jpg", (1600, 1200))
+    existing = thumbs.image_thumb_path(5, 6, 9, 720)
+    os.makedirs(os.path.dirname(existing))
+    Image.new("RGB", (720, 540)).save(existing, format="JPEG")
+    before = os.path.getsize(existing)
+
+    created = thumbs.generate_all_thumbs_for_file(5, 6, 9, "image/jpeg", "a.jpg")
+
+    paths = [thumbs.image_thumb_path(5, 6, 9, w) for w in (480, 960, 1440)]
+    paths += [thumbs.thumb_variant_path(p, ext) for p in paths for ext in thumbs.alt_thumb_exts()]
+    assert created == sum(os.path.getsize(p) for p in paths)
+    assert os.path.getsize(existing) == before
@@ -0,0 +1,71 @@
+import hashlib
+
+from fastapi.testclient import TestClient
+
+from app.models.event import Event, FileMetadata
+from app.models.user import User
+
+
+def test_dedupe_check_reports_existing_checksums(db_session, client: TestClient):
+    u = User(FirstName="D", LastName="C", Email="dedupe@example.test", HashedPassword="x")
+    db_session.add(u)
+    db_session.flush()
+    ev = Event(
+        UserID=u.UserID,
+        Name="Dedupe",
+        Code="DEDUPE1",
+        Password="pw",
+        TermsChecked=True,
+        Published=True,
+    )
+    db_session.add(ev)
+    db_session.flush()
+    known = hashlib.sha256(b"known").hexdigest()
+    deleted = hashlib.sha256(b"deleted").hexdigest()
+    fresh = hashlib.sha256(b"fresh").hexdigest()
+    for checksum, is_deleted in ((known, False), (deleted, True)):
+        db_session.add(
+            FileMetadata(
+                EventID=ev.EventID,
+                FileName=f"{checksum[:8]}.jpg",
+                FileType="image/jpeg",
+                FileSize=5,
+                Checksum=checksum,
+                Deleted=is_deleted,
+            )
+        )
+    db_session.flush()
+
+    r = client.post(
+        f"/guest/upload/{ev.Code}/check",
+        json={
+            "files": [
+                {"sha256": known, "size": 5},
+                {"sha256": deleted.upper(), "size": 7},
+                {"sha256": fresh, "size": 5},
+            ]
+        },
+    )
+    assert r.status_code == 200
+    body = r.json()
+    assert body["existing"] == [known]
+    # Soft-deleted files don't count: the guest may upload them again
+    assert body["missing"] == [deleted, fresh]
+
+
+def test_dedupe_check_rejects_malformed_digest(db_session, client: TestClient):
+    u = User(FirstName="D", LastName="C", Email="dedupe2@example.test", HashedPassword="x")
+    db_session.add(u)
+    db_session.flush()
+    ev = Event(
+        UserID=u.UserID,
+        Name="Dedupe",
+        Code="DEDUPE2",
+        Password="pw",
+        TermsChecked=True,
+        Published=True,
+    )
+    db_session.add(ev)
+    db_session.flush()
+    r = client.post(f"/guest/upload/{ev.Code}/check", json={"files": [{"sha256": "nope"}]})
+    assert r.status_code == 400
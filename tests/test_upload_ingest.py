@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import os
+from io import BytesIO
+
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from app.services.upload_ingest import stage_upload
+
+
+def _jpeg_bytes() -> bytes:
+    from PIL import Image
+
+    buf = BytesIO()
+    Image.new("RGB", (64, 48), color=(10, 120, 200)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def _upload(data: bytes, name: str, ctype: str) -> UploadFile:
+    return UploadFile(
+        file=BytesIO(data), filename=name, headers=Headers({"content-type": ctype})
+    )
+
+
+def test_stage_upload_streams_and_hashes(tmp_path):
+    data = _jpeg_bytes() + (b"\x00" * 50_000)
+    staged = asyncio.run(
+        stage_upload(_upload(data, "a.jpg", "image/jpeg"), str(tmp_path), chunk_size=4096)
+    )
+    assert staged.rejected is None
+    assert staged.mime.startswith("image/")
+    assert staged.size == len(data)
+    assert staged.checksum == hashlib.sha256(data).hexdigest()
+    with open(staged.path, "rb") as fh:
+        assert fh.read() == data
+
+
+def test_stage_upload_enforces_size_mid_stream(tmp_path):
+    data = _jpeg_bytes() + (b"\x00" * 100_000)
+    staged = asyncio.run(
+        stage_upload(
+            _upload(data, "big.jpg", "image/jpeg"),
+            str(tmp_path),
+            max_bytes=20_000,
+            chunk_size=8192,
+        )
+    )
+    assert staged.rejected == "size"
+    assert staged.path is None
+    # Partial staging file is removed
+    assert os.listdir(tmp_path) == []
+
+
+def test_stage_upload_rejects_disallowed_mime_without_writing(tmp_path):
+    staged = asyncio.run(
+        stage_upload(_upload(b"just some text", "x.txt", "text/plain"), str(tmp_path))
+    )
+    assert staged.rejected == "mime"
+    assert not os.path.exists(tmp_path) or os.listdir(tmp_path) == []
+
+
+def _jpeg_with_exif() -> bytes:
+    import piexif
+    from PIL import Image
+
+    exif = piexif.dump({"Exif": {piexif.ExifIFD.DateTimeOriginal: b"2024:05:06 07:08:09"}})
+    buf = BytesIO()
+    Image.new("RGB", (32, 32), color=(1, 2, 3)).save(buf, format="JPEG", exif=exif)
+    return buf.getvalue()
+
+
+def test_extract_image_metadata_reuses_streamed_checksum(tmp_path):
+    from app.services.metadata_utils import extract_image_metadata
+
+    p = tmp_path / "a.jpg"
+    p.write_bytes(_jpeg_with_exif())
+    meta = extract_image_metadata(str(p), checksum="abc123")
+    assert meta["checksum"] == "abc123"
+    assert meta["datetime_taken"] == "2024-05-06 07:08:09"
+    # Without a precomputed checksum it is still derived from the file
+    assert extract_image_metadata(str(p))["checksum"] == hashlib.sha256(p.read_bytes()).hexdigest()
+
+
+def test_finalize_staged_upload_reads_exif_from_stored_file(db_session, tmp_path, monkeypatch):
+    from app.models.event import Event
+    from app.models.user import User
+    from app.services.upload_ingest import finalize_staged_upload
+
+    u = User(FirstName="M", LastName="D", Email="meta@example.test", HashedPassword="x")
+    db_session.add(u)
+    db_session.flush()
+    ev = Event(UserID=u.UserID, Name="Meta", Code="METAEX", Password="pw", TermsChecked=True)
+    db_session.add(ev)
+    db_session.flush()
+
+    monkeypatch.chdir(tmp_path)
+    data = _jpeg_with_exif()
+    staged = asyncio.run(
+        stage_upload(_upload(data, "exif.jpg", "image/jpeg"), str(tmp_path / "staging"))
+    )
+    rec = finalize_staged_upload(
+        db_session,
+        staged,
+        user_id=u.UserID,
+        event_id=ev.EventID,
+        guest_id=None,
+        uploads_base=str(tmp_path / "uploads"),
+    )
+    assert rec is not None
+    assert rec.Checksum == hashlib.sha256(data).hexdigest()
+    assert rec.CapturedDateTime.year == 2024 and rec.CapturedDateTime.second == 9
+    assert (tmp_path / "uploads" / "exif.jpg").read_bytes() == data
+    assert os.listdir(tmp_path / "staging") == []
+
+
+def test_finalize_staged_batch_uses_fixed_round_trips(db_session, tmp_path, monkeypatch):
+    from sqlalchemy import event as sa_event
+
+    from app.models.event import Event, FileMetadata
+    from app.models.user import User
+    from app.services.upload_ingest import finalize_staged_batch
+
+    u = User(FirstName="B", LastName="I", Email="batch@example.test", HashedPassword="x")
+    db_session.add(u)
+    db_session.flush()
+    ev = Event(UserID=u.UserID, Name="Batch", Code="BATCH1", Password="pw", TermsChecked=True)
+    db_session.add(ev)
+    db_session.flush()
+
+    blobs = [_jpeg_bytes() + bytes([i]) * 100 for i in range(3)]
+    db_session.add(
+        FileMetadata(
+            EventID=ev.EventID,
+            FileName="old.jpg",
+            FileType="image/jpeg",
+            FileSize=len(blobs[0]),
+            Checksum=hashlib.sha256(blobs[0]).hexdigest(),
+        )
+    )
+    db_session.flush()
+    monkeypatch.chdir(tmp_path)
+    staging = str(tmp_path / "staging")
+    payloads = [blobs[0], blobs[1], blobs[1], blobs[2]]
+    staged = [
+        asyncio.run(stage_upload(_upload(b, f"f{i}.jpg", "image/jpeg"), staging))
+        for i, b in enumerate(payloads)
+    ]
+
+    statements = []
+    conn = db_session.connection()
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    sa_event.listen(conn, "before_cursor_execute", listener)
+    try:
+        recs, duplicates = finalize_staged_batch(
+            db_session,
+            staged,
+            user_id=u.UserID,
+            event_id=ev.EventID,
+            guest_id=None,
+            uploads_base=str(tmp_path / "uploads"),
+        )
+    finally:
+        sa_event.remove(conn, "before_cursor_execute", listener)
+
+    assert duplicates == 2
+    assert [r.FileName for r in recs] == ["f1.jpg", "f3.jpg"]
+    assert all(r.FileMetadataID for r in recs)
+    # One event dedupe lookup + one blob lookup; one blob insert + one file insert
+    assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 2
+    assert len([s for s in statements if s.lstrip().upper().startswith("INSERT")]) == 2
+    assert sorted(os.listdir(tmp_path / "uploads")) == ["f1.jpg", "f3.jpg"]
+    assert os.listdir(staging) == []
+
+
+def test_s3_batch_pairs_rows_without_checksums_and_skips_repeats(db_session, tmp_path, monkeypatch):
+    from app.models.event import Event
+    from app.models.user import User
+    from app.services.upload_ingest import finalize_staged_batch, store_batch_in_s3
+
+    u = User(FirstName="N", LastName="C", Email="nochecksum@example.test", HashedPassword="x")
+    db_session.add(u)
+    db_session.flush()
+    ev = Event(UserID=u.UserID, Name="NoSum", Code="NOSUM1", Password="pw", TermsChecked=True)
+    db_session.add(ev)
+    db_session.flush()
+
+    class FakeS3:
+        def __init__(self):
+            self.objects = {}
+
+        async def upload_stream(self, path, key, mime):
+            with open(path, "rb") as fh:
+                self.objects[key] = fh.read()
+            return True
+
+    monkeypatch.chdir(tmp_path)
+    staging = str(tmp_path / "staging")
+    payloads = [_jpeg_bytes() + bytes([i]) * 50 for i in range(3)] + [_jpeg_bytes()]
+    staged = [
+        asyncio.run(stage_upload(_upload(b, f"n{i}.jpg", "image/jpeg"), staging))
+        for i, b in enumerate(payloads)
+    ]
+    # Two files with nothing to key on, plus an in-batch repeat of the last one
+    staged[0].checksum = staged[1].checksum = None
+    staged.append(asyncio.run(stage_upload(_upload(payloads[3], "dup.jpg", "image/jpeg"), staging)))
+    s3 = FakeS3()
+    kwargs = dict(user_id=u.UserID, event_id=ev.EventID, uploads_base=str(tmp_path / "uploads"))
+    recs, duplicates = finalize_staged_batch(
+        db_session, staged, guest_id=None, s3_service=s3, **kwargs
+    )
+    asyncio.run(store_batch_in_s3(s3, staged, recs, **kwargs))
+
+    assert duplicates == 1
+    assert [r.FileName for r in recs] == ["n0.jpg", "n1.jpg", "n2.jpg", "n3.jpg"]
+    for rec, data in zip(recs, payloads):
+        key = f"uploads/{u.UserID}/{ev.EventID}/{rec.FileMetadataID}/{rec.FileName}"
+        assert s3.objects[key] == data
+    assert os.listdir(staging) == []